@@ -2,4 +2,5 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
                         
-from .clustering import *
\ No newline at end of file
+from .clustering import *
+from .mesh_clustering import *
\ No newline at end of file
@@ -10,15 +10,20 @@ import sys
 import numpy as np
 from math import pi, gamma
 from .pair_counters.rect_cuboid_pairs import npairs, xy_z_npairs, jnpairs, s_mu_npairs
+from .pair_counters.rect_cuboid_pairs import wnpairs
+from .pair_counters.rect_cuboid_pairs import wp_npairs, labeled_npairs, multipole_npairs
+from .pair_counters.grid_index import GridIndex
+from .pair_counters.pair_count_cache import PairCountCache
 ##########################################################################################
 
-__all__=['tpcf','tpcf_jackknife','redshift_space_tpcf','wp','s_mu_tpcf']
+__all__=['tpcf','tpcf_jackknife','redshift_space_tpcf','wp','s_mu_tpcf','tpcf_multipole',\
+         'labeled_tpcf','marked_tpcf']
 __author__ = ['Duncan Campbell']
 
 
 def tpcf(sample1, rbins, sample2=None, randoms=None, period=None,\
          do_auto=True, do_cross=True, estimator='Natural', N_threads=1,\
-         max_sample_size=int(1e6)):
+         max_sample_size=int(1e6), pair_counter=None, rr_cache=None):
     """ 
     Calculate the real space two-point correlation function, :math:`\\xi(r)`.
     
@@ -36,6 +41,8 @@ def tpcf(sample1, rbins, sample2=None, randoms=None, period=None,\
     randoms : array_like, optional
         Nran x 3 numpy array containing 3-d positions of Npts.  If no randoms are provided
         analytic randoms are used (only valid for periodic boundary conditions).
+        A `GridIndex` of the randoms may also be passed, in which case its cached grids 
+        are used.
     
     period: array_like, optional
         length 3 array defining axis-aligned periodic boundary conditions. If only
@@ -54,12 +61,25 @@ def tpcf(sample1, rbins, sample2=None, randoms=None, period=None,\
     N_threads: int, optional
         number of threads to use in calculation. Default is 1. A string 'max' may be used
         to indicate that the pair counters should use all available cores on the machine.
+        A `~halotools.mock_observables.pair_counters.PairCounterPool` may also be passed 
+        to re-use the same worker processes across many calls.
 
     max_sample_size : int, optional
         Defines maximum size of the sample that will be passed to the pair counter. 
         
         If sample size exeeds max_sample_size, the sample will be randomly down-sampled
         such that the subsample is (roughly) equal to max_sample_size. 
+
+    pair_counter : `~halotools.mock_observables.pair_counters.BatchPairCounter`, optional
+        If passed, the pairs are counted by pair_counter, which caches the pair counts 
+        of each sample in all of its binnings, so that they are shared with other 
+        clustering functions called with the same pair_counter.
+
+    rr_cache : `~halotools.mock_observables.pair_counters.PairCountCache`, optional
+        If passed, the RR pair counts are taken from rr_cache, which stores them on disk 
+        keyed on a hash of the randoms, the bins, and the period, so that they are only 
+        counted the first time the same randoms are used.  If True, a cache in the 
+        halotools cache directory is used.
         
     Returns 
     -------
@@ -84,6 +104,10 @@ def tpcf(sample1, rbins, sample2=None, randoms=None, period=None,\
         return estimators
     estimators = list_estimators()
     
+    #count pairs with the pair counter shared between clustering functions, if passed
+    npairs = _pair_counter_functions(pair_counter)['npairs']
+    rr_npairs = _rr_pair_counter(npairs, 'r', rr_cache)
+    
     #process input parameters
     sample1 = np.asarray(sample1)
     if sample2 is not None: 
@@ -93,7 +117,6 @@ def tpcf(sample1, rbins, sample2=None, randoms=None, period=None,\
             print("Warning: sample1 and sample2 are exactly the same, only the\
                    auto-correlation will be returned.")
     else: sample2 = sample1
-    if randoms is not None: randoms = np.asarray(randoms)
     rbins = np.asarray(rbins)
     
     #Process period entry and check for consistency.
@@ -109,6 +132,9 @@ def tpcf(sample1, rbins, sample2=None, randoms=None, period=None,\
             raise ValueError("period should have shape (k,)")
             return None
     
+    #index the randoms, so that their grids are only built once
+    randoms = _index_randoms(randoms, period)
+    
     #down sample is sample size exceeds max_sample_size.
     if (len(sample2)>max_sample_size) & (not np.all(sample1==sample2)):
         inds = np.arange(0,len(sample2))
@@ -170,7 +196,7 @@ def tpcf(sample1, rbins, sample2=None, randoms=None, period=None,\
         
         #No PBCs, randoms must have been provided.
         if PBCs==False:
-            RR = npairs(randoms, randoms, rbins, period=period, N_threads=N_threads)
+            RR = rr_npairs(randoms, randoms, rbins, period=period, N_threads=N_threads)
             RR = np.diff(RR)
             D1R = npairs(sample1, randoms, rbins, period=period, N_threads=N_threads)
             D1R = np.diff(D1R)
@@ -184,7 +210,7 @@ def tpcf(sample1, rbins, sample2=None, randoms=None, period=None,\
         #PBCs and randoms.
         elif randoms is not None:
             if do_RR==True:
-                RR = npairs(randoms, randoms, rbins, period=period, N_threads=N_threads)
+                RR = rr_npairs(randoms, randoms, rbins, period=period, N_threads=N_threads)
                 RR = np.diff(RR)
             else: RR=None
             if do_DR==True:
@@ -355,7 +381,9 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
         Npts x 3 numpy array containing 3-d positions of Npts.
     
     randoms : array_like
-        Nran x 3 numpy array containing 3-d positions of Npts.
+        Nran x 3 numpy array containing 3-d positions of Npts.  If None, PBCs must be 
+        defined, the estimator must be 'Natural', and the random pair counts of the full 
+        box and of each jackknife sample are calculated analytically.
     
     rbins : array_like
         numpy array of boundaries defining the bins in which pairs are counted. 
@@ -384,10 +412,15 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
     
     estimator: string, optional
         options: 'Natural', 'Davis-Peebles', 'Hewett' , 'Hamilton', 'Landy-Szalay'
+        
+        The estimators which use DR pairs require `randoms`, as the DR pairs of the 
+        jackknife samples depend on the data around each removed subvolume.
     
     N_threads: int, optional
         number of threads to use in calculation. Default is 1. A string 'max' may be used
         to indicate that the pair counters should use all available cores on the machine.
+        A `~halotools.mock_observables.pair_counters.PairCounterPool` may also be passed 
+        to re-use the same worker processes across many calls.
     
     max_sample_size : int, optional
         Defines maximum size of the sample that will be passed to the pair counter. 
@@ -418,7 +451,7 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
             print("Warning: sample1 and sample2 are exactly the same, only the\
                    auto-correlation will be returned.")
     else: sample2 = sample1
-    randoms = np.asarray(randoms)
+    if randoms is not None: randoms = np.asarray(randoms)
     rbins = np.asarray(rbins)
     if type(Nsub) is int: Nsub = np.array([Nsub]*np.shape(sample1)[-1])
     else: Nsub = np.asarray(Nsub)
@@ -449,11 +482,11 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
         inds = inds[0:max_sample_size]
         sample1 = sample1[inds]
         print('down sampling sample1...')
-    if len(randoms)>max_sample_size:
+    if (randoms is not None) and (len(randoms)>max_sample_size):
         inds = np.arange(0,len(randoms))
         np.random.shuffle(inds)
         inds = inds[0:max_sample_size]
-        sample1 = randoms[inds]
+        randoms = randoms[inds]
         print('down sampling randoms...')
     if np.shape(Nsub)[0]!=np.shape(sample1)[-1]:
         raise ValueError("Nsub should have shape (k,) or be a single integer")
@@ -472,7 +505,6 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
         
     N1 = len(sample1)
     N2 = len(sample2)
-    Nran = len(randoms)
     
     #check for input parameter consistency
     if (period is not None) & (np.max(rbins)>np.min(period)/2.0):
@@ -486,6 +518,13 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
         raise ValueError('If a non-infinte PBC specified, all PBCs must be non-infinte.')
     if (type(do_auto) is not bool) | (type(do_cross) is not bool):
         raise ValueError('do_auto and do_cross keywords must be of type boolean.')
+    if (randoms is None) & (PBCs==False):
+        raise ValueError('If no PBCs are specified, randoms must be provided.')
+    if (randoms is None) and np.any(Lbox!=period):
+        raise ValueError('The analytic randoms require Lbox to be equal to the period.')
+    if (randoms is None) and (estimator!='Natural'):
+        raise ValueError('The analytic randoms are only supported for the Natural '
+                         'estimator, randoms must be provided for {0}.'.format(estimator))
     
     def get_subvolume_labels(sample1, sample2, randoms, Nsub, Lbox):
         """
@@ -506,10 +545,12 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
         j_index_1 = inds[index_1[:,0],index_1[:,1],index_1[:,2]].astype(int)
     
         #subvolume indices for the random particle's positions
-        index_random = np.floor(randoms/dL).astype(int)
-        j_index_random = inds[index_random[:,0],\
-                              index_random[:,1],\
-                              index_random[:,2]].astype(int)
+        if randoms is not None:
+            index_random = np.floor(randoms/dL).astype(int)
+            j_index_random = inds[index_random[:,0],\
+                                  index_random[:,1],\
+                                  index_random[:,2]].astype(int)
+        else: j_index_random = None
         
         #subvolume indices for the sample2 particle's positions
         index_2 = np.floor(sample2/dL).astype(int)
@@ -570,7 +611,37 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
         else: RR=None
 
         return DR, RR
+    
+    def analytic_jrandom_counts(N_sub_vol, rbins, period, k):
+        """
+        Calculate jackknife random pairs analytically: RR
+        
+        The randoms are spread uniformly over the periodic box, with a total of one 
+        random point.  As in `jnpairs`, pairs with both points in the subvolume removed 
+        from a jackknife sample are not counted, and pairs with one point in the removed 
+        subvolume are given half weight.  In a periodic box every point is surrounded by 
+        complete shells of randoms, so the parts of the shells clipped by the removed 
+        subvolume, summed over the random points of the box, have the volume of the 
+        subvolume times the volume of the shells, and RR is exact.  DR has no such 
+        closed form, as the part of the shells around the data clipped by the removed 
+        subvolume follows the density of the data around it.
+        """
+        def nball_volume(R,k):
+            """
+            Calculate the volume of a n-shpere.  This is used for the analytical randoms.
+            """
+            return (np.pi**(k/2.0)/gamma(k/2.0+1.0))*R**k
+        
+        dv = np.diff(nball_volume(rbins,k)) #volume of shells
+        global_volume = period.prod()
+        
+        #fraction of the box removed from the full sample, and from each jackknife sample
+        f_removed = np.hstack(([0.0], [1.0/N_sub_vol]*N_sub_vol))
         
+        RR = np.outer(1.0 - f_removed, dv/global_volume)
+        
+        return RR
+    
     def TP_estimator(DD,DR,RR,ND1,ND2,NR1,NR2,estimator):
         """
         two point correlation function estimator
@@ -643,16 +714,9 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
         """
         Calculate the full covariance matrix.
         """
-        Nr = full.shape[0] # Nr is the number of radial bins
-        cov = np.zeros((Nr,Nr)) # 2D array that keeps the covariance matrix 
         after_subtraction = sub - np.mean(sub,axis=0)
-        tmp = 0
-        for i in range(Nr):
-            for j in range(Nr):
-                tmp = 0.0
-                for k in range(N_sub_vol):
-                    tmp = tmp + after_subtraction[k,i]*after_subtraction[k,j]
-                cov[i,j] = (((N_sub_vol-1)/N_sub_vol)*tmp)
+        #sum over the subvolumes of the outer products of the deviations
+        cov = ((N_sub_vol-1)/N_sub_vol)*np.dot(after_subtraction.T, after_subtraction)
     
         return cov
     
@@ -660,19 +724,24 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
     
     N1 = len(sample1)
     N2 = len(sample2)
-    NR = len(randoms)
     
     j_index_1, j_index_2, j_index_random, N_sub_vol = \
                                get_subvolume_labels(sample1, sample2, randoms, Nsub, Lbox)
     
     #number of points in each subvolume
-    NR_subs = get_subvolume_numbers(j_index_random,N_sub_vol)
-    N1_subs = get_subvolume_numbers(j_index_1,N_sub_vol)
-    N2_subs = get_subvolume_numbers(j_index_2,N_sub_vol)
+    N1_in = get_subvolume_numbers(j_index_1,N_sub_vol)
+    N2_in = get_subvolume_numbers(j_index_2,N_sub_vol)
+    if randoms is not None:
+        NR = len(randoms)
+        NR_in = get_subvolume_numbers(j_index_random,N_sub_vol)
+    else:
+        #analytic randoms, one random point spread over the box
+        NR = 1.0
+        NR_in = np.array([NR/N_sub_vol]*N_sub_vol)
     #number of points in each jackknife sample
-    N1_subs = N1 - N1_subs
-    N2_subs = N2 - N2_subs
-    NR_subs = NR - NR_subs
+    N1_subs = N1 - N1_in
+    N2_subs = N2 - N2_in
+    NR_subs = NR - NR_in
     
     #calculate all the pair counts
     D1D1, D1D2, D2D2 = jnpair_counts(sample1, sample2, j_index_1, j_index_2, N_sub_vol,\
@@ -683,16 +752,23 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
     D1D2_sub = D1D2[1:,:]
     D2D2_full = D2D2[0,:]
     D2D2_sub = D2D2[1:,:]
-    D1R, RR = jrandom_counts(sample1, randoms, j_index_1, j_index_random, N_sub_vol,\
-                             rbins, period, N_threads, do_DR, do_RR)
-    if np.all(sample1==sample2):
-        D2R=D1R
+    if randoms is None:
+        #only the Natural estimator is allowed, which uses no DR pairs
+        D1R, D2R = None, None
+        RR = analytic_jrandom_counts(N_sub_vol, rbins, period, k)
     else:
-        if do_DR==True:
-            D2R, RR_dummy= jrandom_counts(sample2, randoms, j_index_2, j_index_random,\
-                                          N_sub_vol, rbins, period, N_threads, do_DR,
-                                          do_RR=False)
-        else: D2R = None
+        #index the randoms, so that their grids are only built once in this call
+        randoms_index = GridIndex(randoms, Lbox=Lbox, cache=False)
+        D1R, RR = jrandom_counts(sample1, randoms_index, j_index_1, j_index_random,\
+                                 N_sub_vol, rbins, period, N_threads, do_DR, do_RR)
+        if np.all(sample1==sample2):
+            D2R=D1R
+        else:
+            if do_DR==True:
+                D2R, RR_dummy= jrandom_counts(sample2, randoms_index, j_index_2,\
+                                              j_index_random, N_sub_vol, rbins, period,\
+                                              N_threads, do_DR, do_RR=False)
+            else: D2R = None
     
     if do_DR==True:    
         D1R_full = D1R[0,:]
@@ -747,7 +823,8 @@ def tpcf_jackknife(sample1, randoms, rbins, Nsub=[5,5,5], Lbox=[250.0,250.0,250.
 
 def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
                         period=None, do_auto=True, do_cross=True, estimator='Natural',\
-                        N_threads=1, max_sample_size=int(1e6)):
+                        N_threads=1, max_sample_size=int(1e6), pair_counter=None,\
+                        rr_cache=None):
     """ 
     Calculate the redshift space correlation function, :math:`\\xi(r_p, \\pi)`.
     
@@ -772,6 +849,8 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
     randoms : array_like, optional
         Nran x 3 numpy array containing 3-d positions of Npts.  If no randoms are provided
         analytic randoms are used (only valid for periodic boundary conditions).
+        A `GridIndex` of the randoms may also be passed, in which case its cached grids 
+        are used.
     
     period: array_like, optional
         length 3 array defining axis-aligned periodic boundary conditions. If only 
@@ -787,9 +866,11 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
     do_cross: boolean, optional
         do cross-correlation?  Default is True.
     
-    N_thread: int, optional
+    N_threads: int, optional
         number of threads to use in calculation. Default is 1. A string 'max' may be used
         to indicate that the pair counters should use all available cores on the machine.
+        A `~halotools.mock_observables.pair_counters.PairCounterPool` may also be passed 
+        to re-use the same worker processes across many calls.
     
     max_sample_size : int, optional
         Defines maximum size of the sample that will be passed to the pair counter. 
@@ -797,6 +878,17 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
         If sample size exeeds max_sample_size, the sample will be randomly down-sampled 
         such that the subsample is (roughly) equal to max_sample_size. 
 
+    pair_counter : `~halotools.mock_observables.pair_counters.BatchPairCounter`, optional
+        If passed, the pairs are counted by pair_counter, which caches the pair counts 
+        of each sample in all of its binnings, so that they are shared with other 
+        clustering functions called with the same pair_counter.
+
+    rr_cache : `~halotools.mock_observables.pair_counters.PairCountCache`, optional
+        If passed, the RR pair counts are taken from rr_cache, which stores them on disk 
+        keyed on a hash of the randoms, the bins, and the period, so that they are only 
+        counted the first time the same randoms are used.  If True, a cache in the 
+        halotools cache directory is used.
+
     Returns 
     -------
     correlation_function : array_like
@@ -823,6 +915,10 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
         return estimators
     estimators = list_estimators()
     
+    #count pairs with the pair counter shared between clustering functions, if passed
+    xy_z_npairs = _pair_counter_functions(pair_counter)['xy_z_npairs']
+    rr_xy_z_npairs = _rr_pair_counter(xy_z_npairs, 'xy_z', rr_cache)
+    
     #process input parameters
     sample1 = np.asarray(sample1)
     if sample2 is not None: 
@@ -832,7 +928,6 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
             print("Warning: sample1 and sample2 are exactly the same, only the\
                    auto-correlation will be returned.")
     else: sample2 = sample1
-    if randoms is not None: randoms = np.asarray(randoms)
     rp_bins = np.asarray(rp_bins)
     pi_bins = np.asarray(pi_bins)
     
@@ -849,6 +944,9 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
             raise ValueError("period should have shape (k,)")
             return None
     
+    #index the randoms, so that their grids are only built once
+    randoms = _index_randoms(randoms, period)
+    
     #down sample is sample size exceeds max_sample_size.
     if (len(sample2)>max_sample_size) & (not np.all(sample1==sample2)):
         inds = np.arange(0,len(sample2))
@@ -912,13 +1010,15 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
         """
         def cylinder_volume(R,h):
             """
-            Calculate the volume of a cylinder(s), used for the analytical randoms.
+            Calculate the volume of a cylinder(s) of radius R, and length 2h, i.e. of 
+            the points with separations along the line of sight <= h, used for the 
+            analytical randoms.
             """
-            return pi*np.outer(R**2.0,h)
+            return 2.0*pi*np.outer(R**2.0,h)
         
         #No PBCs, randoms must have been provided.
         if PBCs==False:
-            RR = xy_z_npairs(randoms, randoms, rp_bins, pi_bins, period=period, N_threads=N_threads)
+            RR = rr_xy_z_npairs(randoms, randoms, rp_bins, pi_bins, period=period, N_threads=N_threads)
             RR = np.diff(np.diff(RR,axis=0),axis=1)
             D1R = xy_z_npairs(sample1, randoms, rp_bins, pi_bins, period=period, N_threads=N_threads)
             D1R = np.diff(np.diff(D1R,axis=0),axis=1)
@@ -932,7 +1032,7 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
         #PBCs and randoms.
         elif randoms is not None:
             if do_RR==True:
-                RR = xy_z_npairs(randoms, randoms, rp_bins, pi_bins, period=period, N_threads=N_threads)
+                RR = rr_xy_z_npairs(randoms, randoms, rp_bins, pi_bins, period=period, N_threads=N_threads)
                 RR = np.diff(np.diff(RR,axis=0),axis=1)
             else: RR=None
             if do_DR==True:
@@ -1089,7 +1189,7 @@ def redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=None, randoms=None,\
 
 def wp(sample1, rp_bins, pi_bins, sample2=None, randoms=None, period=None,\
        do_auto=True, do_cross=True, estimator='Natural', N_threads=1,\
-       max_sample_size=int(1e6)):
+       max_sample_size=int(1e6), pair_counter=None, rr_cache=None):
     """ 
     Calculate the projected correlation function, :math:`\\w_p`.
     
@@ -1097,6 +1197,11 @@ def wp(sample1, rp_bins, pi_bins, sample2=None, randoms=None, period=None,\
     dimension is used for parallel distances.  i.e. x,y positions are on the plane of the
     sky, and z is the redshift coordinate. This is the 'distant observer' approximation.
     
+    If no randoms are passed (analytic randoms), or pi_bins is a single bin, the pairs 
+    with separations along the line of sight <= max(pi_bins) are counted directly in 
+    rp bins by `~halotools.mock_observables.pair_counters.wp_npairs`, rather than in 
+    every (rp, pi) bin.  The result is the same.
+    
     Parameters 
     ----------
     sample1 : array_like
@@ -1112,7 +1217,8 @@ def wp(sample1, rp_bins, pi_bins, sample2=None, randoms=None, period=None,\
         Npts x 3 numpy array containing 3-d positions of Npts.
     
     randoms : array_like, optional
-        Nran x 3 numpy array containing 3-d positions of Npts.
+        Nran x 3 numpy array containing 3-d positions of Npts.  A `GridIndex` of the 
+        randoms may also be passed, in which case its cached grids are used.
     
     period: array_like, optional
         length k array defining axis-aligned periodic boundary conditions. If only 
@@ -1131,6 +1237,8 @@ def wp(sample1, rp_bins, pi_bins, sample2=None, randoms=None, period=None,\
     N_threads: int, optional
         number of threads to use in calculation. Default is 1. A string 'max' may be used
         to indicate that the pair counters should use all available cores on the machine.
+        A `~halotools.mock_observables.pair_counters.PairCounterPool` may also be passed 
+        to re-use the same worker processes across many calls.
     
     max_sample_size : int, optional
         Defines maximum size of the sample that will be passed to the pair counter. 
@@ -1138,6 +1246,17 @@ def wp(sample1, rp_bins, pi_bins, sample2=None, randoms=None, period=None,\
         If sample size exceeds max_sample_size, the sample will be randomly down-sampled 
         such that the subsample is (roughly) equal to max_sample_size.
 
+    pair_counter : `~halotools.mock_observables.pair_counters.BatchPairCounter`, optional
+        If passed, the pairs are counted by pair_counter, which caches the pair counts 
+        of each sample in all of its binnings, so that they are shared with other 
+        clustering functions called with the same pair_counter.
+
+    rr_cache : `~halotools.mock_observables.pair_counters.PairCountCache`, optional
+        If passed, the RR pair counts are taken from rr_cache, which stores them on disk 
+        keyed on a hash of the randoms, the bins, and the period, so that they are only 
+        counted the first time the same randoms are used.  If True, a cache in the 
+        halotools cache directory is used.
+
     Returns 
     -------
     correlation_function : array_like
@@ -1155,6 +1274,19 @@ def wp(sample1, rp_bins, pi_bins, sample2=None, randoms=None, period=None,\
         appropriate result is not returned.
 
     """
+    
+    #w_p only depends on the pairs with separations along the line of sight <= pi_max 
+    #if there is a single pi bin, or if the randoms are analytic, in which case the 
+    #number of random pairs in each pi bin is proportional to its width.  These pairs 
+    #are counted directly in rp bins, unless the pairs are counted in (rp,pi) bins by a 
+    #shared pair counter.
+    pi_bins = np.asarray(pi_bins)
+    if (pair_counter is None) & (pi_bins.ndim==1) & (len(pi_bins)>=2):
+        if (pi_bins[0]==0.0) & ((randoms is None) | (len(pi_bins)==2)):
+            return _direct_wp(sample1, rp_bins, pi_bins[-1], sample2, randoms, period,\
+                              do_auto, do_cross, estimator, N_threads, max_sample_size,\
+                              rr_cache)
+    
     """
     #process parameters
     if type(pi_max) not in [int,float,long]:
@@ -1169,7 +1301,8 @@ def wp(sample1, rp_bins, pi_bins, sample2=None, randoms=None, period=None,\
                                  sample2 = sample2, randoms=randoms,\
                                  period = period, do_auto=do_auto, do_cross=do_cross,\
                                  estimator=estimator, N_threads=N_threads,\
-                                 max_sample_size=max_sample_size)
+                                 max_sample_size=max_sample_size,\
+                                 pair_counter=pair_counter, rr_cache=rr_cache)
     
     #process the output of the redshift space TPCF function
     if sample2 is None: 
@@ -1219,7 +1352,8 @@ def wp(sample1, rp_bins, pi_bins, sample2=None, randoms=None, period=None,\
 
 def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
               period=None, do_auto=True, do_cross=True, estimator='Natural',\
-              N_threads=1, max_sample_size=int(1e6)):
+              N_threads=1, max_sample_size=int(1e6), pair_counter=None,\
+              rr_cache=None):
     """ 
     Calculate the redshift space correlation function, :math:`\\xi(s, \\mu)`.
     
@@ -1246,6 +1380,8 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
     randoms : array_like, optional
         Nran x 3 numpy array containing 3-d positions of Npts.  If no randoms are provided
         analytic randoms are used (only valid for periodic boundary conditions).
+        A `GridIndex` of the randoms may also be passed, in which case its cached grids 
+        are used.
     
     period: array_like, optional
         length 3 array defining axis-aligned periodic boundary conditions. If only 
@@ -1261,9 +1397,11 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
     do_cross: boolean, optional
         do cross-correlation?  Default is True.
     
-    N_thread: int, optional
+    N_threads: int, optional
         number of threads to use in calculation. Default is 1. A string 'max' may be used
         to indicate that the pair counters should use all available cores on the machine.
+        A `~halotools.mock_observables.pair_counters.PairCounterPool` may also be passed 
+        to re-use the same worker processes across many calls.
     
     max_sample_size : int, optional
         Defines maximum size of the sample that will be passed to the pair counter. 
@@ -1271,6 +1409,17 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
         If sample size exeeds max_sample_size, the sample will be randomly down-sampled 
         such that the subsample is (roughly) equal to max_sample_size. 
 
+    pair_counter : `~halotools.mock_observables.pair_counters.BatchPairCounter`, optional
+        If passed, the pairs are counted by pair_counter, which caches the pair counts 
+        of each sample in all of its binnings, so that they are shared with other 
+        clustering functions called with the same pair_counter.
+
+    rr_cache : `~halotools.mock_observables.pair_counters.PairCountCache`, optional
+        If passed, the RR pair counts are taken from rr_cache, which stores them on disk 
+        keyed on a hash of the randoms, the bins, and the period, so that they are only 
+        counted the first time the same randoms are used.  If True, a cache in the 
+        halotools cache directory is used.
+
     Returns 
     -------
     correlation_function : array_like
@@ -1297,6 +1446,10 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
         return estimators
     estimators = list_estimators()
     
+    #count pairs with the pair counter shared between clustering functions, if passed
+    s_mu_npairs = _pair_counter_functions(pair_counter)['s_mu_npairs']
+    rr_s_mu_npairs = _rr_pair_counter(s_mu_npairs, 's_mu', rr_cache)
+    
     #process input parameters
     sample1 = np.asarray(sample1)
     if sample2 is not None: 
@@ -1306,7 +1459,6 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
             print("Warning: sample1 and sample2 are exactly the same, only the\
                    auto-correlation will be returned.")
     else: sample2 = sample1
-    if randoms is not None: randoms = np.asarray(randoms)
     s_bins = np.asarray(s_bins)
     mu_bins = np.asarray(mu_bins)
     
@@ -1323,6 +1475,9 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
             raise ValueError("period should have shape (k,)")
             return None
     
+    #index the randoms, so that their grids are only built once
+    randoms = _index_randoms(randoms, period)
+    
     #down sample is sample size exceeds max_sample_size.
     if (len(sample2)>max_sample_size) & (not np.all(sample1==sample2)):
         inds = np.arange(0,len(sample2))
@@ -1389,14 +1544,17 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
             Calculate the volume of a spherical sector, used for the analytical randoms.
             https://en.wikipedia.org/wiki/Spherical_sector
             
-            #note that the extra *2 is to get the reflection.
+            mu is the cosine of the angle from the line of sight, so the volume with 
+            separations <= s and mu' <= mu is the sphere less the two sectors (one and its 
+            reflection) with half-angle arccos(mu) about the line of sight.
             """
-            theta = np.arcsin(mu)
-            return (2.0*np.pi/3.0) * np.outer((s**3.0),(1.0-np.cos(theta)))*2
+            theta = np.arccos(mu)
+            return (4.0*np.pi/3.0) * np.outer((s**3.0),np.ones(len(mu))) -\
+                   (2.0*np.pi/3.0) * np.outer((s**3.0),(1.0-np.cos(theta)))*2
         
         #No PBCs, randoms must have been provided.
         if PBCs==False:
-            RR = s_mu_npairs(randoms, randoms, s_bins, mu_bins, period=period, N_threads=N_threads)
+            RR = rr_s_mu_npairs(randoms, randoms, s_bins, mu_bins, period=period, N_threads=N_threads)
             RR = np.diff(np.diff(RR,axis=0),axis=1)
             D1R = s_mu_npairs(sample1, randoms, s_bins, mu_bins, period=period, N_threads=N_threads)
             D1R = np.diff(np.diff(D1R,axis=0),axis=1)
@@ -1410,7 +1568,7 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
         #PBCs and randoms.
         elif randoms is not None:
             if do_RR==True:
-                RR = s_mu_npairs(randoms, randoms, s_bins, mu_bins, period=period, N_threads=N_threads)
+                RR = rr_s_mu_npairs(randoms, randoms, s_bins, mu_bins, period=period, N_threads=N_threads)
                 RR = np.diff(np.diff(RR,axis=0),axis=1)
             else: RR=None
             if do_DR==True:
@@ -1563,3 +1721,1080 @@ def s_mu_tpcf(sample1, s_bins, mu_bins, sample2=None, randoms=None,\
             xi_11 = TP_estimator(D1D1,D1R,D1R,N1,N1,NR,NR,estimator)
             xi_22 = TP_estimator(D2D2,D2R,D2R,N2,N2,NR,NR,estimator)
             return xi_11
+
+
+def tpcf_multipole(sample1, s_bins, ells=[0,2,4], sample2=None, randoms=None,\
+                   period=None, do_auto=True, do_cross=True, estimator='Natural',\
+                   N_threads=1, max_sample_size=int(1e6), rr_cache=None):
+    """ 
+    Calculate the Legendre multipoles of the redshift space correlation function, 
+    :math:`\\xi_{\\ell}(s)`.
+    
+    The first two dimensions define the plane for perpendicular distances.  The third 
+    dimension is used for parallel distances.  i.e. x,y positions are on the plane of the
+    sky, and z is the redshift coordinate.  This is the distant observer approximation.
+    
+    The Legendre polynomials of the pairs, :math:`P_{\\ell}(\\mu)`, are summed in each 
+    s bin by `multipole_npairs` as the pairs are counted, so, unlike integrating the 
+    result of `s_mu_tpcf`, no binning in mu is required.  The denominators of the 
+    estimators are the monopoles of the RR (or DR) pair counts, which assumes that the 
+    randoms are isotropic, as they are in a box.  If no randoms are passed, the RR 
+    multipoles are calculated analytically, i.e. only the monopole is non-zero.
+    
+    Parameters 
+    ----------
+    sample1 : array_like
+        Npts x 3 numpy array containing 3-d positions of Npts. 
+    
+    s_bins : array_like
+        numpy array of boundaries defining the bins in which pairs are counted. 
+    
+    ells : array_like, optional
+        even, non-negative, integer orders of the multipoles.  Default is [0,2,4], i.e. 
+        the monopole, quadrupole, and hexadecapole.
+    
+    sample2 : array_like, optional
+        Npts x 3 numpy array containing 3-d positions of Npts.
+    
+    randoms : array_like, optional
+        Nran x 3 numpy array containing 3-d positions of Npts.  If no randoms are provided
+        analytic randoms are used (only valid for periodic boundary conditions).
+        A `GridIndex` of the randoms may also be passed, in which case its cached grids 
+        are used.
+    
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only 
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.
+    
+    do_auto: boolean, optional
+        do auto-correlation?  Default is True.
+    
+    do_cross: boolean, optional
+        do cross-correlation?  Default is True.
+    
+    estimator: string, optional
+        options: 'Natural', 'Davis-Peebles', 'Hewett' , 'Hamilton', 'Landy-Szalay'
+    
+    N_threads: int, optional
+        number of threads to use in calculation. Default is 1. A string 'max' may be used
+        to indicate that the pair counters should use all available cores on the machine.
+        A `~halotools.mock_observables.pair_counters.PairCounterPool` may also be passed 
+        to re-use the same worker processes across many calls.
+    
+    max_sample_size : int, optional
+        Defines maximum size of the sample that will be passed to the pair counter. 
+        
+        If sample size exeeds max_sample_size, the sample will be randomly down-sampled 
+        such that the subsample is (roughly) equal to max_sample_size. 
+
+    rr_cache : `~halotools.mock_observables.pair_counters.PairCountCache`, optional
+        If passed, the RR pair counts are taken from rr_cache, see `tpcf`.
+
+    Returns 
+    -------
+    correlation_function : array_like
+        ndarray containing the multipoles :math:`\\xi_{\\ell}(s)` computed in each of 
+        the len(s_bins)-1 bins defined by input `s_bins`, of shape 
+        (len(s_bins)-1,len(ells)).
+        
+        :math:`\\xi_{\\ell}(s) \equiv (2\\ell+1) (DD_{\\ell} - RR_{\\ell}) / RR_0`, if 
+        the 'Natural' estimator is used, where :math:`DD_{\\ell}` is the sum of 
+        :math:`P_{\\ell}(\\mu)` over the pairs in each s bin.
+        
+        If sample2 is passed as input, three ndarrays of shape 
+        (len(s_bins)-1,len(ells)) are returned: :math:`\\xi_{11,\\ell}(s)`, 
+        :math:`\\xi_{12,\\ell}(s)`, :math:`\\xi_{22,\\ell}(s)`.
+        The autocorrelation of sample1, the cross-correlation between sample1 and sample2,
+        and the autocorrelation of sample2.  If do_auto or do_cross is set to False, the 
+        appropriate result is not returned.
+    """
+    
+    def list_estimators():
+        estimators = ['Natural', 'Davis-Peebles', 'Hewett' , 'Hamilton', 'Landy-Szalay']
+        return estimators
+    estimators = list_estimators()
+    
+    rr_multipole_npairs = _rr_pair_counter(multipole_npairs, 'multipole', rr_cache)
+    
+    #process input parameters
+    sample1 = np.asarray(sample1)
+    if sample2 is not None: 
+        sample2 = np.asarray(sample2)
+        if np.all(sample1==sample2):
+            print("Warning: sample1 and sample2 are exactly the same, only the\
+                   auto-correlation will be returned.")
+    else: sample2 = sample1
+    s_bins = np.asarray(s_bins)
+    ells = np.atleast_1d(ells)
+    
+    #Process period entry and check for consistency.
+    if period is None:
+            PBCs = False
+            period = np.array([np.inf]*np.shape(sample1)[-1])
+    else:
+        PBCs = True
+        period = np.asarray(period).astype("float64")
+        if np.shape(period) == ():
+            period = np.array([period]*np.shape(sample1)[-1])
+        elif np.shape(period)[0] != np.shape(sample1)[-1]:
+            raise ValueError("period should have shape (k,)")
+    
+    #index the randoms, so that their grids are only built once
+    randoms = _index_randoms(randoms, period)
+    
+    #down sample is sample size exceeds max_sample_size.
+    if (len(sample2)>max_sample_size) & (not np.all(sample1==sample2)):
+        inds = np.arange(0,len(sample2))
+        np.random.shuffle(inds)
+        inds = inds[0:max_sample_size]
+        sample2 = sample2[inds]
+        print('down sampling sample2...')
+    if len(sample1)>max_sample_size:
+        inds = np.arange(0,len(sample1))
+        np.random.shuffle(inds)
+        inds = inds[0:max_sample_size]
+        sample1 = sample1[inds]
+        print('down sampling sample1...')
+    
+    #check radial bins and multipoles
+    if np.shape(s_bins) == ():
+        s_bins = np.array([s_bins])
+    if s_bins.ndim != 1:
+        raise ValueError('s bins must be a 1-D array')
+    if len(s_bins)<2:
+        raise ValueError('s bins must be of lenght >=2.')
+    if (ells.ndim!=1) or (not np.issubdtype(ells.dtype, np.integer)):
+        raise ValueError('ells must be a 1-D array of integers')
+    if np.any(ells<0) | np.any(ells%2!=0):
+        raise ValueError('ells must be even and >=0, the odd multipoles vanish by symmetry')
+    
+    k = np.shape(sample1)[-1] #dimensionality of data
+    if k!=3:
+        raise ValueError('data must be 3-dimensional.')
+    
+    #check for input parameter consistency
+    if (np.max(s_bins)>np.min(period)/2.0):
+        raise ValueError('Cannot calculate for s seperations larger than Lbox/2.')
+    if (sample1.shape[-1]!=sample2.shape[-1]):
+        raise ValueError('Sample 1 and sample 2 must have same dimension.')
+    if (randoms is None) & (min(period)==np.inf):
+        raise ValueError('If no PBCs are specified, randoms must be provided.')
+    if estimator not in estimators: 
+        raise ValueError('Must specify a supported estimator. Supported estimators \
+        are:{0}'.format(estimators))
+    if (PBCs==True) & (max(period)==np.inf):
+        raise ValueError('If a non-infinte PBC specified, all PBCs must be non-infinte.')
+    if (type(do_auto) is not bool) | (type(do_cross) is not bool):
+        raise ValueError('do_auto and do_cross keywords must be of type boolean.')
+    
+    #the monopole is always counted, as it is the denominator of the estimators
+    count_ells = np.append([0], ells)
+    
+    def random_counts(sample1, sample2, randoms, s_bins, period, k, N_threads,\
+                      do_RR, do_DR):
+        """
+        Count random pairs, either with the randoms, or analytically if no randoms are 
+        passed, in which case only the monopoles of the pair counts are non-zero, and the 
+        expected pair counts of sample1, of sample1 and sample2, and of sample2 are 
+        returned as D1R, RR, and D2R.
+        """
+        def nball_volume(R,k):
+            """
+            Calculate the volume of a n-shpere.  This is used for the analytical randoms.
+            """
+            return (np.pi**(k/2.0)/gamma(k/2.0+1.0))*R**k
+        
+        #PBCs and no randoms--calculate randoms analytically.
+        if randoms is None:
+            #volume of the spherical shells, in the monopole column
+            dv = np.zeros((len(s_bins)-1, len(count_ells)))
+            dv[:,count_ells==0] = np.diff(nball_volume(s_bins,k))[:,np.newaxis]
+            global_volume = period.prod()
+            
+            N1 = np.shape(sample1)[0]
+            N2 = np.shape(sample2)[0]
+            D1R = N1*N1*dv/global_volume
+            D2R = N2*N2*dv/global_volume
+            RR = N1*N2*dv/global_volume
+            
+            return D1R, D2R, RR
+        
+        if do_RR==True:
+            RR = rr_multipole_npairs(randoms, randoms, s_bins, count_ells, period=period,\
+                                     N_threads=N_threads)
+            RR = np.diff(RR, axis=0)
+        else: RR=None
+        if do_DR==True:
+            D1R = np.diff(multipole_npairs(sample1, randoms, s_bins, count_ells,\
+                                           period=period, N_threads=N_threads), axis=0)
+        else: D1R=None
+        if np.all(sample1 == sample2) | (do_DR==False):
+            D2R = None
+        else:
+            D2R = np.diff(multipole_npairs(sample2, randoms, s_bins, count_ells,\
+                                           period=period, N_threads=N_threads), axis=0)
+        
+        return D1R, D2R, RR
+    
+    def pair_counts(sample1, sample2, s_bins, period, N_threads, do_auto, do_cross):
+        """
+        Count data pairs.
+        """
+        D1D1 = np.diff(multipole_npairs(sample1, sample1, s_bins, count_ells,\
+                                        period=period, N_threads=N_threads), axis=0)
+        if np.all(sample1 == sample2):
+            D1D2 = D1D1
+            D2D2 = D1D1
+        else:
+            if do_cross==True:
+                D1D2 = np.diff(multipole_npairs(sample1, sample2, s_bins, count_ells,\
+                                                period=period, N_threads=N_threads),\
+                               axis=0)
+            else: D1D2 = None
+            if do_auto==True:
+                D2D2 = np.diff(multipole_npairs(sample2, sample2, s_bins, count_ells,\
+                                                period=period, N_threads=N_threads),\
+                               axis=0)
+            else: D2D2 = None
+        
+        return D1D1, D1D2, D2D2
+    
+    def TP_estimator(DD,DR,RR,ND1,ND2,NR1,NR2,estimator):
+        """
+        two point correlation function multipole estimator.  The pair counts are 
+        len(s_bins)-1 by len(count_ells) arrays, and the denominators are their 
+        monopoles, the first column.  The RR (or DR) multipoles take the place of 1.
+        """
+        if DR is not None: DR0 = DR[:,0:1]
+        if RR is not None: RR0 = RR[:,0:1]
+        if estimator == 'Natural':
+            factor = ND1*ND2/(NR1*NR2)
+            #DD/RR-1
+            xi = (1.0/factor)*DD/RR0 - RR/RR0
+        elif estimator == 'Davis-Peebles':
+            factor = ND1*ND2/(ND1*NR2)
+            #DD/DR-1
+            xi = (1.0/factor)*DD/DR0 - DR/DR0
+        elif estimator == 'Hewett':
+            factor1 = ND1*ND2/(NR1*NR2)
+            factor2 = ND1*NR2/(NR1*NR2)
+            #(DD-DR)/RR
+            xi = (1.0/factor1)*DD/RR0 - (1.0/factor2)*DR/RR0
+        elif estimator == 'Hamilton':
+            #DDRR/DRDR-1
+            xi = (DD*RR0)/(DR0*DR0) - RR/RR0
+        elif estimator == 'Landy-Szalay':
+            factor1 = ND1*ND2/(NR1*NR2)
+            factor2 = ND1*NR2/(NR1*NR2)
+            #(DD - 2.0*DR + RR)/RR
+            xi = (1.0/factor1)*DD/RR0 - (1.0/factor2)*2.0*DR/RR0 + RR/RR0
+        else: 
+            raise ValueError("unsupported estimator!")
+        
+        #the multipoles are (2l+1) times the Legendre weighted sums, drop the monopole 
+        #counted for the denominators
+        return ((2.0*count_ells+1.0)*xi)[:,1:]
+    
+    def TP_estimator_requirements(estimator):
+        """
+        return booleans indicating which pairs need to be counted for the chosen estimator
+        """
+        if estimator == 'Natural':
+            do_DD = True
+            do_DR = False
+            do_RR = True
+        elif estimator == 'Davis-Peebles':
+            do_DD = True
+            do_DR = True
+            do_RR = False
+        elif estimator == 'Hewett':
+            do_DD = True
+            do_DR = True
+            do_RR = True
+        elif estimator == 'Hamilton':
+            do_DD = True
+            do_DR = True
+            do_RR = True
+        elif estimator == 'Landy-Szalay':
+            do_DD = True
+            do_DR = True
+            do_RR = True
+        else: 
+            raise ValueError("unsupported estimator!")
+        return do_DD, do_DR, do_RR
+    
+    do_DD, do_DR, do_RR = TP_estimator_requirements(estimator)
+    
+    if randoms is not None:
+        N1 = len(sample1)
+        N2 = len(sample2)
+        NR = len(randoms)
+    else: 
+        N1 = 1.0
+        N2 = 1.0
+        NR = 1.0
+    
+    #count pairs
+    D1D1,D1D2,D2D2 = pair_counts(sample1, sample2, s_bins, period,\
+                                 N_threads, do_auto, do_cross)
+    D1R, D2R, RR = random_counts(sample1, sample2, randoms, s_bins, period, k,\
+                                 N_threads, do_RR, do_DR)
+    
+    #with analytic randoms, the expected pair counts of each pair of samples are used 
+    #in place of both DR and RR
+    if randoms is None:
+        R11, R12, R22 = (D1R, D1R), (RR, RR), (D2R, D2R)
+    else:
+        R11, R12, R22 = (D1R, RR), (D1R, RR), (D2R, RR)
+    
+    if np.all(sample2==sample1):
+        xi_11 = TP_estimator(D1D1,R11[0],R11[1],N1,N1,NR,NR,estimator)
+        return xi_11
+    else:
+        if (do_auto==True) & (do_cross==True): 
+            xi_11 = TP_estimator(D1D1,R11[0],R11[1],N1,N1,NR,NR,estimator)
+            xi_12 = TP_estimator(D1D2,R12[0],R12[1],N1,N2,NR,NR,estimator)
+            xi_22 = TP_estimator(D2D2,R22[0],R22[1],N2,N2,NR,NR,estimator)
+            return xi_11, xi_12, xi_22
+        elif (do_cross==True):
+            xi_12 = TP_estimator(D1D2,R12[0],R12[1],N1,N2,NR,NR,estimator)
+            return xi_12
+        elif (do_auto==True):
+            xi_11 = TP_estimator(D1D1,R11[0],R11[1],N1,N1,NR,NR,estimator)
+            xi_22 = TP_estimator(D2D2,R22[0],R22[1],N2,N2,NR,NR,estimator)
+            return xi_11, xi_22
+
+
+def labeled_tpcf(sample1, labels, rbins, randoms=None, period=None, estimator='Natural',\
+                 N_threads=1, rr_cache=None, return_pair_counts=False):
+    """ 
+    Calculate the real space auto and cross-correlation functions, :math:`\\xi_{ab}(r)`, 
+    of all the pairs of several samples, e.g. galaxies in bins of luminosity or colour.
+    
+    The samples are passed as a single set of positions, with an integer label for each 
+    point, and the pairs of all the samples are counted by `labeled_npairs` in a single 
+    pass over the grid, rather than calling `tpcf` once for each pair of samples.
+    
+    Parameters 
+    ----------
+    sample1 : array_like
+        Npts x 3 numpy array containing 3-d positions of Npts.
+    
+    labels : array_like
+        length Npts array of the integer labels defining the sample of each point.
+    
+    rbins : array_like
+        numpy array of boundaries defining the bins in which pairs are counted.
+    
+    randoms : array_like, optional
+        Nran x 3 numpy array containing 3-d positions of Npts.  If no randoms are provided
+        analytic randoms are used (only valid for periodic boundary conditions).
+        A `GridIndex` of the randoms may also be passed, in which case its cached grids 
+        are used.
+    
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.
+    
+    estimator: string, optional
+        options: 'Natural', 'Davis-Peebles', 'Hewett' , 'Hamilton', 'Landy-Szalay'
+    
+    N_threads: int, optional
+        number of threads to use in calculation. Default is 1. A string 'max' may be used
+        to indicate that the pair counters should use all available cores on the machine.
+        A `~halotools.mock_observables.pair_counters.PairCounterPool` may also be passed 
+        to re-use the same worker processes across many calls.
+
+    rr_cache : `~halotools.mock_observables.pair_counters.PairCountCache`, optional
+        If passed, the RR pair counts are taken from rr_cache, see `tpcf`.
+    
+    return_pair_counts : boolean, optional
+        If True, the differential DD pair counts of each pair of samples are also 
+        returned.  Default is False.
+        
+    Returns 
+    -------
+    correlation_functions : numpy.array
+        Nlabels x Nlabels x len(rbins)-1 array, where correlation_functions[a,b] is the 
+        cross-correlation function of the samples with the a-th and b-th labels, in the 
+        order of np.unique(labels), and correlation_functions[a,a] is the 
+        auto-correlation function of the sample with the a-th label.
+    
+    pair_counts : numpy.array, optional
+        Nlabels x Nlabels x len(rbins)-1 array of the DD pair counts in each bin, 
+        returned if return_pair_counts is True.
+    """
+    
+    def list_estimators():
+        estimators = ['Natural', 'Davis-Peebles', 'Hewett' , 'Hamilton', 'Landy-Szalay']
+        return estimators
+    estimators = list_estimators()
+    
+    rr_npairs = _rr_pair_counter(npairs, 'r', rr_cache)
+    
+    #process input parameters
+    sample1 = np.asarray(sample1)
+    rbins = np.asarray(rbins)
+    labels = np.asarray(labels)
+    if (labels.ndim!=1) or (len(labels)!=len(sample1)):
+        raise ValueError('labels must be a 1-D array with one label for each point.')
+    
+    #the labels passed to the pair counter are the indices of the unique labels
+    labels = np.unique(labels, return_inverse=True)[1]
+    N_labels = np.max(labels)+1 if len(labels)>0 else 0
+    
+    #Process period entry and check for consistency.
+    if period is None:
+            PBCs = False
+            period = np.array([np.inf]*np.shape(sample1)[-1])
+    else:
+        PBCs = True
+        period = np.asarray(period).astype("float64")
+        if np.shape(period) == ():
+            period = np.array([period]*np.shape(sample1)[-1])
+        elif np.shape(period)[0] != np.shape(sample1)[-1]:
+            raise ValueError("period should have shape (k,)")
+    
+    #index the randoms, so that their grids are only built once
+    randoms = _index_randoms(randoms, period)
+    
+    #check radial bins
+    if np.shape(rbins) == ():
+        rbins = np.array([rbins])
+    if rbins.ndim != 1:
+        raise ValueError('rbins must be a 1-D array')
+    if len(rbins)<2:
+        raise ValueError('rbins must be of lenght >=2.')
+    
+    k = np.shape(sample1)[-1] #dimensionality of data
+    if k!=3:
+        raise ValueError('data must be 3-dimensional.')
+    
+    #check for input parameter consistency
+    if (np.max(rbins)>np.min(period)/2.0):
+        raise ValueError('Cannot calculate for seperations larger than Lbox/2.')
+    if (randoms is None) & (min(period)==np.inf):
+        raise ValueError('If no PBCs are specified, randoms must be provided.')
+    if estimator not in estimators: 
+        raise ValueError('Must specify a supported estimator. Supported estimators \
+        are:{0}'.format(estimators))
+    if (PBCs==True) & (max(period)==np.inf):
+        raise ValueError('If a non-infinte PBC specified, all PBCs must be non-infinte.')
+    
+    def random_counts(sample1, labels, N_labels, randoms, rbins, period, k, N_threads,\
+                      do_RR, do_DR):
+        """
+        Count random pairs, returning the DR pair counts of each sample with the 
+        randoms, and the RR pair counts.  If no randoms are passed, the pair counts of 
+        each pair of samples with analytic randoms are returned in place of both.
+        """
+        def nball_volume(R,k):
+            """
+            Calculate the volume of a n-shpere.  This is used for the analytical randoms.
+            """
+            return (np.pi**(k/2.0)/gamma(k/2.0+1.0))*R**k
+        
+        #PBCs and no randoms--calculate randoms analytically.
+        if randoms is None:
+            dv = np.diff(nball_volume(rbins,k)) #volume of shells
+            global_volume = period.prod()
+            
+            #the expected number of pairs of each pair of samples
+            N = np.bincount(labels, minlength=N_labels)
+            RR = np.outer(N,N)[:,:,np.newaxis]*dv/global_volume
+            
+            #in the analytic case DR==RR.
+            return RR, RR
+        
+        if do_RR==True:
+            RR = np.diff(rr_npairs(randoms, randoms, rbins, period=period,\
+                                   N_threads=N_threads))
+        else: RR=None
+        if do_DR==True:
+            #count the pairs of all the samples with the randoms at once, with a single 
+            #label for the randoms
+            DR = labeled_npairs(sample1, randoms, rbins, labels,\
+                                np.zeros(len(randoms), dtype=np.int64), period=period,\
+                                N_threads=N_threads)
+            DR = np.diff(DR[:,0:1,:], axis=-1)
+        else: DR=None
+        
+        return DR, RR
+    
+    def TP_estimator(DD,DR,RR,ND1,ND2,NR1,NR2,estimator):
+        """
+        two point correlation function estimator
+        """
+        if estimator == 'Natural':
+            factor = ND1*ND2/(NR1*NR2)
+            #DD/RR-1
+            xi = (1.0/factor)*DD/RR - 1.0
+        elif estimator == 'Davis-Peebles':
+            factor = ND1*ND2/(ND1*NR2)
+            #DD/DR-1
+            xi = (1.0/factor)*DD/DR - 1.0
+        elif estimator == 'Hewett':
+            factor1 = ND1*ND2/(NR1*NR2)
+            factor2 = ND1*NR2/(NR1*NR2)
+            #(DD-DR)/RR
+            xi = (1.0/factor1)*DD/RR - (1.0/factor2)*DR/RR
+        elif estimator == 'Hamilton':
+            #DDRR/DRDR-1
+            xi = (DD*RR)/(DR*DR) - 1.0
+        elif estimator == 'Landy-Szalay':
+            factor1 = ND1*ND2/(NR1*NR2)
+            factor2 = ND1*NR2/(NR1*NR2)
+            #(DD - 2.0*DR + RR)/RR
+            xi = (1.0/factor1)*DD/RR - (1.0/factor2)*2.0*DR/RR + 1.0
+        else: 
+            raise ValueError("unsupported estimator!")
+        return xi
+    
+    def TP_estimator_requirements(estimator):
+        """
+        return booleans indicating which pairs need to be counted for the chosen estimator
+        """
+        if estimator == 'Natural':
+            do_DD = True
+            do_DR = False
+            do_RR = True
+        elif estimator == 'Davis-Peebles':
+            do_DD = True
+            do_DR = True
+            do_RR = False
+        elif estimator == 'Hewett':
+            do_DD = True
+            do_DR = True
+            do_RR = True
+        elif estimator == 'Hamilton':
+            do_DD = True
+            do_DR = True
+            do_RR = True
+        elif estimator == 'Landy-Szalay':
+            do_DD = True
+            do_DR = True
+            do_RR = True
+        else: 
+            raise ValueError("unsupported estimator!")
+        return do_DD, do_DR, do_RR
+    
+    do_DD, do_DR, do_RR = TP_estimator_requirements(estimator)
+    
+    #number of points of each sample, broadcast against the pair counts of the pairs of 
+    #samples
+    if randoms is not None:
+        N = np.bincount(labels, minlength=N_labels).astype(np.float64)
+        N1 = N[:,np.newaxis,np.newaxis]
+        N2 = N[np.newaxis,:,np.newaxis]
+        NR = len(randoms)
+    else: 
+        N1 = 1.0
+        N2 = 1.0
+        NR = 1.0
+    
+    #count the pairs of all the pairs of samples in one pass
+    DD = np.diff(labeled_npairs(sample1, sample1, rbins, labels, labels, period=period,\
+                                N_threads=N_threads), axis=-1)
+    DR, RR = random_counts(sample1, labels, N_labels, randoms, rbins, period, k,\
+                           N_threads, do_RR, do_DR)
+    
+    xi = TP_estimator(DD,DR,RR,N1,N2,NR,NR,estimator)
+    
+    if return_pair_counts==True:
+        return xi, DD
+    else:
+        return xi
+
+
+def marked_tpcf(sample1, rbins, marks1, sample2=None, marks2=None, period=None,\
+                do_auto=True, do_cross=True, N_threads=1, max_sample_size=int(1e6)):
+    """ 
+    Calculate the real space marked two-point correlation function, :math:`M(r)`.
+    
+    The marked correlation function is the ratio of the pair counts weighted by the 
+    product of the marks of the points, :math:`WW(r)`, to the unweighted pair counts, 
+    :math:`DD(r)`, normalised by the ratio expected if the marks were randomly 
+    re-assigned to the points, which is calculated analytically rather than by 
+    shuffling the marks.  Several marks may be passed at once, in which case the 
+    weighted pair counts of every mark, and the unweighted pair counts, are counted in 
+    a single pass by `~halotools.mock_observables.pair_counters.wnpairs`.
+    
+    Parameters 
+    ----------
+    sample1 : array_like
+        Npts x 3 numpy array containing 3-d positions of Npts.
+    
+    rbins : array_like
+        numpy array of boundaries defining the bins in which pairs are counted.
+    
+    marks1 : array_like
+        length Npts array of the marks of the points in sample1, or an Npts x n_marks 
+        array of several marks.
+    
+    sample2 : array_like, optional
+        Npts x 3 numpy array containing 3-d positions of Npts.
+    
+    marks2 : array_like, optional
+        marks of the points in sample2, which must be passed with sample2.
+    
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.
+    
+    do_auto: boolean, optional
+        do auto-correlation?  Default is True.
+    
+    do_cross: boolean, optional
+        do cross-correlation?  Default is True.
+    
+    N_threads: int, optional
+        number of threads to use in calculation. Default is 1. A string 'max' may be used
+        to indicate that the pair counters should use all available cores on the machine.
+        A `~halotools.mock_observables.pair_counters.PairCounterPool` may also be passed 
+        to re-use the same worker processes across many calls.
+
+    max_sample_size : int, optional
+        Defines maximum size of the sample that will be passed to the pair counter. 
+        
+        If sample size exeeds max_sample_size, the sample (and its marks) will be 
+        randomly down-sampled such that the subsample is (roughly) equal to 
+        max_sample_size. 
+        
+    Returns 
+    -------
+    marked_correlation_function : array_like
+        array containing the marked correlation function :math:`M(r)` computed in each 
+        of the bins defined by input `rbins`, or an n_marks by len(rbins)-1 array if 
+        several marks are passed.
+        
+        :math:`M(r) \equiv WW / (DD \\langle w_i w_j \\rangle)`, where 
+        :math:`\\langle w_i w_j \\rangle` is the mean product of the marks of two 
+        different points, so that :math:`M(r)=1` if the marks are uncorrelated with the 
+        positions.
+        
+        If sample2 is passed as input, three arrays are returned: :math:`M_{11}(r)`, 
+        :math:`M_{12}(r)`, :math:`M_{22}(r)`, the marked autocorrelation of sample1, 
+        the marked cross-correlation between sample1 and sample2, and the marked 
+        autocorrelation of sample2.  If do_auto or do_cross is set to False, the 
+        appropriate result is not returned.
+    """
+    
+    #process input parameters
+    sample1 = np.asarray(sample1)
+    marks1 = np.asarray(marks1, dtype=np.float64)
+    if sample2 is not None: 
+        sample2 = np.asarray(sample2)
+        if marks2 is None:
+            raise ValueError('marks2 must be passed with sample2.')
+        marks2 = np.asarray(marks2, dtype=np.float64)
+        if (np.shape(sample1)==np.shape(sample2)) and np.all(sample1==sample2) and\
+           (np.shape(marks1)==np.shape(marks2)) and np.all(marks1==marks2):
+            print("Warning: sample1 and sample2 are exactly the same, only the\
+                   auto-correlation will be returned.")
+            sample2, marks2 = sample1, marks1
+    else: 
+        sample2 = sample1
+        marks2 = marks1
+    rbins = np.asarray(rbins)
+    
+    #several marks are columns of the marks arrays
+    single_mark = (marks1.ndim==1) & (marks2.ndim==1)
+    if (marks1.ndim>2) | (marks2.ndim>2):
+        raise ValueError('marks must be 1-D, or 2-D arrays with one column per mark.')
+    if len(marks1)!=len(sample1):
+        raise ValueError('marks1 should have same len as sample1')
+    if len(marks2)!=len(sample2):
+        raise ValueError('marks2 should have same len as sample2')
+    
+    #Process period entry and check for consistency.
+    if period is None:
+            PBCs = False
+            period = np.array([np.inf]*np.shape(sample1)[-1])
+    else:
+        PBCs = True
+        period = np.asarray(period).astype("float64")
+        if np.shape(period) == ():
+            period = np.array([period]*np.shape(sample1)[-1])
+        elif np.shape(period)[0] != np.shape(sample1)[-1]:
+            raise ValueError("period should have shape (k,)")
+    
+    #down sample is sample size exceeds max_sample_size.
+    if (len(sample2)>max_sample_size) & (sample2 is not sample1):
+        inds = np.arange(0,len(sample2))
+        np.random.shuffle(inds)
+        inds = inds[0:max_sample_size]
+        sample2 = sample2[inds]
+        marks2 = marks2[inds]
+        print('down sampling sample2...')
+    if len(sample1)>max_sample_size:
+        inds = np.arange(0,len(sample1))
+        np.random.shuffle(inds)
+        inds = inds[0:max_sample_size]
+        same = sample2 is sample1
+        sample1 = sample1[inds]
+        marks1 = marks1[inds]
+        if same: sample2, marks2 = sample1, marks1
+        print('down sampling sample1...')
+    
+    #check radial bins
+    if np.shape(rbins) == ():
+        rbins = np.array([rbins])
+    if rbins.ndim != 1:
+        raise ValueError('rbins must be a 1-D array')
+    if len(rbins)<2:
+        raise ValueError('rbins must be of lenght >=2.')
+    
+    k = np.shape(sample1)[-1] #dimensionality of data
+    if k!=3:
+        raise ValueError('data must be 3-dimensional.')
+    
+    #check for input parameter consistency
+    if (np.max(rbins)>np.min(period)/2.0):
+        raise ValueError('Cannot calculate for seperations larger than Lbox/2.')
+    if (sample1.shape[-1]!=sample2.shape[-1]):
+        raise ValueError('Sample1 and sample2 must have same dimension.')
+    if (PBCs==True) & (max(period)==np.inf):
+        raise ValueError('If a non-infinte PBC specified, all PBCs must be non-infinte.')
+    if (type(do_auto) is not bool) | (type(do_cross) is not bool):
+        raise ValueError('do_auto and do_cross keywords must be of type boolean.')
+    
+    #the marks as N by n_marks arrays, with the same number of columns
+    if marks1.ndim==1: marks1 = marks1[:,np.newaxis]
+    if marks2.ndim==1: marks2 = marks2[:,np.newaxis]
+    n_marks = max(np.shape(marks1)[1], np.shape(marks2)[1])
+    if np.shape(marks1)[1]==1: marks1 = np.repeat(marks1, n_marks, axis=1)
+    if np.shape(marks2)[1]==1: marks2 = np.repeat(marks2, n_marks, axis=1)
+    if np.shape(marks1)[1]!=np.shape(marks2)[1]:
+        raise ValueError('marks1 and marks2 must have the same number of columns')
+    
+    def marked_pair_counts(sample1, sample2, marks1, marks2):
+        """
+        Count the pairs weighted by each mark, WW, and the unweighted pairs, DD, in a 
+        single pass, with a last column of unit weights.
+        """
+        weights1 = np.column_stack([marks1, np.ones(len(sample1))])
+        if (sample2 is sample1) & (marks2 is marks1): weights2 = weights1
+        else: weights2 = np.column_stack([marks2, np.ones(len(sample2))])
+        
+        counts = wnpairs(sample1, sample2, rbins, period=period,\
+                         weights1=weights1, weights2=weights2, N_threads=N_threads)
+        counts = np.diff(counts, axis=1)
+        
+        return counts[:-1], counts[-1]
+    
+    def random_marks_normalization(marks1, marks2, auto):
+        """
+        Calculate the mean product of the marks of two different points, which is the 
+        ratio WW/DD expected if the marks were randomly re-assigned to the points.
+        """
+        if auto:
+            N = len(marks1)
+            sum_w = np.sum(marks1, axis=0)
+            return (sum_w**2 - np.sum(marks1**2, axis=0))/(N*(N-1.0))
+        else:
+            return np.mean(marks1, axis=0)*np.mean(marks2, axis=0)
+    
+    def marked_estimator(sample1, sample2, marks1, marks2, auto):
+        """
+        marked correlation function estimator, WW/(DD <w_i w_j>)
+        """
+        WW, DD = marked_pair_counts(sample1, sample2, marks1, marks2)
+        norm = random_marks_normalization(marks1, marks2, auto)
+        M = WW/(DD*norm[:,np.newaxis])
+        if single_mark: M = M[0]
+        return M
+    
+    if sample2 is sample1:
+        M_11 = marked_estimator(sample1, sample1, marks1, marks1, True)
+        return M_11
+    else:
+        if (do_auto==True) & (do_cross==True): 
+            M_11 = marked_estimator(sample1, sample1, marks1, marks1, True)
+            M_12 = marked_estimator(sample1, sample2, marks1, marks2, False)
+            M_22 = marked_estimator(sample2, sample2, marks2, marks2, True)
+            return M_11, M_12, M_22
+        elif (do_cross==True):
+            M_12 = marked_estimator(sample1, sample2, marks1, marks2, False)
+            return M_12
+        elif (do_auto==True):
+            M_11 = marked_estimator(sample1, sample1, marks1, marks1, True)
+            M_22 = marked_estimator(sample2, sample2, marks2, marks2, True)
+            return M_11, M_22
+
+
+def _index_randoms(randoms, period):
+    """
+    process the randoms passed to a clustering function.  If there is a periodic box, 
+    the randoms are returned as a `GridIndex`, so that their grids are built only once, 
+    and are re-used for the DR and RR pair counts.  The grids are not put in the grid 
+    cache shared between calls, which is only used if a `GridIndex` is passed.
+    """
+    
+    if (randoms is None) | isinstance(randoms, GridIndex):
+        return randoms
+    
+    randoms = np.asarray(randoms)
+    if np.all(np.isfinite(period)):
+        randoms = GridIndex(randoms, Lbox=period, cache=False)
+    
+    return randoms
+
+
+def _pair_counter_functions(pair_counter):
+    """
+    return a dictionary of the npairs, xy_z_npairs, and s_mu_npairs functions used by a 
+    clustering function, which are the methods of pair_counter if it is passed.
+    """
+    
+    if pair_counter is None:
+        return {'npairs':npairs, 'xy_z_npairs':xy_z_npairs, 's_mu_npairs':s_mu_npairs}
+    
+    return {'npairs':pair_counter.npairs, 'xy_z_npairs':pair_counter.xy_z_npairs,\
+            's_mu_npairs':pair_counter.s_mu_npairs}
+
+
+def _rr_pair_counter(counter, kind, rr_cache):
+    """
+    return the function used by a clustering function to count RR pairs, which takes the 
+    pair counts from rr_cache if it is passed, and otherwise is counter.
+    """
+    
+    if rr_cache is None:
+        return counter
+    
+    if rr_cache is True:
+        rr_cache = PairCountCache()
+    
+    def cached_counter(data1, data2, *bins, **kwargs):
+        period = kwargs.pop('period', None)
+        return rr_cache.pair_counts(counter, kind, data1, data2, bins, period=period,\
+                                    **kwargs)
+    
+    return cached_counter
+
+
+def _direct_wp(sample1, rp_bins, pi_max, sample2, randoms, period, do_auto, do_cross,\
+               estimator, N_threads, max_sample_size, rr_cache):
+    """
+    Calculate the projected correlation function, :math:`w_p`, from the pairs with 
+    separations along the line of sight <= pi_max, counted directly in rp bins by 
+    `wp_npairs`, i.e. :math:`w_p(r_p) = \\pi_{max}\\xi(r_p, \\pi \\leq \\pi_{max})`.
+    
+    This is used by `wp` when the result is the same as integrating 
+    :math:`\\xi(r_p,\\pi)` over the pi bins, i.e. with analytic randoms, or a single pi 
+    bin.  The arguments and the results are the same as those of `wp`.
+    """
+    
+    def list_estimators():
+        estimators = ['Natural', 'Davis-Peebles', 'Hewett' , 'Hamilton', 'Landy-Szalay']
+        return estimators
+    estimators = list_estimators()
+    
+    rr_wp_npairs = _rr_pair_counter(wp_npairs, 'wp', rr_cache)
+    
+    #process input parameters
+    sample1 = np.asarray(sample1)
+    if sample2 is not None: 
+        sample2 = np.asarray(sample2)
+    else: sample2 = sample1
+    rp_bins = np.asarray(rp_bins)
+    
+    #Process period entry and check for consistency.
+    if period is None:
+            PBCs = False
+            period = np.array([np.inf]*np.shape(sample1)[-1])
+    else:
+        PBCs = True
+        period = np.asarray(period).astype("float64")
+        if np.shape(period) == ():
+            period = np.array([period]*np.shape(sample1)[-1])
+        elif np.shape(period)[0] != np.shape(sample1)[-1]:
+            raise ValueError("period should have shape (k,)")
+    
+    #index the randoms, so that their grids are only built once
+    randoms = _index_randoms(randoms, period)
+    
+    #down sample is sample size exceeds max_sample_size.
+    if (len(sample2)>max_sample_size) & (not np.all(sample1==sample2)):
+        inds = np.arange(0,len(sample2))
+        np.random.shuffle(inds)
+        inds = inds[0:max_sample_size]
+        sample2 = sample2[inds]
+        print('down sampling sample2...')
+    if len(sample1)>max_sample_size:
+        inds = np.arange(0,len(sample1))
+        np.random.shuffle(inds)
+        inds = inds[0:max_sample_size]
+        sample1 = sample1[inds]
+        print('down sampling sample1...')
+    
+    #check radial bins
+    if np.shape(rp_bins) == ():
+        rp_bins = np.array([rp_bins])
+    if rp_bins.ndim != 1:
+        raise ValueError('rp bins must be a 1-D array')
+    if len(rp_bins)<2:
+        raise ValueError('rp bins must be of lenght >=2.')
+    
+    k = np.shape(sample1)[-1] #dimensionality of data
+    if k!=3:
+        raise ValueError('data must be 3-dimensional.')
+    
+    #check for input parameter consistency
+    if (np.max(rp_bins)>np.min(period[0:2])/2.0):
+        raise ValueError('Cannot calculate for rp seperations larger than Lbox[0:2]/2.')
+    if (pi_max>period[2]/2.0):
+        raise ValueError('Cannot calculate for pi seperations larger than Lbox[2]/2.')
+    if (sample1.shape[-1]!=sample2.shape[-1]):
+        raise ValueError('Sample 1 and sample 2 must have same dimension.')
+    if (randoms is None) & (min(period)==np.inf):
+        raise ValueError('If no PBCs are specified, randoms must be provided.')
+    if estimator not in estimators: 
+        raise ValueError('Must specify a supported estimator. Supported estimators \
+        are:{0}'.format(estimators))
+    if (PBCs==True) & (max(period)==np.inf):
+        raise ValueError('If a non-infinte PBC specified, all PBCs must be non-infinte.')
+    if (type(do_auto) is not bool) | (type(do_cross) is not bool):
+        raise ValueError('do_auto and do_cross keywords must be of type boolean.')
+    
+    def random_counts(sample1, sample2, randoms, rp_bins, pi_max, period,\
+                      PBCs, N_threads, do_RR, do_DR):
+        """
+        Count random pairs within pi_max, either with the randoms, or analytically in 
+        cylinders of length 2*pi_max if no randoms are passed.
+        """
+        
+        #PBCs and no randoms--calculate randoms analytically.
+        if randoms is None:
+            #volume of the cylindrical shells of length 2*pi_max
+            dv = np.diff(2.0*pi_max*pi*rp_bins**2.0)
+            global_volume = period.prod()
+            
+            N1 = np.shape(sample1)[0]
+            D1R = N1*N1*dv/global_volume
+            if np.all(sample1 == sample2):
+                D2R = None
+                RR = D1R #in the analytic case, for the auto-correlation, DR==RR.
+            else:
+                N2 = np.shape(sample2)[0]
+                D2R = N2*N2*dv/global_volume
+                RR = N1*N2*dv/global_volume #RR is only the RR for the cross-correlation.
+            
+            return D1R, D2R, RR
+        
+        if do_RR==True:
+            RR = rr_wp_npairs(randoms, randoms, rp_bins, pi_max, period=period,\
+                              N_threads=N_threads)
+            RR = np.diff(RR)
+        else: RR=None
+        if do_DR==True:
+            D1R = np.diff(wp_npairs(sample1, randoms, rp_bins, pi_max, period=period,\
+                                    N_threads=N_threads))
+        else: D1R=None
+        if np.all(sample1 == sample2) | (do_DR==False):
+            D2R = None
+        else:
+            D2R = np.diff(wp_npairs(sample2, randoms, rp_bins, pi_max, period=period,\
+                                    N_threads=N_threads))
+        
+        return D1R, D2R, RR
+    
+    def pair_counts(sample1, sample2, rp_bins, pi_max, period, N_threads):
+        """
+        Count data pairs within pi_max.
+        """
+        D1D1 = np.diff(wp_npairs(sample1, sample1, rp_bins, pi_max, period=period,\
+                                 N_threads=N_threads))
+        if np.all(sample1 == sample2):
+            D1D2 = D1D1
+            D2D2 = D1D1
+        else:
+            D1D2 = np.diff(wp_npairs(sample1, sample2, rp_bins, pi_max, period=period,\
+                                     N_threads=N_threads))
+            D2D2 = np.diff(wp_npairs(sample2, sample2, rp_bins, pi_max, period=period,\
+                                     N_threads=N_threads))
+        
+        return D1D1, D1D2, D2D2
+    
+    def TP_estimator(DD,DR,RR,ND1,ND2,NR1,NR2,estimator):
+        """
+        two point correlation function estimator
+        """
+        if estimator == 'Natural':
+            factor = ND1*ND2/(NR1*NR2)
+            #DD/RR-1
+            xi = (1.0/factor)*DD/RR - 1.0
+        elif estimator == 'Davis-Peebles':
+            factor = ND1*ND2/(ND1*NR2)
+            #DD/DR-1
+            xi = (1.0/factor)*DD/DR - 1.0
+        elif estimator == 'Hewett':
+            factor1 = ND1*ND2/(NR1*NR2)
+            factor2 = ND1*NR2/(NR1*NR2)
+            #(DD-DR)/RR
+            xi = (1.0/factor1)*DD/RR - (1.0/factor2)*DR/RR
+        elif estimator == 'Hamilton':
+            #DDRR/DRDR-1
+            xi = (DD*RR)/(DR*DR) - 1.0
+        elif estimator == 'Landy-Szalay':
+            factor1 = ND1*ND2/(NR1*NR2)
+            factor2 = ND1*NR2/(NR1*NR2)
+            #(DD - 2.0*DR + RR)/RR
+            xi = (1.0/factor1)*DD/RR - (1.0/factor2)*2.0*DR/RR + 1.0
+        else: 
+            raise ValueError("unsupported estimator!")
+        return xi
+    
+    def TP_estimator_requirements(estimator):
+        """
+        return booleans indicating which pairs need to be counted for the chosen estimator
+        """
+        if estimator == 'Natural':
+            do_DR = False
+            do_RR = True
+        elif estimator == 'Davis-Peebles':
+            do_DR = True
+            do_RR = False
+        elif estimator in ['Hewett', 'Hamilton', 'Landy-Szalay']:
+            do_DR = True
+            do_RR = True
+        else: 
+            raise ValueError("unsupported estimator!")
+        return do_DR, do_RR
+    
+    do_DR, do_RR = TP_estimator_requirements(estimator)
+    
+    #if only the auto-correlations of two samples are returned, D1R is used in place of 
+    #RR, as in redshift_space_tpcf, so it is counted for every estimator
+    if (not np.all(sample2==sample1)) & (do_auto==True) & (do_cross==False):
+        do_DR = True
+    
+    if randoms is not None:
+        N1 = len(sample1)
+        N2 = len(sample2)
+        NR = len(randoms)
+    else: 
+        N1 = 1.0
+        N2 = 1.0
+        NR = 1.0
+    
+    #count pairs
+    D1D1,D1D2,D2D2 = pair_counts(sample1, sample2, rp_bins, pi_max, period, N_threads)
+    D1R, D2R, RR = random_counts(sample1, sample2, randoms, rp_bins, pi_max, period,\
+                                 PBCs, N_threads, do_RR, do_DR)
+    
+    #w_p is the correlation function in the single pi bin, times its width
+    if np.all(sample2==sample1):
+        return pi_max*TP_estimator(D1D1,D1R,RR,N1,N1,NR,NR,estimator)
+    elif (do_auto==True) & (do_cross==True): 
+        wp_11 = pi_max*TP_estimator(D1D1,D1R,RR,N1,N1,NR,NR,estimator)
+        wp_12 = pi_max*TP_estimator(D1D2,D1R,RR,N1,N2,NR,NR,estimator)
+        wp_22 = pi_max*TP_estimator(D2D2,D2R,RR,N2,N2,NR,NR,estimator)
+        return wp_11, wp_12, wp_22
+    elif (do_cross==True):
+        return pi_max*TP_estimator(D1D2,D1R,RR,N1,N2,NR,NR,estimator)
+    else:
+        return pi_max*TP_estimator(D1D1,D1R,D1R,N1,N1,NR,NR,estimator)
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+"""
+functions to calculate large scale clustering statistics, the power spectrum,
+:math:`P(k)`, and the two point correlation function, :math:`\\xi(r)`, of samples in a
+periodic box, by assigning the points to a mesh and using fast Fourier transforms.
+
+The cost of these estimators is O(N + Nmesh^3 log(Nmesh^3)), independent of the
+separations of interest, so they are much faster than the pair counters on large
+scales, where the pair counters must find very many pairs.  They are not limited to
+separations smaller than Lbox/2, but do not resolve separations smaller than a few mesh
+cells, Lbox/Nmesh.
+"""
+
+from __future__ import division, print_function
+####import modules########################################################################
+import numpy as np
+##########################################################################################
+
+__all__=['power_spectrum','mesh_tpcf']
+__author__ = ['Duncan Campbell']
+
+
+#number of mesh cells each point is assigned to along each dimension
+_ASSIGNMENT_ORDER = {'NGP':1, 'CIC':2, 'TSC':3}
+
+
+def power_spectrum(sample1, k_bins, sample2=None, period=None, do_auto=True,\
+                   do_cross=True, Nmesh=256, assignment='CIC'):
+    """
+    Calculate the power spectrum, :math:`P(k)`, of points in a periodic box.
+
+    The points are assigned to a mesh, which is Fourier transformed.  The power is
+    corrected for the window of the mass assignment and for the (aliased) shot noise,
+    see Jing (2005), and averaged over the modes in each bin of :math:`|k|`.
+
+    Parameters
+    ----------
+    sample1 : array_like
+        Npts x 3 numpy array containing 3-d positions of Npts.
+
+    k_bins : array_like
+        numpy array of boundaries defining the bins of angular wavenumber, :math:`|k|`,
+        in which the power is averaged, in units of the inverse of the units of period.
+
+    sample2 : array_like, optional
+        Npts x 3 numpy array containing 3-d positions of Npts.
+
+    period: array_like
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+
+    do_auto: boolean, optional
+        do auto-power spectra?  Default is True.
+
+    do_cross: boolean, optional
+        do cross-power spectrum?  Default is True.
+
+    Nmesh : int, optional
+        number of mesh cells along each dimension.  Default is 256.  The wavenumbers
+        should be well below the Nyquist wavenumber, :math:`\\pi` Nmesh/period.
+
+    assignment : string, optional
+        scheme assigning the points to the mesh, 'NGP' (nearest grid point), 'CIC'
+        (cloud in cell, the default), or 'TSC' (triangular shaped cloud).
+
+    Returns
+    -------
+    power_spectrum : array_like
+        array containing the power spectrum :math:`P(k)` averaged over the modes in each
+        of the bins defined by input `k_bins`, which is nan in bins without any modes.
+
+        If sample2 is passed as input, three arrays of length len(k_bins)-1 are
+        returned: :math:`P_{11}(k)`, :math:`P_{12}(k)`, :math:`P_{22}(k)`, the
+        auto-power spectrum of sample1, the cross-power spectrum of sample1 and sample2,
+        and the auto-power spectrum of sample2.  If do_auto or do_cross is set to False,
+        the appropriate result is not returned.
+
+    Examples
+    --------
+    >>> from halotools.mock_observables import power_spectrum
+    >>> import numpy as np
+    >>> sample1 = np.random.random((1000,3))
+    >>> k_bins = np.linspace(10.0,60.0,6)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> P = power_spectrum(sample1, k_bins, period=period, Nmesh=64)
+    """
+
+    sample1, sample2, period, do_auto, do_cross, p = \
+        _process_mesh_args(sample1, sample2, period, do_auto, do_cross, Nmesh, assignment)
+
+    #check wavenumber bins
+    k_bins = np.asarray(k_bins)
+    if k_bins.ndim != 1:
+        raise ValueError('k_bins must be a 1-D array')
+    if len(k_bins)<2:
+        raise ValueError('k_bins must be of length >=2.')
+
+    power = _mesh_power(sample1, sample2, period, Nmesh, p, do_auto, do_cross)
+
+    #average the power over the modes in each bin of |k|
+    k = [2.0*np.pi*np.fft.fftfreq(Nmesh, period[0]/Nmesh),\
+         2.0*np.pi*np.fft.fftfreq(Nmesh, period[1]/Nmesh),\
+         2.0*np.pi*np.fft.rfftfreq(Nmesh, period[2]/Nmesh)]
+
+    #each mode of the real-to-complex transform with 0<kz<Nyquist stands for two modes,
+    #k and -k
+    n_modes = np.where((np.arange(len(k[2]))==0) | (2*np.arange(len(k[2]))==Nmesh),\
+                       1.0, 2.0)
+
+    result = [_bin_mesh(P, k, k_bins, n_modes) if P is not None else None\
+              for P in power]
+
+    return _results(result, sample1, sample2, do_auto, do_cross)
+
+
+def mesh_tpcf(sample1, rbins, sample2=None, period=None, do_auto=True, do_cross=True,\
+              Nmesh=256, assignment='CIC'):
+    """
+    Calculate the real space two-point correlation function, :math:`\\xi(r)`, of points
+    in a periodic box, using a mesh and fast Fourier transforms.
+
+    The correlation function is the inverse Fourier transform of the power spectrum
+    calculated by `power_spectrum`, which is averaged over the separations of the mesh
+    cells in each bin of r.  The results agree with `tpcf` with analytic randoms on
+    scales larger than a few mesh cells, Lbox/Nmesh, but the cost is independent of the
+    separations, so this is much faster on large scales.  Separations up to the
+    largest separation in the box, :math:`\\sqrt{3}` Lbox/2, may be used, although
+    beyond Lbox/2 only part of each spherical shell fits into the box.
+
+    Parameters
+    ----------
+    sample1 : array_like
+        Npts x 3 numpy array containing 3-d positions of Npts.
+
+    rbins : array_like
+        numpy array of boundaries defining the bins of separation.
+
+    sample2 : array_like, optional
+        Npts x 3 numpy array containing 3-d positions of Npts.
+
+    period: array_like
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+
+    do_auto: boolean, optional
+        do auto-correlation?  Default is True.
+
+    do_cross: boolean, optional
+        do cross-correlation?  Default is True.
+
+    Nmesh : int, optional
+        number of mesh cells along each dimension.  Default is 256.
+
+    assignment : string, optional
+        scheme assigning the points to the mesh, 'NGP', 'CIC' (the default), or 'TSC',
+        see `power_spectrum`.
+
+    Returns
+    -------
+    correlation_function : array_like
+        array containing correlation function :math:`\\xi` computed in each of the bins
+        defined by input `rbins`, which is nan in bins without any mesh separations.
+
+        If sample2 is passed as input, three arrays of length len(rbins)-1 are returned:
+        :math:`\\xi_{11}(r)`, :math:`\\xi_{12}(r)`, :math:`\\xi_{22}(r)`, as for `tpcf`.
+        If do_auto or do_cross is set to False, the appropriate result is not returned.
+
+    Examples
+    --------
+    >>> from halotools.mock_observables import mesh_tpcf
+    >>> import numpy as np
+    >>> sample1 = np.random.random((1000,3))
+    >>> rbins = np.linspace(0.1,0.5,5)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> xi = mesh_tpcf(sample1, rbins, period=period, Nmesh=64)
+    """
+
+    sample1, sample2, period, do_auto, do_cross, p = \
+        _process_mesh_args(sample1, sample2, period, do_auto, do_cross, Nmesh, assignment)
+
+    #check radial bins
+    rbins = np.asarray(rbins)
+    if np.shape(rbins) == ():
+        rbins = np.array([rbins])
+    if rbins.ndim != 1:
+        raise ValueError('rbins must be a 1-D array')
+    if len(rbins)<2:
+        raise ValueError('rbins must be of length >=2.')
+    if np.max(rbins)>np.sqrt(np.sum((period/2.0)**2)):
+        raise ValueError('Cannot calculate for seperations larger than the largest \
+                          separation in the box, sqrt(3)*Lbox/2.')
+
+    power = _mesh_power(sample1, sample2, period, Nmesh, p, do_auto, do_cross)
+
+    #separations of the mesh cells, using the nearest periodic image
+    m = np.arange(Nmesh)
+    r = [np.minimum(m, Nmesh-m)*period[i]/Nmesh for i in range(3)]
+    n_cells = np.ones(Nmesh)
+
+    #the correlation function on the mesh is the inverse transform of the power
+    volume = np.prod(period)
+    result = []
+    for P in power:
+        if P is None:
+            result.append(None)
+            continue
+        xi = np.fft.irfftn(P, s=(Nmesh,Nmesh,Nmesh))*Nmesh**3/volume
+        result.append(_bin_mesh(xi, r, rbins, n_cells))
+
+    return _results(result, sample1, sample2, do_auto, do_cross)
+
+
+def _process_mesh_args(sample1, sample2, period, do_auto, do_cross, Nmesh, assignment):
+    """
+    process and check the arguments shared by the mesh clustering functions, returning
+    the samples wrapped into the box, the period, and the order of the mass assignment.
+    """
+
+    sample1 = np.asarray(sample1, dtype=np.float64)
+    if sample2 is not None:
+        sample2 = np.asarray(sample2, dtype=np.float64)
+        if np.all(sample1==sample2):
+            print("Warning: sample1 and sample2 are exactly the same, only the\
+                   auto-correlation will be returned.")
+            sample2 = sample1
+    else: sample2 = sample1
+
+    if (sample1.ndim!=2) or (np.shape(sample1)[-1]!=3):
+        raise ValueError('data must be 3-dimensional.')
+    if (sample2.ndim!=2) or (np.shape(sample2)[-1]!=3):
+        raise ValueError('data must be 3-dimensional.')
+
+    #Process period entry and check for consistency.
+    if period is None:
+        raise ValueError('period must be specified, the mesh is periodic.')
+    period = np.asarray(period).astype("float64")
+    if np.shape(period) == ():
+        period = np.array([period]*3)
+    elif np.shape(period) == (1,):
+        period = np.array([period[0]]*3)
+    if np.shape(period) != (3,):
+        raise ValueError("period should have shape (k,)")
+    if np.any(~np.isfinite(period)) | np.any(period<=0.0):
+        raise ValueError('period must be finite and positive.')
+
+    if (type(do_auto) is not bool) | (type(do_cross) is not bool):
+        raise ValueError('do_auto and do_cross keywords must be of type boolean.')
+    if (int(Nmesh)!=Nmesh) or (Nmesh<2):
+        raise ValueError('Nmesh must be an integer >=2.')
+    if assignment not in _ASSIGNMENT_ORDER:
+        raise ValueError('assignment must be one of {0}'\
+                         .format(sorted(_ASSIGNMENT_ORDER.keys())))
+
+    #wrap the points into the box
+    if sample2 is sample1:
+        sample1 = sample1 % period
+        sample2 = sample1
+    else:
+        sample1 = sample1 % period
+        sample2 = sample2 % period
+
+    return sample1, sample2, period, do_auto, do_cross, _ASSIGNMENT_ORDER[assignment]
+
+
+def _mesh_power(sample1, sample2, period, Nmesh, p, do_auto, do_cross):
+    """
+    return the auto and cross-power of sample1 and sample2 at each mode of the
+    real-to-complex Fourier transform of the mesh, [P11, P12, P22], corrected for the
+    window of the mass assignment of order p, and for the shot noise.  Power spectra
+    which are not needed are None.
+    """
+
+    Nmesh = int(Nmesh)
+    volume = np.prod(period)
+    same = sample1 is sample2
+
+    #the window of the mass assignment, and the sum of its aliases, C(k), which
+    #multiplies the shot noise (Jing 2005), are separable
+    window = 1.0
+    aliases = 1.0
+    for i, m in enumerate([np.fft.fftfreq(Nmesh, 1.0/Nmesh),\
+                           np.fft.fftfreq(Nmesh, 1.0/Nmesh),\
+                           np.fft.rfftfreq(Nmesh, 1.0/Nmesh)]):
+        shape = [1,1,1]
+        shape[i] = len(m)
+        s = np.sin(np.pi*m/Nmesh)**2
+        if p==1: c = np.ones(len(m))
+        elif p==2: c = 1.0 - 2.0/3.0*s
+        else: c = 1.0 - s + 2.0/15.0*s**2
+        window = window*(np.sinc(m/Nmesh)**p).reshape(shape)
+        aliases = aliases*c.reshape(shape)
+
+    #Fourier transform the density contrast of each sample
+    delta1 = _mesh_transform(sample1, period, Nmesh, p)/window
+    if same: delta2 = delta1
+    else: delta2 = _mesh_transform(sample2, period, Nmesh, p)/window
+
+    def cross_power(delta_a, delta_b, N):
+        """
+        return the power of two transformed samples, less the shot noise of a sample of 
+        N points if it is an auto-power spectrum (N is not None).
+        """
+        P = np.real(delta_a*np.conj(delta_b))*volume/Nmesh**6
+        if N is not None: P -= aliases/window**2*volume/N
+        #the mean density is fixed, so there is no power in the k=0 mode
+        P[0,0,0] = 0.0
+        return P
+
+    N1, N2 = len(sample1), len(sample2)
+    P11 = cross_power(delta1, delta1, N1) if (do_auto | same) else None
+    P12 = cross_power(delta1, delta2, None) if (do_cross & (not same)) else None
+    P22 = cross_power(delta2, delta2, N2) if (do_auto & (not same)) else None
+
+    return [P11, P12, P22]
+
+
+def _mesh_transform(sample, period, Nmesh, p):
+    """
+    return the real-to-complex Fourier transform of the density contrast of sample,
+    assigned to a mesh of Nmesh^3 cells with the scheme of order p.
+    """
+
+    mesh = _assign_to_mesh(sample, period, Nmesh, p)
+    mesh = mesh/(len(sample)/Nmesh**3) - 1.0
+
+    return np.fft.rfftn(mesh)
+
+
+def _assign_to_mesh(sample, period, Nmesh, p):
+    """
+    return the number of points of sample in each of the Nmesh^3 cells of a mesh, with
+    each point assigned to p cells along each dimension, i.e. by nearest grid point
+    (p=1), cloud in cell (p=2), or triangular shaped cloud (p=3).  The cells of the mesh
+    are centered on (i+0.5)*period/Nmesh.
+    """
+
+    mesh = np.zeros(Nmesh**3)
+
+    #assign the points in chunks, to limit the memory used by the indices
+    chunk_size = max(1, 2**21//p**3)
+    for start in range(0, len(sample), chunk_size):
+        x = sample[start:start+chunk_size]/(period/Nmesh)
+
+        #the indices of the cells each point is assigned to along each dimension, and
+        #the weights of the point in these cells, of shape (Npts,3,p)
+        if p==1:
+            i = np.floor(x)[:,:,np.newaxis]
+            w = np.ones(np.shape(i))
+        elif p==2:
+            u = x - 0.5
+            i0 = np.floor(u)
+            f = u - i0
+            i = np.stack([i0, i0+1.0], axis=-1)
+            w = np.stack([1.0-f, f], axis=-1)
+        else:
+            u = x - 0.5
+            i0 = np.floor(u+0.5)
+            d = u - i0
+            i = np.stack([i0-1.0, i0, i0+1.0], axis=-1)
+            w = np.stack([0.5*(0.5-d)**2, 0.75-d**2, 0.5*(0.5+d)**2], axis=-1)
+        i = i.astype(np.int64) % Nmesh
+
+        #the flattened indices and weights of the p^3 cells of each point
+        index = (i[:,0,:,None,None]*Nmesh + i[:,1,None,:,None])*Nmesh + i[:,2,None,None,:]
+        weight = w[:,0,:,None,None]*w[:,1,None,:,None]*w[:,2,None,None,:]
+        mesh += np.bincount(index.ravel(), weights=weight.ravel(), minlength=Nmesh**3)
+
+    return mesh.reshape((Nmesh,Nmesh,Nmesh))
+
+
+def _bin_mesh(values, coords, bins, weights3):
+    """
+    return the weighted average of values on a mesh in bins of the length of the vector
+    with components coords[0][i], coords[1][j], coords[2][k], with
+    bins[n-1] < length <= bins[n].  weights3 are the weights of the mesh points along
+    the third dimension.  The average is nan in bins without any mesh points.
+    """
+
+    nbins = len(bins)
+    sums = np.zeros(nbins+1)
+    counts = np.zeros(nbins+1)
+
+    #loop over slices of the mesh, to limit the memory used
+    for i in range(len(coords[0])):
+        length = np.sqrt(coords[0][i]**2 + coords[1][:,None]**2 + coords[2][None,:]**2)
+        index = np.searchsorted(bins, length.ravel(), side='left')
+        weight = np.broadcast_to(weights3[None,:], length.shape).ravel()
+        sums += np.bincount(index, weights=weight*values[i].ravel(), minlength=nbins+1)
+        counts += np.bincount(index, weights=weight, minlength=nbins+1)
+
+    #the first element counts values at lengths <= bins[0], and the last at lengths
+    #larger than every bin
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums/counts)[1:nbins]
+
+
+def _results(result, sample1, sample2, do_auto, do_cross):
+    """
+    return the statistics of the samples in the same way as `tpcf`: only the auto
+    statistic of sample1 if sample2 is sample1, and otherwise those requested by
+    do_auto and do_cross.
+    """
+
+    r11, r12, r22 = result
+
+    if sample2 is sample1:
+        return r11
+    elif (do_auto==True) & (do_cross==True):
+        return r11, r12, r22
+    elif (do_cross==True):
+        return r12
+    else:
+        return r11, r22
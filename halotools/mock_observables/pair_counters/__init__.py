@@ -3,4 +3,9 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 from .rect_cuboid_pairs import *
-from .objective_rect_cuboid_pairs import *
\ No newline at end of file
+from .objective_rect_cuboid_pairs import *
+from .pair_counter_pool import *
+from .grid_index import *
+from .batch_pair_counter import *
+from .pair_count_cache import *
+from .nearest_neighbors import *
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pair counter which fills several binnings in a single pass.
+
+Clustering statistics of the same sample, e.g. the correlation function in r, the
+projected correlation function in (rp,pi), and the redshift space correlation function
+in (s,mu), each count the same pairs of points in a different binning.  A
+`BatchPairCounter` counts the pairs of each pair of samples once with `multi_npairs`, for
+all of its binnings, and returns the counts of each binning from a cache when they are
+requested by the clustering functions.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+import hashlib
+from rect_cuboid_pairs import npairs, xy_z_npairs, s_mu_npairs, multi_npairs
+from rect_cuboid_pairs import _process_binnings
+from grid_index import GridIndex
+
+
+__all__=['BatchPairCounter']
+__author__=['Duncan Campbell']
+
+
+class BatchPairCounter(object):
+    """
+    pair counter which counts the pairs of samples in several binnings at once.
+
+    An instance provides `npairs`, `xy_z_npairs`, and `s_mu_npairs` methods, with the
+    same arguments as the pair counting functions.  The first time the pairs of two
+    samples are requested, they are counted in all of the binnings by `multi_npairs`, and
+    the counts are cached.  Requests for the counts of the same samples in any of the
+    other binnings are returned from the cache.  Requests for binnings which were not
+    given when the instance was created are passed on to the pair counting functions.
+
+    An instance may be passed as the pair_counter argument of the clustering functions
+    `tpcf`, `redshift_space_tpcf`, `wp`, and `s_mu_tpcf`, in which case their pair counts
+    are shared.
+
+    Parameters
+    ----------
+    binnings: list
+        list of binnings, see `multi_npairs`, e.g. [('r', rbins), ('xy_z', rp_bins,
+        pi_bins), ('s_mu', s_bins, mu_bins)]
+
+    **kwargs: dict, optional
+        keyword arguments passed to `multi_npairs`, and the pair counting functions,
+        e.g. approx_cell_size or backend.
+
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import BatchPairCounter
+    >>> from halotools.mock_observables import tpcf, wp
+    >>> import numpy as np
+    >>> data = np.random.random((1000,3))
+    >>> rbins = np.logspace(-2,-1,5)
+    >>> pi_bins = np.linspace(0.0,0.1,3)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> counter = BatchPairCounter([('r', rbins), ('xy_z', rbins, pi_bins)])
+    >>> xi = tpcf(data, rbins, period=period, pair_counter=counter)
+    >>> w = wp(data, rbins, pi_bins, period=period, pair_counter=counter)
+    """
+
+    def __init__(self, binnings, **kwargs):
+
+        self.binnings = [(kind,)+tuple(bins) for kind, bins in _process_binnings(binnings)]
+        self.kwargs = kwargs
+        self._cache = {}
+
+    def npairs(self, data1, data2, rbins, Lbox=None, period=None, verbose=False,\
+               N_threads=1):
+        """
+        real-space pair counter, see `rect_cuboid_pairs.npairs`.
+        """
+
+        i = self._find_binning('r', [rbins])
+        if i is None:
+            return npairs(data1, data2, rbins, Lbox=Lbox, period=period,\
+                          verbose=verbose, N_threads=N_threads, **self.kwargs)
+
+        return self._counts(data1, data2, Lbox, period, verbose, N_threads)[i]
+
+    def xy_z_npairs(self, data1, data2, rp_bins, pi_bins, Lbox=None, period=None,\
+                    verbose=False, N_threads=1):
+        """
+        2+1D pair counter, see `rect_cuboid_pairs.xy_z_npairs`.
+        """
+
+        i = self._find_binning('xy_z', [rp_bins, pi_bins])
+        if i is None:
+            return xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=Lbox, period=period,\
+                               verbose=verbose, N_threads=N_threads, **self.kwargs)
+
+        return self._counts(data1, data2, Lbox, period, verbose, N_threads)[i]
+
+    def s_mu_npairs(self, data1, data2, s_bins, mu_bins, Lbox=None, period=None,\
+                    verbose=False, N_threads=1):
+        """
+        s-mu pair counter, see `rect_cuboid_pairs.s_mu_npairs`.
+        """
+
+        i = self._find_binning('s_mu', [s_bins, mu_bins])
+        if i is None:
+            return s_mu_npairs(data1, data2, s_bins, mu_bins, Lbox=Lbox, period=period,\
+                               verbose=verbose, N_threads=N_threads, **self.kwargs)
+
+        return self._counts(data1, data2, Lbox, period, verbose, N_threads)[i]
+
+    def clear(self):
+        """
+        remove all cached pair counts.
+        """
+
+        self._cache.clear()
+
+    def _find_binning(self, kind, bins):
+        """
+        return the index of the binning of this kind with these bins, or None if there
+        is no such binning.
+        """
+
+        bins = [np.asarray(b, dtype=np.float64) for b in bins]
+        for i, binning in enumerate(self.binnings):
+            if binning[0]!=kind: continue
+            if all(np.array_equal(b1, b2) for b1, b2 in zip(bins, binning[1:])):
+                return i
+
+        return None
+
+    def _counts(self, data1, data2, Lbox, period, verbose, N_threads):
+        """
+        return the counts of data1 and data2 in every binning, counting the pairs if
+        they are not cached.
+        """
+
+        key = (_sample_key(data1), _sample_key(data2), _box_key(Lbox), _box_key(period))
+        if key not in self._cache:
+            self._cache[key] = multi_npairs(data1, data2, self.binnings, Lbox=Lbox,\
+                                            period=period, verbose=verbose,\
+                                            N_threads=N_threads, **self.kwargs)
+
+        return [np.copy(counts) for counts in self._cache[key]]
+
+
+def _sample_key(data):
+    """
+    return a hash identifying the positions of a sample, which is either an array or a
+    `GridIndex`.
+    """
+
+    if isinstance(data, GridIndex):
+        return data.key
+
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    return (np.shape(data), hashlib.sha1(data).hexdigest())
+
+
+def _box_key(box):
+    """
+    return a hashable version of the Lbox or period arguments of a pair counter.
+    """
+
+    if box is None:
+        return None
+
+    return tuple(np.atleast_1d(np.asarray(box, dtype=np.float64)))
@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite of the pair counters.
+
+`run_benchmarks` times the pair counters of `rect_cuboid_pairs`, `fof_pairs`, and
+`objective_rect_cuboid_pairs` over a grid of sample sizes, clustering of the samples,
+numbers of bins, numbers of threads, and boundary conditions, and returns (or writes) the
+results as JSON, so that the timings of different versions can be compared with
+`compare_benchmarks`.  The suite may also be run from the command line:
+
+    python -m halotools.mock_observables.pair_counters.benchmarks --output timings.json
+"""
+
+from __future__ import print_function, division
+import numpy as np
+import json
+import platform
+import multiprocessing
+from collections import OrderedDict
+from datetime import datetime
+from time import time
+from rect_cuboid_pairs import npairs, wnpairs, jnpairs, xy_z_npairs, xy_z_wnpairs,\
+                              xy_z_jnpairs, s_mu_npairs, multi_npairs, npairs_per_point,\
+                              xy_z_npairs_per_point, wp_npairs, labeled_npairs,\
+                              multipole_npairs
+from fof_pairs import fof_pairs, xy_z_fof_pairs
+from objective_rect_cuboid_pairs import obj_wnpairs
+from nearest_neighbors import nearest_neighbors
+from pair_counter_pool import _process_N_threads
+
+
+__all__=['run_benchmarks', 'compare_benchmarks']
+__author__=['Duncan Campbell']
+
+
+#the timed calls of each pair counter, given a _BenchmarkCase
+_COUNTERS = OrderedDict([
+    ('npairs', lambda c: npairs(c.data, c.data, c.rbins, period=c.period,\
+                                N_threads=c.N_threads)),
+    ('wnpairs', lambda c: wnpairs(c.data, c.data, c.rbins, period=c.period,\
+                                  weights1=c.weights, weights2=c.weights,\
+                                  N_threads=c.N_threads)),
+    ('jnpairs', lambda c: jnpairs(c.data, c.data, c.rbins, period=c.period,\
+                                  weights1=c.weights, weights2=c.weights,\
+                                  jtags1=c.jtags, jtags2=c.jtags,\
+                                  N_samples=c.N_samples, N_threads=c.N_threads)),
+    ('xy_z_npairs', lambda c: xy_z_npairs(c.data, c.data, c.rbins, c.pi_bins,\
+                                          period=c.period, N_threads=c.N_threads)),
+    ('xy_z_wnpairs', lambda c: xy_z_wnpairs(c.data, c.data, c.rbins, c.pi_bins,\
+                                            period=c.period, weights1=c.weights,\
+                                            weights2=c.weights, N_threads=c.N_threads)),
+    ('xy_z_jnpairs', lambda c: xy_z_jnpairs(c.data, c.data, c.rbins, c.pi_bins,\
+                                            period=c.period, weights1=c.weights,\
+                                            weights2=c.weights, jtags1=c.jtags,\
+                                            jtags2=c.jtags, N_samples=c.N_samples,\
+                                            N_threads=c.N_threads)),
+    ('wp_npairs', lambda c: wp_npairs(c.data, c.data, c.rbins, c.pi_bins[-1],\
+                                      period=c.period, N_threads=c.N_threads)),
+    ('s_mu_npairs', lambda c: s_mu_npairs(c.data, c.data, c.rbins, c.mu_bins,\
+                                          period=c.period, N_threads=c.N_threads)),
+    ('multipole_npairs', lambda c: multipole_npairs(c.data, c.data, c.rbins,\
+                                                    period=c.period,\
+                                                    N_threads=c.N_threads)),
+    ('multi_npairs', lambda c: multi_npairs(c.data, c.data, [('r', c.rbins),\
+                                            ('xy_z', c.rbins, c.pi_bins),\
+                                            ('s_mu', c.rbins, c.mu_bins)],\
+                                            period=c.period, N_threads=c.N_threads)),
+    ('labeled_npairs', lambda c: labeled_npairs(c.data, c.data, c.rbins, c.labels,\
+                                                c.labels, period=c.period,\
+                                                N_threads=c.N_threads)),
+    ('npairs_per_point', lambda c: npairs_per_point(c.data, c.data, c.rbins,\
+                                                    period=c.period,\
+                                                    N_threads=c.N_threads)),
+    ('xy_z_npairs_per_point', lambda c: xy_z_npairs_per_point(c.data, c.data, c.rbins,\
+                                                              c.pi_bins,\
+                                                              period=c.period,\
+                                                              N_threads=c.N_threads)),
+    ('fof_pairs', lambda c: fof_pairs(c.data, c.data, c.b_link, period=c.period,\
+                                      N_threads=c.N_threads)),
+    ('xy_z_fof_pairs', lambda c: xy_z_fof_pairs(c.data, c.data, c.b_link,\
+                                                10.0*c.b_link, period=c.period,\
+                                                N_threads=c.N_threads)),
+    ('obj_wnpairs', lambda c: obj_wnpairs(c.data, c.data, c.rbins, period=c.period,\
+                                          weights1=c.weights, weights2=c.weights,\
+                                          wfunc=1, N_threads=c.N_threads)),
+    ('nearest_neighbors', lambda c: nearest_neighbors(c.data, c.data, 10,\
+                                                      period=c.period,\
+                                                      N_threads=c.N_threads)),
+])
+
+#the parameters which identify a benchmark
+_KEYS = ['counter', 'sample', 'Npts', 'Nbins', 'N_threads', 'PBCs']
+
+
+def run_benchmarks(counters=None, Npts=(1e4,1e5), samples=('uniform','clustered'),\
+                   Nbins=(10,50), N_threads=(1,'max'), PBCs=(True,False), Lbox=250.0,\
+                   r_max=20.0, repeat=3, output=None, verbose=False, seed=43):
+    """
+    time the pair counters.
+
+    Each counter is called with every combination of the sample sizes, samples, numbers
+    of bins, numbers of threads, and boundary conditions, counting the pairs of a sample
+    with itself.  Each call is repeated, and the fastest time is reported.
+
+    Parameters
+    ----------
+    counters: list, optional
+        names of the pair counters to time, e.g. ['npairs', 'xy_z_npairs'].  If None,
+        all of the counters are timed.
+
+    Npts: list, optional
+        numbers of points in the samples
+
+    samples: list, optional
+        samples to count, 'uniform' for points drawn from a uniform distribution, and
+        'clustered' for HOD-like galaxies in the halos of a `FakeSim`.
+
+    Nbins: list, optional
+        numbers of bins in which pairs are counted, logarithmically spaced in r and rp
+        up to r_max, and linearly spaced in pi and mu.
+
+    N_threads: list, optional
+        numbers of 'threads' to use in the pair counting, see `npairs`.
+
+    PBCs: list, optional
+        True to count the pairs with periodic boundary conditions, and False without.
+
+    Lbox: float, optional
+        length of the sides of the cube which contains the samples
+
+    r_max: float, optional
+        maximum separation of the bins
+
+    repeat: int, optional
+        number of times each call is repeated
+
+    output: string, optional
+        name of a file to which the results are written as JSON
+
+    verbose: Boolean, optional
+        If True, print the time of each benchmark.
+
+    seed: int, optional
+        random number seed used to generate the samples
+
+    Returns
+    -------
+    results: dict
+        dictionary with 'metadata', describing the machine and the versions of the
+        software, and 'results', a list of dictionaries with the parameters of each
+        benchmark, its fastest time, 'time', and the time of each call, 'times', in
+        seconds.
+
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters.benchmarks import run_benchmarks
+    >>> results = run_benchmarks(['npairs'], Npts=[1000], samples=['uniform'], Nbins=[10], N_threads=[1], PBCs=[True], repeat=1)
+    """
+
+    if counters is None:
+        counters = list(_COUNTERS.keys())
+    for counter in counters:
+        if counter not in _COUNTERS:
+            raise ValueError("counter must be one of {0}".format(list(_COUNTERS.keys())))
+    for sample in samples:
+        if sample not in ('uniform', 'clustered'):
+            raise ValueError("samples must be 'uniform' or 'clustered'")
+    if (int(repeat)!=repeat) or (repeat<1):
+        raise ValueError("repeat must be a positive integer")
+    if not 0.0<r_max<=Lbox/2.0:
+        raise ValueError("r_max must be positive and <= Lbox/2")
+
+    period = np.array([Lbox]*3)
+
+    results = []
+    for N in Npts:
+        N = int(N)
+        for sample in samples:
+            data = _get_sample(sample, N, Lbox, seed)
+            for nbins in Nbins:
+                for n_threads in N_threads:
+                    n_threads = _process_N_threads(n_threads)
+                    for pbcs in PBCs:
+                        case = _BenchmarkCase(data, Lbox, r_max, int(nbins), n_threads,\
+                                              period if pbcs else None, seed)
+                        for counter in counters:
+                            times = []
+                            for i in range(int(repeat)):
+                                start = time()
+                                _COUNTERS[counter](case)
+                                times.append(time()-start)
+                            record = OrderedDict(zip(_KEYS, [counter, sample, N,\
+                                                 int(nbins), n_threads, bool(pbcs)]))
+                            record['time'] = min(times)
+                            record['times'] = times
+                            results.append(record)
+                            if verbose==True:
+                                print(_format_record(record))
+
+    results = OrderedDict([('metadata', _metadata(Lbox, r_max, repeat, seed)),\
+                           ('results', results)])
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+def compare_benchmarks(reference, results, tolerance=0.1):
+    """
+    find the benchmarks which are slower than in a reference set of benchmarks.
+
+    Parameters
+    ----------
+    reference: dict or string
+        results of `run_benchmarks`, or the name of a JSON file to which they were
+        written, e.g. timed with a previous release.
+
+    results: dict or string
+        results of `run_benchmarks` to compare to the reference
+
+    tolerance: float, optional
+        fractional increase in time above which a benchmark is reported as slower.
+
+    Returns
+    -------
+    regressions: list
+        list of (record, ratio) tuples of the benchmarks in results which are more than
+        (1+tolerance) times slower than the same benchmark in reference, where ratio is
+        the time divided by the time of the reference.  Benchmarks which are not in
+        reference are ignored.
+    """
+
+    reference = _load_results(reference)
+    results = _load_results(results)
+
+    reference_times = dict((_record_key(r), r['time']) for r in reference['results'])
+
+    regressions = []
+    for record in results['results']:
+        key = _record_key(record)
+        if key not in reference_times: continue
+        ratio = record['time']/max(reference_times[key], 1e-9)
+        if ratio>(1.0+tolerance):
+            regressions.append((record, ratio))
+
+    return regressions
+
+
+class _BenchmarkCase(object):
+    """
+    arguments of the pair counters in one benchmark.
+    """
+
+    def __init__(self, data, Lbox, r_max, Nbins, N_threads, period, seed):
+
+        np.random.seed(seed)
+        Npts = len(data)
+
+        self.data = data
+        self.period = period
+        self.N_threads = N_threads
+
+        self.rbins = np.logspace(np.log10(r_max)-2.0, np.log10(r_max), Nbins)
+        self.pi_bins = np.linspace(0.0, r_max, Nbins)
+        self.mu_bins = np.linspace(0.0, 1.0, Nbins)
+
+        self.weights = np.random.random(Npts)
+
+        #labels of 4 samples
+        self.labels = np.random.randint(0, 4, Npts)
+
+        #jackknife samples in 5x5x5 subvolumes
+        self.N_samples = 5**3
+        j = np.floor(data/Lbox*5.0).astype(int)
+        j = np.clip(j, 0, 4)
+        self.jtags = (j[:,0]*5+j[:,1])*5+j[:,2]+1
+
+        #FoF linking length of 0.2 times the mean inter-particle separation
+        self.b_link = 0.2*Lbox/Npts**(1.0/3.0)
+
+
+def _get_sample(sample, Npts, Lbox, seed):
+    """
+    return an Npts by 3 array of the positions of a benchmark sample.
+    """
+
+    if sample=='uniform':
+        np.random.seed(seed)
+        return np.random.uniform(0, Lbox, (Npts,3))
+    else:
+        return _clustered_sample(Npts, Lbox, seed)
+
+
+def _clustered_sample(Npts, Lbox, seed):
+    """
+    return an Npts by 3 array of the positions of HOD-like galaxies in the halos of a
+    `FakeSim`.
+
+    Galaxies are assigned to halos with probability proportional to the mean occupation
+    1+M/M1, with M1=1e13.  The first galaxy in each halo is placed at its center, and
+    the others are distributed uniformly within its virial radius.
+    """
+
+    from ...sim_manager.generate_random_sim import FakeSim
+
+    sim = FakeSim(num_halos_per_massbin=max(1000, Npts//10), seed=seed)
+    halos = sim.halos
+    scale = Lbox/sim.Lbox
+
+    halo_pos = np.vstack((halos['x'], halos['y'], halos['z'])).T*scale
+    rvir = np.asarray(halos['rvir'])*scale
+    occupation = 1.0+np.asarray(halos['mvir'])/1e13
+
+    np.random.seed(seed)
+    host = np.sort(np.random.choice(len(halos), Npts, p=occupation/np.sum(occupation)))
+
+    #satellites are the galaxies after the first one in each halo
+    satellite = np.zeros(Npts, dtype=bool)
+    satellite[1:] = (host[1:]==host[:-1])
+    Nsat = np.sum(satellite)
+
+    #uniform positions within a sphere
+    r = rvir[host[satellite]]*np.random.random(Nsat)**(1.0/3.0)
+    cos_t = np.random.uniform(-1.0, 1.0, Nsat)
+    sin_t = np.sqrt(1.0-cos_t**2)
+    phi = np.random.uniform(0.0, 2.0*np.pi, Nsat)
+    offset = np.vstack((r*sin_t*np.cos(phi), r*sin_t*np.sin(phi), r*cos_t)).T
+
+    data = halo_pos[host]
+    data[satellite] += offset
+
+    #wrap the satellites into the box
+    data = np.mod(data, Lbox)
+    data[data>=Lbox] = 0.0
+
+    return data
+
+
+def _metadata(Lbox, r_max, repeat, seed):
+    """
+    return a dictionary describing the machine, the software, and the settings of the
+    benchmarks.
+    """
+
+    from ... import __version__
+
+    return OrderedDict([('halotools_version', __version__),\
+                        ('numpy_version', np.__version__),\
+                        ('python_version', platform.python_version()),\
+                        ('platform', platform.platform()),\
+                        ('processor', platform.processor()),\
+                        ('cpu_count', multiprocessing.cpu_count()),\
+                        ('date', datetime.utcnow().isoformat()),\
+                        ('Lbox', Lbox), ('r_max', r_max), ('repeat', repeat),\
+                        ('seed', seed)])
+
+
+def _load_results(results):
+    """
+    return the results of `run_benchmarks`, reading them from a JSON file if a file name
+    is passed.
+    """
+
+    if isinstance(results, basestring):
+        with open(results, 'r') as f:
+            results = json.load(f)
+
+    return results
+
+
+def _record_key(record):
+    """
+    return a hashable key of the parameters of a benchmark.
+    """
+
+    return tuple(str(record[key]) for key in _KEYS)
+
+
+def _format_record(record):
+    """
+    return a line of text describing a benchmark.
+    """
+
+    return "{0:>22s} {1:>9s} Npts={2:<8d} Nbins={3:<4d} N_threads={4:<3d} "\
+           "PBCs={5!s:<5s} {6:9.3f} s".format(*(list(record.values())[:6]+\
+                                               [record['time']]))
+
+
+def main():
+    """
+    run the benchmarks from the command line.
+    """
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="time the halotools pair counters")
+    parser.add_argument('--counters', nargs='+', default=None,\
+                        choices=list(_COUNTERS.keys()))
+    parser.add_argument('--Npts', nargs='+', type=float, default=[1e4,1e5])
+    parser.add_argument('--samples', nargs='+', default=['uniform','clustered'],\
+                        choices=['uniform','clustered'])
+    parser.add_argument('--Nbins', nargs='+', type=int, default=[10,50])
+    parser.add_argument('--N_threads', nargs='+', default=['1','max'])
+    parser.add_argument('--no_PBCs', action='store_true',\
+                        help="only count pairs without periodic boundary conditions")
+    parser.add_argument('--PBCs_only', action='store_true',\
+                        help="only count pairs with periodic boundary conditions")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help="JSON file of the results")
+    parser.add_argument('--compare', default=None,\
+                        help="JSON file of reference results to compare to")
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    N_threads = [n if n=='max' else int(n) for n in args.N_threads]
+    PBCs = [True, False]
+    if args.no_PBCs: PBCs = [False]
+    if args.PBCs_only: PBCs = [True]
+
+    results = run_benchmarks(args.counters, Npts=args.Npts, samples=args.samples,\
+                             Nbins=args.Nbins, N_threads=N_threads, PBCs=PBCs,\
+                             repeat=args.repeat, output=args.output, verbose=True)
+
+    if args.compare is not None:
+        regressions = compare_benchmarks(args.compare, results, args.tolerance)
+        print("{0} benchmarks are slower than in {1}".format(len(regressions),\
+                                                            args.compare))
+        for record, ratio in regressions:
+            print(_format_record(record)+" ({0:.2f}x)".format(ratio))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,5 @@
 
-from cpairs import *
\ No newline at end of file
+from cpairs import *
+from parallel_cpairs import *
+from dual_tree_cpairs import *
+from knn_cpairs import *
@@ -0,0 +1,150 @@
+"""
+binning functions shared by the cython pair counters
+"""
+
+cimport cython
+cimport numpy as np
+from libc.math cimport sqrt
+
+cdef inline int bin_index(np.float64_t* bins, np.float64_t d, np.int_t k) nogil:
+    """
+    return the index of the smallest bin edge, bins[i], for which d <= bins[i], found by a
+    binary search of the (increasing) bin edges bins[0] to bins[k].  Return -1 if d is
+    larger than every bin edge.
+    """
+    cdef int lo = 0
+    cdef int hi = k
+    cdef int mid
+
+    #most pairs are not in any bin
+    if not d<=bins[k]: return -1
+
+    while lo<hi:
+        mid = (lo+hi)//2
+        if d<=bins[mid]: hi = mid
+        else: lo = mid+1
+
+    return lo
+
+
+#the kinds of binning of a pair counted by `multi_binning`
+cdef enum:
+    R_BINNING = 0
+    XY_Z_BINNING = 1
+    S_MU_BINNING = 2
+
+#number of elements describing each binning in the specs passed to `multi_binning`
+cdef enum:
+    SPEC_SIZE = 6
+
+
+@cython.cdivision(True)
+cdef inline void multi_binning(np.int_t* counts, np.float64_t* edges, np.int64_t* specs,
+                               int nspecs, np.float64_t d_perp, np.float64_t d_para,
+                               np.int_t n) nogil:
+    """
+    add n to the bin of a pair of points, with square separations d_perp and d_para
+    perpendicular and parallel to the line of sight, in each of several binnings.
+
+    Binning *i* is described by specs[SPEC_SIZE*i:SPEC_SIZE*(i+1)], which are the kind
+    of binning, the offsets into edges of the first and second set of bin edges, the
+    number of edges in each set, and the offset into counts of the histogram.  R_BINNING
+    bins the square separation, using only the first set of edges; XY_Z_BINNING bins
+    d_perp and d_para; and S_MU_BINNING bins s and mu, with s the separation and mu the
+    cosine of the angle from the line of sight.  Only the single bin, counts[i,j], with
+    bins[i-1] < d <= bins[i] is incremented in each histogram.
+    """
+    cdef int ispec, k, g
+    cdef np.int64_t* spec
+    cdef double d = d_perp + d_para
+    cdef double s = -1.0
+    cdef double mu = 0.0
+
+    for ispec in range(nspecs):
+        spec = specs + SPEC_SIZE*ispec
+        if spec[0]==R_BINNING:
+            k = bin_index(edges+spec[1], d, spec[3]-1)
+            if k>=0: counts[spec[5]+k] += n
+        elif spec[0]==XY_Z_BINNING:
+            k = bin_index(edges+spec[1], d_perp, spec[3]-1)
+            if k<0: continue
+            g = bin_index(edges+spec[2], d_para, spec[4]-1)
+            if g>=0: counts[spec[5]+k*spec[4]+g] += n
+        else:
+            #transform to s and mu, once for all binnings
+            if s<0.0:
+                s = sqrt(d)
+                if s!=0: mu = sqrt(d_para)/s
+            k = bin_index(edges+spec[1], s, spec[3]-1)
+            if k<0: continue
+            g = bin_index(edges+spec[2], mu, spec[4]-1)
+            if g>=0: counts[spec[5]+k*spec[4]+g] += n
+
+
+cdef inline int point_bin_index(np.float64_t* rp_bins, int nrp_bins,
+                                np.float64_t* pi_bins, int npi_bins,
+                                np.float64_t d_perp, np.float64_t d_para,
+                                bint xy_z) nogil:
+    """
+    return the flattened index, k*npi_bins+g, of the bin of a pair of points with square
+    separations d_perp and d_para perpendicular and parallel to the line of sight, with
+    rp_bins[k-1] < d_perp <= rp_bins[k] and pi_bins[g-1] < d_para <= pi_bins[g].  If
+    xy_z is False, the square separation, d_perp+d_para, is binned in rp_bins, and
+    npi_bins should be 1.  Return -1 if the pair is not in any bin.
+    """
+    cdef int k, g
+
+    if not xy_z:
+        return bin_index(rp_bins, d_perp+d_para, nrp_bins-1)
+
+    k = bin_index(rp_bins, d_perp, nrp_bins-1)
+    if k<0: return -1
+    g = bin_index(pi_bins, d_para, npi_bins-1)
+    if g<0: return -1
+
+    return k*npi_bins+g
+
+
+@cython.cdivision(True)
+cdef inline double legendre(int ell, double mu) nogil:
+    """
+    return the Legendre polynomial of order ell, P_ell(mu), calculated by the recurrence
+    (n+1)*P_(n+1) = (2n+1)*mu*P_n - n*P_(n-1).
+    """
+    cdef int n
+    cdef double p0 = 1.0
+    cdef double p1 = mu
+    cdef double p2
+
+    if ell==0: return p0
+
+    for n in range(1,ell):
+        p2 = ((2*n+1)*mu*p1 - n*p0)/(n+1)
+        p0 = p1
+        p1 = p2
+
+    return p1
+
+
+@cython.cdivision(True)
+cdef inline void multipole_binning(np.float64_t* counts, np.float64_t* s_bins,
+                                   int nbins_minus_one, np.int64_t* ells, int nells,
+                                   np.float64_t d_perp, np.float64_t d_para,
+                                   np.float64_t n) nogil:
+    """
+    add n*P_ell(mu) to the bin of a pair of points, with square separations d_perp and
+    d_para perpendicular and parallel to the line of sight, for each of the nells
+    Legendre polynomials of order ells[l].  The square separation is binned in the
+    (square) s_bins, mu is the cosine of the angle from the line of sight, and counts is
+    the flattened nells by nbins_minus_one+1 array of the Legendre weighted pair counts.
+    """
+    cdef int k, l
+    cdef double d = d_perp + d_para
+    cdef double mu = 0.0
+
+    k = bin_index(s_bins, d, nbins_minus_one)
+    if k<0: return
+
+    if d>0.0: mu = sqrt(d_para/d)
+    for l in range(nells):
+        counts[l*(nbins_minus_one+1)+k] += n*legendre(ells[l], mu)
@@ -0,0 +1,75 @@
+"""
+bounds on the separations between points in two axis-aligned boxes, shared by the cython
+pair counters
+"""
+
+cimport cython
+from libc.math cimport fmin, fmax
+from binning cimport bin_index
+
+#relative tolerance by which the range of separations between two boxes is widened, so
+#that round-off error never causes a pair to be pruned or counted in bulk when its
+#separation, calculated point by point, would fall into a different bin
+DEF BOUNDS_TOL = 1e-12
+
+cdef inline double square_min_separation(double lo1, double hi1, double lo2, double hi2,
+                                         double L) nogil:
+    """
+    return the smallest possible square separation along one dimension between a point
+    in [lo1,hi1] and a point in [lo2,hi2], including the periodic images, with period L,
+    of the second interval.
+    """
+    cdef double d
+
+    d = fmax(0.0, fmax(lo2-hi1, lo1-hi2))
+    if d>0.0:
+        d = fmin(d, fmax(0.0, fmax(lo2+L-hi1, lo1-hi2-L)))
+        d = fmin(d, fmax(0.0, fmax(lo2-L-hi1, lo1-hi2+L)))
+
+    return d*d*(1.0-BOUNDS_TOL)
+
+
+@cython.cdivision(True)
+cdef inline double square_max_separation(double lo1, double hi1, double lo2, double hi2,
+                                         double L) nogil:
+    """
+    return an upper limit on the square separation along one dimension between a point
+    in [lo1,hi1] and a point in [lo2,hi2].  With PBCs, the separation is at most half the
+    period, L.
+    """
+    cdef double d
+
+    d = fmax(hi2-lo1, hi1-lo2)
+    d = fmin(d, L/2.0)
+
+    return d*d*(1.0+BOUNDS_TOL)
+
+
+cdef inline int box_pair_bin(double* lower1, double* upper1, double* lower2,
+                             double* upper2, double* bins, int nbins_minus_one,
+                             double* period) nogil:
+    """
+    return the index of the bin, of the (increasing) square bin edges bins[0] to
+    bins[nbins_minus_one], into which all pairs between a point in the box [lower1,upper1]
+    and a point in the box [lower2,upper2] fall.  Return -1 if all pairs are more widely
+    separated than the largest bin, or either box is empty (lower>upper), and -2 if the
+    pairs may fall into different bins.
+    """
+    cdef double d_min = 0.0
+    cdef double d_max = 0.0
+    cdef int a, k_min
+
+    if (lower1[0]>upper1[0]) or (lower2[0]>upper2[0]): return -1
+
+    for a in range(3):
+        d_min += square_min_separation(lower1[a], upper1[a], lower2[a], upper2[a],
+                                       period[a])
+    k_min = bin_index(bins, d_min, nbins_minus_one)
+    if k_min<0: return -1
+
+    for a in range(3):
+        d_max += square_max_separation(lower1[a], upper1[a], lower2[a], upper2[a],
+                                       period[a])
+    if bin_index(bins, d_max, nbins_minus_one)==k_min: return k_min
+
+    return -2
@@ -5,6 +5,11 @@ optimized cython pair counters.  These are called by "rect_cuboid_pairs" module
 engine to actually calculate the pair-wise distances and do the binning.  These functions 
 should be used with care as there are no 'checks' preformed to ensure the arguments are 
 of the correct format.
+
+Each pair is placed into a single bin, found by a binary search of the bin edges, and 
+the functions return the number of pairs in each bin, i.e. with bins[i-1] < d <= bins[i].  
+The cumulative counts, i.e. with d <= bins[i], are calculated by the calling functions 
+once all the pairs have been counted. 
 """
 
 from __future__ import print_function, division
@@ -14,12 +19,22 @@ import numpy as np
 cimport numpy as np
 from libc.math cimport fabs, fmin, sqrt
 from distances cimport *
+from binning cimport bin_index, multi_binning, point_bin_index, multipole_binning,\
+    SPEC_SIZE
+cimport bounds
 
 __all__ = ['npairs_no_pbc', 'npairs_pbc', 'wnpairs_no_pbc', 'wnpairs_pbc',\
            'jnpairs_no_pbc', 'jnpairs_pbc',\
            'xy_z_npairs_no_pbc', 'xy_z_npairs_pbc', 'xy_z_wnpairs_no_pbc', 'xy_z_wnpairs_pbc',\
            'xy_z_jnpairs_no_pbc', 'xy_z_jnpairs_pbc',\
-           's_mu_npairs_no_pbc', 's_mu_npairs_pbc']
+           's_mu_npairs_no_pbc', 's_mu_npairs_pbc',\
+           'npairs_auto_no_pbc', 'npairs_auto_pbc', 'wnpairs_auto_no_pbc', 'wnpairs_auto_pbc',\
+           'xy_z_npairs_auto_no_pbc', 'xy_z_npairs_auto_pbc',\
+           'xy_z_wnpairs_auto_no_pbc', 'xy_z_wnpairs_auto_pbc',\
+           's_mu_npairs_auto_no_pbc', 's_mu_npairs_auto_pbc',\
+           'cell_pair_bins', 'multi_npairs_cell_pair', 'wnpairs_columns_cell_pair',\
+           'npairs_per_point_cell_pair', 'wp_npairs_cell_pair',\
+           'labeled_npairs_cell_pair', 'multipole_npairs_cell_pair']
 __author__=['Duncan Campbell']
 
 @cython.boundscheck(False)
@@ -212,8 +227,10 @@ def jnpairs_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
                    np.ndarray[np.float64_t, ndim=1] rbins):
     """
     jackknife weighted real-space pair counter.
-    Calculate the weighted number of pairs with separations less than or equal to rbins[i]
-    for a jackknife sample.
+    Calculate, for each jackknife subvolume l, the weighted number of pairs with one (or 
+    both) of the points in subvolume l, where pairs with both points in l are counted 
+    twice.  The jackknife counts are derived from these by the calling function, see 
+    `radial_jbinning`.
     """
     
     #c definitions
@@ -236,7 +253,7 @@ def jnpairs_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
                         
             #calculate counts in bins
             radial_jbinning(<np.float64_t*>counts.data, <np.float64_t*>rbins.data,\
-                            d, nbins_minus_one, N_samples,\
+                            d, nbins_minus_one,\
                             w_icell1[i], w_icell2[j],\
                             j_icell1[i], j_icell2[j])
         
@@ -260,8 +277,10 @@ def jnpairs_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
                 np.ndarray[np.float64_t, ndim=1] period):
     """
     jackknife weighted real-space pair counter.
-    Calculate the weighted number of pairs with separations less than or equal to rbins[i]
-    for a jackknife sample.
+    Calculate, for each jackknife subvolume l, the weighted number of pairs with one (or 
+    both) of the points in subvolume l, where pairs with both points in l are counted 
+    twice.  The jackknife counts are derived from these by the calling function, see 
+    `radial_jbinning`.
     """
     
     #c definitions
@@ -286,7 +305,7 @@ def jnpairs_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
             
             #calculate counts in bins
             radial_jbinning(<np.float64_t*>counts.data, <np.float64_t*>rbins.data,\
-                            d, nbins_minus_one, N_samples,\
+                            d, nbins_minus_one,\
                             w_icell1[i], w_icell2[j],\
                             j_icell1[i], j_icell2[j])
 
@@ -520,9 +539,12 @@ def xy_z_jnpairs_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
                         np.ndarray[np.float64_t, ndim=1] rp_bins,
                         np.ndarray[np.float64_t, ndim=1] pi_bins):
     """
-    2+1D pair counter without periodic boundary conditions (no PBCs).
-    Calculate the number of pairs with separations in the x-y plane less than or equal 
-    to rp_bins[i], and separations in the z coordinate less than or equal to pi_bins[i].
+    jackknife weighted 2+1D pair counter without periodic boundary conditions (no PBCs).
+    Calculate, for each jackknife subvolume l, the weighted number of pairs with one (or 
+    both) of the points in subvolume l, where pairs with both points in l are counted 
+    twice, binned in the separations in the x-y plane and in the z coordinate.  The 
+    jackknife counts are derived from these by the calling function, see 
+    `xy_z_jbinning`.
     """
     
     #c definitions
@@ -553,7 +575,7 @@ def xy_z_jnpairs_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
                           <np.float64_t*>rp_bins.data,\
                           <np.float64_t*>pi_bins.data,\
                           d_perp, d_para,\
-                          nrp_bins_minus_one, npi_bins_minus_one, N_samples,\
+                          nrp_bins_minus_one, npi_bins_minus_one,\
                           w_icell1[i], w_icell2[j], j_icell1[i], j_icell2[j])
         
     return counts
@@ -577,9 +599,12 @@ def xy_z_jnpairs_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
                      np.ndarray[np.float64_t, ndim=1] pi_bins,
                      np.ndarray[np.float64_t, ndim=1] period):
     """
-    2+1D pair counter without periodic boundary conditions (no PBCs).
-    Calculate the number of pairs with separations in the x-y plane less than or equal 
-    to rp_bins[i], and separations in the z coordinate less than or equal to pi_bins[i].
+    jackknife weighted 2+1D pair counter without periodic boundary conditions (no PBCs).
+    Calculate, for each jackknife subvolume l, the weighted number of pairs with one (or 
+    both) of the points in subvolume l, where pairs with both points in l are counted 
+    twice, binned in the separations in the x-y plane and in the z coordinate.  The 
+    jackknife counts are derived from these by the calling function, see 
+    `xy_z_jbinning`.
     """
     
     #c definitions
@@ -613,7 +638,7 @@ def xy_z_jnpairs_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
                           <np.float64_t*>rp_bins.data,\
                           <np.float64_t*>pi_bins.data,\
                           d_perp, d_para,\
-                          nrp_bins_minus_one, npi_bins_minus_one, N_samples,\
+                          nrp_bins_minus_one, npi_bins_minus_one,\
                           w_icell1[i], w_icell2[j], j_icell1[i], j_icell2[j])
         
     return counts
@@ -737,149 +762,1071 @@ def s_mu_npairs_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
     return counts
 
 
-cdef inline radial_binning(np.int_t* counts, np.float64_t* bins,\
-                           np.float64_t d, np.int_t k):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def npairs_auto_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                       np.ndarray[np.float64_t, ndim=1] y_icell,
+                       np.ndarray[np.float64_t, ndim=1] z_icell,
+                       np.ndarray[np.float64_t, ndim=1] rbins):
     """
-    real space radial binning function
+    real-space pair counter without periodic boundary conditions (no PBCs) for the 
+    points within a single cell, paired with themselves.
+    Calculate the number of pairs with separations less than or equal to rbins[i].
+    
+    Only the pairs with i<j are visited.  The result is identical to calling 
+    npairs_no_pbc with the same points as both the first and second cell.
     """
     
-    while d<=bins[k]:
-        counts[k] += 1
-        k=k-1
-        if k<0: break
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int nbins_minus_one = len(rbins) -1
+    cdef np.ndarray[np.int_t, ndim=1] counts = np.zeros((nbins,), dtype=np.int)
+    cdef double d
+    cdef int i, j, k
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                        
+            #calculate the square distance
+            d = square_distance(x_icell[i],y_icell[i],z_icell[i],\
+                                x_icell[j],y_icell[j],z_icell[j])
+                        
+            #calculate counts in bins
+            radial_binning(<np.int_t*> counts.data,\
+                           <np.float64_t*> rbins.data, d, nbins_minus_one)
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,nbins):
+        counts[k] = 2*counts[k]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        radial_binning(<np.int_t*> counts.data,\
+                       <np.float64_t*> rbins.data, 0.0, nbins_minus_one)
+        
+    return counts
 
 
-cdef inline radial_wbinning(np.float64_t* counts, np.float64_t* bins,\
-                            np.float64_t d, np.int_t k,\
-                            np.float64_t w1, np.float64_t w2):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def npairs_auto_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                    np.ndarray[np.float64_t, ndim=1] y_icell,
+                    np.ndarray[np.float64_t, ndim=1] z_icell,
+                    np.ndarray[np.float64_t, ndim=1] rbins,
+                    np.ndarray[np.float64_t, ndim=1] period):
     """
-    real space radial weighted binning function
+    real-space pair counter with periodic boundary conditions (PBCs) for the points 
+    within a single cell, paired with themselves.
+    Calculate the number of pairs with separations less than or equal to rbins[i].
+    
+    Only the pairs with i<j are visited.  The result is identical to calling 
+    npairs_pbc with the same points as both the first and second cell.
     """
     
-    while d<=bins[k]:
-        counts[k] += w1*w2
-        k=k-1
-        if k<0: break
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int nbins_minus_one = len(rbins) -1
+    cdef np.ndarray[np.int_t, ndim=1] counts = np.zeros((nbins,), dtype=np.int)
+    cdef double d
+    cdef int i, j, k
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                        
+            #calculate the square distance
+            d = periodic_square_distance(x_icell[i],y_icell[i],z_icell[i],\
+                                         x_icell[j],y_icell[j],z_icell[j],\
+                                         <np.float64_t*> period.data)
+                        
+            #calculate counts in bins
+            radial_binning(<np.int_t*> counts.data,\
+                           <np.float64_t*> rbins.data, d, nbins_minus_one)
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,nbins):
+        counts[k] = 2*counts[k]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        radial_binning(<np.int_t*> counts.data,\
+                       <np.float64_t*> rbins.data, 0.0, nbins_minus_one)
+        
+    return counts
 
 
-cdef inline radial_jbinning(np.float64_t* counts, np.float64_t* bins,\
-                            np.float64_t d,\
-                            np.int_t nbins_minus_one,\
-                            np.int_t N_samples,\
-                            np.float64_t w1, np.float64_t w2,\
-                            np.int_t j1, np.int_t j2):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def wnpairs_auto_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                        np.ndarray[np.float64_t, ndim=1] y_icell,
+                        np.ndarray[np.float64_t, ndim=1] z_icell,
+                        np.ndarray[np.float64_t, ndim=1] w_icell,
+                        np.ndarray[np.float64_t, ndim=1] rbins):
     """
-    real space radial jackknife binning function
+    weighted real-space pair counter without periodic boundary conditions (no PBCs) for 
+    the points within a single cell, paired with themselves.
+    Calculate the weighted number of pairs with separations less than or equal to 
+    rbins[i].
+    
+    Only the pairs with i<j are visited.
     """
-    cdef int k, l
-    cdef int max_l = nbins_minus_one+1
     
-    for l in range(0,N_samples):
-        k = nbins_minus_one
-        while d<=bins[k]:
-            #counts[l,k] += jweight(l, j1, j2, w1, w2)
-            counts[l*max_l+k] += jweight(l, j1, j2, w1, w2)
-            k=k-1
-            if k<0: break
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int nbins_minus_one = len(rbins) -1
+    cdef np.ndarray[np.float64_t, ndim=1] counts = np.zeros((nbins,), dtype=np.float64)
+    cdef double d
+    cdef int i, j, k
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                    
+            #calculate the square distance
+            d = square_distance(x_icell[i],y_icell[i],z_icell[i],\
+                                x_icell[j],y_icell[j],z_icell[j])
+                    
+            #calculate counts in bins
+            radial_wbinning(<np.float64_t*>counts.data,\
+                            <np.float64_t*>rbins.data, d, nbins_minus_one,\
+                            w_icell[i], w_icell[j])
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,nbins):
+        counts[k] = 2.0*counts[k]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        radial_wbinning(<np.float64_t*>counts.data,\
+                        <np.float64_t*>rbins.data, 0.0, nbins_minus_one,\
+                        w_icell[i], w_icell[i])
+    
+    return counts
 
 
-cdef inline xy_z_binning(np.int_t* counts, np.float64_t* rp_bins,\
-                         np.float64_t* pi_bins, np.float64_t d_perp,\
-                         np.float64_t d_para, np.int_t k,\
-                         np.int_t npi_bins_minus_one):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def wnpairs_auto_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                     np.ndarray[np.float64_t, ndim=1] y_icell,
+                     np.ndarray[np.float64_t, ndim=1] z_icell,
+                     np.ndarray[np.float64_t, ndim=1] w_icell,
+                     np.ndarray[np.float64_t, ndim=1] rbins,
+                     np.ndarray[np.float64_t, ndim=1] period):
     """
-    2D+1 binning function
+    weighted real-space pair counter with periodic boundary conditions (PBCs) for the 
+    points within a single cell, paired with themselves.
+    Calculate the weighted number of pairs with separations less than or equal to 
+    rbins[i].
+    
+    Only the pairs with i<j are visited.
     """
-    cdef int g
-    cdef int max_k = npi_bins_minus_one+1
     
-    while d_perp<=rp_bins[k]:
-        g = npi_bins_minus_one
-        while d_para<=pi_bins[g]:
-            #counts[k,g] += 1
-            counts[k*max_k+g] += 1
-            g=g-1
-            if g<0: break
-        k=k-1
-        if k<0: break
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int nbins_minus_one = len(rbins) -1
+    cdef np.ndarray[np.float64_t, ndim=1] counts = np.zeros((nbins,), dtype=np.float64)
+    cdef double d
+    cdef int i, j, k
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                    
+            #calculate the square distance
+            d = periodic_square_distance(x_icell[i],y_icell[i],z_icell[i],\
+                                         x_icell[j],y_icell[j],z_icell[j],\
+                                         <np.float64_t*>period.data)
+                    
+            #calculate counts in bins
+            radial_wbinning(<np.float64_t*>counts.data,\
+                            <np.float64_t*>rbins.data, d, nbins_minus_one,\
+                            w_icell[i], w_icell[j])
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,nbins):
+        counts[k] = 2.0*counts[k]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        radial_wbinning(<np.float64_t*>counts.data,\
+                        <np.float64_t*>rbins.data, 0.0, nbins_minus_one,\
+                        w_icell[i], w_icell[i])
+    
+    return counts
 
 
-cdef inline xy_z_wbinning(np.float64_t* counts, np.float64_t* rp_bins,\
-                          np.float64_t* pi_bins, np.float64_t d_perp,\
-                          np.float64_t d_para, np.int_t k,\
-                          np.int_t npi_bins_minus_one, np.float64_t w1, np.float64_t w2):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def xy_z_npairs_auto_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                            np.ndarray[np.float64_t, ndim=1] y_icell,
+                            np.ndarray[np.float64_t, ndim=1] z_icell,
+                            np.ndarray[np.float64_t, ndim=1] rp_bins,
+                            np.ndarray[np.float64_t, ndim=1] pi_bins):
     """
-    2D+1 weighted binning function
+    2+1D pair counter without periodic boundary conditions (no PBCs) for the points 
+    within a single cell, paired with themselves.
+    Calculate the number of pairs with separations in the x-y plane less than or equal 
+    to rp_bins[i], and separations in the z coordinate less than or equal to pi_bins[i].
+    
+    Only the pairs with i<j are visited.  The result is identical to calling 
+    xy_z_npairs_no_pbc with the same points as both the first and second cell.
     """
-    cdef int g
-    cdef int max_k = npi_bins_minus_one+1
     
-    while d_perp<=rp_bins[k]:
-        g = npi_bins_minus_one
-        while d_para<=pi_bins[g]:
-            #counts[k,g] += w1*w2
-            counts[k*max_k+g] += w1*w2
-            g=g-1
-            if g<0: break
-        k=k-1
-        if k<0: break
+    #c definitions
+    cdef int nrp_bins = len(rp_bins)
+    cdef int npi_bins = len(pi_bins)
+    cdef int nrp_bins_minus_one = len(rp_bins) -1
+    cdef int npi_bins_minus_one = len(pi_bins) -1
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((nrp_bins, npi_bins), dtype=np.int)
+    cdef double d_perp, d_para
+    cdef int i, j, k, g
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                    
+            #calculate the square distance
+            d_perp = perp_square_distance(x_icell[i], y_icell[i],\
+                                          x_icell[j], y_icell[j])
+            d_para = para_square_distance(z_icell[i], z_icell[j])
+                        
+            #calculate counts in bins
+            xy_z_binning(<np.int_t*>counts.data,\
+                         <np.float64_t*>rp_bins.data,\
+                         <np.float64_t*>pi_bins.data,\
+                         d_perp, d_para, nrp_bins_minus_one, npi_bins_minus_one)
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,nrp_bins):
+        for g in range(0,npi_bins):
+            counts[k,g] = 2*counts[k,g]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        xy_z_binning(<np.int_t*>counts.data,\
+                     <np.float64_t*>rp_bins.data,\
+                     <np.float64_t*>pi_bins.data,\
+                     0.0, 0.0, nrp_bins_minus_one, npi_bins_minus_one)
+        
+    return counts
 
 
-cdef inline xy_z_jbinning(np.float64_t* counts, np.float64_t* rp_bins,\
-                          np.float64_t* pi_bins, np.float64_t d_perp,\
-                          np.float64_t d_para,\
-                          np.int_t nrp_bins_minus_one,\
-                          np.int_t npi_bins_minus_one,\
-                          np.int_t N_samples,\
-                          np.float64_t w1, np.float64_t w2,\
-                          np.int_t j1, np.int_t j2):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def xy_z_npairs_auto_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                         np.ndarray[np.float64_t, ndim=1] y_icell,
+                         np.ndarray[np.float64_t, ndim=1] z_icell,
+                         np.ndarray[np.float64_t, ndim=1] rp_bins,
+                         np.ndarray[np.float64_t, ndim=1] pi_bins,
+                         np.ndarray[np.float64_t, ndim=1] period):
     """
-    2D+1 jackknife binning function
+    2+1D pair counter with periodic boundary conditions (PBCs) for the points within a 
+    single cell, paired with themselves.
+    Calculate the number of pairs with separations in the x-y plane less than or equal 
+    to rp_bins[i], and separations in the z coordinate less than or equal to pi_bins[i].
+    
+    Only the pairs with i<j are visited.  The result is identical to calling 
+    xy_z_npairs_pbc with the same points as both the first and second cell.
     """
-    cdef int l, k, g
-    cdef int max_l = nrp_bins_minus_one+1
-    cdef int max_k = npi_bins_minus_one+1
     
-    for l in range(0,N_samples): #loop over jackknife samples
-            k = nrp_bins_minus_one
-            while d_perp<=rp_bins[k]: #loop over rp bins
-                g = npi_bins_minus_one
-                while d_para<=pi_bins[g]: #loop over pi bins
-                    #counts[l,k,g] += jweight(l, j1, j2, w1, w2)
-                    counts[l*max_l*max_k+k*max_k+g] += jweight(l, j1, j2, w1, w2)
-                    g=g-1
-                    if g<0: break
-                k=k-1
-                if k<0: break
+    #c definitions
+    cdef int nrp_bins = len(rp_bins)
+    cdef int npi_bins = len(pi_bins)
+    cdef int nrp_bins_minus_one = len(rp_bins) -1
+    cdef int npi_bins_minus_one = len(pi_bins) -1
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((nrp_bins, npi_bins), dtype=np.int)
+    cdef double d_perp, d_para
+    cdef int i, j, k, g
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                    
+            #calculate the square distance
+            d_perp = periodic_perp_square_distance(x_icell[i],y_icell[i],\
+                                                   x_icell[j],y_icell[j],\
+                                                   <np.float64_t*>period.data)
+            d_para = periodic_para_square_distance(z_icell[i],\
+                                                   z_icell[j],\
+                                                   <np.float64_t*>period.data)
+                        
+            #calculate counts in bins
+            xy_z_binning(<np.int_t*>counts.data,\
+                         <np.float64_t*>rp_bins.data,\
+                         <np.float64_t*>pi_bins.data,\
+                         d_perp, d_para, nrp_bins_minus_one, npi_bins_minus_one)
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,nrp_bins):
+        for g in range(0,npi_bins):
+            counts[k,g] = 2*counts[k,g]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        xy_z_binning(<np.int_t*>counts.data,\
+                     <np.float64_t*>rp_bins.data,\
+                     <np.float64_t*>pi_bins.data,\
+                     0.0, 0.0, nrp_bins_minus_one, npi_bins_minus_one)
+        
+    return counts
 
 
-cdef inline double jweight(np.int_t j, np.int_t j1, np.int_t j2,\
-                           np.float64_t w1, np.float64_t w2):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def xy_z_wnpairs_auto_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                             np.ndarray[np.float64_t, ndim=1] y_icell,
+                             np.ndarray[np.float64_t, ndim=1] z_icell,
+                             np.ndarray[np.float64_t, ndim=1] w_icell,
+                             np.ndarray[np.float64_t, ndim=1] rp_bins,
+                             np.ndarray[np.float64_t, ndim=1] pi_bins):
     """
-    return jackknife weighted counts
+    weighted 2+1D pair counter without periodic boundary conditions (no PBCs) for the 
+    points within a single cell, paired with themselves.
+    Calculate the weighted number of pairs with separations in the x-y plane less than 
+    or equal to rp_bins[i], and separations in the z coordinate less than or equal to 
+    pi_bins[i].
     
-    parameters
-    ----------
-    j: jackknife subsample
-    j1: jackknife sample 1 tag
-    j2: jackknife sample 2 tag
-    w1: weight1
-    w2: weight2
+    Only the pairs with i<j are visited.
+    """
     
-    notes
-    -----
-    if sample j==0, do no jackknife weighting.  i.e. reserve this for the full sample.
-    if both points are inside the sample, return w1*w2
-    if both points are outside the sample, return 0.0
-    if one point is within and one point is outside the sample, return 0.5*w1*w2
-    """
-    
-    if j==0: return (w1 * w2)
-    # both outside the sub-sample
-    elif (j1 == j2) & (j1 == j): return 0.0
-    # both inside the sub-sample
-    elif (j1 != j) & (j2 != j): return (w1 * w2)
-    # only one inside the sub-sample
-    elif (j1 != j2) & ((j1 == j) | (j2 == j)): return 0.5*(w1 * w2)
+    #c definitions
+    cdef int nrp_bins = len(rp_bins)
+    cdef int npi_bins = len(pi_bins)
+    cdef int nrp_bins_minus_one = len(rp_bins) -1
+    cdef int npi_bins_minus_one = len(pi_bins) -1
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((nrp_bins, npi_bins), dtype=np.float64)
+    cdef double d_perp, d_para
+    cdef int i, j, k, g
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                    
+            #calculate the square distance
+            d_perp = perp_square_distance(x_icell[i], y_icell[i],\
+                                          x_icell[j], y_icell[j])
+            d_para = para_square_distance(z_icell[i], z_icell[j])
+                        
+            #calculate counts in bins
+            xy_z_wbinning(<np.float64_t*>counts.data,\
+                          <np.float64_t*>rp_bins.data,\
+                          <np.float64_t*>pi_bins.data,\
+                          d_perp, d_para, nrp_bins_minus_one, npi_bins_minus_one,\
+                          w_icell[i], w_icell[j])
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,nrp_bins):
+        for g in range(0,npi_bins):
+            counts[k,g] = 2.0*counts[k,g]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        xy_z_wbinning(<np.float64_t*>counts.data,\
+                      <np.float64_t*>rp_bins.data,\
+                      <np.float64_t*>pi_bins.data,\
+                      0.0, 0.0, nrp_bins_minus_one, npi_bins_minus_one,\
+                      w_icell[i], w_icell[i])
+        
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def xy_z_wnpairs_auto_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                          np.ndarray[np.float64_t, ndim=1] y_icell,
+                          np.ndarray[np.float64_t, ndim=1] z_icell,
+                          np.ndarray[np.float64_t, ndim=1] w_icell,
+                          np.ndarray[np.float64_t, ndim=1] rp_bins,
+                          np.ndarray[np.float64_t, ndim=1] pi_bins,
+                          np.ndarray[np.float64_t, ndim=1] period):
+    """
+    weighted 2+1D pair counter with periodic boundary conditions (PBCs) for the points 
+    within a single cell, paired with themselves.
+    Calculate the weighted number of pairs with separations in the x-y plane less than 
+    or equal to rp_bins[i], and separations in the z coordinate less than or equal to 
+    pi_bins[i].
+    
+    Only the pairs with i<j are visited.
+    """
+    
+    #c definitions
+    cdef int nrp_bins = len(rp_bins)
+    cdef int npi_bins = len(pi_bins)
+    cdef int nrp_bins_minus_one = len(rp_bins) -1
+    cdef int npi_bins_minus_one = len(pi_bins) -1
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((nrp_bins, npi_bins), dtype=np.float64)
+    cdef double d_perp, d_para
+    cdef int i, j, k, g
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                    
+            #calculate the square distance
+            d_perp = periodic_perp_square_distance(x_icell[i],y_icell[i],\
+                                                   x_icell[j],y_icell[j],\
+                                                   <np.float64_t*>period.data)
+            d_para = periodic_para_square_distance(z_icell[i],\
+                                                   z_icell[j],\
+                                                   <np.float64_t*>period.data)
+                        
+            #calculate counts in bins
+            xy_z_wbinning(<np.float64_t*>counts.data,\
+                          <np.float64_t*>rp_bins.data,\
+                          <np.float64_t*>pi_bins.data,\
+                          d_perp, d_para, nrp_bins_minus_one, npi_bins_minus_one,\
+                          w_icell[i], w_icell[j])
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,nrp_bins):
+        for g in range(0,npi_bins):
+            counts[k,g] = 2.0*counts[k,g]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        xy_z_wbinning(<np.float64_t*>counts.data,\
+                      <np.float64_t*>rp_bins.data,\
+                      <np.float64_t*>pi_bins.data,\
+                      0.0, 0.0, nrp_bins_minus_one, npi_bins_minus_one,\
+                      w_icell[i], w_icell[i])
+        
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def s_mu_npairs_auto_no_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                            np.ndarray[np.float64_t, ndim=1] y_icell,
+                            np.ndarray[np.float64_t, ndim=1] z_icell,
+                            np.ndarray[np.float64_t, ndim=1] s_bins,
+                            np.ndarray[np.float64_t, ndim=1] mu_bins):
+    """
+    2+1D pair counter without periodic boundary conditions (no PBCs) for the points 
+    within a single cell, paired with themselves.
+    Calculate the number of pairs with separations s, and angle from the line of sight mu.
+    
+    Only the pairs with i<j are visited.  The result is identical to calling 
+    s_mu_npairs_no_pbc with the same points as both the first and second cell.
+    """
+    
+    #c definitions
+    cdef int ns_bins = len(s_bins)
+    cdef int nmu_bins = len(mu_bins)
+    cdef int ns_bins_minus_one = len(s_bins) -1
+    cdef int nmu_bins_minus_one = len(mu_bins) -1
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((ns_bins, nmu_bins), dtype=np.int)
+    cdef double d_perp, d_para, s, mu
+    cdef int i, j, k, g
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                    
+            #calculate the square distance
+            d_perp = perp_square_distance(x_icell[i], y_icell[i],\
+                                          x_icell[j], y_icell[j])
+            d_para = para_square_distance(z_icell[i], z_icell[j])
+                        
+            #transform to s and mu
+            s = sqrt(d_perp + d_para)
+            if s!=0: mu = sqrt(d_para)/s
+            else: mu=0.0
+            
+            #calculate counts in bins
+            xy_z_binning(<np.int_t*>counts.data,\
+                         <np.float64_t*>s_bins.data,\
+                         <np.float64_t*>mu_bins.data,\
+                         s, mu, ns_bins_minus_one, nmu_bins_minus_one)
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,ns_bins):
+        for g in range(0,nmu_bins):
+            counts[k,g] = 2*counts[k,g]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        xy_z_binning(<np.int_t*>counts.data,\
+                     <np.float64_t*>s_bins.data,\
+                     <np.float64_t*>mu_bins.data,\
+                     0.0, 0.0, ns_bins_minus_one, nmu_bins_minus_one)
+        
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def s_mu_npairs_auto_pbc(np.ndarray[np.float64_t, ndim=1] x_icell,
+                         np.ndarray[np.float64_t, ndim=1] y_icell,
+                         np.ndarray[np.float64_t, ndim=1] z_icell,
+                         np.ndarray[np.float64_t, ndim=1] s_bins,
+                         np.ndarray[np.float64_t, ndim=1] mu_bins,
+                         np.ndarray[np.float64_t, ndim=1] period):
+    """
+    2+1D pair counter with periodic boundary conditions (PBCs) for the points within a 
+    single cell, paired with themselves.
+    Calculate the number of pairs with separations s, and angle from the line of sight mu.
+    
+    Only the pairs with i<j are visited.  The result is identical to calling 
+    s_mu_npairs_pbc with the same points as both the first and second cell.
+    """
+    
+    #c definitions
+    cdef int ns_bins = len(s_bins)
+    cdef int nmu_bins = len(mu_bins)
+    cdef int ns_bins_minus_one = len(s_bins) -1
+    cdef int nmu_bins_minus_one = len(mu_bins) -1
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((ns_bins, nmu_bins), dtype=np.int)
+    cdef double d_perp, d_para, s, mu
+    cdef int i, j, k, g
+    cdef int Ni = len(x_icell)
+    
+    #loop over unique pairs of points in the cell
+    for i in range(0,Ni):
+        for j in range(i+1,Ni):
+                    
+            #calculate the square distance
+            d_perp = periodic_perp_square_distance(x_icell[i],y_icell[i],\
+                                                   x_icell[j],y_icell[j],\
+                                                   <np.float64_t*>period.data)
+            d_para = periodic_para_square_distance(z_icell[i],\
+                                                   z_icell[j],\
+                                                   <np.float64_t*>period.data)
+            
+            #transform to s and mu
+            s = sqrt(d_perp + d_para)
+            if s!=0: mu = sqrt(d_para)/s
+            else: mu=0.0
+            
+            #calculate counts in bins
+            xy_z_binning(<np.int_t*>counts.data,\
+                         <np.float64_t*>s_bins.data,\
+                         <np.float64_t*>mu_bins.data,\
+                         s, mu, ns_bins_minus_one, nmu_bins_minus_one)
+    
+    #each unique pair is counted as both (i,j) and (j,i)
+    for k in range(0,ns_bins):
+        for g in range(0,nmu_bins):
+            counts[k,g] = 2*counts[k,g]
+    
+    #each point is also paired with itself
+    for i in range(0,Ni):
+        xy_z_binning(<np.int_t*>counts.data,\
+                     <np.float64_t*>s_bins.data,\
+                     <np.float64_t*>mu_bins.data,\
+                     0.0, 0.0, ns_bins_minus_one, nmu_bins_minus_one)
+        
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def multi_npairs_cell_pair(np.ndarray[np.float64_t, ndim=1] x_icell1,
+                           np.ndarray[np.float64_t, ndim=1] y_icell1,
+                           np.ndarray[np.float64_t, ndim=1] z_icell1,
+                           np.ndarray[np.float64_t, ndim=1] x_icell2,
+                           np.ndarray[np.float64_t, ndim=1] y_icell2,
+                           np.ndarray[np.float64_t, ndim=1] z_icell2,
+                           np.ndarray[np.float64_t, ndim=1] edges,
+                           np.ndarray[np.int64_t, ndim=2] specs,
+                           int ncounts,
+                           np.ndarray[np.float64_t, ndim=1] period,
+                           bint same_cell):
+    """
+    pair counter filling several histograms at once, e.g. in r, (rp,pi), and (s,mu).
+    The binnings are described by edges and specs, see `binning.multi_binning`, and the
+    histograms are returned as a single flattened array of length ncounts.  period is 
+    infinite without PBCs.  If same_cell is True, the two cells are the same, and each 
+    pair of points is only visited once.
+    """
+    
+    #c definitions
+    cdef np.ndarray[np.int_t, ndim=1] counts = np.zeros((ncounts,), dtype=np.int)
+    cdef int nspecs = len(specs)
+    cdef double d_perp, d_para
+    cdef int i, j
+    cdef int Ni = len(x_icell1)
+    cdef int Nj = len(x_icell2)
+    
+    #loop over points in grid1's cell
+    for i in range(0,Ni):
+        #loop over points in grid2's cell
+        for j in range(i if same_cell else 0,Nj):
+            
+            #calculate the square distances
+            d_perp = periodic_perp_square_distance(x_icell1[i], y_icell1[i],\
+                                                   x_icell2[j], y_icell2[j],\
+                                                   <np.float64_t*> period.data)
+            d_para = periodic_para_square_distance(z_icell1[i], z_icell2[j],\
+                                                   <np.float64_t*> period.data)
+            
+            #calculate counts in bins, each point is also paired with itself
+            multi_binning(<np.int_t*> counts.data, <np.float64_t*> edges.data,\
+                          <np.int64_t*> specs.data, nspecs, d_perp, d_para,\
+                          1 if ((not same_cell) or (i==j)) else 2)
+    
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def wnpairs_columns_cell_pair(np.ndarray[np.float64_t, ndim=1] x_icell1,
+                              np.ndarray[np.float64_t, ndim=1] y_icell1,
+                              np.ndarray[np.float64_t, ndim=1] z_icell1,
+                              np.ndarray[np.float64_t, ndim=1] x_icell2,
+                              np.ndarray[np.float64_t, ndim=1] y_icell2,
+                              np.ndarray[np.float64_t, ndim=1] z_icell2,
+                              np.ndarray[np.float64_t, ndim=2] w_icell1,
+                              np.ndarray[np.float64_t, ndim=2] w_icell2,
+                              np.ndarray[np.float64_t, ndim=1] rbins,
+                              np.ndarray[np.float64_t, ndim=1] period,
+                              bint same_cell):
+    """
+    weighted real-space pair counter for several columns of weights at once.
+    The weights are N by n_weights arrays, and the weighted number of pairs in each bin 
+    is returned for each column, as an n_weights by len(rbins) array, where pairs are 
+    weighted by w1[l]*w2[l].  period is infinite without PBCs.  If same_cell is True, 
+    the two cells are the same, and each pair of points is only visited once.
+    """
+    
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int nbins_minus_one = len(rbins) -1
+    cdef int nweights = w_icell1.shape[1]
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((nweights, nbins), dtype=np.float64)
+    cdef double d, n
+    cdef int i, j, k, l
+    cdef int Ni = len(x_icell1)
+    cdef int Nj = len(x_icell2)
+    
+    #loop over points in grid1's cell
+    for i in range(0,Ni):
+        #loop over points in grid2's cell
+        for j in range(i if same_cell else 0,Nj):
+            
+            #calculate the square distance, and the bin, once for all the weights
+            d = periodic_square_distance(x_icell1[i],y_icell1[i],z_icell1[i],\
+                                         x_icell2[j],y_icell2[j],z_icell2[j],\
+                                         <np.float64_t*>period.data)
+            k = bin_index(<np.float64_t*>rbins.data, d, nbins_minus_one)
+            if k<0: continue
+            
+            #each point is also paired with itself
+            n = 1.0 if ((not same_cell) or (i==j)) else 2.0
+            for l in range(0,nweights):
+                counts[l,k] += n*w_icell1[i,l]*w_icell2[j,l]
+    
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def npairs_per_point_cell_pair(np.ndarray[np.float64_t, ndim=1] x_icell1,
+                               np.ndarray[np.float64_t, ndim=1] y_icell1,
+                               np.ndarray[np.float64_t, ndim=1] z_icell1,
+                               np.ndarray[np.float64_t, ndim=1] x_icell2,
+                               np.ndarray[np.float64_t, ndim=1] y_icell2,
+                               np.ndarray[np.float64_t, ndim=1] z_icell2,
+                               np.ndarray[np.float64_t, ndim=1] w_icell2,
+                               np.ndarray[np.float64_t, ndim=1] rp_bins,
+                               np.ndarray[np.float64_t, ndim=1] pi_bins,
+                               np.ndarray[np.float64_t, ndim=1] period,
+                               bint xy_z):
+    """
+    per-point weighted pair counter.  For each point in cell 1, the summed weights of 
+    the points in cell 2 in each bin are returned, as a len(x_icell1) by 
+    len(rp_bins)*len(pi_bins) array.  If xy_z is True, the pairs are binned in the 
+    square separations perpendicular and parallel to the line of sight, see 
+    `binning.point_bin_index`, otherwise the square separation is binned in rp_bins, 
+    and pi_bins should be of length 1.  period is infinite without PBCs.
+    """
+    
+    #c definitions
+    cdef int nrp_bins = len(rp_bins)
+    cdef int npi_bins = len(pi_bins)
+    cdef int Ni = len(x_icell1)
+    cdef int Nj = len(x_icell2)
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((Ni, nrp_bins*npi_bins), dtype=np.float64)
+    cdef double d_perp, d_para
+    cdef int i, j, k
+    
+    #loop over points in grid1's cell
+    for i in range(0,Ni):
+        #loop over points in grid2's cell
+        for j in range(0,Nj):
+            
+            #calculate the square distances
+            d_perp = periodic_perp_square_distance(x_icell1[i], y_icell1[i],\
+                                                   x_icell2[j], y_icell2[j],\
+                                                   <np.float64_t*> period.data)
+            d_para = periodic_para_square_distance(z_icell1[i], z_icell2[j],\
+                                                   <np.float64_t*> period.data)
+            
+            #add the weight of point j to the bin of point i
+            k = point_bin_index(<np.float64_t*> rp_bins.data, nrp_bins,\
+                                <np.float64_t*> pi_bins.data, npi_bins,\
+                                d_perp, d_para, xy_z)
+            if k>=0: counts[i,k] += w_icell2[j]
+    
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def wp_npairs_cell_pair(np.ndarray[np.float64_t, ndim=1] x_icell1,
+                        np.ndarray[np.float64_t, ndim=1] y_icell1,
+                        np.ndarray[np.float64_t, ndim=1] z_icell1,
+                        np.ndarray[np.float64_t, ndim=1] x_icell2,
+                        np.ndarray[np.float64_t, ndim=1] y_icell2,
+                        np.ndarray[np.float64_t, ndim=1] z_icell2,
+                        np.ndarray[np.float64_t, ndim=1] rp_bins,
+                        np.float64_t pi_max,
+                        np.ndarray[np.float64_t, ndim=1] period,
+                        bint same_cell):
+    """
+    projected pair counter.  Calculate the number of pairs with square separations in 
+    the x-y plane rp_bins[i-1] < d_perp <= rp_bins[i], and square separations in the z 
+    coordinate d_para <= pi_max.  Pairs are rejected on their separation along z before 
+    the separation in the x-y plane is calculated.  period is infinite without PBCs.  If 
+    same_cell is True, the two cells are the same, and each pair of points is only 
+    visited once.
+    """
+    
+    #c definitions
+    cdef int nbins = len(rp_bins)
+    cdef int nbins_minus_one = len(rp_bins) -1
+    cdef np.ndarray[np.int_t, ndim=1] counts = np.zeros((nbins,), dtype=np.int)
+    cdef double d_perp, d_para
+    cdef int i, j, k
+    cdef int Ni = len(x_icell1)
+    cdef int Nj = len(x_icell2)
+    
+    #loop over points in grid1's cell
+    for i in range(0,Ni):
+        #loop over points in grid2's cell
+        for j in range(i if same_cell else 0,Nj):
+            
+            #reject the pair on the separation along the line of sight
+            d_para = periodic_para_square_distance(z_icell1[i], z_icell2[j],\
+                                                   <np.float64_t*> period.data)
+            if d_para>pi_max: continue
+            
+            d_perp = periodic_perp_square_distance(x_icell1[i], y_icell1[i],\
+                                                   x_icell2[j], y_icell2[j],\
+                                                   <np.float64_t*> period.data)
+            k = bin_index(<np.float64_t*> rp_bins.data, d_perp, nbins_minus_one)
+            if k<0: continue
+            
+            #each point is also paired with itself
+            counts[k] += 1 if ((not same_cell) or (i==j)) else 2
+    
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def labeled_npairs_cell_pair(np.ndarray[np.float64_t, ndim=1] x_icell1,
+                             np.ndarray[np.float64_t, ndim=1] y_icell1,
+                             np.ndarray[np.float64_t, ndim=1] z_icell1,
+                             np.ndarray[np.float64_t, ndim=1] x_icell2,
+                             np.ndarray[np.float64_t, ndim=1] y_icell2,
+                             np.ndarray[np.float64_t, ndim=1] z_icell2,
+                             np.ndarray[np.int64_t, ndim=1] l_icell1,
+                             np.ndarray[np.int64_t, ndim=1] l_icell2,
+                             int nlabels1, int nlabels2,
+                             np.ndarray[np.float64_t, ndim=1] rbins,
+                             np.ndarray[np.float64_t, ndim=1] period,
+                             bint same_cell):
+    """
+    labeled real-space pair counter.  The points are labeled by integers in the range 
+    [0,nlabels1) and [0,nlabels2), and the pairs are counted separately for each pair 
+    of labels, returned as an nlabels1 by nlabels2 by len(rbins) array.  period is 
+    infinite without PBCs.  If same_cell is True, the two cells are the same, and each 
+    pair of points is only visited once, but counted as both (i,j) and (j,i).
+    """
+    
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int nbins_minus_one = len(rbins) -1
+    cdef np.ndarray[np.int_t, ndim=3] counts =\
+        np.zeros((nlabels1, nlabels2, nbins), dtype=np.int)
+    cdef double d
+    cdef int i, j, k
+    cdef int Ni = len(x_icell1)
+    cdef int Nj = len(x_icell2)
+    
+    #loop over points in grid1's cell
+    for i in range(0,Ni):
+        #loop over points in grid2's cell
+        for j in range(i if same_cell else 0,Nj):
+            
+            #calculate the square distance
+            d = periodic_square_distance(x_icell1[i],y_icell1[i],z_icell1[i],\
+                                         x_icell2[j],y_icell2[j],z_icell2[j],\
+                                         <np.float64_t*>period.data)
+            k = bin_index(<np.float64_t*>rbins.data, d, nbins_minus_one)
+            if k<0: continue
+            
+            #count the pair with the labels of both points, each point is also paired 
+            #with itself
+            counts[l_icell1[i],l_icell2[j],k] += 1
+            if same_cell and (i!=j): counts[l_icell2[j],l_icell1[i],k] += 1
+    
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def multipole_npairs_cell_pair(np.ndarray[np.float64_t, ndim=1] x_icell1,
+                               np.ndarray[np.float64_t, ndim=1] y_icell1,
+                               np.ndarray[np.float64_t, ndim=1] z_icell1,
+                               np.ndarray[np.float64_t, ndim=1] x_icell2,
+                               np.ndarray[np.float64_t, ndim=1] y_icell2,
+                               np.ndarray[np.float64_t, ndim=1] z_icell2,
+                               np.ndarray[np.float64_t, ndim=1] s_bins,
+                               np.ndarray[np.int64_t, ndim=1] ells,
+                               np.ndarray[np.float64_t, ndim=1] period,
+                               bint same_cell):
+    """
+    Legendre multipole pair counter.  Calculate the sum over the pairs with square 
+    separations s_bins[i-1] < s <= s_bins[i] of the Legendre polynomial P_ell(mu), where 
+    mu is the cosine of the angle from the line of sight, for each ell in ells, returned 
+    as a len(ells) by len(s_bins) array.  period is infinite without PBCs.  If same_cell 
+    is True, the two cells are the same, and each pair of points is only visited once.
+    """
+    
+    #c definitions
+    cdef int nbins = len(s_bins)
+    cdef int nells = len(ells)
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((nells, nbins), dtype=np.float64)
+    cdef double d_perp, d_para
+    cdef int i, j
+    cdef int Ni = len(x_icell1)
+    cdef int Nj = len(x_icell2)
+    
+    #loop over points in grid1's cell
+    for i in range(0,Ni):
+        #loop over points in grid2's cell
+        for j in range(i if same_cell else 0,Nj):
+            
+            #calculate the square distances
+            d_perp = periodic_perp_square_distance(x_icell1[i], y_icell1[i],\
+                                                   x_icell2[j], y_icell2[j],\
+                                                   <np.float64_t*> period.data)
+            d_para = periodic_para_square_distance(z_icell1[i], z_icell2[j],\
+                                                   <np.float64_t*> period.data)
+            
+            #add the Legendre polynomials of the pair, each point is also paired with 
+            #itself
+            multipole_binning(<np.float64_t*> counts.data, <np.float64_t*> s_bins.data,\
+                              nbins-1, <np.int64_t*> ells.data, nells, d_perp, d_para,\
+                              1.0 if ((not same_cell) or (i==j)) else 2.0)
+    
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def cell_pair_bins(np.ndarray[np.float64_t, ndim=2] cell_lower1,
+                   np.ndarray[np.float64_t, ndim=2] cell_upper1,
+                   np.int64_t icell1,
+                   np.ndarray[np.float64_t, ndim=2] cell_lower2,
+                   np.ndarray[np.float64_t, ndim=2] cell_upper2,
+                   np.ndarray[np.int64_t, ndim=1] adj_cells,
+                   np.ndarray[np.float64_t, ndim=1] rbins,
+                   np.ndarray[np.float64_t, ndim=1] period):
+    """
+    Find the radial bin into which all pairs between cell icell1 of grid1 and each of
+    the cells adj_cells of grid2 fall, using the bounding boxes of the cells.  rbins are
+    the squared bin edges, and period is infinite without PBCs.
+
+    Returns an array with one element for each cell in adj_cells, which is -1 if all
+    pairs are more widely separated than the largest bin (or either cell is empty), the
+    index of the bin if all pairs fall into the same bin, and -2 otherwise, in which case
+    the pairs must be counted point by point.
+    """
+
+    cdef int nbins_minus_one = len(rbins) -1
+    cdef int Nadj = len(adj_cells)
+    cdef np.ndarray[np.int_t, ndim=1] result = np.empty((Nadj,), dtype=np.int)
+    cdef int i
+    cdef np.int64_t icell2
+
+    for i in range(0,Nadj):
+        icell2 = adj_cells[i]
+        result[i] = bounds.box_pair_bin(&cell_lower1[icell1,0], &cell_upper1[icell1,0],\
+                                        &cell_lower2[icell2,0], &cell_upper2[icell2,0],\
+                                        <np.float64_t*> rbins.data, nbins_minus_one,\
+                                        <np.float64_t*> period.data)
+
+    return result
+
+
+cdef inline radial_binning(np.int_t* counts, np.float64_t* bins,\
+                           np.float64_t d, np.int_t k):
+    """
+    real space radial binning function
+    
+    Only the single bin, counts[i], with bins[i-1] < d <= bins[i] is incremented.  The 
+    cumulative counts are calculated once all pairs have been binned. 
+    """
+    
+    k = bin_index(bins, d, k)
+    if k>=0: counts[k] += 1
+
+
+cdef inline radial_wbinning(np.float64_t* counts, np.float64_t* bins,\
+                            np.float64_t d, np.int_t k,\
+                            np.float64_t w1, np.float64_t w2):
+    """
+    real space radial weighted binning function
+    
+    Only the single bin, counts[i], with bins[i-1] < d <= bins[i] is incremented.  The 
+    cumulative counts are calculated once all pairs have been binned. 
+    """
+    
+    k = bin_index(bins, d, k)
+    if k>=0: counts[k] += w1*w2
+
+
+cdef inline radial_jbinning(np.float64_t* counts, np.float64_t* bins,\
+                            np.float64_t d,\
+                            np.int_t nbins_minus_one,\
+                            np.float64_t w1, np.float64_t w2,\
+                            np.int_t j1, np.int_t j2):
+    """
+    real space radial jackknife binning function
+    
+    Only the single bin, counts[l,i], with bins[i-1] < d <= bins[i] is incremented for 
+    the subvolumes of each of the two points, l=j1 and l=j2.  The cumulative counts are 
+    calculated once all pairs have been binned. 
+    
+    notes
+    -----
+    A pair is weighted by w1*w2 in jackknife sample l if neither point is in subvolume 
+    l, by 0.5*w1*w2 if one point is in subvolume l, and by 0 if both points are.  The 
+    jackknife counts are then the total count less half of counts[l], so the cost per 
+    pair does not depend on the number of subvolumes.  Tag 0 is reserved for the full 
+    sample, for which counts[0] is not incremented.
+    """
+    cdef int k
+    cdef int max_l = nbins_minus_one+1
+    
+    k = bin_index(bins, d, nbins_minus_one)
+    if k<0: return
+    
+    #counts[j1,k] += w1*w2, counts[j2,k] += w1*w2
+    counts[j1*max_l+k] += w1*w2
+    counts[j2*max_l+k] += w1*w2
+
+
+cdef inline xy_z_binning(np.int_t* counts, np.float64_t* rp_bins,\
+                         np.float64_t* pi_bins, np.float64_t d_perp,\
+                         np.float64_t d_para, np.int_t k,\
+                         np.int_t npi_bins_minus_one):
+    """
+    2D+1 binning function
+    
+    Only the single bin, counts[i,j], with rp_bins[i-1] < d_perp <= rp_bins[i] and 
+    pi_bins[j-1] < d_para <= pi_bins[j] is incremented.  The cumulative counts are 
+    calculated once all pairs have been binned. 
+    """
+    cdef int g
+    cdef int max_k = npi_bins_minus_one+1
+    
+    k = bin_index(rp_bins, d_perp, k)
+    if k<0: return
+    g = bin_index(pi_bins, d_para, npi_bins_minus_one)
+    if g<0: return
+    
+    #counts[k,g] += 1
+    counts[k*max_k+g] += 1
+
+
+cdef inline xy_z_wbinning(np.float64_t* counts, np.float64_t* rp_bins,\
+                          np.float64_t* pi_bins, np.float64_t d_perp,\
+                          np.float64_t d_para, np.int_t k,\
+                          np.int_t npi_bins_minus_one, np.float64_t w1, np.float64_t w2):
+    """
+    2D+1 weighted binning function
+    
+    Only the single bin, counts[i,j], with rp_bins[i-1] < d_perp <= rp_bins[i] and 
+    pi_bins[j-1] < d_para <= pi_bins[j] is incremented.  The cumulative counts are 
+    calculated once all pairs have been binned. 
+    """
+    cdef int g
+    cdef int max_k = npi_bins_minus_one+1
+    
+    k = bin_index(rp_bins, d_perp, k)
+    if k<0: return
+    g = bin_index(pi_bins, d_para, npi_bins_minus_one)
+    if g<0: return
+    
+    #counts[k,g] += w1*w2
+    counts[k*max_k+g] += w1*w2
+
+
+cdef inline xy_z_jbinning(np.float64_t* counts, np.float64_t* rp_bins,\
+                          np.float64_t* pi_bins, np.float64_t d_perp,\
+                          np.float64_t d_para,\
+                          np.int_t nrp_bins_minus_one,\
+                          np.int_t npi_bins_minus_one,\
+                          np.float64_t w1, np.float64_t w2,\
+                          np.int_t j1, np.int_t j2):
+    """
+    2D+1 jackknife binning function
+    
+    Only the single bin, counts[l,i,j], with rp_bins[i-1] < d_perp <= rp_bins[i] and 
+    pi_bins[j-1] < d_para <= pi_bins[j] is incremented for the subvolumes of each of the 
+    two points, l=j1 and l=j2, see `radial_jbinning`.  The cumulative counts are 
+    calculated once all pairs have been binned. 
+    """
+    cdef int k, g
+    cdef int max_l = nrp_bins_minus_one+1
+    cdef int max_k = npi_bins_minus_one+1
+    
+    k = bin_index(rp_bins, d_perp, nrp_bins_minus_one)
+    if k<0: return
+    g = bin_index(pi_bins, d_para, npi_bins_minus_one)
+    if g<0: return
+    
+    #counts[j1,k,g] += w1*w2, counts[j2,k,g] += w1*w2
+    counts[j1*max_l*max_k+k*max_k+g] += w1*w2
+    counts[j2*max_l*max_k+k*max_k+g] += w1*w2
 
 
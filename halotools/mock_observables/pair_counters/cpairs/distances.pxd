@@ -7,20 +7,20 @@ cdef double periodic_square_distance(np.float64_t x1,\
                                      np.float64_t x2,\
                                      np.float64_t y2,\
                                      np.float64_t z2,\
-                                     np.float64_t* period)
+                                     np.float64_t* period) nogil
                                      
 cdef double square_distance(np.float64_t x1, np.float64_t y1, np.float64_t z1,\
-                            np.float64_t x2, np.float64_t y2, np.float64_t z2)
+                            np.float64_t x2, np.float64_t y2, np.float64_t z2) nogil
 
 cdef double perp_square_distance(np.float64_t x1, np.float64_t y1,\
-                                 np.float64_t x2, np.float64_t y2)
+                                 np.float64_t x2, np.float64_t y2) nogil
 
-cdef double para_square_distance(np.float64_t z1, np.float64_t z2)
+cdef double para_square_distance(np.float64_t z1, np.float64_t z2) nogil
 
 cdef double periodic_perp_square_distance(np.float64_t x1, np.float64_t y1,\
                                           np.float64_t x2, np.float64_t y2,\
-                                          np.float64_t* period)
+                                          np.float64_t* period) nogil
 
 cdef double periodic_para_square_distance(np.float64_t z1, np.float64_t z2,\
-                                          np.float64_t* period)
+                                          np.float64_t* period) nogil
 
@@ -21,7 +21,7 @@ cdef double periodic_square_distance(np.float64_t x1,\
                                      np.float64_t x2,\
                                      np.float64_t y2,\
                                      np.float64_t z2,\
-                                     np.float64_t* period):
+                                     np.float64_t* period) nogil:
     """
     Calculate the 3D square cartesian distance between two sets of points with periodic
     boundary conditions.
@@ -41,7 +41,7 @@ cdef double periodic_square_distance(np.float64_t x1,\
 @cython.wraparound(False)
 @cython.nonecheck(False)
 cdef double square_distance(np.float64_t x1, np.float64_t y1, np.float64_t z1,\
-                            np.float64_t x2, np.float64_t y2, np.float64_t z2):
+                            np.float64_t x2, np.float64_t y2, np.float64_t z2) nogil:
     """
     Calculate the 3D square cartesian distance between two sets of points.
     """
@@ -57,7 +57,7 @@ cdef double square_distance(np.float64_t x1, np.float64_t y1, np.float64_t z1,\
 @cython.wraparound(False)
 @cython.nonecheck(False)
 cdef double perp_square_distance(np.float64_t x1, np.float64_t y1,\
-                                 np.float64_t x2, np.float64_t y2):
+                                 np.float64_t x2, np.float64_t y2) nogil:
     """
     Calculate the projected square cartesian distance between two sets of points.
     e.g. r_p
@@ -72,7 +72,7 @@ cdef double perp_square_distance(np.float64_t x1, np.float64_t y1,\
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.nonecheck(False)
-cdef double para_square_distance(np.float64_t z1, np.float64_t z2):
+cdef double para_square_distance(np.float64_t z1, np.float64_t z2) nogil:
     """
     Calculate the parallel square cartesian distance between two sets of points.
     e.g. pi
@@ -88,7 +88,7 @@ cdef double para_square_distance(np.float64_t z1, np.float64_t z2):
 @cython.nonecheck(False)
 cdef double periodic_perp_square_distance(np.float64_t x1, np.float64_t y1,\
                                           np.float64_t x2, np.float64_t y2,\
-                                          np.float64_t* period):
+                                          np.float64_t* period) nogil:
     """
     Calculate the projected square cartesian distance between two sets of points with 
     periodic boundary conditions.
@@ -107,7 +107,7 @@ cdef double periodic_perp_square_distance(np.float64_t x1, np.float64_t y1,\
 @cython.wraparound(False)
 @cython.nonecheck(False)
 cdef double periodic_para_square_distance(np.float64_t z1, np.float64_t z2,\
-                                          np.float64_t* period):
+                                          np.float64_t* period) nogil:
     """
     Calculate the parallel square cartesian distance between two sets of points with 
     periodic boundary conditions.
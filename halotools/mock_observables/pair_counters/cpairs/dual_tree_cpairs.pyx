@@ -0,0 +1,303 @@
+# cython: profile=False
+
+"""
+optimized cython dual-tree pair counters.  These are called by the "dual_tree_pairs"
+module as the engine to traverse the kd-trees (see `kd_tree`) of two samples.
+
+Starting from a pair of nodes, the functions recursively visit pairs of nodes.  The
+smallest and largest possible separations between the points of two nodes are found
+from their bounding boxes.  If the smallest separation is larger than the largest bin,
+the pair of nodes is skipped.  If both separations fall into the same bin, all of the
+pairs between the two nodes are counted at once, without calculating their separations.
+Only the pairs of leaf nodes which are not handled in this way are counted pair by pair.
+
+As with the functions in "cpairs", the number of pairs in each bin is returned, i.e.
+with bins[i-1] < d <= bins[i], and there are no 'checks' preformed to ensure the
+arguments are of the correct format.  With no PBCs, the period should be set to
+infinity.
+"""
+
+from __future__ import print_function, division
+cimport cython
+import numpy as np
+cimport numpy as np
+from distances cimport *
+from binning cimport bin_index
+cimport bounds
+
+__all__ = ['npairs_dual_tree', 'xy_z_npairs_dual_tree']
+__author__=['Duncan Campbell']
+
+
+#pointers to the arrays of a kd_tree object
+cdef struct tree_t:
+    np.float64_t* x
+    np.float64_t* y
+    np.float64_t* z
+    np.int64_t* start
+    np.int64_t* end
+    np.float64_t* lower
+    np.float64_t* upper
+    np.int64_t* children
+
+
+cdef tree_t get_tree(tree):
+    """
+    return the pointers to the arrays of a kd_tree object.
+    """
+    cdef tree_t t
+    cdef np.ndarray[np.float64_t, ndim=1] x = tree.x
+    cdef np.ndarray[np.float64_t, ndim=1] y = tree.y
+    cdef np.ndarray[np.float64_t, ndim=1] z = tree.z
+    cdef np.ndarray[np.int64_t, ndim=1] start = tree.node_start
+    cdef np.ndarray[np.int64_t, ndim=1] end = tree.node_end
+    cdef np.ndarray[np.float64_t, ndim=2] lower = tree.node_lower
+    cdef np.ndarray[np.float64_t, ndim=2] upper = tree.node_upper
+    cdef np.ndarray[np.int64_t, ndim=2] children = tree.node_children
+
+    t.x = <np.float64_t*> x.data
+    t.y = <np.float64_t*> y.data
+    t.z = <np.float64_t*> z.data
+    t.start = <np.int64_t*> start.data
+    t.end = <np.int64_t*> end.data
+    t.lower = <np.float64_t*> lower.data
+    t.upper = <np.float64_t*> upper.data
+    t.children = <np.int64_t*> children.data
+    return t
+
+
+def npairs_dual_tree(tree1, tree2, int node1, int node2, np.int_t weight,
+                     np.ndarray[np.float64_t, ndim=1] rbins,
+                     np.ndarray[np.float64_t, ndim=1] period,
+                     bint auto):
+    """
+    real-space dual-tree pair counter.
+    Calculate the number of pairs with square separations rbins[i-1] < d <= rbins[i],
+    between the points in node1 of tree1, and node2 of tree2.  Each pair is counted
+    weight times.
+
+    If auto is True, tree1 and tree2 are the same tree, and when node1 and node2 are
+    the same node, each pair of distinct points in the node is only visited once.
+    """
+
+    cdef int nbins = len(rbins)
+    cdef np.ndarray[np.int_t, ndim=1] counts = np.zeros((nbins,), dtype=np.int)
+    cdef tree_t t1 = get_tree(tree1)
+    cdef tree_t t2 = get_tree(tree2)
+
+    npairs_node_pair(&t1, &t2, node1, node2, weight,\
+                     <np.float64_t*> rbins.data, nbins-1,\
+                     <np.float64_t*> period.data, auto,\
+                     <np.int_t*> counts.data)
+
+    return counts
+
+
+def xy_z_npairs_dual_tree(tree1, tree2, int node1, int node2, np.int_t weight,
+                          np.ndarray[np.float64_t, ndim=1] rp_bins,
+                          np.ndarray[np.float64_t, ndim=1] pi_bins,
+                          np.ndarray[np.float64_t, ndim=1] period,
+                          bint auto):
+    """
+    2+1D dual-tree pair counter.
+    Calculate the number of pairs with square separations in the x-y plane
+    rp_bins[i-1] < d_perp <= rp_bins[i], and square separations in the z coordinate
+    pi_bins[j-1] < d_para <= pi_bins[j], between the points in node1 of tree1, and node2
+    of tree2.  Each pair is counted weight times.
+
+    If auto is True, tree1 and tree2 are the same tree, and when node1 and node2 are
+    the same node, each pair of distinct points in the node is only visited once.
+    """
+
+    cdef int nrp_bins = len(rp_bins)
+    cdef int npi_bins = len(pi_bins)
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((nrp_bins, npi_bins), dtype=np.int)
+    cdef tree_t t1 = get_tree(tree1)
+    cdef tree_t t2 = get_tree(tree2)
+
+    xy_z_npairs_node_pair(&t1, &t2, node1, node2, weight,\
+                          <np.float64_t*> rp_bins.data, nrp_bins-1,\
+                          <np.float64_t*> pi_bins.data, npi_bins-1,\
+                          <np.float64_t*> period.data, auto,\
+                          <np.int_t*> counts.data)
+
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void npairs_node_pair(tree_t* t1, tree_t* t2, np.int64_t node1, np.int64_t node2,
+                           np.int_t weight, np.float64_t* rbins, int nbins_minus_one,
+                           np.float64_t* period, bint auto, np.int_t* counts):
+    """
+    count the pairs between node1 of tree t1 and node2 of tree t2.
+    """
+    cdef np.int64_t i, j, a, b
+    cdef double d, d_min, d_max
+    cdef int k, k_max
+    cdef bint same = auto and (node1==node2)
+    cdef bint leaf1 = t1.children[2*node1]<0
+    cdef bint leaf2 = t2.children[2*node2]<0
+
+    #range of square separations between the two nodes
+    d_min = 0.0
+    d_max = 0.0
+    for a in range(3):
+        d_min += square_min_separation(t1, t2, node1, node2, a, period)
+        d_max += square_max_separation(t1, t2, node1, node2, a, period)
+
+    #no pairs are close enough to be counted
+    k = bin_index(rbins, d_min, nbins_minus_one)
+    if k<0: return
+
+    #all pairs fall into the same bin
+    k_max = bin_index(rbins, d_max, nbins_minus_one)
+    if k==k_max:
+        counts[k] += weight*(t1.end[node1]-t1.start[node1])*\
+                            (t2.end[node2]-t2.start[node2])
+        return
+
+    #count the pairs between two leaf nodes one by one
+    if leaf1 and leaf2:
+        for i in range(t1.start[node1], t1.end[node1]):
+            if same: b = i
+            else: b = t2.start[node2]
+            for j in range(b, t2.end[node2]):
+                d = periodic_square_distance(t1.x[i], t1.y[i], t1.z[i],\
+                                             t2.x[j], t2.y[j], t2.z[j], period)
+                k = bin_index(rbins, d, nbins_minus_one)
+                if k<0: continue
+                if same and (i!=j): counts[k] += 2*weight
+                else: counts[k] += weight
+        return
+
+    #split a node with the same node, counting the pairs between the children once
+    if same:
+        for a in range(2):
+            npairs_node_pair(t1, t2, t1.children[2*node1+a], t1.children[2*node1+a],\
+                             weight, rbins, nbins_minus_one, period, auto, counts)
+        npairs_node_pair(t1, t2, t1.children[2*node1], t1.children[2*node1+1],\
+                         2*weight, rbins, nbins_minus_one, period, auto, counts)
+    #otherwise, split the larger node
+    elif leaf2 or ((not leaf1) and\
+         (t1.end[node1]-t1.start[node1] >= t2.end[node2]-t2.start[node2])):
+        for a in range(2):
+            npairs_node_pair(t1, t2, t1.children[2*node1+a], node2,\
+                             weight, rbins, nbins_minus_one, period, auto, counts)
+    else:
+        for a in range(2):
+            npairs_node_pair(t1, t2, node1, t2.children[2*node2+a],\
+                             weight, rbins, nbins_minus_one, period, auto, counts)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void xy_z_npairs_node_pair(tree_t* t1, tree_t* t2, np.int64_t node1,
+                                np.int64_t node2, np.int_t weight,
+                                np.float64_t* rp_bins, int nrp_bins_minus_one,
+                                np.float64_t* pi_bins, int npi_bins_minus_one,
+                                np.float64_t* period, bint auto, np.int_t* counts):
+    """
+    count the pairs between node1 of tree t1 and node2 of tree t2, binned in the
+    separations perpendicular and parallel to the line of sight.
+    """
+    cdef np.int64_t i, j, a, b
+    cdef double d_perp, d_para, d_perp_max
+    cdef int k, g, k_max, g_max
+    cdef int max_k = npi_bins_minus_one+1
+    cdef bint same = auto and (node1==node2)
+    cdef bint leaf1 = t1.children[2*node1]<0
+    cdef bint leaf2 = t2.children[2*node2]<0
+
+    #range of square separations between the two nodes
+    d_perp = square_min_separation(t1, t2, node1, node2, 0, period) +\
+             square_min_separation(t1, t2, node1, node2, 1, period)
+    d_para = square_min_separation(t1, t2, node1, node2, 2, period)
+
+    #no pairs are close enough to be counted
+    k = bin_index(rp_bins, d_perp, nrp_bins_minus_one)
+    if k<0: return
+    g = bin_index(pi_bins, d_para, npi_bins_minus_one)
+    if g<0: return
+
+    #all pairs fall into the same bin
+    d_perp_max = square_max_separation(t1, t2, node1, node2, 0, period) +\
+                 square_max_separation(t1, t2, node1, node2, 1, period)
+    k_max = bin_index(rp_bins, d_perp_max, nrp_bins_minus_one)
+    if k==k_max:
+        g_max = bin_index(pi_bins, square_max_separation(t1, t2, node1, node2, 2, period),\
+                          npi_bins_minus_one)
+        if g==g_max:
+            counts[k*max_k+g] += weight*(t1.end[node1]-t1.start[node1])*\
+                                        (t2.end[node2]-t2.start[node2])
+            return
+
+    #count the pairs between two leaf nodes one by one
+    if leaf1 and leaf2:
+        for i in range(t1.start[node1], t1.end[node1]):
+            if same: b = i
+            else: b = t2.start[node2]
+            for j in range(b, t2.end[node2]):
+                d_perp = periodic_perp_square_distance(t1.x[i], t1.y[i],\
+                                                       t2.x[j], t2.y[j], period)
+                d_para = periodic_para_square_distance(t1.z[i], t2.z[j], period)
+                k = bin_index(rp_bins, d_perp, nrp_bins_minus_one)
+                if k<0: continue
+                g = bin_index(pi_bins, d_para, npi_bins_minus_one)
+                if g<0: continue
+                if same and (i!=j): counts[k*max_k+g] += 2*weight
+                else: counts[k*max_k+g] += weight
+        return
+
+    #split a node with the same node, counting the pairs between the children once
+    if same:
+        for a in range(2):
+            xy_z_npairs_node_pair(t1, t2, t1.children[2*node1+a], t1.children[2*node1+a],\
+                                  weight, rp_bins, nrp_bins_minus_one,\
+                                  pi_bins, npi_bins_minus_one, period, auto, counts)
+        xy_z_npairs_node_pair(t1, t2, t1.children[2*node1], t1.children[2*node1+1],\
+                              2*weight, rp_bins, nrp_bins_minus_one,\
+                              pi_bins, npi_bins_minus_one, period, auto, counts)
+    #otherwise, split the larger node
+    elif leaf2 or ((not leaf1) and\
+         (t1.end[node1]-t1.start[node1] >= t2.end[node2]-t2.start[node2])):
+        for a in range(2):
+            xy_z_npairs_node_pair(t1, t2, t1.children[2*node1+a], node2,\
+                                  weight, rp_bins, nrp_bins_minus_one,\
+                                  pi_bins, npi_bins_minus_one, period, auto, counts)
+    else:
+        for a in range(2):
+            xy_z_npairs_node_pair(t1, t2, node1, t2.children[2*node2+a],\
+                                  weight, rp_bins, nrp_bins_minus_one,\
+                                  pi_bins, npi_bins_minus_one, period, auto, counts)
+
+
+cdef inline double square_min_separation(tree_t* t1, tree_t* t2,
+                                         np.int64_t node1, np.int64_t node2, int a,
+                                         np.float64_t* period):
+    """
+    return the smallest possible square separation along dimension a between a point in
+    node1 of tree t1 and a point in node2 of tree t2, including the periodic images of
+    node2.
+    """
+
+    return bounds.square_min_separation(t1.lower[3*node1+a], t1.upper[3*node1+a],\
+                                        t2.lower[3*node2+a], t2.upper[3*node2+a],\
+                                        period[a])
+
+
+cdef inline double square_max_separation(tree_t* t1, tree_t* t2,
+                                         np.int64_t node1, np.int64_t node2, int a,
+                                         np.float64_t* period):
+    """
+    return an upper limit on the square separation along dimension a between a point
+    in node1 of tree t1 and a point in node2 of tree t2.  With PBCs, the separation is
+    at most half the period.
+    """
+
+    return bounds.square_max_separation(t1.lower[3*node1+a], t1.upper[3*node1+a],\
+                                        t2.lower[3*node2+a], t2.upper[3*node2+a],\
+                                        period[a])
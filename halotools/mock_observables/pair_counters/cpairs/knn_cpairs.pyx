@@ -0,0 +1,292 @@
+# cython: profile=False
+
+"""
+cython k-nearest neighbor search on the grids of "rect_cuboid_cells".  This is called by
+the "nearest_neighbors" module.
+
+The neighbors of each point are searched for in shells of cells of increasing size
+around the cell of the point.  The k nearest points found so far are kept in a max-heap,
+and the search stops once the k-th nearest point is closer than any point in the cells
+which have not been searched.  Cells whose bounding boxes are further away than the k-th
+nearest point are skipped without visiting their points.  The loop over the cells of
+grid1 is run in parallel with OpenMP (cython's prange) without the GIL.  Each point's
+neighbors are only written by the thread visiting the cell of the point.
+"""
+
+from __future__ import print_function, division
+cimport cython
+from cython.parallel cimport prange
+import numpy as np
+cimport numpy as np
+from libc.math cimport fmin, sqrt, INFINITY
+from distances cimport *
+from bounds cimport square_min_separation
+
+__all__ = ['knn_threads']
+__author__=['Duncan Campbell']
+
+#the coordinates of the points may either be single or double precision.  In either case,
+#the separations of the points are calculated in double precision.
+ctypedef fused coord_t:
+    np.float32_t
+    np.float64_t
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def knn_threads(np.ndarray[coord_t, ndim=1] x1,
+                np.ndarray[coord_t, ndim=1] y1,
+                np.ndarray[coord_t, ndim=1] z1,
+                np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                np.ndarray[coord_t, ndim=1] x2,
+                np.ndarray[coord_t, ndim=1] y2,
+                np.ndarray[coord_t, ndim=1] z2,
+                np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                np.ndarray[np.float64_t, ndim=2] cell_lower2,
+                np.ndarray[np.float64_t, ndim=2] cell_upper2,
+                np.ndarray[np.int64_t, ndim=1] num_divs,
+                np.ndarray[np.float64_t, ndim=1] dL,
+                np.ndarray[np.float64_t, ndim=1] period,
+                int k, bint xy_z, double pi_max,
+                int icell_start, int icell_end, int N_threads):
+    """
+    find the k nearest points in grid2 to each point in cells icell_start to icell_end-1
+    of grid1.  The grids must have the same cells, and period is infinite without PBCs.
+    If xy_z is True, the separations are measured in the x-y plane, and only points
+    with separations along the z coordinate <= pi_max are neighbors.
+
+    Return the square separations and the (sorted) indices in grid2 of the neighbors, as
+    two n by k arrays, where n is the number of points in the cells, in their (sorted)
+    order in grid1.  The neighbors of each point are in order of increasing separation.
+    If fewer than k neighbors are found, the remaining separations are infinite, and
+    the indices are -1.
+    """
+
+    #c definitions
+    cdef np.int64_t i_start = cell_id_indices1[icell_start]
+    cdef np.int64_t n = cell_id_indices1[icell_end] - i_start
+    cdef np.ndarray[np.float64_t, ndim=2] dists = np.empty((n, k), dtype=np.float64)
+    cdef np.ndarray[np.int64_t, ndim=2] inds = np.empty((n, k), dtype=np.int64)
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.float64_t* plower2 = <np.float64_t*> cell_lower2.data
+    cdef np.float64_t* pupper2 = <np.float64_t*> cell_upper2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.float64_t* pdL = <np.float64_t*> dL.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.float64_t* pdists = <np.float64_t*> dists.data
+    cdef np.int64_t* pinds = <np.int64_t*> inds.data
+
+    #loop over the cells of grid1
+    with nogil:
+        for icell1 in prange(icell_start, icell_end, num_threads=N_threads,\
+                             schedule='dynamic'):
+            knn_cell(icell1, px1, py1, pz1, pcells1, px2, py2, pz2, pcells2,\
+                     plower2, pupper2, pdivs, pdL, pperiod, k, xy_z, pi_max*pi_max,\
+                     pdists, pinds, i_start)
+
+    return dists, inds
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void knn_cell(int icell1,
+                   coord_t* x1, coord_t* y1, coord_t* z1, np.int64_t* cell_id_indices1,
+                   coord_t* x2, coord_t* y2, coord_t* z2, np.int64_t* cell_id_indices2,
+                   np.float64_t* cell_lower2, np.float64_t* cell_upper2,
+                   np.int64_t* num_divs, np.float64_t* dL, np.float64_t* period,
+                   int k, bint xy_z, double pi_max2,
+                   np.float64_t* dists, np.int64_t* inds, np.int64_t i_start) nogil:
+    """
+    find the k nearest neighbors of each point in cell icell1 of grid1, storing them in
+    row i-i_start of the n by k arrays dists and inds, for each (sorted) point i.
+    """
+    cdef np.int64_t i, j, icell2
+    cdef int a, s, s_max, n_found, n_axes, ox, oy, oz, oz_lo, oz_hi
+    cdef int lo[3]
+    cdef int hi[3]
+    cdef int c[3]
+    cdef double p[3]
+    cdef double d, d_min, d_para, edge
+    cdef np.float64_t* row_d
+    cdef np.int64_t* row_i
+    cdef bint PBCs = period[0]<INFINITY
+
+    #the cell of the points, and the range of cell offsets which may be searched along
+    #each dimension.  With PBCs, each offset is a different cell.
+    c[0] = icell1//(num_divs[1]*num_divs[2])
+    c[1] = (icell1//num_divs[2])%num_divs[1]
+    c[2] = icell1%num_divs[2]
+    for a in range(3):
+        if PBCs:
+            lo[a] = -((num_divs[a]-1)//2)
+            hi[a] = num_divs[a]//2
+        else:
+            lo[a] = -c[a]
+            hi[a] = num_divs[a]-1-c[a]
+
+    #the shells extend along x and y only with the projected separation, and every
+    #cell within pi_max along z is searched in each shell
+    n_axes = 2 if xy_z else 3
+    if xy_z and (pi_max2<INFINITY):
+        a = <int>(sqrt(pi_max2)/dL[2]) + 1
+        if lo[2]<-a: lo[2] = -a
+        if hi[2]>a: hi[2] = a
+
+    #the largest shell needed to search every cell
+    s_max = 0
+    for a in range(n_axes):
+        if -lo[a]>s_max: s_max = -lo[a]
+        if hi[a]>s_max: s_max = hi[a]
+
+    for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+        p[0] = x1[i]
+        p[1] = y1[i]
+        p[2] = z1[i]
+        row_d = dists + (i-i_start)*k
+        row_i = inds + (i-i_start)*k
+        n_found = 0
+
+        for s in range(s_max+1):
+            #loop over the cells in the shell, with offsets max(|ox|,|oy|,|oz|)==s, or
+            #max(|ox|,|oy|)==s with the projected separation
+            oz_lo = lo[2] if xy_z else max_int(lo[2],-s)
+            oz_hi = hi[2] if xy_z else min_int(hi[2],s)
+            for ox in range(max_int(lo[0],-s), min_int(hi[0],s)+1):
+                for oy in range(max_int(lo[1],-s), min_int(hi[1],s)+1):
+                    for oz in range(oz_lo, oz_hi+1):
+                        if (abs_int(ox)!=s) and (abs_int(oy)!=s) and\
+                           (xy_z or (abs_int(oz)!=s)):
+                            continue
+
+                        #the cell in grid2
+                        icell2 = (((c[0]+ox+num_divs[0])%num_divs[0])*num_divs[1] +\
+                                  (c[1]+oy+num_divs[1])%num_divs[1])*num_divs[2] +\
+                                  (c[2]+oz+num_divs[2])%num_divs[2]
+                        if cell_id_indices2[icell2]==cell_id_indices2[icell2+1]:
+                            continue
+
+                        #skip cells further away than the k-th nearest neighbor
+                        d_para = square_min_separation(p[2], p[2],\
+                                                       cell_lower2[3*icell2+2],\
+                                                       cell_upper2[3*icell2+2],\
+                                                       period[2])
+                        if xy_z and (d_para>pi_max2): continue
+                        d_min = 0.0 if xy_z else d_para
+                        for a in range(2):
+                            d_min += square_min_separation(p[a], p[a],\
+                                                           cell_lower2[3*icell2+a],\
+                                                           cell_upper2[3*icell2+a],\
+                                                           period[a])
+                        if (n_found==k) and (d_min>=row_d[0]): continue
+
+                        for j in range(cell_id_indices2[icell2],\
+                                       cell_id_indices2[icell2+1]):
+                            if xy_z:
+                                if periodic_para_square_distance(p[2], z2[j],\
+                                                                 period)>pi_max2:
+                                    continue
+                                d = periodic_perp_square_distance(p[0], p[1], x2[j],\
+                                                                  y2[j], period)
+                            else:
+                                d = periodic_square_distance(p[0], p[1], p[2], x2[j],\
+                                                             y2[j], z2[j], period)
+                            if n_found<k:
+                                heap_push(row_d, row_i, n_found, d, j)
+                                n_found += 1
+                            elif d<row_d[0]:
+                                row_d[0] = d
+                                row_i[0] = j
+                                heap_sift_down(row_d, row_i, k, 0)
+
+            #stop once the k-th nearest neighbor is closer than any unsearched cell,
+            #which are outside of the searched block of cells.  With PBCs, the 
+            #unsearched cells along a dimension may be reached across either side.
+            if n_found==k:
+                edge = INFINITY
+                for a in range(n_axes):
+                    if (-s>lo[a]) or (PBCs and (s<hi[a])):
+                        edge = fmin(edge, p[a]-(c[a]-s)*dL[a])
+                    if (s<hi[a]) or (PBCs and (-s>lo[a])):
+                        edge = fmin(edge, (c[a]+s+1)*dL[a]-p[a])
+                if row_d[0]<=edge*edge: break
+
+        #fill the missing neighbors, and sort the neighbors by separation
+        for j in range(n_found, k):
+            row_d[j] = INFINITY
+            row_i[j] = -1
+        heap_sort(row_d, row_i, n_found)
+
+
+cdef inline int max_int(int a, int b) nogil:
+    return a if a>b else b
+
+
+cdef inline int min_int(int a, int b) nogil:
+    return a if a<b else b
+
+
+cdef inline int abs_int(int a) nogil:
+    return a if a>=0 else -a
+
+
+cdef inline void heap_push(np.float64_t* d, np.int64_t* ind, int n, double d_new,
+                           np.int64_t ind_new) nogil:
+    """
+    add an element to the max-heap of separations d[0] to d[n-1].
+    """
+    cdef int parent
+
+    while n>0:
+        parent = (n-1)//2
+        if d[parent]>=d_new: break
+        d[n] = d[parent]
+        ind[n] = ind[parent]
+        n = parent
+    d[n] = d_new
+    ind[n] = ind_new
+
+
+cdef inline void heap_sift_down(np.float64_t* d, np.int64_t* ind, int n, int i) nogil:
+    """
+    restore the max-heap of separations d[0] to d[n-1], after element i was decreased.
+    """
+    cdef int child
+    cdef double d_i = d[i]
+    cdef np.int64_t ind_i = ind[i]
+
+    while 2*i+1<n:
+        child = 2*i+1
+        if (child+1<n) and (d[child+1]>d[child]): child += 1
+        if d[child]<=d_i: break
+        d[i] = d[child]
+        ind[i] = ind[child]
+        i = child
+    d[i] = d_i
+    ind[i] = ind_i
+
+
+cdef inline void heap_sort(np.float64_t* d, np.int64_t* ind, int n) nogil:
+    """
+    sort the max-heap of separations d[0] to d[n-1] into increasing order.
+    """
+    cdef double d_tmp
+    cdef np.int64_t ind_tmp
+
+    while n>1:
+        n -= 1
+        d_tmp, ind_tmp = d[0], ind[0]
+        d[0], ind[0] = d[n], ind[n]
+        d[n], ind[n] = d_tmp, ind_tmp
+        heap_sift_down(d, ind, n, 0)
@@ -0,0 +1,1153 @@
+# cython: profile=False
+
+"""
+multi-threaded cython pair counters.  These are called by "rect_cuboid_pairs" module when
+the pair counters are run with backend='threads'.
+
+Unlike the functions in "cpairs", which count the pairs between two cells and are mapped
+over the cells by a pool of worker processes, these functions loop over every cell of
+the grids themselves.  The loop over cells is run in parallel with OpenMP (cython's
+prange) without the GIL, so no data is pickled and no processes are started.  Each
+thread adds its pairs to its own buffer of counts, and these are summed once all the
+cells have been visited.  If the module is compiled without OpenMP, the cells are visited
+serially.
+
+The grids are passed as the (sorted) coordinates of the points, and the CSR offsets of
+the points in each cell, see `rect_cuboid_cells`.  The neighboring cells in grid2 of each
+cell in grid1 are found from the number of cells, num_divs, and the number of
+neighboring cells, num_adjacent, along each dimension of the grids, see "stencil".  With
+no PBCs, the period should be set to infinity.  When counting the pairs of a sample with
+itself (auto=True), only the forward neighbors of each cell are visited, and each pair of
+points is visited once.
+
+As with the functions in "cpairs", the number of pairs in each bin is returned, i.e.
+with bins[i-1] < d <= bins[i], and there are no 'checks' preformed to ensure the
+arguments are of the correct format.
+"""
+
+from __future__ import print_function, division
+cimport cython
+from cython.parallel cimport prange, threadid
+import numpy as np
+cimport numpy as np
+from libc.math cimport sqrt
+from distances cimport *
+from binning cimport bin_index, multi_binning, point_bin_index, multipole_binning,\
+    SPEC_SIZE
+cimport bounds
+cimport stencil
+
+__all__ = ['npairs_threads', 'wnpairs_threads', 'xy_z_npairs_threads',\
+           's_mu_npairs_threads', 'multi_npairs_threads', 'wnpairs_columns_threads',\
+           'npairs_per_point_threads', 'wp_npairs_threads', 'labeled_npairs_threads',\
+           'multipole_npairs_threads']
+__author__=['Duncan Campbell']
+
+#the coordinates of the points may either be single or double precision.  In either case,
+#the separations of the points are calculated in double precision.
+ctypedef fused coord_t:
+    np.float32_t
+    np.float64_t
+
+#number of elements by which the buffer of each thread is padded, so that the buffers
+#of different threads do not share a cache line
+cdef int PAD = 8
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def npairs_threads(np.ndarray[coord_t, ndim=1] x1,
+                   np.ndarray[coord_t, ndim=1] y1,
+                   np.ndarray[coord_t, ndim=1] z1,
+                   np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                   np.ndarray[np.float64_t, ndim=2] cell_lower1,
+                   np.ndarray[np.float64_t, ndim=2] cell_upper1,
+                   np.ndarray[coord_t, ndim=1] x2,
+                   np.ndarray[coord_t, ndim=1] y2,
+                   np.ndarray[coord_t, ndim=1] z2,
+                   np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                   np.ndarray[np.float64_t, ndim=2] cell_lower2,
+                   np.ndarray[np.float64_t, ndim=2] cell_upper2,
+                   np.ndarray[np.int64_t, ndim=1] num_divs,
+                   np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                   np.ndarray[np.float64_t, ndim=1] rbins,
+                   np.ndarray[np.float64_t, ndim=1] period,
+                   int N_threads, bint auto):
+    """
+    multi-threaded real-space pair counter.
+    Calculate the number of pairs with square separations rbins[i-1] < d <= rbins[i].
+    Pairs of cells are skipped, or counted in bulk, if the bounding boxes of the cells
+    (see `rect_cuboid_cells.compute_cell_bounds`) show that all their pairs are beyond
+    the largest bin, or in a single bin.
+    """
+
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int stride = nbins + PAD
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.int)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef np.float64_t* plower1 = <np.float64_t*> cell_lower1.data
+    cdef np.float64_t* pupper1 = <np.float64_t*> cell_upper1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.float64_t* plower2 = <np.float64_t*> cell_lower2.data
+    cdef np.float64_t* pupper2 = <np.float64_t*> cell_upper2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* pbins = <np.float64_t*> rbins.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.int_t* pcounts = <np.int_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            npairs_cell(icell1, px1, py1, pz1, pcells1, plower1, pupper1,\
+                        px2, py2, pz2, pcells2, plower2, pupper2,\
+                        pdivs, padjacent, pbins, nbins-1, pperiod, auto,\
+                        pcounts + threadid()*stride)
+
+    return np.sum(counts[:,:nbins], axis=0)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def wnpairs_threads(np.ndarray[coord_t, ndim=1] x1,
+                    np.ndarray[coord_t, ndim=1] y1,
+                    np.ndarray[coord_t, ndim=1] z1,
+                    np.ndarray[np.float64_t, ndim=1] w1,
+                    np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                    np.ndarray[coord_t, ndim=1] x2,
+                    np.ndarray[coord_t, ndim=1] y2,
+                    np.ndarray[coord_t, ndim=1] z2,
+                    np.ndarray[np.float64_t, ndim=1] w2,
+                    np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                    np.ndarray[np.int64_t, ndim=1] num_divs,
+                    np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                    np.ndarray[np.float64_t, ndim=1] rbins,
+                    np.ndarray[np.float64_t, ndim=1] period,
+                    int N_threads, bint auto):
+    """
+    multi-threaded weighted real-space pair counter.
+    Calculate the weighted number of pairs with square separations
+    rbins[i-1] < d <= rbins[i].
+    """
+
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int stride = nbins + PAD
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.float64)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.float64_t* pw1 = <np.float64_t*> w1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.float64_t* pw2 = <np.float64_t*> w2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* pbins = <np.float64_t*> rbins.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.float64_t* pcounts = <np.float64_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            wnpairs_cell(icell1, px1, py1, pz1, pw1, pcells1,\
+                         px2, py2, pz2, pw2, pcells2,\
+                         pdivs, padjacent, pbins, nbins-1, pperiod, auto,\
+                         pcounts + threadid()*stride)
+
+    return np.sum(counts[:,:nbins], axis=0)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def wnpairs_columns_threads(np.ndarray[coord_t, ndim=1] x1,
+                            np.ndarray[coord_t, ndim=1] y1,
+                            np.ndarray[coord_t, ndim=1] z1,
+                            np.ndarray[np.float64_t, ndim=2] w1,
+                            np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                            np.ndarray[coord_t, ndim=1] x2,
+                            np.ndarray[coord_t, ndim=1] y2,
+                            np.ndarray[coord_t, ndim=1] z2,
+                            np.ndarray[np.float64_t, ndim=2] w2,
+                            np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                            np.ndarray[np.int64_t, ndim=1] num_divs,
+                            np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                            np.ndarray[np.float64_t, ndim=1] rbins,
+                            np.ndarray[np.float64_t, ndim=1] period,
+                            int N_threads, bint auto):
+    """
+    multi-threaded weighted real-space pair counter for several columns of weights at
+    once.  The weights are C-contiguous N by n_weights arrays.  Calculate the weighted
+    number of pairs with square separations rbins[i-1] < d <= rbins[i], for each column,
+    returned as an n_weights by len(rbins) array.
+    """
+
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int nweights = w1.shape[1]
+    cdef int stride = nweights*nbins + PAD
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.float64)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.float64_t* pw1 = <np.float64_t*> w1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.float64_t* pw2 = <np.float64_t*> w2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* pbins = <np.float64_t*> rbins.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.float64_t* pcounts = <np.float64_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            wnpairs_columns_cell(icell1, px1, py1, pz1, pw1, pcells1,\
+                                 px2, py2, pz2, pw2, pcells2, nweights,\
+                                 pdivs, padjacent, pbins, nbins, pperiod, auto,\
+                                 pcounts + threadid()*stride)
+
+    return np.sum(counts[:,:nweights*nbins], axis=0).reshape((nweights, nbins))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def xy_z_npairs_threads(np.ndarray[coord_t, ndim=1] x1,
+                        np.ndarray[coord_t, ndim=1] y1,
+                        np.ndarray[coord_t, ndim=1] z1,
+                        np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                        np.ndarray[coord_t, ndim=1] x2,
+                        np.ndarray[coord_t, ndim=1] y2,
+                        np.ndarray[coord_t, ndim=1] z2,
+                        np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                        np.ndarray[np.int64_t, ndim=1] num_divs,
+                        np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                        np.ndarray[np.float64_t, ndim=1] rp_bins,
+                        np.ndarray[np.float64_t, ndim=1] pi_bins,
+                        np.ndarray[np.float64_t, ndim=1] period,
+                        int N_threads, bint auto):
+    """
+    multi-threaded 2+1D pair counter.
+    Calculate the number of pairs with square separations in the x-y plane
+    rp_bins[i-1] < d_perp <= rp_bins[i], and square separations in the z coordinate
+    pi_bins[j-1] < d_para <= pi_bins[j].
+    """
+
+    #c definitions
+    cdef int nrp_bins = len(rp_bins)
+    cdef int npi_bins = len(pi_bins)
+    cdef int stride = nrp_bins*npi_bins + PAD
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.int)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* prp_bins = <np.float64_t*> rp_bins.data
+    cdef np.float64_t* ppi_bins = <np.float64_t*> pi_bins.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.int_t* pcounts = <np.int_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            xy_z_npairs_cell(icell1, px1, py1, pz1, pcells1, px2, py2, pz2, pcells2,\
+                             pdivs, padjacent, prp_bins, nrp_bins-1, ppi_bins, npi_bins-1,\
+                             pperiod, 0, auto, pcounts + threadid()*stride)
+
+    counts_2d = np.sum(counts[:,:nrp_bins*npi_bins], axis=0)
+    return counts_2d.reshape((nrp_bins, npi_bins))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def s_mu_npairs_threads(np.ndarray[coord_t, ndim=1] x1,
+                        np.ndarray[coord_t, ndim=1] y1,
+                        np.ndarray[coord_t, ndim=1] z1,
+                        np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                        np.ndarray[coord_t, ndim=1] x2,
+                        np.ndarray[coord_t, ndim=1] y2,
+                        np.ndarray[coord_t, ndim=1] z2,
+                        np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                        np.ndarray[np.int64_t, ndim=1] num_divs,
+                        np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                        np.ndarray[np.float64_t, ndim=1] s_bins,
+                        np.ndarray[np.float64_t, ndim=1] mu_bins,
+                        np.ndarray[np.float64_t, ndim=1] period,
+                        int N_threads, bint auto):
+    """
+    multi-threaded s-mu pair counter.
+    Calculate the number of pairs with separations s_bins[i-1] < s <= s_bins[i], and
+    angle from the line of sight mu_bins[j-1] < mu <= mu_bins[j].
+    """
+
+    #c definitions
+    cdef int ns_bins = len(s_bins)
+    cdef int nmu_bins = len(mu_bins)
+    cdef int stride = ns_bins*nmu_bins + PAD
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.int)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* ps_bins = <np.float64_t*> s_bins.data
+    cdef np.float64_t* pmu_bins = <np.float64_t*> mu_bins.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.int_t* pcounts = <np.int_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            xy_z_npairs_cell(icell1, px1, py1, pz1, pcells1, px2, py2, pz2, pcells2,\
+                             pdivs, padjacent, ps_bins, ns_bins-1, pmu_bins, nmu_bins-1,\
+                             pperiod, 1, auto, pcounts + threadid()*stride)
+
+    counts_2d = np.sum(counts[:,:ns_bins*nmu_bins], axis=0)
+    return counts_2d.reshape((ns_bins, nmu_bins))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def multi_npairs_threads(np.ndarray[coord_t, ndim=1] x1,
+                         np.ndarray[coord_t, ndim=1] y1,
+                         np.ndarray[coord_t, ndim=1] z1,
+                         np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                         np.ndarray[coord_t, ndim=1] x2,
+                         np.ndarray[coord_t, ndim=1] y2,
+                         np.ndarray[coord_t, ndim=1] z2,
+                         np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                         np.ndarray[np.int64_t, ndim=1] num_divs,
+                         np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                         np.ndarray[np.float64_t, ndim=1] edges,
+                         np.ndarray[np.int64_t, ndim=2] specs,
+                         int ncounts,
+                         np.ndarray[np.float64_t, ndim=1] period,
+                         int N_threads, bint auto):
+    """
+    multi-threaded pair counter filling several histograms at once, e.g. in r, (rp,pi),
+    and (s,mu).  The binnings are described by edges and specs, see
+    `binning.multi_binning`, and the histograms are returned as a single flattened array
+    of length ncounts.
+    """
+
+    #c definitions
+    cdef int stride = ncounts + PAD
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.int)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int nspecs = len(specs)
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* pedges = <np.float64_t*> edges.data
+    cdef np.int64_t* pspecs = <np.int64_t*> specs.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.int_t* pcounts = <np.int_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            multi_npairs_cell(icell1, px1, py1, pz1, pcells1, px2, py2, pz2, pcells2,\
+                              pdivs, padjacent, pedges, pspecs, nspecs, pperiod, auto,\
+                              pcounts + threadid()*stride)
+
+    return np.sum(counts[:,:ncounts], axis=0)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def wp_npairs_threads(np.ndarray[coord_t, ndim=1] x1,
+                      np.ndarray[coord_t, ndim=1] y1,
+                      np.ndarray[coord_t, ndim=1] z1,
+                      np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                      np.ndarray[coord_t, ndim=1] x2,
+                      np.ndarray[coord_t, ndim=1] y2,
+                      np.ndarray[coord_t, ndim=1] z2,
+                      np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                      np.ndarray[np.int64_t, ndim=1] num_divs,
+                      np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                      np.ndarray[np.float64_t, ndim=1] rp_bins,
+                      np.float64_t pi_max,
+                      np.ndarray[np.float64_t, ndim=1] period,
+                      int N_threads, bint auto):
+    """
+    multi-threaded projected pair counter.
+    Calculate the number of pairs with square separations in the x-y plane
+    rp_bins[i-1] < d_perp <= rp_bins[i], and square separations in the z coordinate
+    d_para <= pi_max.
+    """
+
+    #c definitions
+    cdef int nbins = len(rp_bins)
+    cdef int stride = nbins + PAD
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.int)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* prp_bins = <np.float64_t*> rp_bins.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.int_t* pcounts = <np.int_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            wp_npairs_cell(icell1, px1, py1, pz1, pcells1, px2, py2, pz2, pcells2,\
+                           pdivs, padjacent, prp_bins, nbins-1, pi_max, pperiod, auto,\
+                           pcounts + threadid()*stride)
+
+    return np.sum(counts[:,:nbins], axis=0)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def labeled_npairs_threads(np.ndarray[coord_t, ndim=1] x1,
+                           np.ndarray[coord_t, ndim=1] y1,
+                           np.ndarray[coord_t, ndim=1] z1,
+                           np.ndarray[np.int64_t, ndim=1] labels1,
+                           np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                           np.ndarray[coord_t, ndim=1] x2,
+                           np.ndarray[coord_t, ndim=1] y2,
+                           np.ndarray[coord_t, ndim=1] z2,
+                           np.ndarray[np.int64_t, ndim=1] labels2,
+                           np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                           int nlabels1, int nlabels2,
+                           np.ndarray[np.int64_t, ndim=1] num_divs,
+                           np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                           np.ndarray[np.float64_t, ndim=1] rbins,
+                           np.ndarray[np.float64_t, ndim=1] period,
+                           int N_threads, bint auto):
+    """
+    multi-threaded labeled real-space pair counter.
+    Calculate the number of pairs with square separations rbins[i-1] < d <= rbins[i]
+    for each pair of labels, returned as an nlabels1 by nlabels2 by len(rbins) array.
+    """
+
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int ncounts = nlabels1*nlabels2*nbins
+    cdef int stride = ncounts + PAD
+    cdef np.ndarray[np.int_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.int)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pl1 = <np.int64_t*> labels1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.int64_t* pl2 = <np.int64_t*> labels2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* pbins = <np.float64_t*> rbins.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.int_t* pcounts = <np.int_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            labeled_npairs_cell(icell1, px1, py1, pz1, pl1, pcells1,\
+                                px2, py2, pz2, pl2, pcells2, nlabels2,\
+                                pdivs, padjacent, pbins, nbins-1, pperiod, auto,\
+                                pcounts + threadid()*stride)
+
+    return np.sum(counts[:,:ncounts], axis=0).reshape((nlabels1, nlabels2, nbins))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def multipole_npairs_threads(np.ndarray[coord_t, ndim=1] x1,
+                             np.ndarray[coord_t, ndim=1] y1,
+                             np.ndarray[coord_t, ndim=1] z1,
+                             np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                             np.ndarray[coord_t, ndim=1] x2,
+                             np.ndarray[coord_t, ndim=1] y2,
+                             np.ndarray[coord_t, ndim=1] z2,
+                             np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                             np.ndarray[np.int64_t, ndim=1] num_divs,
+                             np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                             np.ndarray[np.float64_t, ndim=1] s_bins,
+                             np.ndarray[np.int64_t, ndim=1] ells,
+                             np.ndarray[np.float64_t, ndim=1] period,
+                             int N_threads, bint auto):
+    """
+    multi-threaded Legendre multipole pair counter.
+    Calculate the sum over the pairs with square separations s_bins[i-1] < s <= s_bins[i]
+    of the Legendre polynomial P_ell(mu) for each ell in ells, returned as a len(ells) by
+    len(s_bins) array.
+    """
+
+    #c definitions
+    cdef int nbins = len(s_bins)
+    cdef int nells = len(ells)
+    cdef int ncounts = nells*nbins
+    cdef int stride = ncounts + PAD
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((N_threads, stride), dtype=np.float64)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* pbins = <np.float64_t*> s_bins.data
+    cdef np.int64_t* pells = <np.int64_t*> ells.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.float64_t* pcounts = <np.float64_t*> counts.data
+
+    #loop over the cells of grid1, each thread using its own row of counts
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            multipole_npairs_cell(icell1, px1, py1, pz1, pcells1, px2, py2, pz2, pcells2,\
+                                  pdivs, padjacent, pbins, nbins-1, pells, nells, pperiod,\
+                                  auto, pcounts + threadid()*stride)
+
+    return np.sum(counts[:,:ncounts], axis=0).reshape((nells, nbins))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def npairs_per_point_threads(np.ndarray[coord_t, ndim=1] x1,
+                             np.ndarray[coord_t, ndim=1] y1,
+                             np.ndarray[coord_t, ndim=1] z1,
+                             np.ndarray[np.int64_t, ndim=1] cell_id_indices1,
+                             np.ndarray[coord_t, ndim=1] x2,
+                             np.ndarray[coord_t, ndim=1] y2,
+                             np.ndarray[coord_t, ndim=1] z2,
+                             np.ndarray[np.float64_t, ndim=1] w2,
+                             np.ndarray[np.int64_t, ndim=1] cell_id_indices2,
+                             np.ndarray[np.int64_t, ndim=1] num_divs,
+                             np.ndarray[np.int64_t, ndim=1] num_adjacent,
+                             np.ndarray[np.float64_t, ndim=1] rp_bins,
+                             np.ndarray[np.float64_t, ndim=1] pi_bins,
+                             np.ndarray[np.float64_t, ndim=1] period,
+                             int N_threads, bint xy_z):
+    """
+    multi-threaded per-point weighted pair counter.
+    For each point in grid1, calculate the summed weights of the points in grid2 in each
+    bin, returned as an N1 by len(rp_bins)*len(pi_bins) array, in the (sorted) order of
+    the points in grid1.  If xy_z is True, the pairs are binned in the square separations
+    perpendicular and parallel to the line of sight, otherwise the square separation is
+    binned in rp_bins, and pi_bins should be of length 1.  All the neighbors of each
+    cell are visited.  Each row of counts is only filled by the thread visiting the
+    cell of the point, so the threads do not need their own buffers.
+    """
+
+    #c definitions
+    cdef int nrp_bins = len(rp_bins)
+    cdef int npi_bins = len(pi_bins)
+    cdef int stride = nrp_bins*npi_bins
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((len(x1), stride), dtype=np.float64)
+    cdef int Ncell1 = len(cell_id_indices1) - 1
+    cdef int icell1
+
+    #pointers to the data, which may be used without the GIL
+    cdef coord_t* px1 = <coord_t*> x1.data
+    cdef coord_t* py1 = <coord_t*> y1.data
+    cdef coord_t* pz1 = <coord_t*> z1.data
+    cdef np.int64_t* pcells1 = <np.int64_t*> cell_id_indices1.data
+    cdef coord_t* px2 = <coord_t*> x2.data
+    cdef coord_t* py2 = <coord_t*> y2.data
+    cdef coord_t* pz2 = <coord_t*> z2.data
+    cdef np.float64_t* pw2 = <np.float64_t*> w2.data
+    cdef np.int64_t* pcells2 = <np.int64_t*> cell_id_indices2.data
+    cdef np.int64_t* pdivs = <np.int64_t*> num_divs.data
+    cdef np.int64_t* padjacent = <np.int64_t*> num_adjacent.data
+    cdef np.float64_t* prp_bins = <np.float64_t*> rp_bins.data
+    cdef np.float64_t* ppi_bins = <np.float64_t*> pi_bins.data
+    cdef np.float64_t* pperiod = <np.float64_t*> period.data
+    cdef np.float64_t* pcounts = <np.float64_t*> counts.data
+
+    #loop over the cells of grid1
+    with nogil:
+        for icell1 in prange(Ncell1, num_threads=N_threads, schedule='dynamic'):
+            npairs_per_point_cell(icell1, px1, py1, pz1, pcells1,\
+                                  px2, py2, pz2, pw2, pcells2, pdivs, padjacent,\
+                                  prp_bins, nrp_bins, ppi_bins, npi_bins,\
+                                  pperiod, xy_z, pcounts)
+
+    return counts
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void npairs_cell(int icell1,
+                      coord_t* x1, coord_t* y1, coord_t* z1,
+                      np.int64_t* cell_id_indices1,
+                      np.float64_t* cell_lower1, np.float64_t* cell_upper1,
+                      coord_t* x2, coord_t* y2, coord_t* z2,
+                      np.int64_t* cell_id_indices2,
+                      np.float64_t* cell_lower2, np.float64_t* cell_upper2,
+                      np.int64_t* num_divs, np.int64_t* num_adjacent,
+                      np.float64_t* rbins, int nbins_minus_one,
+                      np.float64_t* period, bint auto, np.int_t* counts) nogil:
+    """
+    count the pairs between the points in cell icell1 of grid1, and the points in the
+    neighboring cells of grid2.  If auto is True, grid1 and grid2 are the same, and
+    only the forward neighbors of each cell are visited (see
+    `rect_cuboid_cells.forward_adjacent_cells`), so each pair of points is visited once.
+    """
+    cdef int a, k
+    cdef np.int64_t i, j, icell2
+    cdef double d
+    cdef int n = 1
+    cdef np.int64_t N1 = cell_id_indices1[icell1+1] - cell_id_indices1[icell1]
+
+    if N1==0: return
+
+    if auto:
+        k = bounds.box_pair_bin(cell_lower1+3*icell1, cell_upper1+3*icell1,\
+                                cell_lower1+3*icell1, cell_upper1+3*icell1,\
+                                rbins, nbins_minus_one, period)
+        if k>=0:
+            #all pairs within the cell are in the same bin
+            counts[k] += N1*N1
+        else:
+            #loop over the pairs within the cell, each point is also paired with itself
+            for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+                for j in range(i, cell_id_indices1[icell1+1]):
+                    d = periodic_square_distance(x1[i], y1[i], z1[i],\
+                                                 x1[j], y1[j], z1[j], period)
+                    k = bin_index(rbins, d, nbins_minus_one)
+                    if k<0: continue
+                    if i==j: counts[k] += 1
+                    else: counts[k] += 2
+
+        #each pair between cells is counted as both (i,j) and (j,i)
+        n = 2
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, auto)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, auto)
+
+        #skip the pair of cells, or count its pairs in bulk, using the bounding boxes
+        k = bounds.box_pair_bin(cell_lower1+3*icell1, cell_upper1+3*icell1,\
+                                cell_lower2+3*icell2, cell_upper2+3*icell2,\
+                                rbins, nbins_minus_one, period)
+        if k==-1: continue
+        if k>=0:
+            counts[k] += n*N1*(cell_id_indices2[icell2+1]-cell_id_indices2[icell2])
+            continue
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+
+                #calculate the square distance
+                d = periodic_square_distance(x1[i], y1[i], z1[i],\
+                                             x2[j], y2[j], z2[j], period)
+
+                #calculate counts in bins
+                k = bin_index(rbins, d, nbins_minus_one)
+                if k>=0: counts[k] += n
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void wnpairs_cell(int icell1,
+                       coord_t* x1, coord_t* y1, coord_t* z1,
+                       np.float64_t* w1, np.int64_t* cell_id_indices1,
+                       coord_t* x2, coord_t* y2, coord_t* z2,
+                       np.float64_t* w2, np.int64_t* cell_id_indices2,
+                       np.int64_t* num_divs, np.int64_t* num_adjacent,
+                       np.float64_t* rbins, int nbins_minus_one,
+                       np.float64_t* period, bint auto, np.float64_t* counts) nogil:
+    """
+    weighted count of the pairs between the points in cell icell1 of grid1, and the
+    points in the neighboring cells of grid2.  If auto is True, grid1 and grid2 are the
+    same, and only the forward neighbors of each cell are visited.
+    """
+    cdef int a, k
+    cdef np.int64_t i, j, icell2
+    cdef double d
+    cdef double n = 1.0
+
+    if auto:
+        #loop over the pairs within the cell, each point is also paired with itself
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            for j in range(i, cell_id_indices1[icell1+1]):
+                d = periodic_square_distance(x1[i], y1[i], z1[i],\
+                                             x1[j], y1[j], z1[j], period)
+                k = bin_index(rbins, d, nbins_minus_one)
+                if k<0: continue
+                if i==j: counts[k] += w1[i]*w1[j]
+                else: counts[k] += 2.0*w1[i]*w1[j]
+
+        #each pair between cells is counted as both (i,j) and (j,i)
+        n = 2.0
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, auto)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, auto)
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+
+                #calculate the square distance
+                d = periodic_square_distance(x1[i], y1[i], z1[i],\
+                                             x2[j], y2[j], z2[j], period)
+
+                #calculate counts in bins
+                k = bin_index(rbins, d, nbins_minus_one)
+                if k>=0: counts[k] += n*w1[i]*w2[j]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void wnpairs_columns_cell(int icell1,
+                               coord_t* x1, coord_t* y1, coord_t* z1,
+                               np.float64_t* w1, np.int64_t* cell_id_indices1,
+                               coord_t* x2, coord_t* y2, coord_t* z2,
+                               np.float64_t* w2, np.int64_t* cell_id_indices2,
+                               int nweights, np.int64_t* num_divs, np.int64_t* num_adjacent,
+                               np.float64_t* rbins, int nbins,
+                               np.float64_t* period, bint auto,
+                               np.float64_t* counts) nogil:
+    """
+    weighted count of the pairs between the points in cell icell1 of grid1, and the
+    points in the neighboring cells of grid2, for each of nweights columns of weights.
+    The counts of column l are stored in counts[l*nbins:(l+1)*nbins].  If auto is True,
+    grid1 and grid2 are the same, and only the forward neighbors of each cell are
+    visited.
+    """
+    cdef int a, k, l
+    cdef np.int64_t i, j, icell2
+    cdef double d, n
+
+    if auto:
+        #loop over the pairs within the cell, each point is also paired with itself
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            for j in range(i, cell_id_indices1[icell1+1]):
+                d = periodic_square_distance(x1[i], y1[i], z1[i],\
+                                             x1[j], y1[j], z1[j], period)
+                k = bin_index(rbins, d, nbins-1)
+                if k<0: continue
+                n = 1.0 if i==j else 2.0
+                for l in range(nweights):
+                    counts[l*nbins+k] += n*w1[i*nweights+l]*w1[j*nweights+l]
+
+    #each pair between cells is counted as both (i,j) and (j,i)
+    n = 2.0 if auto else 1.0
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, auto)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, auto)
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+
+                #calculate the square distance, and the bin, once for all the weights
+                d = periodic_square_distance(x1[i], y1[i], z1[i],\
+                                             x2[j], y2[j], z2[j], period)
+                k = bin_index(rbins, d, nbins-1)
+                if k<0: continue
+                for l in range(nweights):
+                    counts[l*nbins+k] += n*w1[i*nweights+l]*w2[j*nweights+l]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void xy_z_npairs_cell(int icell1,
+                           coord_t* x1, coord_t* y1, coord_t* z1,
+                           np.int64_t* cell_id_indices1,
+                           coord_t* x2, coord_t* y2, coord_t* z2,
+                           np.int64_t* cell_id_indices2,
+                           np.int64_t* num_divs, np.int64_t* num_adjacent,
+                           np.float64_t* rp_bins, int nrp_bins_minus_one,
+                           np.float64_t* pi_bins, int npi_bins_minus_one,
+                           np.float64_t* period, bint s_mu, bint auto,
+                           np.int_t* counts) nogil:
+    """
+    count the pairs between the points in cell icell1 of grid1, and the points in the
+    neighboring cells of grid2, binned in the square separations perpendicular and
+    parallel to the line of sight.  If s_mu is True, the pairs are instead binned in
+    s and mu, see `s_mu_npairs_threads`.  If auto is True, grid1 and grid2 are the same,
+    and only the forward neighbors of each cell are visited.
+    """
+    cdef int a
+    cdef np.int64_t i, j, icell2
+
+    if auto:
+        #loop over the pairs within the cell, each point is also paired with itself
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            for j in range(i, cell_id_indices1[icell1+1]):
+                xy_z_bin_pair(x1[i], y1[i], z1[i], x1[j], y1[j], z1[j],\
+                              rp_bins, nrp_bins_minus_one, pi_bins, npi_bins_minus_one,\
+                              period, s_mu, 1 if i==j else 2, counts)
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, auto)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, auto)
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+                xy_z_bin_pair(x1[i], y1[i], z1[i], x2[j], y2[j], z2[j],\
+                              rp_bins, nrp_bins_minus_one, pi_bins, npi_bins_minus_one,\
+                              period, s_mu, 2 if auto else 1, counts)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void multi_npairs_cell(int icell1,
+                            coord_t* x1, coord_t* y1, coord_t* z1,
+                            np.int64_t* cell_id_indices1,
+                            coord_t* x2, coord_t* y2, coord_t* z2,
+                            np.int64_t* cell_id_indices2,
+                            np.int64_t* num_divs, np.int64_t* num_adjacent,
+                            np.float64_t* edges, np.int64_t* specs, int nspecs,
+                            np.float64_t* period, bint auto, np.int_t* counts) nogil:
+    """
+    count the pairs between the points in cell icell1 of grid1, and the points in the
+    neighboring cells of grid2, in each of several binnings.  If auto is True, grid1 and
+    grid2 are the same, and only the forward neighbors of each cell are visited.
+    """
+    cdef int a
+    cdef np.int64_t i, j, icell2
+    cdef double d_perp, d_para
+
+    if auto:
+        #loop over the pairs within the cell, each point is also paired with itself
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            for j in range(i, cell_id_indices1[icell1+1]):
+                d_perp = periodic_perp_square_distance(x1[i], y1[i], x1[j], y1[j], period)
+                d_para = periodic_para_square_distance(z1[i], z1[j], period)
+                multi_binning(counts, edges, specs, nspecs, d_perp, d_para,\
+                              1 if i==j else 2)
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, auto)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, auto)
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+                d_perp = periodic_perp_square_distance(x1[i], y1[i], x2[j], y2[j], period)
+                d_para = periodic_para_square_distance(z1[i], z2[j], period)
+                multi_binning(counts, edges, specs, nspecs, d_perp, d_para,\
+                              2 if auto else 1)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void npairs_per_point_cell(int icell1,
+                                coord_t* x1, coord_t* y1, coord_t* z1,
+                                np.int64_t* cell_id_indices1,
+                                coord_t* x2, coord_t* y2, coord_t* z2,
+                                np.float64_t* w2, np.int64_t* cell_id_indices2,
+                                np.int64_t* num_divs, np.int64_t* num_adjacent,
+                                np.float64_t* rp_bins, int nrp_bins,
+                                np.float64_t* pi_bins, int npi_bins,
+                                np.float64_t* period, bint xy_z,
+                                np.float64_t* counts) nogil:
+    """
+    add the weights of the points in the neighboring cells of grid2 to the bins of each
+    point in cell icell1 of grid1.  The counts of point i are stored in
+    counts[i*nrp_bins*npi_bins:(i+1)*nrp_bins*npi_bins].
+    """
+    cdef int a, k
+    cdef np.int64_t i, j, icell2
+    cdef int stride = nrp_bins*npi_bins
+    cdef double d_perp, d_para
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, False)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, False)
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+                d_perp = periodic_perp_square_distance(x1[i], y1[i], x2[j], y2[j], period)
+                d_para = periodic_para_square_distance(z1[i], z2[j], period)
+                k = point_bin_index(rp_bins, nrp_bins, pi_bins, npi_bins,\
+                                    d_perp, d_para, xy_z)
+                if k>=0: counts[i*stride+k] += w2[j]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void wp_npairs_cell(int icell1,
+                         coord_t* x1, coord_t* y1, coord_t* z1,
+                         np.int64_t* cell_id_indices1,
+                         coord_t* x2, coord_t* y2, coord_t* z2,
+                         np.int64_t* cell_id_indices2,
+                         np.int64_t* num_divs, np.int64_t* num_adjacent,
+                         np.float64_t* rp_bins, int nbins_minus_one,
+                         np.float64_t pi_max, np.float64_t* period, bint auto,
+                         np.int_t* counts) nogil:
+    """
+    count the pairs between the points in cell icell1 of grid1, and the points in the
+    neighboring cells of grid2, with square separations along the line of sight
+    <= pi_max, binned in the square separation perpendicular to the line of sight.  If
+    auto is True, grid1 and grid2 are the same, and only the forward neighbors of each
+    cell are visited.
+    """
+    cdef int a, k
+    cdef np.int64_t i, j, icell2
+    cdef double d_perp
+
+    if auto:
+        #loop over the pairs within the cell, each point is also paired with itself
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            for j in range(i, cell_id_indices1[icell1+1]):
+                if periodic_para_square_distance(z1[i], z1[j], period)>pi_max: continue
+                d_perp = periodic_perp_square_distance(x1[i], y1[i], x1[j], y1[j], period)
+                k = bin_index(rp_bins, d_perp, nbins_minus_one)
+                if k>=0: counts[k] += 1 if i==j else 2
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, auto)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, auto)
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+                if periodic_para_square_distance(z1[i], z2[j], period)>pi_max: continue
+                d_perp = periodic_perp_square_distance(x1[i], y1[i], x2[j], y2[j], period)
+                k = bin_index(rp_bins, d_perp, nbins_minus_one)
+                if k>=0: counts[k] += 2 if auto else 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void labeled_npairs_cell(int icell1,
+                              coord_t* x1, coord_t* y1, coord_t* z1,
+                              np.int64_t* labels1, np.int64_t* cell_id_indices1,
+                              coord_t* x2, coord_t* y2, coord_t* z2,
+                              np.int64_t* labels2, np.int64_t* cell_id_indices2,
+                              int nlabels2, np.int64_t* num_divs, np.int64_t* num_adjacent,
+                              np.float64_t* rbins, int nbins_minus_one,
+                              np.float64_t* period, bint auto,
+                              np.int_t* counts) nogil:
+    """
+    count the pairs between the points in cell icell1 of grid1, and the points in the
+    neighboring cells of grid2, for each pair of labels.  counts is the flattened
+    nlabels1 by nlabels2 by (nbins_minus_one+1) array.  If auto is True, grid1 and grid2
+    are the same, and only the forward neighbors of each cell are visited, so each pair
+    is counted as both (i,j) and (j,i).
+    """
+    cdef int a, k
+    cdef np.int64_t i, j, icell2
+    cdef int nbins = nbins_minus_one + 1
+    cdef double d
+
+    if auto:
+        #loop over the pairs within the cell, each point is also paired with itself
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            for j in range(i, cell_id_indices1[icell1+1]):
+                d = periodic_square_distance(x1[i], y1[i], z1[i],\
+                                             x1[j], y1[j], z1[j], period)
+                k = bin_index(rbins, d, nbins_minus_one)
+                if k<0: continue
+                counts[(labels1[i]*nlabels2+labels1[j])*nbins+k] += 1
+                if i!=j: counts[(labels1[j]*nlabels2+labels1[i])*nbins+k] += 1
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, auto)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, auto)
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+                d = periodic_square_distance(x1[i], y1[i], z1[i],\
+                                             x2[j], y2[j], z2[j], period)
+                k = bin_index(rbins, d, nbins_minus_one)
+                if k<0: continue
+                counts[(labels1[i]*nlabels2+labels2[j])*nbins+k] += 1
+                if auto: counts[(labels2[j]*nlabels2+labels1[i])*nbins+k] += 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void multipole_npairs_cell(int icell1,
+                                coord_t* x1, coord_t* y1, coord_t* z1,
+                                np.int64_t* cell_id_indices1,
+                                coord_t* x2, coord_t* y2, coord_t* z2,
+                                np.int64_t* cell_id_indices2,
+                                np.int64_t* num_divs, np.int64_t* num_adjacent,
+                                np.float64_t* s_bins, int nbins_minus_one,
+                                np.int64_t* ells, int nells,
+                                np.float64_t* period, bint auto,
+                                np.float64_t* counts) nogil:
+    """
+    sum the Legendre polynomials of the pairs between the points in cell icell1 of
+    grid1, and the points in the neighboring cells of grid2, see `multipole_binning`.
+    If auto is True, grid1 and grid2 are the same, and only the forward neighbors of
+    each cell are visited.
+    """
+    cdef int a
+    cdef np.int64_t i, j, icell2
+    cdef double d_perp, d_para
+
+    if auto:
+        #loop over the pairs within the cell, each point is also paired with itself
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            for j in range(i, cell_id_indices1[icell1+1]):
+                d_perp = periodic_perp_square_distance(x1[i], y1[i], x1[j], y1[j], period)
+                d_para = periodic_para_square_distance(z1[i], z1[j], period)
+                multipole_binning(counts, s_bins, nbins_minus_one, ells, nells,\
+                                  d_perp, d_para, 1.0 if i==j else 2.0)
+
+    #loop over the neighboring cells
+    for a in range(stencil.stencil_size(num_divs, num_adjacent, auto)):
+        icell2 = stencil.adjacent_cell(icell1, a, num_divs, num_adjacent, auto)
+
+        #loop over points in grid1's cell
+        for i in range(cell_id_indices1[icell1], cell_id_indices1[icell1+1]):
+            #loop over points in grid2's cell
+            for j in range(cell_id_indices2[icell2], cell_id_indices2[icell2+1]):
+                d_perp = periodic_perp_square_distance(x1[i], y1[i], x2[j], y2[j], period)
+                d_para = periodic_para_square_distance(z1[i], z2[j], period)
+                multipole_binning(counts, s_bins, nbins_minus_one, ells, nells,\
+                                  d_perp, d_para, 2.0 if auto else 1.0)
+
+
+@cython.cdivision(True)
+cdef inline void xy_z_bin_pair(np.float64_t x1, np.float64_t y1, np.float64_t z1,
+                               np.float64_t x2, np.float64_t y2, np.float64_t z2,
+                               np.float64_t* rp_bins, int nrp_bins_minus_one,
+                               np.float64_t* pi_bins, int npi_bins_minus_one,
+                               np.float64_t* period, bint s_mu, int n,
+                               np.int_t* counts) nogil:
+    """
+    add n to the bin of a pair of points, binned in the square separations perpendicular
+    and parallel to the line of sight, or in s and mu if s_mu is True.
+    """
+    cdef int k, g
+    cdef int max_k = npi_bins_minus_one+1
+    cdef double d_perp, d_para, s
+
+    #calculate the square distance
+    d_perp = periodic_perp_square_distance(x1, y1, x2, y2, period)
+    d_para = periodic_para_square_distance(z1, z2, period)
+
+    #transform to s and mu
+    if s_mu:
+        s = sqrt(d_perp + d_para)
+        if s!=0: d_para = sqrt(d_para)/s
+        else: d_para = 0.0
+        d_perp = s
+
+    #calculate counts in bins
+    k = bin_index(rp_bins, d_perp, nrp_bins_minus_one)
+    if k<0: return
+    g = bin_index(pi_bins, d_para, npi_bins_minus_one)
+    if g<0: return
+
+    #counts[k,g] += n
+    counts[k*max_k+g] += n
@@ -4,7 +4,10 @@ import os
 import sys
 
 PATH_TO_PKG = os.path.relpath(os.path.dirname(__file__))
-SOURCES = ["cpairs.pyx", "distances.pyx", "pairwise_distances.pyx"]
+SOURCES = ["cpairs.pyx", "distances.pyx", "pairwise_distances.pyx", "parallel_cpairs.pyx",\
+           "dual_tree_cpairs.pyx", "knn_cpairs.pyx"]
+#sources which are compiled with OpenMP
+OPENMP_SOURCES = ["parallel_cpairs.pyx", "knn_cpairs.pyx"]
 THIS_PKG_NAME = '.'.join(__name__.split('.')[:-1])
 
 def get_extensions():
@@ -17,12 +20,19 @@ def get_extensions():
     extra_compile_args = []
     
     extensions = []
-    for name, source in zip(names, sources):
+    for name, source, src in zip(names, sources, SOURCES):
+        if src in OPENMP_SOURCES:
+            compile_args = extra_compile_args + ['-fopenmp']
+            link_args = ['-fopenmp']
+        else:
+            compile_args = extra_compile_args
+            link_args = []
         extensions.append(Extension(name=name,
                           sources=[source],
                           include_dirs=include_dirs,
                           libraries=libraries,
                           language = language,
-                          extra_compile_args=extra_compile_args))
+                          extra_compile_args=compile_args,
+                          extra_link_args=link_args))
 
     return extensions
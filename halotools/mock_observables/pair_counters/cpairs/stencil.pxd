@@ -0,0 +1,72 @@
+"""
+neighboring cells of the cells of a grid, shared by the multi-threaded cython pair
+counters.  The neighbors of a cell are the cells within num_adjacent cells along each
+dimension (see `rect_cuboid_cells.adjacent_cells`).  They are found from their offsets in
+the stencil of neighbors as each cell is visited, so no table of neighbors is stored.
+"""
+
+cimport cython
+cimport numpy as np
+
+cdef inline np.int64_t stencil_width(np.int64_t num_divs, np.int64_t num_adjacent) nogil:
+    """
+    return the number of different neighboring cells along one dimension.  When there are
+    fewer than 2*num_adjacent+1 cells along the dimension, every cell is a neighbor.
+    """
+
+    if 2*num_adjacent+1<=num_divs: return 2*num_adjacent+1
+    else: return num_divs
+
+cdef inline np.int64_t stencil_size(np.int64_t* num_divs, np.int64_t* num_adjacent,
+                                    bint forward) nogil:
+    """
+    return the number of neighbors of each cell, including the cell itself, or the number
+    of forward neighbors of each cell if forward is True.
+    """
+    cdef np.int64_t n = stencil_width(num_divs[0], num_adjacent[0])*\
+                        stencil_width(num_divs[1], num_adjacent[1])*\
+                        stencil_width(num_divs[2], num_adjacent[2])
+
+    if forward: return n//2
+    else: return n
+
+@cython.cdivision(True)
+cdef inline np.int64_t adjacent_cell(np.int64_t icell, np.int64_t a,
+                                     np.int64_t* num_divs, np.int64_t* num_adjacent,
+                                     bint forward) nogil:
+    """
+    return the cellID of neighbor a of cell icell, with the neighbors in lexicographic
+    order of their offsets, or of forward neighbor a if forward is True (see
+    `rect_cuboid_cells.forward_adjacent_cells`), which requires at least
+    2*num_adjacent+1 cells along each dimension.
+    """
+    cdef np.int64_t w[3]
+    cdef np.int64_t s[3]
+    cdef np.int64_t c[3]
+    cdef int d
+    cdef np.int64_t result = 0
+
+    for d in range(3):
+        w[d] = stencil_width(num_divs[d], num_adjacent[d])
+
+    #the forward neighbors follow the cell itself, the middle element of the stencil
+    if forward: a = a + (w[0]*w[1]*w[2])//2 + 1
+
+    #position in the stencil, and the cell
+    s[0] = a//(w[1]*w[2])
+    s[1] = (a//w[2])%w[1]
+    s[2] = a%w[2]
+    c[0] = icell//(num_divs[1]*num_divs[2])
+    c[1] = (icell//num_divs[2])%num_divs[1]
+    c[2] = icell%num_divs[2]
+
+    for d in range(3):
+        if 2*num_adjacent[d]+1<=num_divs[d]:
+            #offsets from -num_adjacent to num_adjacent, wrapped around the box
+            result = result*num_divs[d] +\
+                     (c[d]+s[d]-num_adjacent[d]+num_divs[d])%num_divs[d]
+        else:
+            #every cell along the dimension
+            result = result*num_divs[d] + s[d]
+
+    return result
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+"""
+dual-tree pair counter.
+
+This module contains pair counting functions used to count the number of pairs with
+separations less than or equal to r, with the same interface as the functions in
+`rect_cuboid_pairs`.  Instead of a grid of cells, the samples are sorted into kd-trees,
+and pairs of nodes of the trees are pruned, or counted in bulk, when all of the pairs
+between them fall outside of the bins, or into a single bin.  This is faster than the
+grid for heavily clustered samples, where many points fall into the same cells, and for
+bins spanning a wide range of scales.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+from functools import partial
+from kd_tree import kd_tree
+from cpairs import npairs_dual_tree, xy_z_npairs_dual_tree
+from pair_counter_pool import _get_pool
+from grid_index import _process_data, _process_box
+from rect_cuboid_pairs import _is_auto
+
+
+__all__=['npairs', 'xy_z_npairs']
+__author__=['Duncan Campbell']
+
+
+def npairs(data1, data2, rbins, Lbox=None, period=None, verbose=False, N_threads=1,\
+           leafsize=32):
+    """
+    real-space dual-tree pair counter.
+
+    Count the number of pairs (x1,x2) that can be formed, with x1 drawn from data1 and x2
+    drawn from data2, and where distance(x1, x2) <= rbins[i].
+
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and
+        period.  A `GridIndex` may also be passed.
+
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and
+        period.  A `GridIndex` may also be passed.
+
+    rbins: array_like
+        numpy array of boundaries defining the bins in which pairs are counted.
+
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+
+    verbose: Boolean, optional
+        If True, print out information and progress.
+
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting.  if set to 'max', use all
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be
+        passed, in which case its (persistent) worker processes are used.
+
+    leafsize: int, optional
+        maximum number of points in the leaf nodes of the trees.
+
+    Returns
+    -------
+    N_pairs : array of length len(rbins)
+        number counts of pairs
+
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters.dual_tree_pairs import npairs
+    >>> import numpy as np
+    >>> data = np.random.random((1000,3))
+    >>> rbins = np.logspace(-2,-0.5,10)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> counts = npairs(data, data, rbins, period=period)
+    """
+
+    #process N_threads, returning a (possibly shared) pool of worker processes
+    pool, close_pool = _get_pool(N_threads)
+
+    #process input
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    rbins = np.array(rbins)
+    if np.all(period==np.inf): period=None
+
+    #enforce shape requirements on input
+    if (np.shape(data1)[1]!=3) | (data1.ndim>2):
+        raise ValueError("data1 must be of shape (Npts,3)")
+    if (np.shape(data2)[1]!=3) | (data2.ndim>2):
+        raise ValueError("data2 must be of shape (Npts,3)")
+    if rbins.ndim != 1:
+        raise ValueError("rbins must be a 1D array")
+
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
+    
+    #check to see we dont count pairs more than once
+    if (PBCs==True) & np.any(np.max(rbins)>Lbox/2.0):
+        raise ValueError('cannot count pairs with seperations \
+                          larger than Lbox/2 with PBCs')
+
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2)
+
+    #build trees for data1 and data2
+    tree1 = kd_tree(data1[:,0], data1[:,1], data1[:,2], Lbox, leafsize)
+    if do_auto:
+        tree2 = tree1
+    else:
+        tree2 = kd_tree(data2[:,0], data2[:,1], data2[:,2], Lbox, leafsize)
+
+    #square radial bins to make distance calculation cheaper
+    rbins = rbins**2.0
+
+    #print some information
+    if verbose==True:
+        print("running dual-tree pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("number of nodes = {0} by {1}".format(tree1.num_nodes(),tree2.num_nodes()))
+
+    #pairs of nodes from which the trees are traversed
+    node_pairs = _node_pairs(tree1, tree2, do_auto, pool.N_threads)
+
+    #create a function to call with only one argument
+    engine = partial(_npairs_engine, tree1, tree2, rbins, _tree_period(period, PBCs),\
+                     do_auto)
+
+    #do the pair counting
+    try:
+        counts = np.sum(pool.map(engine,node_pairs),axis=0)
+    finally:
+        if close_pool: pool.close()
+
+    #the engines return the number of pairs in each bin, accumulate these once to get
+    #the cumulative counts
+    counts = np.cumsum(counts)
+
+    return counts
+
+
+def _npairs_engine(tree1, tree2, rbins, period, auto, node_pair):
+    """
+    pair counting engine for npairs function.  This code calls a cython function.
+    """
+
+    node1, node2, weight = node_pair
+
+    return npairs_dual_tree(tree1, tree2, node1, node2, weight, rbins, period, auto)
+
+
+def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=False,\
+                N_threads=1, leafsize=32):
+    """
+    2+1D dual-tree pair counter.
+
+    Count the number of pairs (x1,x2) that can be formed, with x1 drawn from data1 and x2
+    drawn from data2, and where the separation in the x-y plane is <= rp_bins[i], and
+    the separation along the z coordinate is <= pi_bins[j].
+
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and
+        period.  A `GridIndex` may also be passed.
+
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and
+        period.  A `GridIndex` may also be passed.
+
+    rp_bins: array_like
+        numpy array of boundaries defining the radial projected bins in which pairs are
+        counted.
+
+    pi_bins: array_like
+        numpy array of boundaries defining the parallel bins in which pairs are counted.
+
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+
+    verbose: Boolean, optional
+        If True, print out information and progress.
+
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting.  if set to 'max', use all
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be
+        passed, in which case its (persistent) worker processes are used.
+
+    leafsize: int, optional
+        maximum number of points in the leaf nodes of the trees.
+
+    Returns
+    -------
+    N_pairs : ndarray of shape (len(rp_bins),len(pi_bins))
+        number counts of pairs
+    """
+
+    #process N_threads, returning a (possibly shared) pool of worker processes
+    pool, close_pool = _get_pool(N_threads)
+
+    #process input
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    rp_bins = np.array(rp_bins)
+    pi_bins = np.array(pi_bins)
+    if np.all(period==np.inf): period=None
+
+    #enforce shape requirements on input
+    if (np.shape(data1)[1]!=3) | (data1.ndim>2):
+        raise ValueError("data1 must be of shape (Npts,3)")
+    if (np.shape(data2)[1]!=3) | (data2.ndim>2):
+        raise ValueError("data2 must be of shape (Npts,3)")
+    if rp_bins.ndim != 1:
+        raise ValueError("rp_bins must be a 1D array")
+    if pi_bins.ndim != 1:
+        raise ValueError("pi_bins must be a 1D array")
+
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
+    
+    #check to see we dont count pairs more than once
+    if (PBCs==True) & np.any(np.max(rp_bins)>Lbox[0:2]/2.0):
+        raise ValueError('cannot count pairs with seperations \
+                          larger than Lbox/2 with PBCs')
+    if (PBCs==True) & np.any(np.max(pi_bins)>Lbox[2]/2.0):
+        raise ValueError('cannot count pairs with seperations \
+                          larger than Lbox/2 with PBCs')
+
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2)
+
+    #build trees for data1 and data2
+    tree1 = kd_tree(data1[:,0], data1[:,1], data1[:,2], Lbox, leafsize)
+    if do_auto:
+        tree2 = tree1
+    else:
+        tree2 = kd_tree(data2[:,0], data2[:,1], data2[:,2], Lbox, leafsize)
+
+    #square radial bins to make distance calculation cheaper
+    rp_bins = rp_bins**2.0
+    pi_bins = pi_bins**2.0
+
+    #print some information
+    if verbose==True:
+        print("running dual-tree pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("number of nodes = {0} by {1}".format(tree1.num_nodes(),tree2.num_nodes()))
+
+    #pairs of nodes from which the trees are traversed
+    node_pairs = _node_pairs(tree1, tree2, do_auto, pool.N_threads)
+
+    #create a function to call with only one argument
+    engine = partial(_xy_z_npairs_engine, tree1, tree2, rp_bins, pi_bins,\
+                     _tree_period(period, PBCs), do_auto)
+
+    #do the pair counting
+    try:
+        counts = np.sum(pool.map(engine,node_pairs),axis=0)
+    finally:
+        if close_pool: pool.close()
+
+    #the engines return the number of pairs in each bin, accumulate these once to get
+    #the cumulative counts
+    counts = np.cumsum(np.cumsum(counts, axis=0), axis=1)
+
+    return counts
+
+
+def _xy_z_npairs_engine(tree1, tree2, rp_bins, pi_bins, period, auto, node_pair):
+    """
+    pair counting engine for xy_z_npairs function.  This code calls a cython function.
+    """
+
+    node1, node2, weight = node_pair
+
+    return xy_z_npairs_dual_tree(tree1, tree2, node1, node2, weight, rp_bins, pi_bins,\
+                                 period, auto)
+
+
+def _node_pairs(tree1, tree2, auto, N_threads):
+    """
+    return a list of (node1, node2, weight) tuples, such that traversing the trees from
+    each pair of nodes counts every pair of points once.  If N_threads>1, the nodes are
+    split until there are several pairs of nodes per thread, so the work may be spread
+    over the worker processes.
+    """
+
+    node_pairs = [(0, 0, 1)]
+    if N_threads==1: return node_pairs
+
+    while len(node_pairs)<8*N_threads:
+        new_node_pairs = []
+        for node1, node2, weight in node_pairs:
+            leaf1, leaf2 = tree1.is_leaf(node1), tree2.is_leaf(node2)
+            if leaf1 & leaf2:
+                new_node_pairs.append((node1, node2, weight))
+            elif auto & (node1==node2):
+                child1, child2 = tree1.node_children[node1]
+                new_node_pairs += [(child1, child1, weight), (child2, child2, weight),\
+                                   (child1, child2, 2*weight)]
+            else:
+                children1 = [node1] if leaf1 else tree1.node_children[node1]
+                children2 = [node2] if leaf2 else tree2.node_children[node2]
+                new_node_pairs += [(child1, child2, weight)\
+                                   for child1 in children1 for child2 in children2]
+
+        #all nodes are leaves
+        if len(new_node_pairs)==len(node_pairs): break
+        node_pairs = new_node_pairs
+
+    return node_pairs
+
+
+def _tree_period(period, PBCs):
+    """
+    return the period passed to the dual-tree kernels, which is infinite if there are
+    no PBCs.
+    """
+
+    if PBCs==True:
+        return np.asarray(period, dtype=np.float64)
+    else:
+        return np.array([np.inf]*3)
@@ -7,11 +7,14 @@ Cuboid FoF pair search
 from __future__ import print_function, division
 import numpy as np
 from rect_cuboid import *
+from rect_cuboid import _process_cell_size
 from cpairs.pairwise_distances import *
 from time import time
 import sys
 import multiprocessing
 from functools import partial
+from pair_counter_pool import _get_pool
+from grid_index import _process_data, _get_grid, _process_box
 from scipy.sparse import coo_matrix
 
 
@@ -19,7 +22,8 @@ __all__=['fof_pairs', 'xy_z_fof_pairs']
 __author__=['Duncan Campbell']
 
 
-def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_threads=1):
+def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_threads=1,\
+              approx_cell_size=None):
     """
     real-space FoF pair finder.
     
@@ -29,11 +33,13 @@ def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_thre
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     r_max: float
         maximum distance to connect pairs
@@ -51,7 +57,17 @@ def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_thre
     
     N_threads: int, optional
         number of 'threads' to use in the pair counting.  if set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the box is divided into no more than 10 cells along 
+        each dimension.  For dense samples, cells smaller than the maximum separation 
+        (e.g. one half or one third of that size) reduce the number of separations 
+        which are calculated, at the cost of searching more neighboring cells.  If set 
+        to 'auto', the cell size is chosen based on the number of points and the size 
+        of the box and the maximum separation.
     
     Returns
     -------
@@ -59,16 +75,12 @@ def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_thre
         N1 x N2 sparse matrix in COO format containing distances between points.
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #process N_threads, returning a (possibly shared) pool of worker processes
+    pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     if np.all(period==np.inf): period=None
     
     #enforce shape requirements on input
@@ -77,43 +89,9 @@ def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_thre
     if (np.shape(data2)[1]!=3) | (data2.ndim>2):
         raise ValueError("data2 must be of shape (Npts,3)")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a cube")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #check to see we dont count pairs more than once
     if (PBCs==True) & np.any(np.max(r_max)>Lbox/2.0):
@@ -121,17 +99,22 @@ def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_thre
                           larger than Lbox/2 with PBCs')
     
     #choose grid size along each dimension.
-    #too small of a grid size is inefficient.
-    use_max = (Lbox/r_max) > 10
-    cell_size = np.array([np.max(r_max)]*3)
-    cell_size[use_max] = Lbox[use_max]/10.0
-    #cell shouldn't be bigger than the box
-    too_big = (cell_size>Lbox)
-    cell_size[too_big] = Lbox[too_big]
+    search_length = np.array([np.max(r_max)]*3)
+    if approx_cell_size is None:
+        #too small of a grid size is inefficient.
+        use_max = (Lbox/r_max) > 10
+        cell_size = np.array([np.max(r_max)]*3)
+        cell_size[use_max] = Lbox[use_max]/10.0
+        #cell shouldn't be bigger than the box
+        too_big = (cell_size>Lbox)
+        cell_size[too_big] = Lbox[too_big]
+    else:
+        cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                       len(data1), len(data2))
     
     #build grids for data1 and data2
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length)
+    grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length)
     
     #square radial bins to make distance calculation cheaper
     r_max = r_max**2.0
@@ -141,6 +124,7 @@ def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_thre
         print("running for pairs with {0} by {1} points".format(len(data1),len(data2)))
         print("cell size= {0}".format(grid1.dL))
         print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #number of cells
     Ncell1 = np.prod(grid1.num_divs)
@@ -149,10 +133,10 @@ def fof_pairs(data1, data2, r_max, Lbox=None, period=None, verbose=False, N_thre
     engine = partial(_fof_pairs_engine, grid1, grid2, r_max, period, PBCs)
     
     #do the pair counting
-    if N_threads>1:
+    try:
         result = pool.map(engine,range(Ncell1))
-    if N_threads==1:
-        result = map(engine,range(Ncell1))
+    finally:
+        if close_pool: pool.close()
     
     #arrays to store result
     d = np.zeros((0,), dtype='float')
@@ -181,12 +165,15 @@ def _fof_pairs_engine(grid1, grid2, r_max, period, PBCs, icell1):
     i_inds = np.zeros((0,), dtype='int')
     j_inds = np.zeros((0,), dtype='int')
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
     
-    i_min = grid1.slice_array[icell1].start
+    i_min = i_start1
     
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
@@ -197,12 +184,15 @@ def _fof_pairs_engine(grid1, grid2, r_max, period, PBCs, icell1):
     #Loop over each of the (up to) 27 subvolumes neighboring, including the current cell.
     for icell2 in adj_cell_arr:
                 
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
         
-        j_min = grid2.slice_array[icell2].start
+        j_min = i_start2
         
         #use cython functions to do pair counting
         if PBCs==False:
@@ -226,7 +216,7 @@ def _fof_pairs_engine(grid1, grid2, r_max, period, PBCs, icell1):
 
 
 def xy_z_fof_pairs(data1, data2, rp_max, pi_max, Lbox=None, period=None, verbose=False,\
-                   N_threads=1):
+                   N_threads=1, approx_cell_size=None):
     """
     redshift-space FoF pair finder.
     
@@ -236,11 +226,13 @@ def xy_z_fof_pairs(data1, data2, rp_max, pi_max, Lbox=None, period=None, verbose
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     r_max: float
         maximum distance to connect pairs
@@ -258,7 +250,17 @@ def xy_z_fof_pairs(data1, data2, rp_max, pi_max, Lbox=None, period=None, verbose
     
     N_threads: int, optional
         number of 'threads' to use in the pair counting.  if set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the box is divided into no more than 10 cells along 
+        each dimension.  For dense samples, cells smaller than the maximum separation 
+        (e.g. one half or one third of that size) reduce the number of separations 
+        which are calculated, at the cost of searching more neighboring cells.  If set 
+        to 'auto', the cell size is chosen based on the number of points and the size 
+        of the box and the maximum separation.
     
     Returns
     -------
@@ -266,16 +268,12 @@ def xy_z_fof_pairs(data1, data2, rp_max, pi_max, Lbox=None, period=None, verbose
         N1 x N2 sparse matrix in COO format containing distances between points.
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #process N_threads, returning a (possibly shared) pool of worker processes
+    pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     if np.all(period==np.inf): period=None
     
     #enforce shape requirements on input
@@ -284,43 +282,9 @@ def xy_z_fof_pairs(data1, data2, rp_max, pi_max, Lbox=None, period=None, verbose
     if (np.shape(data2)[1]!=3) | (data2.ndim>2):
         raise ValueError("data2 must be of shape (Npts,3)")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a cube")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #check to see we dont count pairs more than once    
     if (PBCs==True) & np.any(rp_max>Lbox[0:2]/2.0):
@@ -331,19 +295,24 @@ def xy_z_fof_pairs(data1, data2, rp_max, pi_max, Lbox=None, period=None, verbose
                           larger than Lbox/2 with PBCs')
     
     #choose grid size along each dimension.
-    #too small of a grid size is inefficient.
-    cell_size = np.zeros((3,))
-    cell_size[0:2] = np.array([rp_max]*2)
-    cell_size[2] = pi_max
-    use_max = (Lbox/cell_size) > 10
-    cell_size[use_max] = Lbox[use_max]/10.0
-    #cells shouldn't be bigger than the box
-    too_big = (cell_size>Lbox)
-    cell_size[too_big] = Lbox[too_big]
+    search_length = np.array([rp_max, rp_max, pi_max])
+    if approx_cell_size is None:
+        #too small of a grid size is inefficient.
+        cell_size = np.zeros((3,))
+        cell_size[0:2] = np.array([rp_max]*2)
+        cell_size[2] = pi_max
+        use_max = (Lbox/cell_size) > 10
+        cell_size[use_max] = Lbox[use_max]/10.0
+        #cells shouldn't be bigger than the box
+        too_big = (cell_size>Lbox)
+        cell_size[too_big] = Lbox[too_big]
+    else:
+        cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                       len(data1), len(data2))
     
     #build grids for data1 and data2
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length)
+    grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length)
     
     #square radial bins to make distance calculation cheaper
     rp_max = rp_max**2.0
@@ -354,6 +323,7 @@ def xy_z_fof_pairs(data1, data2, rp_max, pi_max, Lbox=None, period=None, verbose
         print("running for pairs with {0} by {1} points".format(len(data1),len(data2)))
         print("cell size= {0}".format(grid1.dL))
         print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #number of cells
     Ncell1 = np.prod(grid1.num_divs)
@@ -362,10 +332,10 @@ def xy_z_fof_pairs(data1, data2, rp_max, pi_max, Lbox=None, period=None, verbose
     engine = partial(_xy_z_fof_pairs_engine, grid1, grid2, rp_max, pi_max, period, PBCs)
     
     #do the pair counting
-    if N_threads>1:
+    try:
         result = pool.map(engine,range(Ncell1))
-    if N_threads==1:
-        result = map(engine,range(Ncell1))
+    finally:
+        if close_pool: pool.close()
     
     #arrays to store result
     d_perp = np.zeros((0,), dtype='float')
@@ -397,12 +367,15 @@ def _xy_z_fof_pairs_engine(grid1, grid2, rp_max, pi_max, period, PBCs, icell1):
     i_inds = np.zeros((0,), dtype='int')
     j_inds = np.zeros((0,), dtype='int')
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
     
-    i_min = grid1.slice_array[icell1].start
+    i_min = i_start1
     
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
@@ -413,12 +386,15 @@ def _xy_z_fof_pairs_engine(grid1, grid2, rp_max, pi_max, period, PBCs, icell1):
     #Loop over each of the (up to) 27 subvolumes neighboring, including the current cell.
     for icell2 in adj_cell_arr:
                 
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
         
-        j_min = grid2.slice_array[icell2].start
+        j_min = i_start2
         
         #use cython functions to do pair counting
         if PBCs==False:
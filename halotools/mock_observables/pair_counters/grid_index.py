@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reusable spatial index used by the pair counters.
+
+Every call to a pair counter sorts its input samples into a grid of cells (see
+`rect_cuboid_cells`).  When the same sample is used many times, e.g. a random sample used
+to calculate DR and RR for many different galaxy samples, a `GridIndex` can be created
+once and passed to the pair counters in place of the array of positions.  The grids built
+for an index are stored in a (least recently used) cache keyed on a hash of the
+positions, the box, and the cell size, so each grid is only built once per session.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+import hashlib
+from collections import OrderedDict
+from rect_cuboid import rect_cuboid_cells
+
+
+__all__=['GridIndex', 'clear_grid_cache']
+__author__=['Duncan Campbell']
+
+
+#maximum number of grids kept in the cache
+_MAX_CACHED_GRIDS = 8
+
+#grids built for GridIndex objects, the most recently used grid is last
+_grid_cache = OrderedDict()
+
+
+class GridIndex(object):
+    """
+    spatial index of a sample of points, which may be passed to any of the pair counting
+    functions in place of an array of positions.
+
+    The positions are copied when the index is created, and may not be modified
+    afterwards.  The grids of the sample are built when first needed by a pair counter,
+    and are cached.
+
+    Parameters
+    ----------
+    data: array_like
+        N by 3 numpy array of 3-dimensional positions. Should be between zero and Lbox.
+
+    Lbox: array_like
+        length of cube sides which encloses data, e.g. the period of a simulation box.
+        If only one number is specified, the box is assumed to be a cube.  Pair counters
+        called without Lbox or period use this box.
+
+    cache: bool, optional
+        If True (the default), the grids are stored in the cache shared by all indices,
+        and are re-used by later indices of the same sample.  If False, the grids are
+        only kept by this index, and are freed with it.
+
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import npairs, GridIndex
+    >>> import numpy as np
+    >>> data = np.random.random((100,3))
+    >>> randoms = np.random.random((1000,3))
+    >>> rbins = np.linspace(0.1,0.3,5)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> randoms_index = GridIndex(randoms, Lbox=period)
+    >>> RR = npairs(randoms_index, randoms_index, rbins, period=period)
+    >>> DR = npairs(data, randoms_index, rbins, period=period)
+    """
+
+    def __init__(self, data, Lbox, cache=True):
+
+        data = np.array(data, dtype=np.float64, order='C')
+        if (data.ndim!=2) or (np.shape(data)[1]!=3):
+            raise ValueError("data must be of shape (Npts,3)")
+
+        Lbox = np.array(Lbox, dtype=np.float64)
+        if np.shape(Lbox)==():
+            Lbox = np.array([Lbox]*3)
+        elif np.shape(Lbox)==(1,):
+            Lbox = np.array([Lbox[0]]*3)
+        if np.shape(Lbox)!=(3,):
+            raise ValueError("Lbox must be an array of length 3, or number indicating the \
+                              length of one side of a cube")
+
+        #the hash identifies the sample in the grid cache, so the data must not change
+        data.flags.writeable = False
+        self.data = data
+        self.Lbox = Lbox
+        self.key = hashlib.sha1(data).hexdigest()
+
+        #grids of an index which does not use the shared cache
+        if cache: self._grids = None
+        else: self._grids = {}
+
+    def __len__(self):
+        return len(self.data)
+
+    def grid(self, cell_size, Lbox=None, search_length=None, precision='float64'):
+        """
+        return the grid of the sample, building it only if it is not already cached.
+
+        Parameters
+        ----------
+        cell_size: array_like
+            length 3 array of the approximate cell size along each dimension
+
+        Lbox: array_like, optional
+            length 3 array of the box dimensions.  If None, the Lbox of the index is used.
+
+        search_length: array_like, optional
+            length 3 array of the maximum separation along each dimension between pairs
+            of points that are searched for.  If None, the cell size is used.
+
+        precision: string, optional
+            'float64' (the default) or 'float32', the precision of the coordinates stored
+            in the grid.
+
+        Returns
+        -------
+        grid: rect_cuboid_cells
+        """
+
+        if Lbox is None: Lbox = self.Lbox
+        Lbox = np.asarray(Lbox, dtype=np.float64)
+        cell_size = np.asarray(cell_size, dtype=np.float64)
+        if search_length is None: search_length = cell_size
+        search_length = np.asarray(search_length, dtype=np.float64)
+
+        key = (self.key, tuple(Lbox), tuple(cell_size), tuple(search_length), precision)
+        if self._grids is not None:
+            if key not in self._grids:
+                self._grids[key] = rect_cuboid_cells(self.data[:,0], self.data[:,1],\
+                                                     self.data[:,2], Lbox, cell_size,\
+                                                     search_length, precision)
+            return self._grids[key]
+
+        if key in _grid_cache:
+            grid = _grid_cache.pop(key)
+        else:
+            grid = rect_cuboid_cells(self.data[:,0], self.data[:,1], self.data[:,2],\
+                                     Lbox, cell_size, search_length, precision)
+
+        #move the grid to the end of the cache, and discard the least recently used grids
+        _grid_cache[key] = grid
+        while len(_grid_cache)>_MAX_CACHED_GRIDS:
+            _grid_cache.popitem(last=False)
+
+        return grid
+
+
+def clear_grid_cache():
+    """
+    remove all grids from the cache used by `GridIndex` objects, freeing their memory.
+    """
+
+    _grid_cache.clear()
+
+
+def _process_data(data):
+    """
+    process a data argument passed to a pair counter, which may either be an array of
+    positions, or a `GridIndex`.
+
+    Returns
+    -------
+    data: numpy.array
+        array of positions
+
+    index: GridIndex
+        the index passed to the pair counter, or None if an array of positions was passed.
+    """
+
+    if isinstance(data, GridIndex):
+        return data.data, data
+    else:
+        return np.array(data), None
+
+
+def _index_Lbox(index1, index2):
+    """
+    return the Lbox of the indices passed to a pair counter, or None if neither sample
+    is a `GridIndex`.
+    """
+
+    if index1 is not None: return index1.Lbox
+    elif index2 is not None: return index2.Lbox
+    else: return None
+
+
+def _get_grid(data, index, Lbox, cell_size, search_length=None, precision='float64'):
+    """
+    return the grid of a sample, using the cached grid of index if it is not None.
+    """
+
+    if index is not None:
+        return index.grid(cell_size, Lbox, search_length, precision)
+    else:
+        return rect_cuboid_cells(data[:,0], data[:,1], data[:,2], Lbox, cell_size,\
+                                 search_length, precision)
+
+
+def _enclose_in_box(data1, data2):
+    """
+    build axis aligned box which encloses all points.
+    shift points so cube's origin is at 0,0,0.
+    """
+
+    xmin = np.min([np.min(data1[:,0]),np.min(data2[:,0])])
+    ymin = np.min([np.min(data1[:,1]),np.min(data2[:,1])])
+    zmin = np.min([np.min(data1[:,2]),np.min(data2[:,2])])
+    xmax = np.max([np.max(data1[:,0]),np.max(data2[:,0])])
+    ymax = np.max([np.max(data1[:,1]),np.max(data2[:,1])])
+    zmax = np.max([np.max(data1[:,2]),np.max(data2[:,2])])
+
+    xyzmin = np.min([xmin,ymin,zmin])
+    xyzmax = np.min([xmax,ymax,zmax])-xyzmin
+
+    data1 = data1-xyzmin
+    data2 = data2-xyzmin
+
+    Lbox = np.array([xyzmax]*3)
+
+    return data1, data2, Lbox
+
+
+def _process_box(data1, data2, Lbox, period, index1=None, index2=None):
+    """
+    process the Lbox and period parameters passed to a pair counter.
+
+    If neither Lbox nor period is given, the box of a `GridIndex` passed as index1 or
+    index2 is used, or else a box is built which encloses all points and the points are
+    shifted into it.  If data1 is None, the box is left undefined instead.
+
+    Returns
+    -------
+    data1, data2: numpy.arrays
+        the positions, shifted if a box was built around them
+
+    Lbox: numpy.array
+        length 3 array of the lengths of the box, or None
+
+    period: numpy.array
+        length 3 array of the periods, or None
+
+    PBCs: bool
+        True if periodic boundary conditions are used
+    """
+
+    #process Lbox parameter, using the box of a GridIndex if one was passed
+    if (Lbox is None) & (period is None): Lbox = _index_Lbox(index1, index2)
+    if (Lbox is None) & (period is None):
+        if data1 is not None:
+            data1, data2, Lbox = _enclose_in_box(data1, data2)
+    elif (Lbox is None) & (period is True):
+        raise ValueError("If period is set to True, Lbox must be defined.")
+    elif (Lbox is None) & (period is not None):
+        Lbox = period
+    elif np.shape(Lbox)==():
+        Lbox = np.array([Lbox]*3)
+    elif np.shape(Lbox)==(1,):
+        Lbox = np.array([Lbox[0]]*3)
+    else: Lbox = np.array(Lbox)
+    if (Lbox is not None) and (np.shape(Lbox) != (3,)):
+        raise ValueError("Lbox must be an array of length 3, or number indicating the \
+                          length of one side of a cube")
+
+    #are we working with periodic boundary conditions (PBCs)?
+    if period is None:
+        PBCs = False
+    elif np.shape(period) == (3,):
+        PBCs = True
+        if np.any(period!=Lbox):
+            raise ValueError("period must == Lbox")
+    elif np.shape(period) == (1,):
+        period = np.array([period[0]]*3)
+        PBCs = True
+        if np.any(period!=Lbox):
+            raise ValueError("period must == Lbox")
+    elif isinstance(period, (int, long, float, complex)):
+        period = np.array([period]*3)
+        PBCs = True
+        if np.any(period!=Lbox):
+            raise ValueError("period must == Lbox")
+    elif period == True:
+        PBCs = True
+        period = Lbox
+    else: PBCs=True
+
+    return data1, data2, Lbox, period, PBCs
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+kd-tree object used by the dual-tree pair counters.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+
+__all__=['kd_tree']
+__author__ = ['Duncan Campbell']
+
+class kd_tree(object):
+
+    def __init__(self, x, y, z, Lbox, leafsize=32):
+        """
+        Build the tree.
+
+        Parameters
+        ----------
+        x, y, z : arrays
+            Length-Npts arrays containing the spatial position of the Npts points.
+
+        Lbox : array_like
+            length 3 array of the box dimensions
+
+        leafsize : int, optional
+            maximum number of points in the leaf nodes of the tree
+
+        Notes
+        -----
+        Each node of the tree holds a contiguous range of the sorted x, y, and z arrays,
+        the points node_start[i] to node_end[i], and the axis aligned box which bounds
+        these points, node_lower[i] to node_upper[i].  Nodes with more than leafsize
+        points are split at the median of the dimension along which their bounding box
+        is largest.  The children of node *i* are node_children[i,0] and
+        node_children[i,1], or -1 if node *i* is a leaf.  Node 0 is the root of the tree.
+        """
+
+        leafsize = int(leafsize)
+        if leafsize<1:
+            raise ValueError("leafsize must be >=1")
+
+        self.Lbox = np.asarray(Lbox).astype(np.float)
+        self.leafsize = leafsize
+
+        #build tree
+        idx_sorted, nodes = self.compute_tree_structure(x, y, z)
+        self.x = np.ascontiguousarray(x[idx_sorted],dtype=np.float64)
+        self.y = np.ascontiguousarray(y[idx_sorted],dtype=np.float64)
+        self.z = np.ascontiguousarray(z[idx_sorted],dtype=np.float64)
+        self.idx_sorted = idx_sorted
+        self.node_start, self.node_end, self.node_lower, self.node_upper,\
+            self.node_children = nodes
+
+    def compute_tree_structure(self, x, y, z):
+        """
+        Method recursively splits the points at the median, returning the order of the
+        sorted points, and the arrays describing the nodes of the tree.
+
+        Parameters
+        ----------
+        x, y, z : arrays
+            Length-Npts arrays containing the spatial position of the Npts points.
+
+        Returns
+        -------
+        idx_sorted : array
+            Array of indices that sort the points such that the points in each node are
+            contiguous.
+
+        nodes : tuple
+            node_start, node_end, node_lower, node_upper, and node_children arrays, see
+            `__init__`.
+        """
+
+        pos = np.vstack((x, y, z)).T.astype(np.float64)
+        Npts = len(pos)
+        idx_sorted = np.arange(Npts)
+
+        #nodes are stored in the order in which they are created
+        node_start = [0]
+        node_end = [Npts]
+        node_children = [[-1,-1]]
+        lower = [np.min(pos, axis=0) if Npts>0 else np.zeros(3)]
+        upper = [np.max(pos, axis=0) if Npts>0 else np.zeros(3)]
+
+        inode = 0
+        while inode<len(node_start):
+            i_start, i_end = node_start[inode], node_end[inode]
+            if i_end-i_start>self.leafsize:
+                #split the node along the dimension of its largest extent
+                dim = np.argmax(upper[inode]-lower[inode])
+                mid = (i_start+i_end)//2
+                inds = idx_sorted[i_start:i_end]
+                order = np.argpartition(pos[inds,dim], mid-i_start)
+                idx_sorted[i_start:i_end] = inds[order]
+
+                for j_start, j_end in [(i_start, mid), (mid, i_end)]:
+                    node_children[inode][j_start!=i_start] = len(node_start)
+                    node_start.append(j_start)
+                    node_end.append(j_end)
+                    node_children.append([-1,-1])
+                    node_pos = pos[idx_sorted[j_start:j_end]]
+                    lower.append(np.min(node_pos, axis=0))
+                    upper.append(np.max(node_pos, axis=0))
+            inode += 1
+
+        nodes = (np.array(node_start, dtype=np.int64),\
+                 np.array(node_end, dtype=np.int64),\
+                 np.ascontiguousarray(lower, dtype=np.float64),\
+                 np.ascontiguousarray(upper, dtype=np.float64),\
+                 np.ascontiguousarray(node_children, dtype=np.int64))
+
+        return idx_sorted, nodes
+
+    def num_nodes(self):
+        """
+        Return the number of nodes in the tree.
+        """
+
+        return len(self.node_start)
+
+    def is_leaf(self, inode):
+        """
+        Return True if node inode has no children.
+        """
+
+        return self.node_children[inode,0]<0
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cuboid k-nearest neighbor search
+"""
+
+from __future__ import print_function, division
+import numpy as np
+from rect_cuboid import *
+from rect_cuboid import _process_cell_size, _process_precision
+from cpairs.knn_cpairs import *
+from functools import partial
+from pair_counter_pool import _get_pool, _get_num_threads, _process_backend
+from grid_index import _process_data, _get_grid, _process_box
+from rect_cuboid_pairs import _threads_period
+
+
+__all__=['nearest_neighbors', 'xy_z_nearest_neighbors']
+__author__=['Duncan Campbell']
+
+
+def nearest_neighbors(data1, data2, k, Lbox=None, period=None, verbose=False,\
+                      N_threads=1, approx_cell_size=None, backend='processes',\
+                      precision='float64'):
+    """
+    real-space k-nearest neighbor search.
+
+    For each point in data1, find the k nearest points in data2.  The points are sorted
+    into the same grids used by the pair counters, and the neighbors of each point are
+    searched for in shells of cells of increasing size around it, until the k-th
+    nearest neighbor is closer than any cell which has not been searched.  If data1 and
+    data2 are the same sample, the nearest neighbor of each point is itself.
+
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and
+        period.  A `GridIndex` may also be passed, in which case its cached grids
+        are used.
+
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and
+        period.  A `GridIndex` may also be passed, in which case its cached grids
+        are used.
+
+    k: int
+        number of nearest neighbors to find for each point
+
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+
+    verbose: Boolean, optional
+        If True, print out information and progress.
+
+    N_threads: int, optional
+        number of 'threads' to use in the search.  if set to 'max', use all available
+        cores.  N_threads=1 is the default.  A `PairCounterPool` may also be passed, in
+        which case its (persistent) worker processes are used.
+
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find neighbors, along each
+        dimension.  By default, the cells are the size of the cube which contains k
+        points of data2 on average.  If 'auto', these cells are refined by the factor
+        which minimizes a simple model of the cost of the search.
+
+    backend: string, optional
+        If 'processes' (the default), blocks of the cells of data1 are searched by a
+        pool of N_threads worker processes.  If 'threads', the cells are searched with
+        N_threads OpenMP threads, which avoids starting processes and copying the grids
+        to them.
+
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates
+        of the points are stored in the grids.  The separations between points are
+        always calculated in double precision.
+
+    Returns
+    -------
+    distances : numpy.array
+        N1 by k array of the distances to the k nearest neighbors of each point in data1,
+        in increasing order.  If data2 has fewer than k points, the missing distances
+        are infinite.
+
+    indices : numpy.array
+        N1 by k array of the indices in data2 of the k nearest neighbors of each point
+        in data1.  The indices of missing neighbors are -1.
+
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import nearest_neighbors
+    >>> import numpy as np
+    >>> data1 = np.random.random((100,3))
+    >>> data2 = np.random.random((1000,3))
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> distances, indices = nearest_neighbors(data1, data2, 5, period=period)
+    """
+
+    return _nearest_neighbors(data1, data2, k, False, np.inf, Lbox, period, verbose,\
+                              N_threads, approx_cell_size, backend, precision)
+
+
+def xy_z_nearest_neighbors(data1, data2, k, pi_max=None, Lbox=None, period=None,\
+                           verbose=False, N_threads=1, approx_cell_size=None,\
+                           backend='processes', precision='float64'):
+    """
+    projected k-nearest neighbor search.
+
+    For each point in data1, find the k points in data2 which are nearest in the x-y
+    plane, out of the points with separations along the z coordinate (the line of
+    sight) <= pi_max.  See `nearest_neighbors`.
+
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and
+        period.  A `GridIndex` may also be passed, in which case its cached grids
+        are used.
+
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and
+        period.  A `GridIndex` may also be passed, in which case its cached grids
+        are used.
+
+    k: int
+        number of nearest neighbors to find for each point
+
+    pi_max: float, optional
+        maximum separation along the z coordinate of neighbors.  If None, the
+        separation along the z coordinate is not limited.
+
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+
+    verbose: Boolean, optional
+        If True, print out information and progress.
+
+    N_threads: int, optional
+        number of 'threads' to use in the search, see `nearest_neighbors`.
+
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find neighbors, along each
+        dimension.  By default, the cells in the x-y plane are the size of the cylinder
+        of length 2*pi_max which contains k points of data2 on average.
+
+    backend: string, optional
+        'processes' (the default) or 'threads', see `nearest_neighbors`.
+
+    precision: string, optional
+        'float64' (the default) or 'float32', see `nearest_neighbors`.
+
+    Returns
+    -------
+    distances : numpy.array
+        N1 by k array of the projected distances to the k nearest neighbors of each
+        point in data1, in increasing order.  If fewer than k neighbors are within
+        pi_max, the missing distances are infinite.
+
+    indices : numpy.array
+        N1 by k array of the indices in data2 of the k nearest neighbors of each point
+        in data1.  The indices of missing neighbors are -1.
+    """
+
+    if pi_max is None: pi_max = np.inf
+    if not pi_max>0.0:
+        raise ValueError("pi_max must be a positive number")
+
+    return _nearest_neighbors(data1, data2, k, True, pi_max, Lbox, period, verbose,\
+                              N_threads, approx_cell_size, backend, precision)
+
+
+def _nearest_neighbors(data1, data2, k, xy_z, pi_max, Lbox, period, verbose, N_threads,\
+                       approx_cell_size, backend, precision):
+    """
+    find the k nearest neighbors for `nearest_neighbors` (xy_z=False) and
+    `xy_z_nearest_neighbors` (xy_z=True).
+    """
+
+    _process_precision(precision)
+
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
+
+    #process input
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    if np.all(period==np.inf): period=None
+
+    #enforce shape requirements on input
+    if (np.shape(data1)[1]!=3) | (data1.ndim>2):
+        raise ValueError("data1 must be of shape (Npts,3)")
+    if (np.shape(data2)[1]!=3) | (data2.ndim>2):
+        raise ValueError("data2 must be of shape (Npts,3)")
+    if (int(k)!=k) or (k<1):
+        raise ValueError("k must be a positive integer")
+    k = int(k)
+
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
+    Lbox = Lbox.astype(np.float64)
+
+    #by default, choose the cell size so that the cells around a point contain about k
+    #points of data2
+    search_length = _knn_search_length(k, len(data2), Lbox, xy_z, pi_max)
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+
+    #build grids for data1 and data2
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, None, precision)
+    grid2 = _get_grid(data2, index2, Lbox, cell_size, None, precision)
+
+    #print some information
+    if verbose==True:
+        print("running nearest neighbors with {0} by {1} points".format(len(data1),\
+                                                                      len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+
+    #number of cells
+    Ncell1 = np.prod(grid1.num_divs)
+
+    #create a function to call with only a block of cells
+    engine = partial(_nearest_neighbors_engine, grid1, grid2, k, xy_z, pi_max,\
+                     _threads_period(period, PBCs))
+
+    #do the search, the neighbors are in the (sorted) order of the points in grid1
+    if backend=='threads':
+        dists, inds = engine((0, Ncell1), N_threads=N_threads)
+    else:
+        #split the cells into blocks, several for each process to balance the load
+        N_blocks = min(Ncell1, 4*pool.N_threads)
+        edges = np.linspace(0, Ncell1, N_blocks+1).astype(int)
+        try:
+            result = pool.map(engine, zip(edges[:-1], edges[1:]))
+        finally:
+            if close_pool: pool.close()
+        dists = np.vstack([r[0] for r in result])
+        inds = np.vstack([r[1] for r in result])
+
+    #return the neighbors in the order of the points in data1, with the indices of the
+    #points in data2
+    distances = np.empty_like(dists)
+    distances[grid1.idx_sorted] = np.sqrt(dists)
+    indices = np.empty_like(inds)
+    indices[grid1.idx_sorted] = np.where(inds>=0, grid2.idx_sorted[inds], -1)
+
+    return distances, indices
+
+
+def _nearest_neighbors_engine(grid1, grid2, k, xy_z, pi_max, period, cells, N_threads=1):
+    """
+    search engine for the nearest neighbor functions.  Return the square distances and
+    sorted indices of the neighbors of the points in the block of cells,
+    cells[0] to cells[1]-1, of grid1.  This code calls a cython function.
+    """
+
+    icell_start, icell_end = cells
+
+    return knn_threads(grid1.x, grid1.y, grid1.z, grid1.cell_id_indices,\
+                       grid2.x, grid2.y, grid2.z, grid2.cell_id_indices,\
+                       grid2.cell_lower, grid2.cell_upper,\
+                       grid1.num_divs.astype(np.int64), grid1.dL.astype(np.float64),\
+                       period, k, xy_z, pi_max, icell_start, icell_end, N_threads)
+
+
+def _knn_search_length(k, N2, Lbox, xy_z, pi_max):
+    """
+    return the typical distance to the k-th nearest neighbor along each dimension, the
+    size of the region which contains k points of data2 on average.
+    """
+
+    N2 = max(N2, 1)
+    if xy_z:
+        #cylinders of length 2*pi_max
+        length = min(2.0*pi_max, Lbox[2])
+        area = k*np.prod(Lbox)/(N2*length)
+        search_length = np.array([np.sqrt(area)]*2+[min(pi_max, Lbox[2])])
+    else:
+        search_length = np.array([(k*np.prod(Lbox)/N2)**(1.0/3.0)]*3)
+
+    return np.minimum(search_length, Lbox)
+
@@ -15,7 +15,7 @@ from objective_weights cimport *
 
 
 __author__ = ['Duncan Campbell']
-__all__ = ['obj_wnpairs_no_pbc', 'obj_wnpairs_pbc']
+__all__ = ['obj_wnpairs_no_pbc', 'obj_wnpairs_pbc', 'obj_wnpairs_columns']
 
 
 @cython.boundscheck(False)
@@ -191,6 +191,70 @@ def obj_wnpairs_pbc(np.ndarray[np.float64_t, ndim=1] x_icell1,
     return counts
 
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def obj_wnpairs_columns(np.ndarray[np.float64_t, ndim=1] x_icell1,
+                        np.ndarray[np.float64_t, ndim=1] y_icell1,
+                        np.ndarray[np.float64_t, ndim=1] z_icell1,
+                        np.ndarray[np.float64_t, ndim=1] x_icell2,
+                        np.ndarray[np.float64_t, ndim=1] y_icell2,
+                        np.ndarray[np.float64_t, ndim=1] z_icell2,
+                        np.ndarray[np.float64_t, ndim=2] w_icell1,
+                        np.ndarray[np.float64_t, ndim=2] w_icell2,
+                        np.ndarray[np.float64_t, ndim=2] r_icell1,
+                        np.ndarray[np.float64_t, ndim=2] r_icell2,
+                        np.ndarray[np.float64_t, ndim=1] rbins,
+                        np.ndarray[np.float64_t, ndim=1] period,
+                        np.ndarray[np.int64_t, ndim=1] weight_func_ids):
+    """
+    weighted real-space pair counter for several columns of weights at once.
+    The weights and auxiliary weights are N by n_weights arrays, and column l is 
+    weighted by the weighting function weight_func_ids[l].  period is infinite without 
+    PBCs.
+    
+    Unlike the other functions in this module, the weighted number of pairs in each 
+    bin, i.e. with rbins[i-1] < d <= rbins[i], is returned for each column, as an 
+    n_weights by len(rbins) array.  The cumulative counts are calculated by the calling 
+    function.
+    """
+    
+    #c definitions
+    cdef int nbins = len(rbins)
+    cdef int nweights = len(weight_func_ids)
+    cdef np.ndarray[np.float64_t, ndim=2] counts =\
+        np.zeros((nweights, nbins), dtype=np.float64)
+    cdef double d
+    cdef int i, j, k, l
+    cdef int Ni = len(x_icell1)
+    cdef int Nj = len(x_icell2)
+    
+    #loop over points in grid1's cell
+    for i in range(0,Ni):
+                
+        #loop over points in grid2's cell
+        for j in range(0,Nj):
+                    
+            #calculate the square distance
+            d = periodic_square_distance(x_icell1[i],y_icell1[i],z_icell1[i],\
+                                         x_icell2[j],y_icell2[j],z_icell2[j],\
+                                         <np.float64_t*>period.data)
+            
+            #find the bin once for all the weights, rbins[k-1] < d <= rbins[k]
+            if d>rbins[nbins-1]: continue
+            k = nbins-1
+            while (k>0) and (d<=rbins[k-1]):
+                k=k-1
+            
+            #calculate counts in the bin
+            for l in range(0,nweights):
+                counts[l,k] += objective_weight(weight_func_ids[l],\
+                                                w_icell1[i,l], w_icell2[j,l],\
+                                                r_icell1[i,l], r_icell2[j,l])
+    
+    return counts
+
+
 cdef inline double periodic_square_distance(np.float64_t x1,\
                                             np.float64_t y1,\
                                             np.float64_t z1,\
@@ -228,6 +292,25 @@ cdef inline double square_distance(np.float64_t x1, np.float64_t y1, np.float64_
     return dx*dx+dy*dy+dz*dz
 
 
+cdef inline double objective_weight(np.int64_t weight_func_id,\
+                                    np.float64_t w1, np.float64_t w2,\
+                                    np.float64_t r1, np.float64_t r2):
+    """
+    return the weight of a pair given by the weighting function with ID weight_func_id
+    """
+    
+    if weight_func_id==1: return mweights(w1,w2,r1,r2)
+    elif weight_func_id==2: return sweights(w1,w2,r1,r2)
+    elif weight_func_id==3: return eqweights(w1,w2,r1,r2)
+    elif weight_func_id==4: return gweights(w1,w2,r1,r2)
+    elif weight_func_id==5: return lweights(w1,w2,r1,r2)
+    elif weight_func_id==6: return tgweights(w1,w2,r1,r2)
+    elif weight_func_id==7: return tlweights(w1,w2,r1,r2)
+    elif weight_func_id==8: return tweights(w1,w2,r1,r2)
+    elif weight_func_id==9: return exweights(w1,w2,r1,r2)
+    else: return 0.0
+
+
 cdef inline radial_wbinning_0(np.float64_t* counts, np.float64_t* bins,\
                              np.float64_t d, np.int_t k,\
                              np.float64_t w1, np.float64_t w2,
@@ -12,11 +12,14 @@ The weighting is done using special user specified objective weighting functions
 from __future__ import print_function, division
 import numpy as np
 from rect_cuboid import *
+from rect_cuboid import _process_cell_size
 from objective_cpairs import *
 from time import time
 import sys
 import multiprocessing
 from functools import partial
+from pair_counter_pool import _get_pool
+from grid_index import _process_data, _get_grid, _process_box
 
 
 __all__=['obj_wnpairs']
@@ -25,7 +28,8 @@ __author__=['Duncan Campbell']
 
 def obj_wnpairs(data1, data2, rbins, Lbox=None, period=None,\
                 weights1=None, weights2=None, aux1=None, aux2=None,\
-                wfunc=0, verbose=False, N_threads=1):
+                wfunc=0, verbose=False, N_threads=1,\
+                approx_cell_size=None):
     """
     weighted real-space pair counter.
     
@@ -37,11 +41,13 @@ def obj_wnpairs(data1, data2, rbins, Lbox=None, period=None,\
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data1.ndim==2.
+        period. This cython implementation requires data1.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data2.ndim==2.
+        period. This cython implementation requires data2.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
             
     rbins: array_like
         numpy array of boundaries defining the bins in which pairs are counted. 
@@ -55,51 +61,64 @@ def obj_wnpairs(data1, data2, rbins, Lbox=None, period=None,\
         If none, PBCs are set to infinity.  If True, period is set to be Lbox
     
     weights1: array_like, optional
-        length N1 array containing weights used for weighted pair counts
+        length N1 array containing weights used for weighted pair counts.  An N1 by 
+        n_weights array may also be passed, in which case the pairs are counted with 
+        each column of weights in a single pass, e.g. for several marks.
         
     weights2: array_like, optional
-        length N2 array containing weights used for weighted pair counts.
+        length N2 array containing weights used for weighted pair counts.  An N2 by 
+        n_weights array may also be passed.
     
     aux1: array_like, optional
-        length N1 array containing auxiliary weights used for weighted pair counts
+        length N1 array containing auxiliary weights used for weighted pair counts.  An 
+        N1 by n_weights array may also be passed.
         
     aux2: array_like, optional
-        length N2 array containing auxiliary weights used for weighted pair counts.
+        length N2 array containing auxiliary weights used for weighted pair counts.  An 
+        N2 by n_weights array may also be passed.
     
     wfunc: int, optional
-        weighting function ID.
+        weighting function ID.  A list of n_weights IDs may also be passed, in which 
+        case each column of weights is counted with its own weighting function.  1D 
+        weights (or auxiliary weights) are used with each column of the others.
     
     verbose: Boolean, optional
         If True, print out information and progress.
     
     N_threads: int, optional
         number of 'threads' to use in the pair counting.  if set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the cells are the size of the maximum separation 
+        counted.  For dense samples, smaller cells (e.g. one half or one third of that 
+        size) reduce the number of separations which are calculated, at the cost of 
+        searching more neighboring cells.  If set to 'auto', the cell size is chosen 
+        based on the number of points and the size of the box and the bins.
         
     Returns
     -------
     N_pairs : array of length len(rbins)
-        number counts of pairs
+        number counts of pairs.  If several columns of weights, or a list of weighting 
+        functions, are passed, an n_weights by len(rbins) array of the counts with each 
+        column.
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #process N_threads, returning a (possibly shared) pool of worker processes
+    pool, close_pool = _get_pool(N_threads)
     
-    if type(wfunc) is not int:
-        raise ValueError("wfunc ID must be an integer")
-    if (wfunc<0 | wfunc>9):
-        raise ValueError("wfunc ID does not exist.  Availabel wfunc are:", list_weighting_functions())
+    #are the pairs counted with several columns of weights at once?
+    columns = isinstance(wfunc, (list, tuple, np.ndarray))
+    wfunc = _process_wfunc(wfunc)
     
     if verbose==True:
         print("Using wfunc: {0}".format(wfunc))
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     rbins = np.array(rbins)
     if np.all(period==np.inf): period=None
     
@@ -111,43 +130,9 @@ def obj_wnpairs(data1, data2, rbins, Lbox=None, period=None,\
     if rbins.ndim != 1:
         raise ValueError("rbins must be a 1D array")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a cube")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #Process weights1 entry and check for consistency.
     if weights1 is None:
@@ -179,19 +164,45 @@ def obj_wnpairs(data1, data2, rbins, Lbox=None, period=None,\
         if np.shape(aux2)[0] != np.shape(data2)[0]:
             raise ValueError("aux2 should have same len as data2")
     
+    #the number of columns of weights, each of which is counted with its weighting 
+    #function.  1D weights are used with each column.
+    columns = columns | np.any([np.ndim(w)>1 for w in [weights1, weights2, aux1, aux2]])
+    if columns:
+        shapes = [np.shape(w)[1] for w in [weights1, weights2, aux1, aux2] if w.ndim==2]
+        n_weights = max(shapes+[len(wfunc)])
+        if len(wfunc)==1: wfunc = np.repeat(wfunc, n_weights)
+        if len(wfunc)!=n_weights:
+            raise ValueError("the number of wfunc IDs must match the number of columns "
+                             "of weights")
+        weights1, weights2, aux1, aux2 = [_weight_columns(w, n_weights) for w in\
+                                          [weights1, weights2, aux1, aux2]]
+    else:
+        wfunc = wfunc[0]
+    
     #check to see we dont count pairs more than once
     if (PBCs==True) & np.any(np.max(rbins)>Lbox/2.0):
         raise ValueError('cannot count pairs with seperations \
                           larger than Lbox/2 with PBCs')
     
     #build grids for data1 and data2
-    cell_size = np.array([np.max(rbins)]*3)
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    search_length = np.array([np.max(rbins)]*3)
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length)
+    grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #sort the weights arrays
     weights1 = weights1[grid1.idx_sorted]
     weights2 = weights2[grid2.idx_sorted]
+    aux1 = aux1[grid1.idx_sorted]
+    aux2 = aux2[grid2.idx_sorted]
     
     #square radial bins to make distance calculation cheaper
     rbins = rbins**2.0
@@ -200,13 +211,23 @@ def obj_wnpairs(data1, data2, rbins, Lbox=None, period=None,\
     Ncell1 = np.prod(grid1.num_divs)
     
     #create a function to call with only one argument
-    engine = partial(_wnpairs_engine, grid1, grid2, weights1, weights2, aux1, aux2, rbins, period, PBCs, wfunc)
+    if columns:
+        if PBCs==False: period = np.array([np.inf]*3)
+        engine = partial(_wnpairs_columns_engine, grid1, grid2, weights1, weights2,\
+                         aux1, aux2, rbins, period, wfunc)
+    else:
+        engine = partial(_wnpairs_engine, grid1, grid2, weights1, weights2, aux1, aux2, rbins, period, PBCs, wfunc)
     
     #do the pair counting
-    if N_threads>1:
+    try:
         counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
-    if N_threads==1:
-        counts = np.sum(map(engine,range(Ncell1)),axis=0)
+    finally:
+        if close_pool: pool.close()
+    
+    #the columns engine returns the weighted number of pairs in each bin, accumulate 
+    #these once to get the cumulative counts
+    if columns:
+        counts = np.cumsum(counts, axis=-1)
     
     return counts
 
@@ -215,16 +236,19 @@ def _wnpairs_engine(grid1, grid2, weights1, weights2, aux1, aux2, rbins, period,
     
     counts = np.zeros(len(rbins))
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
         
     #extract the weights in the cell
-    w_icell1 = weights1[grid1.slice_array[icell1]]
+    w_icell1 = weights1[i_start1:i_end1]
     
     #extract the weights in the cell
-    r_icell1 = aux1[grid1.slice_array[icell1]]
+    r_icell1 = aux1[i_start1:i_end1]
         
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
@@ -239,16 +263,19 @@ def _wnpairs_engine(grid1, grid2, weights1, weights2, aux1, aux2, rbins, period,
                                                  grid2.num_divs[1],\
                                                  grid2.num_divs[2]))
         
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
         
         #extract the weights in the cell
-        w_icell2 = weights2[grid2.slice_array[icell2]]
+        w_icell2 = weights2[i_start2:i_end2]
         
         #extract the weights in the cell
-        r_icell2 = aux2[grid2.slice_array[icell2]]
+        r_icell2 = aux2[i_start2:i_end2]
         
         #use cython functions to do pair counting
         if PBCs==False:
@@ -264,6 +291,78 @@ def _wnpairs_engine(grid1, grid2, weights1, weights2, aux1, aux2, rbins, period,
     return counts
 
 
+def _wnpairs_columns_engine(grid1, grid2, weights1, weights2, aux1, aux2, rbins, period,\
+                            wfunc, icell1):
+    """
+    pair counting engine for obj_wnpairs function with several columns of weights.  This 
+    code calls a cython function.
+    """
+    
+    counts = np.zeros((len(wfunc), len(rbins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points, weights, and auxiliary weights in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    w_icell1 = weights1[i_start1:i_end1]
+    r_icell1 = aux1[i_start1:i_end1]
+    
+    #get the list of neighboring cells
+    adj_cell_arr = grid1.adjacent_cells(icell1)
+    
+    #Loop over each of the neighboring subvolumes, including the current cell.
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += obj_wnpairs_columns(x_icell1, y_icell1, z_icell1,\
+                                      grid2.x[i_start2:i_end2],\
+                                      grid2.y[i_start2:i_end2],\
+                                      grid2.z[i_start2:i_end2],\
+                                      w_icell1, weights2[i_start2:i_end2],\
+                                      r_icell1, aux2[i_start2:i_end2],\
+                                      rbins, period, wfunc)
+    return counts
+
+
+def _process_wfunc(wfunc):
+    """
+    check the weighting function ID(s), returning them as a 1D array.
+    """
+    
+    wfunc = np.atleast_1d(wfunc)
+    if (wfunc.ndim!=1) | (len(wfunc)==0):
+        raise ValueError("wfunc must be an integer, or a list of integers")
+    if not np.issubdtype(wfunc.dtype, np.integer):
+        raise ValueError("wfunc ID must be an integer")
+    if np.any((wfunc<0) | (wfunc>9)):
+        list_weighting_functions()
+        raise ValueError("wfunc ID does not exist, the available wfunc are listed above")
+    
+    return wfunc.astype(np.int64)
+
+
+def _weight_columns(weights, n_weights):
+    """
+    return (auxiliary) weights as an N by n_weights array.  1D weights are used with 
+    each column.
+    """
+    
+    if weights.ndim==1:
+        weights = np.repeat(weights[:,np.newaxis], n_weights, axis=1)
+    elif (weights.ndim>2) | (np.shape(weights)[1]!=n_weights):
+        raise ValueError("weights must be 1D, or 2D arrays with n_weights columns")
+    
+    return np.ascontiguousarray(weights, dtype=np.float64)
+
+
 def list_weighting_functions():
     """
     Print the available weighting functions for this module.
@@ -282,6 +381,3 @@ def list_weighting_functions():
     print("func ID 7: less than tolerance weights, return r2 if w2<(w1-r1)")
     print("func ID 8: tolerance weights, return r2 if |w1-w2|<r1")
     print("func ID 9: exclusion weights, return r2 if |w1-w2|>r1")
-
-if __name__ == '__main__':
-    main()
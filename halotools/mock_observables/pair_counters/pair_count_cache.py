@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent cache of pair counts.
+
+The random-random pair counts used by the clustering functions depend only on the
+randoms, the bins, and the period, but with a large random sample they are usually the
+most expensive pair counts to calculate.  A `PairCountCache` stores pair counts on disk,
+by default in a subdirectory of the halotools cache directory, so that they are counted
+only once for a given random sample, and are re-used across calls and sessions.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+import os
+import hashlib
+import tempfile
+from batch_pair_counter import _sample_key, _box_key
+
+
+__all__=['PairCountCache']
+__author__=['Duncan Campbell']
+
+
+#default maximum total size of the files in the cache, in bytes
+_DEFAULT_MAX_SIZE = 100*1024**2
+
+
+class PairCountCache(object):
+    """
+    on-disk cache of pair counts, keyed on a hash of the samples, the bins, and the box.
+
+    Each set of pair counts is stored in a .npy file.  When the total size of the files
+    in the cache exceeds max_size, the least recently used files are removed.
+
+    An instance may be passed as the rr_cache argument of the clustering functions
+    `tpcf`, `redshift_space_tpcf`, `wp`, `s_mu_tpcf`, `tpcf_multipole`, and
+    `labeled_tpcf`, in which case their RR pair counts are taken from the cache.
+
+    Parameters
+    ----------
+    cache_dir: string, optional
+        directory in which the pair counts are stored.  If None, the 'pair_counts'
+        subdirectory of the halotools cache directory is used.
+
+    max_size: int, optional
+        maximum total size, in bytes, of the files in the cache.  Default is 100 MB.
+
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import PairCountCache, npairs
+    >>> import numpy as np
+    >>> import tempfile
+    >>> randoms = np.random.random((1000,3))
+    >>> rbins = np.linspace(0.1,0.3,5)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> cache = PairCountCache(cache_dir=tempfile.mkdtemp())
+    >>> RR = cache.pair_counts(npairs, 'r', randoms, randoms, [rbins], period=period)
+    """
+
+    def __init__(self, cache_dir=None, max_size=_DEFAULT_MAX_SIZE):
+
+        if cache_dir is None:
+            from ...sim_manager.cache_config import get_halotools_cache_dir
+            cache_dir = os.path.join(get_halotools_cache_dir(), 'pair_counts')
+
+        if max_size<0:
+            raise ValueError("max_size must be non-negative")
+
+        if not os.path.exists(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                if not os.path.exists(cache_dir):
+                    raise IOError("Unable to create the pair count cache directory {0}"\
+                                  .format(cache_dir))
+        elif not os.path.isdir(cache_dir):
+            raise IOError("Pair count cache {0} is not a directory".format(cache_dir))
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def pair_counts(self, counter, kind, data1, data2, bins, period=None, **kwargs):
+        """
+        return the pair counts of data1 and data2, counting the pairs with counter only
+        if they are not in the cache.
+
+        Parameters
+        ----------
+        counter: function
+            pair counting function, e.g. `npairs`, called as
+            counter(data1, data2, *bins, period=period, **kwargs)
+
+        kind: string
+            name of the binning counted by counter, e.g. 'r', 'xy_z', or 's_mu', which
+            distinguishes pair counts of the same bins in different binnings.
+
+        data1, data2: array_like
+            N by 3 numpy arrays of 3-dimensional positions, or `GridIndex` objects.
+
+        bins: list
+            list of the arrays of bin boundaries passed to counter.
+
+        period: array_like, optional
+            length 3 array defining axis-aligned periodic boundary conditions.
+
+        **kwargs: dict, optional
+            other keyword arguments passed to counter, e.g. N_threads.  These are assumed
+            not to change the pair counts.
+
+        Returns
+        -------
+        counts: numpy.array
+            the pair counts returned by counter
+        """
+
+        filename = os.path.join(self.cache_dir, self._key(kind, data1, data2, bins,\
+                                                          period)+'.npy')
+
+        if os.path.exists(filename):
+            try:
+                counts = np.load(filename)
+            except (IOError, ValueError):
+                counts = None
+            if counts is not None:
+                #mark the file as the most recently used
+                os.utime(filename, None)
+                return counts
+
+        counts = counter(data1, data2, *bins, period=period, **kwargs)
+        self._store(filename, counts)
+
+        return counts
+
+    def size(self):
+        """
+        return the total size, in bytes, of the files in the cache.
+        """
+
+        return sum(_size(f) for f in self._files())
+
+    def clear(self):
+        """
+        remove all pair counts from the cache.
+        """
+
+        for f in self._files():
+            _remove(f)
+
+    def _key(self, kind, data1, data2, bins, period):
+        """
+        return a hash identifying the pair counts of data1 and data2 in bins.
+        """
+
+        bins = [np.ascontiguousarray(b, dtype=np.float64) for b in bins]
+        key = (kind, _sample_key(data1), _sample_key(data2),\
+               [(np.shape(b), hashlib.sha1(b).hexdigest()) for b in bins],\
+               _box_key(period))
+
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def _store(self, filename, counts):
+        """
+        write counts to filename, then remove the least recently used files until the
+        cache is no larger than max_size.
+        """
+
+        #write to a temporary file first, so that a partially written file is never read
+        fd, tmp_filename = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, counts)
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError):
+            _remove(tmp_filename)
+            return
+
+        files = sorted(self._files(), key=_mtime)
+        total_size = sum(_size(f) for f in files)
+        while (total_size>self.max_size) and (len(files)>0):
+            f = files.pop(0)
+            total_size -= _size(f)
+            _remove(f)
+
+    def _files(self):
+        """
+        return the paths of the files in the cache.
+        """
+
+        return [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)\
+                if f.endswith('.npy')]
+
+
+def _mtime(filename):
+    """
+    return the modification time of a file, or 0 if it has been removed.
+    """
+
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return 0.0
+
+
+def _size(filename):
+    """
+    return the size of a file, or 0 if it has been removed.
+    """
+
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def _remove(filename):
+    """
+    remove a file, ignoring files which have already been removed, e.g. by another
+    process sharing the cache.
+    """
+
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent worker pool used by the pair counters.
+
+By default, each call to a pair counter with N_threads>1 starts (and stops) its own pool
+of worker processes.  When a pair counter is called many times, e.g. inside of an MCMC
+loop, a single `PairCounterPool` can be created once and passed to every call in place
+of an integer N_threads, keeping the same worker processes alive between calls.
+
+The grids and other large arrays needed by the pair counting engines are not pickled and 
+sent to the workers.  They are written once to a memory-mapped file (in /dev/shm when 
+available), and each worker attaches to this file without copying the data.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+import multiprocessing
+import os
+import tempfile
+import uuid
+from collections import OrderedDict
+from functools import partial
+from rect_cuboid import rect_cuboid_cells
+from kd_tree import kd_tree
+
+
+__all__=['PairCounterPool']
+__author__=['Duncan Campbell']
+
+
+class PairCounterPool(object):
+    """
+    explicitly managed pool of worker processes for the pair counters.
+
+    An instance may be passed as the N_threads argument of any of the pair counting
+    functions, and of the clustering functions that call them.  The worker processes are
+    started the first time they are needed, and are only stopped when `close` is called,
+    or when exiting a ``with`` block.
+
+    Parameters
+    ----------
+    N_threads: int, optional
+        number of worker processes.  If set to 'max', use all available cores.
+        N_threads=1 runs the calculation serially in the calling process.
+
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import npairs, PairCounterPool
+    >>> import numpy as np
+    >>> data = np.random.random((100,3))
+    >>> rbins = np.linspace(0.1,0.3,5)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> with PairCounterPool(2) as pool:
+    ...     counts_1 = npairs(data, data, rbins, period=period, N_threads=pool)
+    ...     counts_2 = npairs(data, data, rbins, Lbox=period, N_threads=pool)
+    """
+
+    def __init__(self, N_threads='max'):
+
+        self.N_threads = _process_N_threads(N_threads)
+        self._pool = None
+        self._closed = False
+
+    def map(self, func, iterable):
+        """
+        apply func to every element of iterable, returning a list of the results.
+        """
+
+        if self._closed:
+            raise ValueError("PairCounterPool has already been closed.")
+
+        if self.N_threads==1:
+            return list(map(func, iterable))
+
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.N_threads)
+
+        #place grids and large arrays into shared memory before sending them to workers
+        func, filenames = _share_arguments(func)
+        try:
+            return self._pool.map(func, iterable)
+        finally:
+            for filename in filenames:
+                os.remove(filename)
+
+    def close(self):
+        """
+        stop the worker processes.
+        """
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        if self._pool is not None:
+            self._pool.terminate()
+
+
+def _process_N_threads(N_threads):
+    """
+    process the N_threads argument passed to a pair counter, returning an integer.
+    """
+
+    if N_threads=='max':
+        N_threads = multiprocessing.cpu_count()
+    if (not isinstance(N_threads, (int, long))) | isinstance(N_threads, bool):
+        raise ValueError("N_threads argument must be an integer number or 'max'")
+    if N_threads<1:
+        raise ValueError("N_threads argument must be >=1")
+
+    return int(N_threads)
+
+
+def _get_pool(N_threads):
+    """
+    return a `PairCounterPool` to be used in a pair counting function.
+
+    Parameters
+    ----------
+    N_threads: int, string, or PairCounterPool
+        N_threads argument passed to a pair counter
+
+    Returns
+    -------
+    pool: PairCounterPool
+
+    close_pool: bool
+        True if the pool was created here and must be closed by the caller.
+    """
+
+    if isinstance(N_threads, PairCounterPool):
+        return N_threads, False
+    else:
+        return PairCounterPool(N_threads), True
+
+
+def _get_num_threads(N_threads):
+    """
+    return the number of threads used by the multi-threaded pair counting kernels, 
+    i.e. when a pair counter is called with backend='threads'.
+
+    Parameters
+    ----------
+    N_threads: int, string, or PairCounterPool
+        N_threads argument passed to a pair counter
+
+    Returns
+    -------
+    N_threads: int
+    """
+
+    if isinstance(N_threads, PairCounterPool):
+        return N_threads.N_threads
+    else:
+        return _process_N_threads(N_threads)
+
+
+def _process_backend(backend):
+    """
+    process the backend argument passed to a pair counter, which must either be 
+    'processes' or 'threads'.
+    """
+
+    if backend not in ['processes', 'threads']:
+        raise ValueError("backend must be 'processes' or 'threads'")
+
+    return backend
+
+
+##########################################################################################
+#minimum size (in bytes) of an array for it to be placed into shared memory
+_MIN_SHARED_NBYTES = 2**20
+
+#maximum number of grids each worker keeps attached between tasks
+_MAX_ATTACHED_GRIDS = 4
+
+#grids attached by this (worker) process
+_attached_grids = OrderedDict()
+
+
+class _SharedArray(np.ndarray):
+    """
+    ndarray whose data has been written to a memory-mapped file.  When pickled, only the 
+    name of the file is sent, and the array is re-attached to the file when unpickled.
+    """
+
+    def __array_finalize__(self, obj):
+        self._filename = None
+
+    def __reduce__(self):
+        if self._filename is None:
+            return np.ascontiguousarray(self).view(np.ndarray).__reduce__()
+        return (_attach_array, (self._filename, self.dtype.str, self.shape))
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+
+class _SharedCells(rect_cuboid_cells):
+    """
+    rect_cuboid_cells object whose arrays have been placed into shared memory.  When 
+    unpickled, each worker process builds the grid only once.
+    """
+
+    def __reduce__(self):
+        return (_attach_grid, (self._token, self._shared_state, rect_cuboid_cells))
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+
+class _SharedTree(kd_tree):
+    """
+    kd_tree object whose arrays have been placed into shared memory.  When unpickled, 
+    each worker process builds the tree only once.
+    """
+
+    def __reduce__(self):
+        return (_attach_grid, (self._token, self._shared_state, kd_tree))
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+
+def _shared_memory_dir():
+    """
+    return the directory used to store memory-mapped arrays.
+    """
+
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    else:
+        return tempfile.gettempdir()
+
+
+def _share_array(arr, filenames):
+    """
+    write arr to a memory-mapped file, returning a `_SharedArray`.
+    """
+
+    arr = np.ascontiguousarray(arr)
+    fd, filename = tempfile.mkstemp(prefix='halotools_', suffix='.dat',\
+                                    dir=_shared_memory_dir())
+    filenames.append(filename)
+    with os.fdopen(fd, 'wb') as f:
+        arr.tofile(f)
+
+    shared = arr.view(_SharedArray)
+    shared._filename = filename
+    return shared
+
+
+def _share_grid(grid, filenames):
+    """
+    place the arrays of a rect_cuboid_cells or kd_tree object into shared memory, 
+    returning a `_SharedCells` or `_SharedTree` object.
+    """
+
+    if isinstance(grid, kd_tree): shared_class = _SharedTree
+    else: shared_class = _SharedCells
+    shared = shared_class.__new__(shared_class)
+    shared.__dict__.update(grid.__dict__)
+
+    state = grid.__dict__.copy()
+    for key in state.keys():
+        state[key] = _share(state[key], filenames)
+    shared._shared_state = state
+    shared._token = uuid.uuid4().hex
+
+    return shared
+
+
+def _share(arg, filenames):
+    """
+    return a version of arg which is backed by shared memory, if appropriate.
+    """
+
+    if isinstance(arg, (rect_cuboid_cells, kd_tree)):
+        return _share_grid(arg, filenames)
+    elif isinstance(arg, np.ndarray):
+        if (arg.dtype!=object) & (arg.nbytes>=_MIN_SHARED_NBYTES):
+            return _share_array(arg, filenames)
+    return arg
+
+
+def _share_arguments(func):
+    """
+    place the grids and large arrays bound to func (a `functools.partial` object) into 
+    shared memory.
+
+    Returns
+    -------
+    func: function
+        function whose arguments are backed by shared memory
+
+    filenames: list
+        names of the files holding the shared arrays, to be removed once the workers 
+        are done with func.
+    """
+
+    if not isinstance(func, partial):
+        return func, []
+
+    filenames = []
+    try:
+        args = [_share(arg, filenames) for arg in func.args]
+        keywords = dict((key, _share(value, filenames))\
+                        for key, value in (func.keywords or {}).items())
+    except:
+        for filename in filenames:
+            os.remove(filename)
+        raise
+
+    return partial(func.func, *args, **keywords), filenames
+
+
+def _attach_array(filename, dtype, shape):
+    """
+    attach to an array written to a memory-mapped file by `_share_array`.
+    """
+
+    arr = np.memmap(filename, dtype=np.dtype(dtype), mode='c', shape=shape)
+    return arr.view(np.ndarray)
+
+
+def _attach_grid(token, state, cls=rect_cuboid_cells):
+    """
+    attach to a grid (or tree) of type cls shared by `_share_grid`, re-using the grid if 
+    this process has already attached to it.
+    """
+
+    if token in _attached_grids:
+        return _attached_grids[token]
+
+    grid = cls.__new__(cls)
+    grid.__dict__.update(state)
+
+    _attached_grids[token] = grid
+    while len(_attached_grids)>_MAX_ATTACHED_GRIDS:
+        _attached_grids.popitem(last=False)
+
+    return grid
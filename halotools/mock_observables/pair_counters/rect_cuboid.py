@@ -10,9 +10,9 @@ import numpy as np
 __all__=['rect_cuboid_cells']
 __author__ = ['Andrew Hearin, Duncan Campbell']
 
-class rect_cuboid_cells():
+class rect_cuboid_cells(object):
 
-    def __init__(self, x, y, z, Lbox, cell_size):
+    def __init__(self, x, y, z, Lbox, cell_size, search_length=None, precision='float64'):
         """
         Initialize the grid. 
 
@@ -26,20 +26,37 @@ class rect_cuboid_cells():
 
         cell_size : float 
             The approximate cell size into which the box will be divided. 
+        
+        search_length : array_like, optional
+            The maximum separation along each dimension between pairs of points that 
+            are searched for.  This sets the number of cells along each dimension 
+            returned by `adjacent_cells`.  If None, the search length is taken to be 
+            the cell size, and only the immediately adjacent cells are returned. 
+        
+        precision : string, optional
+            'float64' (the default) or 'float32', the precision in which the sorted 
+            x, y, and z arrays of the grid are stored. 
         """
 
         self.cell_size = cell_size.astype(np.float)
         self.Lbox = Lbox.astype(np.float)
-        self.num_divs = np.floor(Lbox/cell_size).astype(int)
+        self.num_divs = np.floor(Lbox/cell_size).astype(np.int64)
         self.dL = Lbox/self.num_divs
         
+        #number of cells along each dimension which must be searched for neighbors
+        if search_length is None: search_length = self.cell_size
+        self.search_length = np.asarray(search_length).astype(np.float)
+        self.num_adjacent = _num_adjacent(self.search_length, self.dL)
+        
         #build grid tree
-        idx_sorted, slice_array = self.compute_cell_structure(x, y, z)
-        self.x = np.ascontiguousarray(x[idx_sorted],dtype=np.float64)
-        self.y = np.ascontiguousarray(y[idx_sorted],dtype=np.float64)
-        self.z = np.ascontiguousarray(z[idx_sorted],dtype=np.float64)
-        self.slice_array = slice_array
+        self.precision = _process_precision(precision)
+        idx_sorted, cell_id_indices = self.compute_cell_structure(x, y, z)
+        self.x = np.ascontiguousarray(x[idx_sorted],dtype=self.precision)
+        self.y = np.ascontiguousarray(y[idx_sorted],dtype=self.precision)
+        self.z = np.ascontiguousarray(z[idx_sorted],dtype=self.precision)
+        self.cell_id_indices = cell_id_indices
         self.idx_sorted = idx_sorted
+        self.cell_lower, self.cell_upper = self.compute_cell_bounds()
 
     def compute_cell_structure(self, x, y, z):
         """ 
@@ -58,9 +75,10 @@ class rect_cuboid_cells():
             Array of indices that sort the points according to the dictionary 
             order of the 3d subvolumes. 
 
-        slice_array : array 
-            array of slice objects used to access the elements of x, y, and z 
-            of points residing in a given subvolume. 
+        cell_id_indices : array 
+            Length Ncells+1 integer array.  The points residing in subvolume *i* are 
+            the elements cell_id_indices[i] to cell_id_indices[i+1] of the sorted x, y, 
+            and z arrays. 
 
         Notes 
         -----
@@ -79,12 +97,16 @@ class rect_cuboid_cells():
         or equivalently, unique integer specifying the subvolume containing the point. 
         The unique integer is called the *cellID*. 
         In order to access the *x* positions of the points lying in subvolume *i*, 
-        x[idx_sort][slice_array[i]]. 
+        x[idx_sort][cell_id_indices[i]:cell_id_indices[i+1]]. 
 
         In practice, because fancy indexing with `idx_sort` is not instantaneous, 
         it will be more efficient to use `idx_sort` once to sort the x, y, and z arrays 
-        in-place, and then access the sorted arrays with the relevant slice_array element. 
-        This is the strategy used in the `retrieve_tree` method. 
+        in-place, and then access the sorted arrays with the relevant cell_id_indices 
+        elements.  This is the strategy used in the `__init__` method. 
+        
+        cell_id_indices is a compressed sparse row (CSR) style index built with 
+        `numpy.bincount` and `numpy.cumsum`, so its construction does not require a 
+        python loop over the cells. 
 
         """
 
@@ -106,23 +128,58 @@ class rect_cuboid_cells():
                                                 self.num_divs[2]))
         
         idx_sorted = np.argsort(particle_indices)
-        bin_indices = np.searchsorted(particle_indices[idx_sorted], 
-                                      np.arange(np.prod(self.num_divs)))
-        bin_indices = np.append(bin_indices, None)
         
-        slice_array = np.empty(np.prod(self.num_divs), dtype=object)
-        for icell in range(np.prod(self.num_divs)):
-            slice_array[icell] = slice(bin_indices[icell], bin_indices[icell+1], 1)
+        #number of points in each cell, and the offset of the first point in each cell
+        Ncells = np.prod(self.num_divs)
+        cell_counts = np.bincount(particle_indices, minlength=Ncells)
+        cell_id_indices = np.zeros(Ncells+1, dtype=np.int64)
+        np.cumsum(cell_counts, out=cell_id_indices[1:])
             
-        return idx_sorted, slice_array
+        return idx_sorted, cell_id_indices
     
     
+    def compute_cell_bounds(self):
+        """
+        Method returns the axis-aligned bounding box of the points in each cell, which
+        may be used to find the range of separations between the points in two cells
+        without visiting the points.
+
+        Returns
+        -------
+        cell_lower, cell_upper : arrays
+            Ncells by 3 arrays of the smallest and largest x, y, and z coordinates of the
+            points in each cell.  For empty cells, cell_lower is inf and cell_upper is
+            -inf.
+        """
+
+        Ncells = np.prod(self.num_divs)
+        cell_lower = np.empty((Ncells,3), dtype=np.float64)
+        cell_upper = np.empty((Ncells,3), dtype=np.float64)
+        cell_lower.fill(np.inf)
+        cell_upper.fill(-np.inf)
+
+        #np.minimum.reduceat requires the start index of each (non-empty) cell
+        occupied = np.flatnonzero(np.diff(self.cell_id_indices)>0)
+        if len(occupied)==0:
+            return cell_lower, cell_upper
+        i_start = self.cell_id_indices[occupied]
+
+        for dim, coords in enumerate([self.x, self.y, self.z]):
+            coords = coords.astype(np.float64)
+            cell_lower[occupied,dim] = np.minimum.reduceat(coords, i_start)
+            cell_upper[occupied,dim] = np.maximum.reduceat(coords, i_start)
+
+        return cell_lower, cell_upper
+
     def adjacent_cells(self, *args):
         """ 
         Given a subvolume specified by the input arguments,  
-        return the up to length-27 array of cellIDs of the neighboring cells. 
+        return the array of cellIDs of the neighboring cells. 
         The input subvolume can be specified either by its ix, iy, iz triplet, 
         or by its cellID. 
+        The neighbors are the cells within `num_adjacent` cells along each dimension, 
+        i.e. up to 27 cells when the cell size is equal to the search length, and 
+        up to 125 cells when the cells are refined by a factor of 2. 
         Parameters 
         ----------
         ix, iy, iz : int, optional
@@ -134,7 +191,7 @@ class rect_cuboid_cells():
         Returns 
         -------
         result : int array
-            up to Length-27 array of cellIDs of neighboring subvolumes. 
+            array of cellIDs of neighboring subvolumes. 
         Notes 
         -----
         If one argument is passed to `adjacent_cells`, this argument will be 
@@ -143,7 +200,7 @@ class rect_cuboid_cells():
         the ix, iy, iz triplet of the input subvolume. 
         """
 
-        ixgen, iygen, izgen = np.unravel_index(np.arange(3**3), (3, 3, 3)) 
+        ixgen, iygen, izgen = self._stencil()
 
         if len(args) >= 3:
             ix, iy, iz = args[0], args[1], args[2]
@@ -153,9 +210,9 @@ class rect_cuboid_cells():
                                                self.num_divs[1],\
                                                self.num_divs[2]))
 
-        ixgen = (ixgen + ix - 1) % self.num_divs[0]
-        iygen = (iygen + iy - 1) % self.num_divs[1]
-        izgen = (izgen + iz - 1) % self.num_divs[2]
+        ixgen = (ixgen + ix) % self.num_divs[0]
+        iygen = (iygen + iy) % self.num_divs[1]
+        izgen = (izgen + iz) % self.num_divs[2]
 
         return np.unique(np.ravel_multi_index((ixgen, iygen, izgen), 
                                               (self.num_divs[0],\
@@ -163,3 +220,196 @@ class rect_cuboid_cells():
                                                self.num_divs[2])))
 
 
+    
+    
+    def forward_adjacent_cells(self, *args):
+        """ 
+        Given a subvolume specified by the input arguments, return the array of cellIDs 
+        of the "forward" neighboring cells, i.e. 13 cells when the cell size is equal to 
+        the search length. 
+        
+        Of the neighbors of each cell, exactly one of each pair of opposite neighbors 
+        is a forward neighbor, i.e. has an (ix, iy, iz) offset which is 
+        lexicographically larger than (0, 0, 0).  Looping over every cell and its forward 
+        neighbors (plus the cell itself) therefore visits each pair of neighboring cells 
+        exactly once.  This is only true if there are at least 2*num_adjacent+1 cells 
+        along each dimension (see `has_forward_cells`).
+        
+        Parameters 
+        ----------
+        ix, iy, iz : int, optional
+            Integers specifying the ix, iy, and iz triplet of the subvolume. 
+            If ix, iy, and iz are not passed, then ic must be passed. 
+        ic : int, optional
+            Integer specifying the cellID of the input subvolume
+            If ic is not passed, the ix, iy, and iz must be passed. 
+        Returns 
+        -------
+        result : int array
+            array of cellIDs of the forward neighboring subvolumes. 
+        """
+        
+        if not self.has_forward_cells():
+            raise ValueError("forward neighbors are only defined if there are at least "
+                             "2*num_adjacent+1 cells along each dimension.")
+        
+        ixgen, iygen, izgen = self._stencil()
+        forward = slice(len(ixgen)//2+1, None)
+        ixgen, iygen, izgen = ixgen[forward], iygen[forward], izgen[forward]
+        
+        if len(args) >= 3:
+            ix, iy, iz = args[0], args[1], args[2]
+        elif len(args) == 1:
+            ic = args[0]
+            ix, iy, iz = np.unravel_index(ic, (self.num_divs[0],\
+                                               self.num_divs[1],\
+                                               self.num_divs[2]))
+        
+        ixgen = (ixgen + ix) % self.num_divs[0]
+        iygen = (iygen + iy) % self.num_divs[1]
+        izgen = (izgen + iz) % self.num_divs[2]
+        
+        return np.ravel_multi_index((ixgen, iygen, izgen), 
+                                    (self.num_divs[0],\
+                                     self.num_divs[1],\
+                                     self.num_divs[2]))
+    
+    def has_forward_cells(self):
+        """ 
+        Return True if there are enough cells along each dimension for the forward 
+        neighbors of each cell, see `forward_adjacent_cells`, to be well defined. 
+        """
+        
+        return np.all(self.num_divs>=2*self.num_adjacent+1)
+    
+    def _stencil(self):
+        """ 
+        Return the ix, iy, iz offsets of the neighbors of a cell, in lexicographic 
+        order, such that the cell itself is the middle element. 
+        """
+        
+        nx, ny, nz = 2*self.num_adjacent+1
+        ixgen, iygen, izgen = np.unravel_index(np.arange(nx*ny*nz), (nx, ny, nz))
+        
+        return (ixgen - self.num_adjacent[0],\
+                iygen - self.num_adjacent[1],\
+                izgen - self.num_adjacent[2])
+
+
+def _num_adjacent(search_length, dL):
+    """ 
+    Return the number of cells of size dL along each dimension which must be searched in 
+    order to find all pairs with separations up to search_length.  A small tolerance 
+    prevents round-off error from adding cells when the search length equals the cell 
+    size. 
+    """
+    
+    num_adjacent = np.ceil(search_length/dL*(1.0-1e-10)).astype(np.int64)
+    
+    return np.maximum(num_adjacent, 1)
+
+
+def _process_precision(precision):
+    """ 
+    Return the precision of the coordinates stored in a grid, which must either be 
+    'float64' or 'float32'. 
+    """
+    
+    if precision not in ['float64', 'float32']:
+        raise ValueError("precision must be 'float64' or 'float32'")
+    
+    return precision
+
+
+#cost of visiting a pair of cells in the pair counting engines, in units of the cost of 
+#calculating the separation of one pair of points
+_CELL_PAIR_COST = 1000.0
+
+#largest factor by which the auto-tuner refines the cells
+_MAX_REFINEMENT = 4
+
+
+def _process_cell_size(approx_cell_size, search_length, Lbox, N1, N2):
+    """ 
+    Return the approximate cell size of the grids used by a pair counter. 
+    
+    Parameters 
+    ----------
+    approx_cell_size : array_like, string, or None
+        approx_cell_size argument passed to the pair counter.  If None, the cell size is 
+        equal to the search length.  If 'auto', the cells are refined by the factor 
+        chosen by `_tune_cell_refinement`. 
+    
+    search_length : array_like
+        length 3 array of the maximum separation along each dimension between pairs 
+        of points that are counted
+    
+    Lbox : array_like
+        length 3 array of the box dimensions
+    
+    N1, N2 : int
+        number of points in each sample
+    
+    Returns 
+    -------
+    cell_size : numpy.array
+        length 3 array of the approximate cell size along each dimension
+    """
+    
+    search_length = np.asarray(search_length).astype(np.float)
+    Lbox = np.asarray(Lbox).astype(np.float)
+    
+    if approx_cell_size is None:
+        cell_size = search_length
+    elif isinstance(approx_cell_size, basestring):
+        if approx_cell_size!='auto':
+            raise ValueError("approx_cell_size must be a number, an array of length 3, "
+                             "or 'auto'")
+        refinement = _tune_cell_refinement(search_length, Lbox, N1, N2)
+        cell_size = search_length/refinement
+    else:
+        cell_size = np.asarray(approx_cell_size).astype(np.float)
+        if np.shape(cell_size)==():
+            cell_size = np.array([cell_size]*3)
+        if np.shape(cell_size)!=(3,):
+            raise ValueError("approx_cell_size must be a number, an array of length 3, "
+                             "or 'auto'")
+        if np.any(cell_size<=0.0):
+            raise ValueError("approx_cell_size must be positive")
+    
+    #cells can not be larger than the box
+    return np.minimum(cell_size, Lbox)
+
+
+def _tune_cell_refinement(search_length, Lbox, N1, N2):
+    """ 
+    Return the integer factor by which the cells should be made smaller than the search 
+    length, chosen to minimize a simple model of the cost of counting pairs. 
+    
+    Smaller cells mean that fewer separations are calculated for pairs of points which 
+    are further apart than the search length, at the cost of visiting more pairs of 
+    cells.  For each refinement factor, the model cost is the expected number of 
+    separations calculated, for uniformly distributed points, plus `_CELL_PAIR_COST` 
+    times the number of pairs of cells visited. 
+    
+    The refinement is memory-neutral with respect to the neighboring cells: both 
+    backends find the neighbors of a cell from the stencil of offsets as the cell is 
+    visited, and no table of neighbors is stored, so a larger stencil costs no memory.  
+    Only the per-cell arrays of the grids (the CSR offsets and the cell bounding boxes) 
+    grow with the number of cells. 
+    """
+    
+    costs = np.zeros(_MAX_REFINEMENT)
+    for i, refinement in enumerate(range(1, _MAX_REFINEMENT+1)):
+        cell_size = np.minimum(search_length/refinement, Lbox)
+        num_divs = np.floor(Lbox/cell_size)
+        dL = Lbox/num_divs
+        
+        #number of neighboring cells along each dimension, including the cell itself
+        num_adjacent = np.minimum(2*_num_adjacent(search_length, dL)+1, num_divs)
+        
+        N_cell_pairs = np.prod(num_divs)*np.prod(num_adjacent)
+        N_separations = N1*N2*np.prod(num_adjacent*dL/Lbox)
+        costs[i] = N_separations + _CELL_PAIR_COST*N_cell_pairs
+    
+    return np.argmin(costs)+1
@@ -12,18 +12,25 @@ This module also contains a 'main' function which runs speed tests.
 from __future__ import print_function, division
 import numpy as np
 from rect_cuboid import *
+from rect_cuboid import _process_cell_size, _process_precision
 from cpairs import *
 from time import time
 import sys
 import multiprocessing
 from functools import partial
+from pair_counter_pool import _get_pool, _get_num_threads, _process_backend
+from grid_index import _process_data, _get_grid, _process_box
 
 
-__all__=['npairs', 'wnpairs', 'jnpairs', 'xy_z_npairs', 'xy_z_wnpairs', 'xy_z_jnpairs']
+__all__=['npairs', 'wnpairs', 'jnpairs', 'xy_z_npairs', 'xy_z_wnpairs', 'xy_z_jnpairs',\
+         'multi_npairs', 'npairs_per_point', 'xy_z_npairs_per_point', 'wp_npairs',\
+         'labeled_npairs', 'multipole_npairs']
 __author__=['Duncan Campbell']
 
 
-def npairs(data1, data2, rbins, Lbox=None, period=None, verbose=False, N_threads=1):
+def npairs(data1, data2, rbins, Lbox=None, period=None, verbose=False, N_threads=1,\
+           approx_cell_size=None, backend='processes',\
+           precision='float64'):
     """
     real-space pair counter.
     
@@ -34,11 +41,13 @@ def npairs(data1, data2, rbins, Lbox=None, period=None, verbose=False, N_threads
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     rbins: array_like
         numpy array of boundaries defining the bins in which pairs are counted.
@@ -56,7 +65,28 @@ def npairs(data1, data2, rbins, Lbox=None, period=None, verbose=False, N_threads
     
     N_threads: int, optional
         number of 'threads' to use in the pair counting.  if set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the cells are the size of the maximum separation 
+        counted.  For dense samples, smaller cells (e.g. one half or one third of that 
+        size) reduce the number of separations which are calculated, at the cost of 
+        searching more neighboring cells.  If set to 'auto', the cell size is chosen 
+        based on the number of points and the size of the box and the bins.
+    
+    backend: string, optional
+        If 'processes' (the default), the pair counting is mapped over the cells of the 
+        grids by a pool of N_threads worker processes.  If 'threads', a single 
+        multi-threaded kernel loops over the cells with N_threads OpenMP threads, 
+        which avoids starting processes and copying the grids to them.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids.  The separations between points are 
+        always calculated in double precision.  'float32' halves the memory used by 
+        the grids, and is only available with backend='threads'.
     
     Returns
     -------
@@ -64,16 +94,21 @@ def npairs(data1, data2, rbins, Lbox=None, period=None, verbose=False, N_threads
         number of pairs
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     rbins = np.array(rbins)
     if np.all(period==np.inf): period=None
     
@@ -85,74 +120,65 @@ def npairs(data1, data2, rbins, Lbox=None, period=None, verbose=False, N_threads
     if rbins.ndim != 1:
         raise ValueError("rbins must be a 1D array")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a cube")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #check to see we dont count pairs more than once
     if (PBCs==True) & np.any(np.max(rbins)>Lbox/2.0):
         raise ValueError('cannot count pairs with seperations \
                           larger than Lbox/2 with PBCs')
     
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2)
+    
     #build grids for data1 and data2
-    cell_size = np.array([np.max(rbins)]*3)
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    search_length = np.array([np.max(rbins)]*3)
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
     
     #square radial bins to make distance calculation cheaper
     rbins = rbins**2.0
     
-    #print come information
+    #print some information
     if verbose==True:
         print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
         print("cell size= {0}".format(grid1.dL))
         print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #number of cells
     Ncell1 = np.prod(grid1.num_divs)
     
     #create a function to call with only one argument
-    engine = partial(_npairs_engine, grid1, grid2, rbins, period, PBCs)
+    if do_auto:
+        engine = partial(_npairs_auto_engine, grid1, rbins, period, PBCs)
+    else:
+        engine = partial(_npairs_engine, grid1, grid2, rbins, period, PBCs)
     
     #do the pair counting
-    if N_threads>1:
-        counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
-    if N_threads==1:
-        counts = np.sum(map(engine,range(Ncell1)),axis=0)
+    if backend=='threads':
+        counts = npairs_threads(grid1.x, grid1.y, grid1.z, grid1.cell_id_indices,\
+                                grid1.cell_lower, grid1.cell_upper,\
+                                grid2.x, grid2.y, grid2.z, grid2.cell_id_indices,\
+                                grid2.cell_lower, grid2.cell_upper,\
+                                grid1.num_divs, grid1.num_adjacent, rbins,\
+                                _threads_period(period, PBCs), N_threads, do_auto)
+    else:
+        try:
+            counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
+        finally:
+            if close_pool: pool.close()
+    
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    counts = np.cumsum(counts)
     
     return counts
 
@@ -164,24 +190,45 @@ def _npairs_engine(grid1, grid2, rbins, period, PBCs, icell1):
     
     counts = np.zeros(len(rbins))
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
         
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
                                              grid1.num_divs[1],\
                                              grid1.num_divs[2]))
     adj_cell_arr = grid1.adjacent_cells(ix1, iy1, iz1)
+    
+    #find the neighboring cells whose pairs are all beyond the largest bin, or all in 
+    #the same bin, from the bounding boxes of the cells
+    cell_bins = cell_pair_bins(grid1.cell_lower, grid1.cell_upper, icell1,\
+                               grid2.cell_lower, grid2.cell_upper, adj_cell_arr,\
+                               rbins, _threads_period(period, PBCs))
             
     #Loop over each of the (up to) 27 subvolumes neighboring, including the current cell.
-    for icell2 in adj_cell_arr:
+    for icell2, k in zip(adj_cell_arr, cell_bins):
+        
+        #no pairs are in any bin
+        if k==-1: continue
                 
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
+        #all pairs are in bin k
+        if k>=0:
+            counts[k] += (i_end1-i_start1)*(i_end2-i_start2)
+            continue
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
             
         #use cython functions to do pair counting
         if PBCs==False:
@@ -195,9 +242,79 @@ def _npairs_engine(grid1, grid2, rbins, period, PBCs, icell1):
     return counts
 
 
+def _npairs_auto_engine(grid1, rbins, period, PBCs, icell1):
+    """
+    pair counting engine for npairs function when data1 and data2 are the same sample.  
+    Each pair of cells is visited only once.  This code calls a cython function.
+    """
+    
+    counts = np.zeros(len(rbins))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #get the list of forward neighboring cells
+    ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
+                                             grid1.num_divs[1],\
+                                             grid1.num_divs[2]))
+    adj_cell_arr = grid1.forward_adjacent_cells(ix1, iy1, iz1)
+    
+    #find the cells whose pairs are all beyond the largest bin, or all in the same bin, 
+    #from the bounding boxes of the cells.  The first element is the cell itself.
+    cell_bins = cell_pair_bins(grid1.cell_lower, grid1.cell_upper, icell1,\
+                               grid1.cell_lower, grid1.cell_upper,\
+                               np.append(icell1, adj_cell_arr).astype(np.int64),\
+                               rbins, _threads_period(period, PBCs))
+    
+    #count the pairs within the cell
+    if cell_bins[0]>=0:
+        counts[cell_bins[0]] += (i_end1-i_start1)**2
+    elif PBCs==False:
+        counts += npairs_auto_no_pbc(x_icell1, y_icell1, z_icell1, rbins)
+    else: #PBCs==True
+        counts += npairs_auto_pbc(x_icell1, y_icell1, z_icell1, rbins, period)
+    
+    #Loop over each of the 13 forward neighboring subvolumes.  Pairs between the cells 
+    #are counted twice, as (x1,x2) and (x2,x1).
+    for icell2, k in zip(adj_cell_arr, cell_bins[1:]):
+        
+        #no pairs are in any bin
+        if k==-1: continue
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        
+        #all pairs are in bin k
+        if k>=0:
+            counts[k] += 2*(i_end1-i_start1)*(i_end2-i_start2)
+            continue
+        
+        #extract the points in the cell
+        x_icell2 = grid1.x[i_start2:i_end2]
+        y_icell2 = grid1.y[i_start2:i_end2]
+        z_icell2 = grid1.z[i_start2:i_end2]
+        
+        #use cython functions to do pair counting
+        if PBCs==False:
+            counts += 2*npairs_no_pbc(x_icell1, y_icell1, z_icell1,\
+                                      x_icell2, y_icell2, z_icell2,\
+                                      rbins)
+        else: #PBCs==True
+            counts += 2*npairs_pbc(x_icell1, y_icell1, z_icell1,\
+                                   x_icell2, y_icell2, z_icell2,\
+                                   rbins, period)
+    return counts
+
 
 def wnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2=None,\
-            verbose=False, N_threads=1):
+            verbose=False, N_threads=1, approx_cell_size=None, backend='processes',\
+            precision='float64'):
     """
     weighted real-space pair counter.
     
@@ -209,11 +326,13 @@ def wnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data1.ndim==2.
+        period. This cython implementation requires data1.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data2.ndim==2.
+        period. This cython implementation requires data2.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
             
     rbins: array_like
         numpy array of boundaries defining the bins in which pairs are counted. 
@@ -227,34 +346,65 @@ def wnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
         If none, PBCs are set to infinity.  If True, period is set to be Lbox
     
     weights1: array_like, optional
-        length N1 array containing weights used for weighted pair counts
+        length N1 array containing weights used for weighted pair counts.  An N1 by 
+        n_weights array may also be passed, in which case the pairs are counted with 
+        each column of weights in a single pass, e.g. for several marks.
         
     weights2: array_like, optional
-        length N2 array containing weights used for weighted pair counts.
+        length N2 array containing weights used for weighted pair counts.  An N2 by 
+        n_weights array may also be passed.  If only one of weights1 and weights2 has 
+        several columns, the other weights are used with each column.
     
     verbose: Boolean, optional
         If True, print out information and progress.
     
     N_threads: int, optional
         number of 'threads' to use in the pair counting.  if set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the cells are the size of the maximum separation 
+        counted.  For dense samples, smaller cells (e.g. one half or one third of that 
+        size) reduce the number of separations which are calculated, at the cost of 
+        searching more neighboring cells.  If set to 'auto', the cell size is chosen 
+        based on the number of points and the size of the box and the bins.
+    
+    backend: string, optional
+        If 'processes' (the default), the pair counting is mapped over the cells of the 
+        grids by a pool of N_threads worker processes.  If 'threads', a single 
+        multi-threaded kernel loops over the cells with N_threads OpenMP threads, 
+        which avoids starting processes and copying the grids to them.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids.  The separations between points are 
+        always calculated in double precision.  'float32' halves the memory used by 
+        the grids, and is only available with backend='threads'.
         
     Returns
     -------
     N_pairs : array of length len(rbins)
-        number counts of pairs
+        number counts of pairs.  If several columns of weights are passed, an n_weights 
+        by len(rbins) array of the counts with each column.
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     rbins = np.array(rbins)
     if np.all(period==np.inf): period=None
     
@@ -266,43 +416,9 @@ def wnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
     if rbins.ndim != 1:
         raise ValueError("rbins must be a 1D array")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a cube")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #Process weights1 entry and check for consistency.
     if weights1 is None:
@@ -319,15 +435,36 @@ def wnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
         if np.shape(weights2)[0] != np.shape(data2)[0]:
             raise ValueError("weights2 should have same len as data2")
     
+    #are the pairs counted with several columns of weights at once?
+    columns = (weights1.ndim>1) | (weights2.ndim>1)
+    if columns:
+        weights1, weights2 = _process_weight_columns(weights1, weights2)
+    
     #check to see we dont count pairs more than once
     if (PBCs==True) & np.any(np.max(rbins)>Lbox/2.0):
         raise ValueError('cannot count pairs with seperations \
                           larger than Lbox/2 with PBCs')
     
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2, weights1, weights2)
+    
     #build grids for data1 and data2
-    cell_size = np.array([np.max(rbins)]*3)
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    search_length = np.array([np.max(rbins)]*3)
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #sort the weights arrays
     weights1 = weights1[grid1.idx_sorted]
@@ -340,13 +477,35 @@ def wnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
     Ncell1 = np.prod(grid1.num_divs)
     
     #create a function to call with only one argument
-    engine = partial(_wnpairs_engine, grid1, grid2, weights1, weights2, rbins, period, PBCs)
+    if columns & do_auto:
+        engine = partial(_wnpairs_columns_auto_engine, grid1, weights1, rbins,\
+                         _threads_period(period, PBCs))
+    elif columns:
+        engine = partial(_wnpairs_columns_engine, grid1, grid2, weights1, weights2, rbins,\
+                         _threads_period(period, PBCs))
+    elif do_auto:
+        engine = partial(_wnpairs_auto_engine, grid1, weights1, rbins, period, PBCs)
+    else:
+        engine = partial(_wnpairs_engine, grid1, grid2, weights1, weights2, rbins, period, PBCs)
     
     #do the pair counting
-    if N_threads>1:
-        counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
-    if N_threads==1:
-        counts = np.sum(map(engine,range(Ncell1)),axis=0)
+    if backend=='threads':
+        kernel = wnpairs_columns_threads if columns else wnpairs_threads
+        counts = kernel(grid1.x, grid1.y, grid1.z, weights1,\
+                        grid1.cell_id_indices,\
+                        grid2.x, grid2.y, grid2.z, weights2,\
+                        grid2.cell_id_indices,\
+                        grid1.num_divs, grid1.num_adjacent, rbins,\
+                        _threads_period(period, PBCs), N_threads, do_auto)
+    else:
+        try:
+            counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
+        finally:
+            if close_pool: pool.close()
+    
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    counts = np.cumsum(counts, axis=-1)
     
     return counts
 
@@ -355,13 +514,16 @@ def _wnpairs_engine(grid1, grid2, weights1, weights2, rbins, period, PBCs, icell
     
     counts = np.zeros(len(rbins))
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
         
     #extract the weights in the cell
-    w_icell1 = weights1[grid1.slice_array[icell1]]
+    w_icell1 = weights1[i_start1:i_end1]
         
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
@@ -376,13 +538,16 @@ def _wnpairs_engine(grid1, grid2, weights1, weights2, rbins, period, PBCs, icell
                                                  grid2.num_divs[1],\
                                                  grid2.num_divs[2]))
         
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
         
         #extract the weights in the cell
-        w_icell2 = weights2[grid2.slice_array[icell2]]
+        w_icell2 = weights2[i_start2:i_end2]
         
         #use cython functions to do pair counting
         if PBCs==False:
@@ -398,8 +563,177 @@ def _wnpairs_engine(grid1, grid2, weights1, weights2, rbins, period, PBCs, icell
     return counts
 
 
+def _wnpairs_auto_engine(grid1, weights1, rbins, period, PBCs, icell1):
+    """
+    pair counting engine for wnpairs function when data1 and data2 (and weights1 and 
+    weights2) are the same sample.  Each pair of cells is visited only once.
+    """
+    
+    counts = np.zeros(len(rbins))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+        
+    #extract the weights in the cell
+    w_icell1 = weights1[i_start1:i_end1]
+    
+    #count the pairs within the cell
+    if PBCs==False:
+        counts += wnpairs_auto_no_pbc(x_icell1, y_icell1, z_icell1, w_icell1, rbins)
+    else: #PBCs==True
+        counts += wnpairs_auto_pbc(x_icell1, y_icell1, z_icell1, w_icell1, rbins, period)
+        
+    #get the list of forward neighboring cells
+    ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
+                                             grid1.num_divs[1],\
+                                             grid1.num_divs[2]))
+    adj_cell_arr = grid1.forward_adjacent_cells(ix1, iy1, iz1)
+        
+    #Loop over each of the 13 forward neighboring subvolumes.  Pairs between the cells 
+    #are counted twice, as (x1,x2) and (x2,x1).
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        
+        #extract the points in the cell
+        x_icell2 = grid1.x[i_start2:i_end2]
+        y_icell2 = grid1.y[i_start2:i_end2]
+        z_icell2 = grid1.z[i_start2:i_end2]
+        
+        #extract the weights in the cell
+        w_icell2 = weights1[i_start2:i_end2]
+        
+        #use cython functions to do pair counting
+        if PBCs==False:
+            counts += 2.0*wnpairs_no_pbc(x_icell1, y_icell1, z_icell1,\
+                                         x_icell2, y_icell2, z_icell2,\
+                                         w_icell1, w_icell2,\
+                                         rbins)
+        else: #PBCs==True
+            counts += 2.0*wnpairs_pbc(x_icell1, y_icell1, z_icell1,\
+                                      x_icell2, y_icell2, z_icell2,\
+                                      w_icell1, w_icell2,\
+                                      rbins, period)
+    return counts
+
+def _wnpairs_columns_engine(grid1, grid2, weights1, weights2, rbins, period, icell1):
+    """
+    pair counting engine for wnpairs function with several columns of weights.  This 
+    code calls a cython function.
+    """
+    
+    counts = np.zeros((weights1.shape[1], len(rbins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #extract the weights in the cell
+    w_icell1 = weights1[i_start1:i_end1]
+    
+    #get the list of neighboring cells
+    adj_cell_arr = grid1.adjacent_cells(icell1)
+    
+    #Loop over each of the neighboring subvolumes, including the current cell.
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += wnpairs_columns_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                            grid2.x[i_start2:i_end2],\
+                                            grid2.y[i_start2:i_end2],\
+                                            grid2.z[i_start2:i_end2],\
+                                            w_icell1, weights2[i_start2:i_end2],\
+                                            rbins, period, False)
+    return counts
+
+
+def _wnpairs_columns_auto_engine(grid1, weights1, rbins, period, icell1):
+    """
+    pair counting engine for wnpairs function with several columns of weights, when 
+    data1 and data2 (and weights1 and weights2) are the same sample.  Each pair of cells 
+    is visited only once.  This code calls a cython function.
+    """
+    
+    counts = np.zeros((weights1.shape[1], len(rbins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #extract the weights in the cell
+    w_icell1 = weights1[i_start1:i_end1]
+    
+    #count the pairs within the cell
+    counts += wnpairs_columns_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                        x_icell1, y_icell1, z_icell1,\
+                                        w_icell1, w_icell1, rbins, period, True)
+    
+    #get the list of forward neighboring cells
+    adj_cell_arr = grid1.forward_adjacent_cells(icell1)
+    
+    #Loop over each of the forward neighboring subvolumes.  Pairs between the cells are 
+    #counted twice, as (x1,x2) and (x2,x1).
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += 2.0*wnpairs_columns_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                                grid1.x[i_start2:i_end2],\
+                                                grid1.y[i_start2:i_end2],\
+                                                grid1.z[i_start2:i_end2],\
+                                                w_icell1, weights1[i_start2:i_end2],\
+                                                rbins, period, False)
+    return counts
+
+
+def _process_weight_columns(weights1, weights2):
+    """
+    return weights1 and weights2 as N by n_weights arrays with the same number of 
+    columns.  1D weights are used with each column of the other weights.
+    """
+    
+    if (weights1.ndim>2) | (weights2.ndim>2):
+        raise ValueError("weights must be 1D, or 2D arrays with one column per weight")
+    
+    n_weights = max([np.shape(w)[1] for w in [weights1, weights2] if w.ndim==2])
+    
+    result = []
+    for weights in [weights1, weights2]:
+        if weights.ndim==1:
+            weights = np.repeat(weights[:,np.newaxis], n_weights, axis=1)
+        elif np.shape(weights)[1]!=n_weights:
+            raise ValueError("weights1 and weights2 must have the same number of columns")
+        result.append(np.ascontiguousarray(weights, dtype=np.float64))
+    
+    return result[0], result[1]
+
+
 def jnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2=None,\
-            jtags1=None, jtags2=None, N_samples=0, verbose=False, N_threads=1):
+            jtags1=None, jtags2=None, N_samples=0, verbose=False, N_threads=1,\
+            approx_cell_size=None):
     """
     jackknife weighted real-space pair counter.
     
@@ -411,11 +745,13 @@ def jnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data1.ndim==2.
+        period. This cython implementation requires data1.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data2.ndim==2.
+        period. This cython implementation requires data2.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
             
     rbins: array_like
         numpy array of boundaries defining the bins in which pairs are counted. 
@@ -451,8 +787,17 @@ def jnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
         If True, print out information and progress.
     
     N_threads: int, optional
-        number of 'threads' to use in the pair counting.  If set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        number of 'threads' to use in the pair counting.  if set to 'max', use all 
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the cells are the size of the maximum separation 
+        counted.  For dense samples, smaller cells (e.g. one half or one third of that 
+        size) reduce the number of separations which are calculated, at the cost of 
+        searching more neighboring cells.  If set to 'auto', the cell size is chosen 
+        based on the number of points and the size of the box and the bins.
         
     Returns
     -------
@@ -468,16 +813,12 @@ def jnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
     if one point is inside, and the other is outside return 0.5*(w1 * w2)
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #process N_threads, returning a (possibly shared) pool of worker processes
+    pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     rbins = np.array(rbins)
     if np.all(period==np.inf): period=None
     
@@ -489,43 +830,9 @@ def jnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
     if rbins.ndim != 1:
         raise ValueError("rbins must be a 1D array")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a rectangular cuboid")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #Process weights1 entry and check for consistency.
     if weights1 is None:
@@ -577,9 +884,18 @@ def jnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
         raise ValueError("There are more jackknife samples than indicated by N_samples")
     
     #build grids for data1 and data2
-    cell_size = np.array([np.max(rbins)]*3)
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    search_length = np.array([np.max(rbins)]*3)
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length)
+    grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #sort the weights arrays
     weights1 = weights1[grid1.idx_sorted]
@@ -600,10 +916,18 @@ def jnpairs(data1, data2, rbins, Lbox=None, period=None, weights1=None, weights2
                      N_samples, rbins, period, PBCs)
     
     #do the pair counting
-    if N_threads>1:
+    try:
         counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
-    if N_threads==1:
-        counts = np.sum(map(engine,range(Ncell1)),axis=0)
+    finally:
+        if close_pool: pool.close()
+    
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    counts = np.cumsum(counts, axis=1)
+    
+    #the engines return the counts of the pairs with a point in each subvolume, from 
+    #which the counts of every jackknife sample are found at once
+    counts = _jackknife_counts(counts)
     
     return counts
 
@@ -613,16 +937,19 @@ def _jnpairs_engine(grid1, grid2, weights1, weights2, jtags1, jtags2, N_samples,
     
     counts = np.zeros((N_samples+1,len(rbins)))
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
         
     #extract the weights in the cell
-    w_icell1 = weights1[grid1.slice_array[icell1]]
+    w_icell1 = weights1[i_start1:i_end1]
         
     #extract the jackknife tags in the cell
-    j_icell1 = jtags1[grid1.slice_array[icell1]]
+    j_icell1 = jtags1[i_start1:i_end1]
         
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
@@ -637,16 +964,19 @@ def _jnpairs_engine(grid1, grid2, weights1, weights2, jtags1, jtags2, N_samples,
                                                  grid2.num_divs[1],\
                                                  grid2.num_divs[2]))
             
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
             
         #extract the weights in the cell
-        w_icell2 = weights2[grid2.slice_array[icell2]]
+        w_icell2 = weights2[i_start2:i_end2]
             
         #extract the jackknife tags in the cell
-        j_icell2 = jtags2[grid2.slice_array[icell2]]
+        j_icell2 = jtags2[i_start2:i_end2]
             
         #use cython functions to do pair counting
         if PBCs==False:
@@ -665,7 +995,9 @@ def _jnpairs_engine(grid1, grid2, weights1, weights2, jtags1, jtags2, N_samples,
     return counts
 
 
-def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=False, N_threads=1):
+def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=False, N_threads=1,\
+                approx_cell_size=None, backend='processes',\
+                precision='float64'):
     """
     real-space pair counter.
     
@@ -676,11 +1008,13 @@ def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     rp_bins: array_like
         numpy array of boundaries defining the radial projected bins in which pairs are 
@@ -702,7 +1036,28 @@ def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=
     
     N_threads: int, optional
         number of 'threads' to use in the pair counting.  if set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the cells are the size of the maximum separation 
+        counted.  For dense samples, smaller cells (e.g. one half or one third of that 
+        size) reduce the number of separations which are calculated, at the cost of 
+        searching more neighboring cells.  If set to 'auto', the cell size is chosen 
+        based on the number of points and the size of the box and the bins.
+    
+    backend: string, optional
+        If 'processes' (the default), the pair counting is mapped over the cells of the 
+        grids by a pool of N_threads worker processes.  If 'threads', a single 
+        multi-threaded kernel loops over the cells with N_threads OpenMP threads, 
+        which avoids starting processes and copying the grids to them.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids.  The separations between points are 
+        always calculated in double precision.  'float32' halves the memory used by 
+        the grids, and is only available with backend='threads'.
     
     Returns
     -------
@@ -710,16 +1065,21 @@ def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=
         number of pairs
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     rp_bins = np.array(rp_bins)
     pi_bins = np.array(pi_bins)
     if np.all(period==np.inf): period=None
@@ -734,43 +1094,9 @@ def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=
     if pi_bins.ndim != 1:
         raise ValueError("pi_bins must be a 1D array")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a cube")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #check to see we dont count pairs more than once    
     if (PBCs==True) & np.any(np.max(rp_bins)>Lbox[0:2]/2.0):
@@ -780,32 +1106,56 @@ def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=
         raise ValueError('grid_pairs pair counter cannot count pairs with seperations\
                           larger than Lbox/2 with PBCs')
     
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2)
+    
     #build grids for data1 and data2
-    cell_size = np.array([np.max(rp_bins),np.max(rp_bins),np.max(pi_bins)])
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    search_length = np.array([np.max(rp_bins),np.max(rp_bins),np.max(pi_bins)])
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
     
     #square radial bins to make distance calculation cheaper
     rp_bins = rp_bins**2.0
     pi_bins = pi_bins**2.0
     
-    #print come information
+    #print some information
     if verbose==True:
         print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
         print("cell size= {0}".format(grid1.dL))
         print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #number of cells
     Ncell1 = np.prod(grid1.num_divs)
     
     #create a function to call with only one argument
-    engine = partial(_xy_z_npairs_engine, grid1, grid2, rp_bins, pi_bins, period, PBCs)
+    if do_auto:
+        engine = partial(_xy_z_npairs_auto_engine, grid1, rp_bins, pi_bins, period, PBCs)
+    else:
+        engine = partial(_xy_z_npairs_engine, grid1, grid2, rp_bins, pi_bins, period, PBCs)
     
     #do the pair counting
-    if N_threads>1:
-        counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
-    if N_threads==1:
-        counts = np.sum(map(engine,range(Ncell1)),axis=0)
+    if backend=='threads':
+        counts = xy_z_npairs_threads(grid1.x, grid1.y, grid1.z, grid1.cell_id_indices,\
+                                     grid2.x, grid2.y, grid2.z, grid2.cell_id_indices,\
+                                     grid1.num_divs, grid1.num_adjacent,\
+                                     rp_bins, pi_bins,\
+                                     _threads_period(period, PBCs), N_threads, do_auto)
+    else:
+        try:
+            counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
+        finally:
+            if close_pool: pool.close()
+    
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    counts = np.cumsum(np.cumsum(counts, axis=0), axis=1)
     
     return counts
 
@@ -817,10 +1167,13 @@ def _xy_z_npairs_engine(grid1, grid2, rp_bins, pi_bins, period, PBCs, icell1):
     
     counts = np.zeros((len(rp_bins),len(pi_bins)))
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                        grid1.y[grid1.slice_array[icell1]],\
-                                        grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                        grid1.y[i_start1:i_end1],\
+                                        grid1.z[i_start1:i_end1])
         
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
@@ -831,10 +1184,13 @@ def _xy_z_npairs_engine(grid1, grid2, rp_bins, pi_bins, period, PBCs, icell1):
     #Loop over each of the (up to) 27 subvolumes neighboring, including the current cell.
     for icell2 in adj_cell_arr:
                 
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
             
         #use cython functions to do pair counting
         if PBCs==False:
@@ -848,29 +1204,90 @@ def _xy_z_npairs_engine(grid1, grid2, rp_bins, pi_bins, period, PBCs, icell1):
     return counts
 
 
-def s_mu_npairs(data1, data2, s_bins, mu_bins, Lbox=None, period=None, verbose=False, N_threads=1):
+def _xy_z_npairs_auto_engine(grid1, rp_bins, pi_bins, period, PBCs, icell1):
     """
-    real-space pair counter.
+    pair counting engine for xy_z_npairs function when data1 and data2 are the same 
+    sample.  Each pair of cells is visited only once.  This code calls a cython function.
+    """
+    
+    counts = np.zeros((len(rp_bins),len(pi_bins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #count the pairs within the cell
+    if PBCs==False:
+        counts += xy_z_npairs_auto_no_pbc(x_icell1, y_icell1, z_icell1, rp_bins, pi_bins)
+    else: #PBCs==True
+        counts += xy_z_npairs_auto_pbc(x_icell1, y_icell1, z_icell1,\
+                                       rp_bins, pi_bins, period)
+    
+    #get the list of forward neighboring cells
+    ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
+                                             grid1.num_divs[1],\
+                                             grid1.num_divs[2]))
+    adj_cell_arr = grid1.forward_adjacent_cells(ix1, iy1, iz1)
+    
+    #Loop over each of the 13 forward neighboring subvolumes.  Pairs between the cells 
+    #are counted twice, as (x1,x2) and (x2,x1).
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        
+        #extract the points in the cell
+        x_icell2 = grid1.x[i_start2:i_end2]
+        y_icell2 = grid1.y[i_start2:i_end2]
+        z_icell2 = grid1.z[i_start2:i_end2]
+        
+        #use cython functions to do pair counting
+        if PBCs==False:
+            counts += 2*xy_z_npairs_no_pbc(x_icell1, y_icell1, z_icell1,\
+                                           x_icell2, y_icell2, z_icell2,\
+                                           rp_bins, pi_bins)
+        else: #PBCs==True
+            counts += 2*xy_z_npairs_pbc(x_icell1, y_icell1, z_icell1,\
+                                        x_icell2, y_icell2, z_icell2,\
+                                        rp_bins, pi_bins, period)
+    return counts
+
+
+def wp_npairs(data1, data2, rp_bins, pi_max, Lbox=None, period=None, verbose=False,\
+              N_threads=1, approx_cell_size=None, backend='processes',\
+              precision='float64'):
+    """
+    projected pair counter.
     
     Count the number of pairs (x1,x2) that can be formed, with x1 drawn from data1 and x2
-    drawn from data2, and where distance(x1, x2) <= rbins[i]. 
+    drawn from data2, with separations in the x-y plane <= rp_bins[i], and separations 
+    along the z coordinate (the line of sight) <= pi_max.  This is equivalent to 
+    `xy_z_npairs` with the single pi bin pi_max, but the pairs are only binned in rp, 
+    and pairs with separations along the line of sight larger than pi_max are rejected 
+    before their separations in the x-y plane are calculated.
     
     Parameters
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period.
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
             
-    s_bins: array_like
-        numpy array of boundaries defining the radial bins in which pairs are counted.
+    rp_bins: array_like
+        numpy array of boundaries defining the radial projected bins in which pairs are 
+        counted.
     
-    mu_bins: array_like
-        numpy array of boundaries defining sin(angle) from the line of sight that pairs 
-        are counted in.
+    pi_max: float
+        maximum separation along the z coordinate of the pairs which are counted.
     
     Lbox: array_like, optional
         length of cube sides which encloses data1 and data2.
@@ -885,27 +1302,52 @@ def s_mu_npairs(data1, data2, s_bins, mu_bins, Lbox=None, period=None, verbose=F
     
     N_threads: int, optional
         number of 'threads' to use in the pair counting.  if set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension, see `xy_z_npairs`.
+    
+    backend: string, optional
+        'processes' (the default) or 'threads', see `xy_z_npairs`.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids, see `xy_z_npairs`.  'float32' is only 
+        available with backend='threads'.
     
     Returns
     -------
-    N_pairs: np.ndarray
-        array of shape len(s_bins) x len(mu_bins) with the number of pairs with 
-        separations less than or equal to s_bins[i], mu_bins[j].
+    N_pairs : array of length len(rp_bins)
+        number of pairs
+    
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import wp_npairs
+    >>> import numpy as np
+    >>> data = np.random.random((1000,3))
+    >>> rp_bins = np.logspace(-2,-1,5)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> N_pairs = wp_npairs(data, data, rp_bins, 0.2, period=period)
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
-    s_bins = np.array(s_bins)
-    mu_bins = np.array(mu_bins)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    rp_bins = np.array(rp_bins)
     if np.all(period==np.inf): period=None
     
     #enforce shape requirements on input
@@ -913,142 +1355,1611 @@ def s_mu_npairs(data1, data2, s_bins, mu_bins, Lbox=None, period=None, verbose=F
         raise ValueError("data1 must be of shape (Npts,3)")
     if (np.shape(data2)[1]!=3) | (data2.ndim>2):
         raise ValueError("data2 must be of shape (Npts,3)")
-    if s_bins.ndim != 1:
-        raise ValueError("s_bins must be a 1D array")
-    if mu_bins.ndim != 1:
-        raise ValueError("mu_bins must be a 1D array")
+    if rp_bins.ndim != 1:
+        raise ValueError("rp_bins must be a 1D array")
+    if (np.shape(pi_max)!=()) or (not pi_max>0.0):
+        raise ValueError("pi_max must be a positive number")
+    pi_max = float(pi_max)
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a cube")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #check to see we dont count pairs more than once    
-    if (PBCs==True) & np.any(np.max(s_bins)>Lbox/2.0):
+    if (PBCs==True) & np.any(np.max(rp_bins)>Lbox[0:2]/2.0):
+        raise ValueError('grid_pairs pair counter cannot count pairs with seperations\
+                          larger than Lbox/2 with PBCs')
+    if (PBCs==True) & (pi_max>Lbox[2]/2.0):
         raise ValueError('grid_pairs pair counter cannot count pairs with seperations\
                           larger than Lbox/2 with PBCs')
     
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2)
+    
     #build grids for data1 and data2
-    cell_size = np.array([np.max(s_bins),np.max(s_bins),np.max(s_bins)])
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    search_length = np.array([np.max(rp_bins),np.max(rp_bins),pi_max])
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
     
-    #do not square s and mu bins!
+    #square bins to make distance calculation cheaper
+    rp_bins = rp_bins**2.0
+    pi_max = pi_max**2.0
     
-    #print come information
+    #print some information
     if verbose==True:
         print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
         print("cell size= {0}".format(grid1.dL))
         print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #number of cells
     Ncell1 = np.prod(grid1.num_divs)
     
     #create a function to call with only one argument
-    engine = partial(_s_mu_npairs_engine, grid1, grid2, s_bins, mu_bins, period, PBCs)
+    if do_auto:
+        engine = partial(_wp_npairs_auto_engine, grid1, rp_bins, pi_max,\
+                         _threads_period(period, PBCs))
+    else:
+        engine = partial(_wp_npairs_engine, grid1, grid2, rp_bins, pi_max,\
+                         _threads_period(period, PBCs))
     
     #do the pair counting
-    if N_threads>1:
-        counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
-    if N_threads==1:
-        counts = np.sum(map(engine,range(Ncell1)),axis=0)
+    if backend=='threads':
+        counts = wp_npairs_threads(grid1.x, grid1.y, grid1.z, grid1.cell_id_indices,\
+                                   grid2.x, grid2.y, grid2.z, grid2.cell_id_indices,\
+                                   grid1.num_divs, grid1.num_adjacent, rp_bins, pi_max,\
+                                   _threads_period(period, PBCs), N_threads, do_auto)
+    else:
+        try:
+            counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
+        finally:
+            if close_pool: pool.close()
     
-    return counts
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    return np.cumsum(counts)
 
 
-def _s_mu_npairs_engine(grid1, grid2, s_bins, mu_bins, period, PBCs, icell1):
+def _wp_npairs_engine(grid1, grid2, rp_bins, pi_max, period, icell1):
     """
-    pair counting engine for npairs function.  This code calls a cython function.
+    pair counting engine for wp_npairs function.  This code calls a cython function.
     """
     
-    counts = np.zeros((len(s_bins),len(mu_bins)))
+    counts = np.zeros(len(rp_bins), dtype=np.int)
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
     
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
-        
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
     #get the list of neighboring cells
-    ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
-                                             grid1.num_divs[1],\
-                                             grid1.num_divs[2]))
-    adj_cell_arr = grid1.adjacent_cells(ix1, iy1, iz1)
-            
-    #Loop over each of the (up to) 27 subvolumes neighboring, including the current cell.
+    adj_cell_arr = grid1.adjacent_cells(icell1)
+    
+    #Loop over each of the neighboring subvolumes, including the current cell.
     for icell2 in adj_cell_arr:
-                
-        #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
-            
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
         #use cython functions to do pair counting
-        if PBCs==False:
-            counts += s_mu_npairs_no_pbc(x_icell1, y_icell1, z_icell1,\
-                                         x_icell2, y_icell2, z_icell2,\
-                                         s_bins, mu_bins)
-        else: #PBCs==True
-            counts += s_mu_npairs_pbc(x_icell1, y_icell1, z_icell1,\
-                                      x_icell2, y_icell2, z_icell2,\
-                                      s_bins, mu_bins, period)
+        counts += wp_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                      grid2.x[i_start2:i_end2],\
+                                      grid2.y[i_start2:i_end2],\
+                                      grid2.z[i_start2:i_end2],\
+                                      rp_bins, pi_max, period, False)
     return counts
 
 
-
-def xy_z_wnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights1=None, weights2=None,\
-            verbose=False, N_threads=1):
+def _wp_npairs_auto_engine(grid1, rp_bins, pi_max, period, icell1):
+    """
+    pair counting engine for wp_npairs function when data1 and data2 are the same 
+    sample.  Each pair of cells is visited only once.  This code calls a cython function.
     """
-    weighted real-space pair counter.
     
-    Count the weighted number of pairs (x1,x2) that can be formed, with x1 drawn from 
-    data1 and x2 drawn from data2, and where distance(x1, x2) <= rbins[i].  Weighted 
-    counts are calculated as w1*w2.
+    counts = np.zeros(len(rp_bins), dtype=np.int)
     
-    Parameters
-    ----------
-    data1: array_like
-        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data1.ndim==2.
-            
-    data2: array_like
-        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data2.ndim==2.
-            
-    rp_bins: array_like
-        numpy array of boundaries defining the radial projected bins in which pairs are 
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #count the pairs within the cell
+    counts += wp_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                  x_icell1, y_icell1, z_icell1,\
+                                  rp_bins, pi_max, period, True)
+    
+    #get the list of forward neighboring cells
+    adj_cell_arr = grid1.forward_adjacent_cells(icell1)
+    
+    #Loop over each of the forward neighboring subvolumes.  Pairs between the cells are 
+    #counted twice, as (x1,x2) and (x2,x1).
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += 2*wp_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                        grid1.x[i_start2:i_end2],\
+                                        grid1.y[i_start2:i_end2],\
+                                        grid1.z[i_start2:i_end2],\
+                                        rp_bins, pi_max, period, False)
+    return counts
+
+
+def labeled_npairs(data1, data2, rbins, labels1, labels2, Lbox=None, period=None,\
+                   verbose=False, N_threads=1, approx_cell_size=None, backend='processes',\
+                   precision='float64'):
+    """
+    labeled real-space pair counter.
+    
+    Count the number of pairs (x1,x2) that can be formed, with x1 drawn from data1 and x2 
+    drawn from data2, and where distance(x1, x2) <= rbins[i], separately for each pair 
+    of the integer labels of x1 and x2.  The pairs of several samples, e.g. galaxies in 
+    bins of luminosity or colour, are counted in a single pass over the grids, instead 
+    of once for each pair of samples.
+    
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    rbins: array_like
+        numpy array of boundaries defining the bins in which pairs are counted. 
+    
+    labels1: array_like
+        length N1 array of non-negative integer labels of the points in data1.
+    
+    labels2: array_like
+        length N2 array of non-negative integer labels of the points in data2.
+    
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+    
+    period: array_like, optional
+        length k array defining axis-aligned periodic boundary conditions. If only 
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*k).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+    
+    verbose: Boolean, optional
+        If True, print out information and progress.
+    
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting.  if set to 'max', use all 
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension, see `npairs`.
+    
+    backend: string, optional
+        'processes' (the default) or 'threads', see `npairs`.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids, see `npairs`.  'float32' is only 
+        available with backend='threads'.
+    
+    Returns
+    -------
+    N_pairs : numpy.array
+        max(labels1)+1 by max(labels2)+1 by len(rbins) array of the number counts of 
+        pairs, where N_pairs[a,b] are the counts of the pairs of the points in data1 
+        labeled a, and the points in data2 labeled b.
+    
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import labeled_npairs
+    >>> import numpy as np
+    >>> data = np.random.random((1000,3))
+    >>> labels = np.random.randint(0,3,1000)
+    >>> rbins = np.logspace(-2,-1,5)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> N_pairs = labeled_npairs(data, data, rbins, labels, labels, period=period)
+    """
+    
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
+    
+    #process input
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    rbins = np.array(rbins)
+    if np.all(period==np.inf): period=None
+    
+    #enforce shape requirements on input
+    if (np.shape(data1)[1]!=3) | (data1.ndim>2):
+        raise ValueError("data1 must be of shape (N,3)")
+    if (np.shape(data2)[1]!=3) | (data2.ndim>2):
+        raise ValueError("data2 must be of shape (N,3)")
+    if rbins.ndim != 1:
+        raise ValueError("rbins must be a 1D array")
+    labels1 = _process_labels(labels1, len(data1), 'labels1')
+    labels2 = _process_labels(labels2, len(data2), 'labels2')
+    
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
+    
+    #check to see we dont count pairs more than once
+    if (PBCs==True) & np.any(np.max(rbins)>Lbox/2.0):
+        raise ValueError('cannot count pairs with seperations \
+                          larger than Lbox/2 with PBCs')
+    
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2, labels1, labels2)
+    
+    #build grids for data1 and data2
+    search_length = np.array([np.max(rbins)]*3)
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
+    
+    #number of labels, and the labels sorted into the order of the grids
+    nlabels1 = int(np.max(labels1))+1 if len(labels1)>0 else 0
+    nlabels2 = int(np.max(labels2))+1 if len(labels2)>0 else 0
+    labels1 = labels1[grid1.idx_sorted]
+    labels2 = labels2[grid2.idx_sorted]
+    
+    #square radial bins to make distance calculation cheaper
+    rbins = rbins**2.0
+    
+    #number of cells
+    Ncell1 = np.prod(grid1.num_divs)
+    
+    #create a function to call with only one argument
+    if do_auto:
+        engine = partial(_labeled_npairs_auto_engine, grid1, labels1, nlabels1, rbins,\
+                         _threads_period(period, PBCs))
+    else:
+        engine = partial(_labeled_npairs_engine, grid1, grid2, labels1, labels2,\
+                         nlabels1, nlabels2, rbins, _threads_period(period, PBCs))
+    
+    #do the pair counting
+    if backend=='threads':
+        counts = labeled_npairs_threads(grid1.x, grid1.y, grid1.z, labels1,\
+                                        grid1.cell_id_indices,\
+                                        grid2.x, grid2.y, grid2.z, labels2,\
+                                        grid2.cell_id_indices, nlabels1, nlabels2,\
+                                        grid1.num_divs, grid1.num_adjacent, rbins,\
+                                        _threads_period(period, PBCs), N_threads, do_auto)
+    else:
+        try:
+            counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
+        finally:
+            if close_pool: pool.close()
+    
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    return np.cumsum(counts, axis=-1)
+
+
+def _labeled_npairs_engine(grid1, grid2, labels1, labels2, nlabels1, nlabels2, rbins,\
+                           period, icell1):
+    """
+    pair counting engine for labeled_npairs function.  This code calls a cython function.
+    """
+    
+    counts = np.zeros((nlabels1, nlabels2, len(rbins)), dtype=np.int)
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points, and their labels, in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    l_icell1 = labels1[i_start1:i_end1]
+    
+    #get the list of neighboring cells
+    adj_cell_arr = grid1.adjacent_cells(icell1)
+    
+    #Loop over each of the neighboring subvolumes, including the current cell.
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += labeled_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                           grid2.x[i_start2:i_end2],\
+                                           grid2.y[i_start2:i_end2],\
+                                           grid2.z[i_start2:i_end2],\
+                                           l_icell1, labels2[i_start2:i_end2],\
+                                           nlabels1, nlabels2, rbins, period, False)
+    return counts
+
+
+def _labeled_npairs_auto_engine(grid1, labels1, nlabels1, rbins, period, icell1):
+    """
+    pair counting engine for labeled_npairs function when data1 and data2 (and labels1 
+    and labels2) are the same sample.  Each pair of cells is visited only once.  This 
+    code calls a cython function.
+    """
+    
+    counts = np.zeros((nlabels1, nlabels1, len(rbins)), dtype=np.int)
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points, and their labels, in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    l_icell1 = labels1[i_start1:i_end1]
+    
+    #count the pairs within the cell
+    counts += labeled_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                       x_icell1, y_icell1, z_icell1,\
+                                       l_icell1, l_icell1, nlabels1, nlabels1,\
+                                       rbins, period, True)
+    
+    #get the list of forward neighboring cells
+    adj_cell_arr = grid1.forward_adjacent_cells(icell1)
+    
+    #Loop over each of the forward neighboring subvolumes.  Pairs between the cells are 
+    #counted twice, as (x1,x2) and (x2,x1), i.e. with the labels in both orders.
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        cell_counts = labeled_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                               grid1.x[i_start2:i_end2],\
+                                               grid1.y[i_start2:i_end2],\
+                                               grid1.z[i_start2:i_end2],\
+                                               l_icell1, labels1[i_start2:i_end2],\
+                                               nlabels1, nlabels1, rbins, period, False)
+        counts += cell_counts + np.transpose(cell_counts, (1,0,2))
+    return counts
+
+
+def s_mu_npairs(data1, data2, s_bins, mu_bins, Lbox=None, period=None, verbose=False, N_threads=1,\
+                approx_cell_size=None, backend='processes',\
+                precision='float64'):
+    """
+    real-space pair counter.
+    
+    Count the number of pairs (x1,x2) that can be formed, with x1 drawn from data1 and x2
+    drawn from data2, and where distance(x1, x2) <= rbins[i]. 
+    
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    s_bins: array_like
+        numpy array of boundaries defining the radial bins in which pairs are counted.
+    
+    mu_bins: array_like
+        numpy array of boundaries defining sin(angle) from the line of sight that pairs 
+        are counted in.
+    
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+    
+    period: array_like, optional
+        length k array defining axis-aligned periodic boundary conditions. If only 
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*k).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+    
+    verbose: Boolean, optional
+        If True, print out information and progress.
+    
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting.  if set to 'max', use all 
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the cells are the size of the maximum separation 
+        counted.  For dense samples, smaller cells (e.g. one half or one third of that 
+        size) reduce the number of separations which are calculated, at the cost of 
+        searching more neighboring cells.  If set to 'auto', the cell size is chosen 
+        based on the number of points and the size of the box and the bins.
+    
+    backend: string, optional
+        If 'processes' (the default), the pair counting is mapped over the cells of the 
+        grids by a pool of N_threads worker processes.  If 'threads', a single 
+        multi-threaded kernel loops over the cells with N_threads OpenMP threads, 
+        which avoids starting processes and copying the grids to them.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids.  The separations between points are 
+        always calculated in double precision.  'float32' halves the memory used by 
+        the grids, and is only available with backend='threads'.
+    
+    Returns
+    -------
+    N_pairs: np.ndarray
+        array of shape len(s_bins) x len(mu_bins) with the number of pairs with 
+        separations less than or equal to s_bins[i], mu_bins[j].
+    """
+    
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
+    
+    #process input
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    s_bins = np.array(s_bins)
+    mu_bins = np.array(mu_bins)
+    if np.all(period==np.inf): period=None
+    
+    #enforce shape requirements on input
+    if (np.shape(data1)[1]!=3) | (data1.ndim>2):
+        raise ValueError("data1 must be of shape (Npts,3)")
+    if (np.shape(data2)[1]!=3) | (data2.ndim>2):
+        raise ValueError("data2 must be of shape (Npts,3)")
+    if s_bins.ndim != 1:
+        raise ValueError("s_bins must be a 1D array")
+    if mu_bins.ndim != 1:
+        raise ValueError("mu_bins must be a 1D array")
+    
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
+    
+    #check to see we dont count pairs more than once    
+    if (PBCs==True) & np.any(np.max(s_bins)>Lbox/2.0):
+        raise ValueError('grid_pairs pair counter cannot count pairs with seperations\
+                          larger than Lbox/2 with PBCs')
+    
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2)
+    
+    #build grids for data1 and data2
+    search_length = np.array([np.max(s_bins),np.max(s_bins),np.max(s_bins)])
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
+    
+    #do not square s and mu bins!
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
+    
+    #number of cells
+    Ncell1 = np.prod(grid1.num_divs)
+    
+    #create a function to call with only one argument
+    if do_auto:
+        engine = partial(_s_mu_npairs_auto_engine, grid1, s_bins, mu_bins, period, PBCs)
+    else:
+        engine = partial(_s_mu_npairs_engine, grid1, grid2, s_bins, mu_bins, period, PBCs)
+    
+    #do the pair counting
+    if backend=='threads':
+        counts = s_mu_npairs_threads(grid1.x, grid1.y, grid1.z, grid1.cell_id_indices,\
+                                     grid2.x, grid2.y, grid2.z, grid2.cell_id_indices,\
+                                     grid1.num_divs, grid1.num_adjacent,\
+                                     s_bins, mu_bins,\
+                                     _threads_period(period, PBCs), N_threads, do_auto)
+    else:
+        try:
+            counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
+        finally:
+            if close_pool: pool.close()
+    
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    counts = np.cumsum(np.cumsum(counts, axis=0), axis=1)
+    
+    return counts
+
+
+def _s_mu_npairs_engine(grid1, grid2, s_bins, mu_bins, period, PBCs, icell1):
+    """
+    pair counting engine for npairs function.  This code calls a cython function.
+    """
+    
+    counts = np.zeros((len(s_bins),len(mu_bins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+        
+    #get the list of neighboring cells
+    ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
+                                             grid1.num_divs[1],\
+                                             grid1.num_divs[2]))
+    adj_cell_arr = grid1.adjacent_cells(ix1, iy1, iz1)
+            
+    #Loop over each of the (up to) 27 subvolumes neighboring, including the current cell.
+    for icell2 in adj_cell_arr:
+                
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
+        #extract the points in the cell
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
+            
+        #use cython functions to do pair counting
+        if PBCs==False:
+            counts += s_mu_npairs_no_pbc(x_icell1, y_icell1, z_icell1,\
+                                         x_icell2, y_icell2, z_icell2,\
+                                         s_bins, mu_bins)
+        else: #PBCs==True
+            counts += s_mu_npairs_pbc(x_icell1, y_icell1, z_icell1,\
+                                      x_icell2, y_icell2, z_icell2,\
+                                      s_bins, mu_bins, period)
+    return counts
+
+
+def _s_mu_npairs_auto_engine(grid1, s_bins, mu_bins, period, PBCs, icell1):
+    """
+    pair counting engine for s_mu_npairs function when data1 and data2 are the same 
+    sample.  Each pair of cells is visited only once.  This code calls a cython function.
+    """
+    
+    counts = np.zeros((len(s_bins),len(mu_bins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #count the pairs within the cell
+    if PBCs==False:
+        counts += s_mu_npairs_auto_no_pbc(x_icell1, y_icell1, z_icell1, s_bins, mu_bins)
+    else: #PBCs==True
+        counts += s_mu_npairs_auto_pbc(x_icell1, y_icell1, z_icell1,\
+                                       s_bins, mu_bins, period)
+    
+    #get the list of forward neighboring cells
+    ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
+                                             grid1.num_divs[1],\
+                                             grid1.num_divs[2]))
+    adj_cell_arr = grid1.forward_adjacent_cells(ix1, iy1, iz1)
+    
+    #Loop over each of the 13 forward neighboring subvolumes.  Pairs between the cells 
+    #are counted twice, as (x1,x2) and (x2,x1).
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        
+        #extract the points in the cell
+        x_icell2 = grid1.x[i_start2:i_end2]
+        y_icell2 = grid1.y[i_start2:i_end2]
+        z_icell2 = grid1.z[i_start2:i_end2]
+        
+        #use cython functions to do pair counting
+        if PBCs==False:
+            counts += 2*s_mu_npairs_no_pbc(x_icell1, y_icell1, z_icell1,\
+                                           x_icell2, y_icell2, z_icell2,\
+                                           s_bins, mu_bins)
+        else: #PBCs==True
+            counts += 2*s_mu_npairs_pbc(x_icell1, y_icell1, z_icell1,\
+                                        x_icell2, y_icell2, z_icell2,\
+                                        s_bins, mu_bins, period)
+    return counts
+
+
+
+def multipole_npairs(data1, data2, s_bins, ells=[0,2,4], Lbox=None, period=None,\
+                     verbose=False, N_threads=1, approx_cell_size=None,\
+                     backend='processes', precision='float64'):
+    """
+    Legendre multipole pair counter.
+    
+    Sum the Legendre polynomials, :math:`P_{\\ell}(\\mu)`, of the pairs (x1,x2) that can 
+    be formed, with x1 drawn from data1 and x2 drawn from data2, and where 
+    distance(x1, x2) <= s_bins[i], where mu is the cosine of the angle between the 
+    separation of the pair and the line of sight (the z coordinate).  The multipoles are 
+    accumulated as the pairs are counted, so, unlike `s_mu_npairs`, they do not require 
+    the pairs to be binned in mu.
+    
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    s_bins: array_like
+        numpy array of boundaries defining the bins in which pairs are counted. 
+    
+    ells: array_like, optional
+        non-negative integer orders of the Legendre polynomials.  Default is [0,2,4], 
+        i.e. the monopole, quadrupole, and hexadecapole.
+    
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+    
+    period: array_like, optional
+        length k array defining axis-aligned periodic boundary conditions. If only 
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*k).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+    
+    verbose: Boolean, optional
+        If True, print out information and progress.
+    
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting.  if set to 'max', use all 
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension, see `npairs`.
+    
+    backend: string, optional
+        'processes' (the default) or 'threads', see `npairs`.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids, see `npairs`.  'float32' is only 
+        available with backend='threads'.
+    
+    Returns
+    -------
+    N_pairs : numpy.array
+        len(s_bins) by len(ells) array of the sums of :math:`P_{\\ell}(\\mu)` over the 
+        pairs with separations <= s_bins[i].  The column with ell=0 is the number of 
+        pairs.
+    
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import multipole_npairs
+    >>> import numpy as np
+    >>> data = np.random.random((1000,3))
+    >>> s_bins = np.logspace(-2,-1,5)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> N_pairs = multipole_npairs(data, data, s_bins, ells=[0,2], period=period)
+    """
+    
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
+    
+    #process input
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    s_bins = np.array(s_bins)
+    ells = np.atleast_1d(ells)
+    if np.all(period==np.inf): period=None
+    
+    #enforce shape requirements on input
+    if (np.shape(data1)[1]!=3) | (data1.ndim>2):
+        raise ValueError("data1 must be of shape (N,3)")
+    if (np.shape(data2)[1]!=3) | (data2.ndim>2):
+        raise ValueError("data2 must be of shape (N,3)")
+    if s_bins.ndim != 1:
+        raise ValueError("s_bins must be a 1D array")
+    if (ells.ndim!=1) or (len(ells)==0) or (not np.issubdtype(ells.dtype, np.integer)):
+        raise ValueError("ells must be a 1D array of integers")
+    if np.any(ells<0):
+        raise ValueError("ells must be >=0")
+    ells = ells.astype(np.int64)
+    
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
+    
+    #check to see we dont count pairs more than once
+    if (PBCs==True) & np.any(np.max(s_bins)>Lbox/2.0):
+        raise ValueError('cannot count pairs with seperations \
+                          larger than Lbox/2 with PBCs')
+    
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2)
+    
+    #build grids for data1 and data2
+    search_length = np.array([np.max(s_bins)]*3)
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
+    
+    #square radial bins to make distance calculation cheaper
+    s_bins = s_bins**2.0
+    
+    #number of cells
+    Ncell1 = np.prod(grid1.num_divs)
+    
+    #create a function to call with only one argument
+    if do_auto:
+        engine = partial(_multipole_npairs_auto_engine, grid1, s_bins, ells,\
+                         _threads_period(period, PBCs))
+    else:
+        engine = partial(_multipole_npairs_engine, grid1, grid2, s_bins, ells,\
+                         _threads_period(period, PBCs))
+    
+    #do the pair counting
+    if backend=='threads':
+        counts = multipole_npairs_threads(grid1.x, grid1.y, grid1.z, grid1.cell_id_indices,\
+                                          grid2.x, grid2.y, grid2.z, grid2.cell_id_indices,\
+                                          grid1.num_divs, grid1.num_adjacent,\
+                                          s_bins, ells,\
+                                          _threads_period(period, PBCs), N_threads, do_auto)
+    else:
+        try:
+            counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
+        finally:
+            if close_pool: pool.close()
+    
+    #the engines return the sums in each bin, accumulate these once to get the cumulative 
+    #sums, in the same (s, ell) layout as the (s, mu) counts of `s_mu_npairs`
+    return np.cumsum(counts, axis=1).T
+
+
+def _multipole_npairs_engine(grid1, grid2, s_bins, ells, period, icell1):
+    """
+    pair counting engine for multipole_npairs function.  This code calls a cython 
+    function.
+    """
+    
+    counts = np.zeros((len(ells), len(s_bins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #get the list of neighboring cells
+    adj_cell_arr = grid1.adjacent_cells(icell1)
+    
+    #Loop over each of the neighboring subvolumes, including the current cell.
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += multipole_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                             grid2.x[i_start2:i_end2],\
+                                             grid2.y[i_start2:i_end2],\
+                                             grid2.z[i_start2:i_end2],\
+                                             s_bins, ells, period, False)
+    return counts
+
+
+def _multipole_npairs_auto_engine(grid1, s_bins, ells, period, icell1):
+    """
+    pair counting engine for multipole_npairs function when data1 and data2 are the same 
+    sample.  Each pair of cells is visited only once.  This code calls a cython function.
+    """
+    
+    counts = np.zeros((len(ells), len(s_bins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #count the pairs within the cell
+    counts += multipole_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                         x_icell1, y_icell1, z_icell1,\
+                                         s_bins, ells, period, True)
+    
+    #get the list of forward neighboring cells
+    adj_cell_arr = grid1.forward_adjacent_cells(icell1)
+    
+    #Loop over each of the forward neighboring subvolumes.  Pairs between the cells are 
+    #counted twice, as (x1,x2) and (x2,x1).
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += 2.0*multipole_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                                 grid1.x[i_start2:i_end2],\
+                                                 grid1.y[i_start2:i_end2],\
+                                                 grid1.z[i_start2:i_end2],\
+                                                 s_bins, ells, period, False)
+    return counts
+
+
+def multi_npairs(data1, data2, binnings, Lbox=None, period=None, verbose=False,\
+                 N_threads=1, approx_cell_size=None, backend='processes',\
+                 precision='float64'):
+    """
+    real-space and 2+1D pair counter, filling several binnings in one pass.
+    
+    Count the pairs (x1,x2) that can be formed, with x1 drawn from data1 and x2 drawn 
+    from data2, in each of the binnings of `npairs`, `xy_z_npairs`, and `s_mu_npairs`.  
+    The separations of each pair are only calculated once, and binned in all of the 
+    binnings, which is faster than calling the pair counters separately.
+    
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+    
+    binnings: list
+        list of binnings, each of which is one of:
+        
+        * ('r', rbins), the bins of `npairs`
+        * ('xy_z', rp_bins, pi_bins), the bins of `xy_z_npairs`
+        * ('s_mu', s_bins, mu_bins), the bins of `s_mu_npairs`
+    
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+    
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only 
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+    
+    verbose: Boolean, optional
+        If True, print out information and progress.
+    
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting.  if set to 'max', use all 
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate length 3 array of the cell size used to grid the points along each 
+        dimension, see `npairs`.
+    
+    backend: string, optional
+        'processes' (the default) or 'threads', see `npairs`.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids, see `npairs`.
+    
+    Returns
+    -------
+    N_pairs: list
+        list of the number counts of pairs in each of the binnings, in the same form as 
+        returned by `npairs`, `xy_z_npairs`, or `s_mu_npairs`.
+    
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters.rect_cuboid_pairs import multi_npairs
+    >>> import numpy as np
+    >>> data = np.random.random((1000,3))
+    >>> rbins = np.logspace(-2,-0.5,10)
+    >>> pi_bins = np.linspace(0.0,0.3,4)
+    >>> mu_bins = np.linspace(0.0,1.0,5)
+    >>> binnings = [('r', rbins), ('xy_z', rbins, pi_bins), ('s_mu', rbins, mu_bins)]
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> r_counts, xy_z_counts, s_mu_counts = multi_npairs(data, data, binnings, period=period)
+    """
+    
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
+    
+    #process input
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    binnings = _process_binnings(binnings)
+    if np.all(period==np.inf): period=None
+    
+    #enforce shape requirements on input
+    if (np.shape(data1)[1]!=3) | (data1.ndim>2):
+        raise ValueError("data1 must be of shape (Npts,3)")
+    if (np.shape(data2)[1]!=3) | (data2.ndim>2):
+        raise ValueError("data2 must be of shape (Npts,3)")
+    
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
+    
+    #the largest separation along each dimension of any of the binnings
+    search_length = _binnings_search_length(binnings)
+    
+    #check to see we dont count pairs more than once
+    if (PBCs==True) & np.any(search_length>Lbox/2.0):
+        raise ValueError('cannot count pairs with seperations \
+                          larger than Lbox/2 with PBCs')
+    
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2)
+    
+    #build grids for data1 and data2
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
+    
+    #pack the (squared, where appropriate) bins of all binnings into single arrays
+    edges, specs, ncounts = _pack_binnings(binnings)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
+        print("number of binnings = {0}".format(len(binnings)))
+    
+    #number of cells
+    Ncell1 = np.prod(grid1.num_divs)
+    
+    #create a function to call with only one argument
+    if do_auto:
+        engine = partial(_multi_npairs_auto_engine, grid1, edges, specs, ncounts,\
+                         _threads_period(period, PBCs))
+    else:
+        engine = partial(_multi_npairs_engine, grid1, grid2, edges, specs, ncounts,\
+                         _threads_period(period, PBCs))
+    
+    #do the pair counting
+    if backend=='threads':
+        counts = multi_npairs_threads(grid1.x, grid1.y, grid1.z, grid1.cell_id_indices,\
+                                      grid2.x, grid2.y, grid2.z, grid2.cell_id_indices,\
+                                      grid1.num_divs, grid1.num_adjacent, edges, specs,\
+                                      ncounts, _threads_period(period, PBCs), N_threads,\
+                                      do_auto)
+    else:
+        try:
+            counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
+        finally:
+            if close_pool: pool.close()
+    
+    #split the counts into the histogram of each binning, and accumulate these once to 
+    #get the cumulative counts
+    return _unpack_counts(counts, binnings, specs)
+
+
+def _multi_npairs_engine(grid1, grid2, edges, specs, ncounts, period, icell1):
+    """
+    pair counting engine for multi_npairs function.  This code calls a cython function.
+    """
+    
+    counts = np.zeros(ncounts, dtype=np.int)
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #get the list of neighboring cells
+    adj_cell_arr = grid1.adjacent_cells(icell1)
+    
+    #Loop over each of the neighboring subvolumes, including the current cell.
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += multi_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                         grid2.x[i_start2:i_end2],\
+                                         grid2.y[i_start2:i_end2],\
+                                         grid2.z[i_start2:i_end2],\
+                                         edges, specs, ncounts, period, False)
+    return counts
+
+
+def _multi_npairs_auto_engine(grid1, edges, specs, ncounts, period, icell1):
+    """
+    pair counting engine for multi_npairs function when data1 and data2 are the same 
+    sample.  Each pair of cells is visited only once.  This code calls a cython function.
+    """
+    
+    counts = np.zeros(ncounts, dtype=np.int)
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #count the pairs within the cell
+    counts += multi_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                     x_icell1, y_icell1, z_icell1,\
+                                     edges, specs, ncounts, period, True)
+    
+    #get the list of forward neighboring cells
+    adj_cell_arr = grid1.forward_adjacent_cells(icell1)
+    
+    #Loop over each of the forward neighboring subvolumes.  Pairs between the cells are 
+    #counted twice, as (x1,x2) and (x2,x1).
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += 2*multi_npairs_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                           grid1.x[i_start2:i_end2],\
+                                           grid1.y[i_start2:i_end2],\
+                                           grid1.z[i_start2:i_end2],\
+                                           edges, specs, ncounts, period, False)
+    return counts
+
+
+#kinds of binnings accepted by multi_npairs, and the number of sets of bins of each
+_BINNING_KINDS = {'r':1, 'xy_z':2, 's_mu':2}
+
+
+def _process_binnings(binnings):
+    """
+    check the binnings passed to `multi_npairs`, returning a list of (kind, bins) 
+    tuples, where bins is a list of 1D arrays.
+    """
+    
+    if len(binnings)==0:
+        raise ValueError("at least one binning must be specified")
+    
+    result = []
+    for binning in binnings:
+        kind = binning[0]
+        if kind not in _BINNING_KINDS:
+            raise ValueError("binning must be one of {0}".format(_BINNING_KINDS.keys()))
+        bins = [np.asarray(b, dtype=np.float64) for b in binning[1:]]
+        if len(bins)!=_BINNING_KINDS[kind]:
+            raise ValueError("a '{0}' binning requires {1} sets of bins"\
+                             .format(kind, _BINNING_KINDS[kind]))
+        for b in bins:
+            if b.ndim != 1:
+                raise ValueError("bins must be 1D arrays")
+        result.append((kind, bins))
+    
+    return result
+
+
+def _binnings_search_length(binnings):
+    """
+    return the largest separation along each dimension counted in any of the binnings.
+    """
+    
+    search_length = np.zeros(3)
+    for kind, bins in binnings:
+        if kind=='xy_z':
+            length = np.array([np.max(bins[0]), np.max(bins[0]), np.max(bins[1])])
+        else:
+            length = np.array([np.max(bins[0])]*3)
+        search_length = np.maximum(search_length, length)
+    
+    return search_length
+
+
+def _pack_binnings(binnings):
+    """
+    pack the bins of several binnings into the arrays passed to the cython multi-binning 
+    functions, see `binning.multi_binning`.  r, rp, and pi bins are squared, s and mu 
+    bins are not.
+    
+    Returns
+    -------
+    edges: numpy.array
+        the bins of every binning
+    
+    specs: numpy.array
+        Nbinnings by 6 array with the kind of each binning, the offsets into edges and 
+        the lengths of the bins, and the offset into the (flattened) histograms.
+    
+    ncounts: int
+        total number of bins of the histograms
+    """
+    
+    kinds = {'r':0, 'xy_z':1, 's_mu':2}
+    
+    edges = []
+    specs = np.zeros((len(binnings),6), dtype=np.int64)
+    offset, ncounts = 0, 0
+    for i, (kind, bins) in enumerate(binnings):
+        if kind!='s_mu': bins = [b**2.0 for b in bins]
+        if len(bins)==1: bins = bins + [np.zeros(0)]
+        specs[i] = [kinds[kind], offset, offset+len(bins[0]), len(bins[0]), len(bins[1]),\
+                    ncounts]
+        edges += bins
+        offset += len(bins[0]) + len(bins[1])
+        ncounts += len(bins[0])*max(len(bins[1]),1)
+    
+    return np.ascontiguousarray(np.concatenate(edges)), specs, ncounts
+
+
+def _unpack_counts(counts, binnings, specs):
+    """
+    split the flattened histograms returned by the multi-binning engines into the 
+    cumulative counts of each binning.
+    """
+    
+    result = []
+    for (kind, bins), spec in zip(binnings, specs):
+        if kind=='r':
+            result.append(np.cumsum(counts[spec[5]:spec[5]+spec[3]]))
+        else:
+            hist = counts[spec[5]:spec[5]+spec[3]*spec[4]].reshape((spec[3],spec[4]))
+            result.append(np.cumsum(np.cumsum(hist, axis=0), axis=1))
+    
+    return result
+
+
+def npairs_per_point(data1, data2, rbins, Lbox=None, period=None, weights2=None,\
+                     verbose=False, N_threads=1, approx_cell_size=None,\
+                     backend='processes', precision='float64'):
+    """
+    real-space pair counter, returning the counts around each point, i.e. counts-in-spheres.
+    
+    For each point x1 in data1, count the number of points x2 in data2 with 
+    distance(x1, x2) <= rbins[i], or the summed weights of these points if weights2 is 
+    passed.  The counts are calculated with the same grids as `npairs`, without storing 
+    the pairs.  If data1 and data2 are the same sample, each point is counted as its 
+    own neighbor.
+    
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    rbins: array_like
+        numpy array of boundaries defining the bins in which pairs are counted. 
+    
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+    
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only 
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+    
+    weights2: array_like, optional
+        length N2 array containing the weights of the points in data2.
+    
+    verbose: Boolean, optional
+        If True, print out information and progress.
+    
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting.  if set to 'max', use all 
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate length 3 array of the cell size used to grid the points along each 
+        dimension, see `npairs`.
+    
+    backend: string, optional
+        'processes' (the default) or 'threads', see `npairs`.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids, see `npairs`.
+    
+    Returns
+    -------
+    N_pairs : numpy.array
+        N1 by len(rbins) array of the number counts of data2 around each point in 
+        data1, or of the summed weights if weights2 is passed.
+    
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters import npairs_per_point
+    >>> import numpy as np
+    >>> data = np.random.random((1000,3))
+    >>> rbins = np.array([0.05,0.1])
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> counts = npairs_per_point(data, data, rbins, period=period)
+    >>> isolated = (counts[:,0]==1)
+    """
+    
+    rbins = np.array(rbins)
+    if rbins.ndim != 1:
+        raise ValueError("rbins must be a 1D array")
+    
+    counts = _npairs_per_point(data1, data2, rbins, np.array([0.0]), False, Lbox, period,\
+                               weights2, verbose, N_threads, approx_cell_size, backend,\
+                               precision)
+    
+    return counts.reshape((len(counts), len(rbins)))
+
+
+def xy_z_npairs_per_point(data1, data2, rp_bins, pi_bins, Lbox=None, period=None,\
+                          weights2=None, verbose=False, N_threads=1,\
+                          approx_cell_size=None, backend='processes',\
+                          precision='float64'):
+    """
+    2+1D pair counter, returning the counts around each point, i.e. counts-in-cylinders.
+    
+    For each point x1 in data1, count the number of points x2 in data2 with separations 
+    in the x-y plane d_perp(x1, x2) <= rp_bins[i], and separations along the z 
+    coordinate d_para(x1, x2) <= pi_bins[j], or the summed weights of these points if 
+    weights2 is passed.  The counts are calculated with the same grids as `xy_z_npairs`, 
+    without storing the pairs.  If data1 and data2 are the same sample, each point is 
+    counted as its own neighbor.
+    
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period.  A `GridIndex` may also be passed, in which case its cached grids 
+        are used.
+            
+    rp_bins: array_like
+        numpy array of boundaries defining the radial projected bins in which pairs are 
+        counted.
+    
+    pi_bins: array_like
+        numpy array of boundaries defining the parallel bins in which pairs are counted.
+        For the counts in a single cylinder of half length pi_max, use [pi_max].
+    
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.
+    
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only 
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+    
+    weights2: array_like, optional
+        length N2 array containing the weights of the points in data2.
+    
+    verbose: Boolean, optional
+        If True, print out information and progress.
+    
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting.  if set to 'max', use all 
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.
+    
+    approx_cell_size: array_like, optional
+        approximate length 3 array of the cell size used to grid the points along each 
+        dimension, see `npairs`.
+    
+    backend: string, optional
+        'processes' (the default) or 'threads', see `npairs`.
+    
+    precision: string, optional
+        'float64' (the default) or 'float32', the precision in which the coordinates 
+        of the points are stored in the grids, see `npairs`.
+    
+    Returns
+    -------
+    N_pairs : numpy.array
+        N1 by len(rp_bins) by len(pi_bins) array of the number counts of data2 around 
+        each point in data1, or of the summed weights if weights2 is passed.
+    """
+    
+    rp_bins = np.array(rp_bins)
+    pi_bins = np.array(pi_bins)
+    if rp_bins.ndim != 1:
+        raise ValueError("rp_bins must be a 1D array")
+    if pi_bins.ndim != 1:
+        raise ValueError("pi_bins must be a 1D array")
+    
+    counts = _npairs_per_point(data1, data2, rp_bins, pi_bins, True, Lbox, period,\
+                               weights2, verbose, N_threads, approx_cell_size, backend,\
+                               precision)
+    
+    return counts.reshape((len(counts), len(rp_bins), len(pi_bins)))
+
+
+def _npairs_per_point(data1, data2, rp_bins, pi_bins, xy_z, Lbox, period, weights2,\
+                      verbose, N_threads, approx_cell_size, backend, precision):
+    """
+    count the pairs around each point of data1 for `npairs_per_point` (xy_z=False, in 
+    which case pi_bins is not used) and `xy_z_npairs_per_point` (xy_z=True).  Return 
+    the cumulative counts as an N1 by len(rp_bins)*len(pi_bins) array.
+    """
+    
+    #single precision coordinates are only supported by the multi-threaded kernels
+    if (_process_precision(precision)=='float32') & (backend!='threads'):
+        raise ValueError("precision='float32' is only available with backend='threads'")
+    
+    #process N_threads, returning a (possibly shared) pool of worker processes, or the 
+    #number of threads used by the multi-threaded kernel
+    if _process_backend(backend)=='threads':
+        pool, close_pool = None, False
+        N_threads = _get_num_threads(N_threads)
+    else:
+        pool, close_pool = _get_pool(N_threads)
+    
+    #process input
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
+    if np.all(period==np.inf): period=None
+    
+    #enforce shape requirements on input
+    if (np.shape(data1)[1]!=3) | (data1.ndim>2):
+        raise ValueError("data1 must be of shape (Npts,3)")
+    if (np.shape(data2)[1]!=3) | (data2.ndim>2):
+        raise ValueError("data2 must be of shape (Npts,3)")
+    
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
+    
+    #Process weights2 entry and check for consistency.
+    weighted = weights2 is not None
+    if weights2 is None:
+        weights2 = np.ones(np.shape(data2)[0], dtype=np.float64)
+    else:
+        weights2 = np.asarray(weights2).astype("float64")
+        if np.shape(weights2)!=(np.shape(data2)[0],):
+            raise ValueError("weights2 should be a 1D array with the same len as data2")
+    
+    #the largest separation along each dimension
+    if xy_z:
+        search_length = np.array([np.max(rp_bins),np.max(rp_bins),np.max(pi_bins)])
+    else:
+        search_length = np.array([np.max(rp_bins)]*3)
+    
+    #check to see we dont count pairs more than once
+    if (PBCs==True) & np.any(search_length>Lbox/2.0):
+        raise ValueError('cannot count pairs with seperations \
+                          larger than Lbox/2 with PBCs')
+    
+    #build grids for data1 and data2.  Every point needs the pairs with all of its 
+    #neighbors, so the pairs of a sample with itself are not visited only once.
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length, precision)
+    grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length, precision)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
+    
+    #sort the weights array
+    weights2 = weights2[grid2.idx_sorted]
+    
+    #square bins to make distance calculation cheaper
+    rp_bins = rp_bins**2.0
+    pi_bins = pi_bins**2.0
+    
+    #number of cells
+    Ncell1 = np.prod(grid1.num_divs)
+    
+    #create a function to call with only one argument
+    engine = partial(_npairs_per_point_engine, grid1, grid2, weights2, rp_bins, pi_bins,\
+                     _threads_period(period, PBCs), xy_z)
+    
+    #do the pair counting, the counts are in the (sorted) order of the points in grid1
+    if backend=='threads':
+        counts = npairs_per_point_threads(grid1.x, grid1.y, grid1.z,\
+                                          grid1.cell_id_indices,\
+                                          grid2.x, grid2.y, grid2.z, weights2,\
+                                          grid2.cell_id_indices,\
+                                          grid1.num_divs, grid1.num_adjacent,\
+                                          rp_bins, pi_bins,\
+                                          _threads_period(period, PBCs), N_threads, xy_z)
+    else:
+        try:
+            counts = np.vstack(pool.map(engine,range(Ncell1)))
+        finally:
+            if close_pool: pool.close()
+    
+    #accumulate the number of pairs in each bin to get the cumulative counts
+    if xy_z:
+        counts = counts.reshape((len(counts), len(rp_bins), len(pi_bins)))
+        counts = np.cumsum(np.cumsum(counts, axis=1), axis=2)
+    else:
+        counts = np.cumsum(counts, axis=1)
+    counts = counts.reshape((len(counts), len(rp_bins)*len(pi_bins)))
+    
+    #return the counts in the order of the points in data1
+    result = np.empty_like(counts)
+    result[grid1.idx_sorted] = counts
+    
+    if not weighted:
+        result = result.astype(np.int)
+    
+    return result
+
+
+def _npairs_per_point_engine(grid1, grid2, weights2, rp_bins, pi_bins, period, xy_z,\
+                             icell1):
+    """
+    pair counting engine for the per-point pair counters.  Return the counts around 
+    each point in cell icell1 of grid1.  This code calls a cython function.
+    """
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
+    counts = np.zeros((i_end1-i_start1, len(rp_bins)*len(pi_bins)))
+    if i_end1==i_start1: return counts
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+    
+    #get the list of neighboring cells
+    adj_cell_arr = grid1.adjacent_cells(icell1)
+    
+    #Loop over each of the neighboring subvolumes, including the current cell.
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        if i_end2==i_start2: continue
+        
+        #use cython functions to do pair counting
+        counts += npairs_per_point_cell_pair(x_icell1, y_icell1, z_icell1,\
+                                             grid2.x[i_start2:i_end2],\
+                                             grid2.y[i_start2:i_end2],\
+                                             grid2.z[i_start2:i_end2],\
+                                             weights2[i_start2:i_end2],\
+                                             rp_bins, pi_bins, period, xy_z)
+    return counts
+
+
+def xy_z_wnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights1=None,\
+                 weights2=None, verbose=False, N_threads=1, approx_cell_size=None):
+    """
+    weighted real-space pair counter.
+    
+    Count the weighted number of pairs (x1,x2) that can be formed, with x1 drawn from 
+    data1 and x2 drawn from data2, and where distance(x1, x2) <= rbins[i].  Weighted 
+    counts are calculated as w1*w2.
+    
+    Parameters
+    ----------
+    data1: array_like
+        N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period. This cython implementation requires data1.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
+            
+    data2: array_like
+        N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
+        period. This cython implementation requires data2.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
+            
+    rp_bins: array_like
+        numpy array of boundaries defining the radial projected bins in which pairs are 
         counted.
     
     pi_bins: array_like
@@ -1073,7 +2984,18 @@ def xy_z_wnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
     
     N_threads: int, optional
         number of 'threads' to use in the pair counting.  if set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.  Only the 
+        pool of worker processes is supported by this counter, i.e. there is no 
+        multi-threaded (backend='threads') or single precision version.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the cells are the size of the maximum separation 
+        counted.  For dense samples, smaller cells (e.g. one half or one third of that 
+        size) reduce the number of separations which are calculated, at the cost of 
+        searching more neighboring cells.  If set to 'auto', the cell size is chosen 
+        based on the number of points and the size of the box and the bins.
         
     Returns
     -------
@@ -1081,16 +3003,12 @@ def xy_z_wnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
         number counts of pairs
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #process N_threads, returning a (possibly shared) pool of worker processes
+    pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     rp_bins = np.array(rp_bins)
     pi_bins = np.array(pi_bins)
     if np.all(period==np.inf): period=None
@@ -1105,43 +3023,9 @@ def xy_z_wnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
     if pi_bins.ndim != 1:
         raise ValueError("pi_bins must be a 1D array")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a cube")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #Process weights1 entry and check for consistency.
     if weights1 is None:
@@ -1166,10 +3050,26 @@ def xy_z_wnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
         raise ValueError('grid_pairs pair counter cannot count pairs with seperations\
                           larger than Lbox/2 with PBCs')
     
+    #are we counting the pairs of a sample with itself?
+    do_auto = _is_auto(data1, data2, weights1, weights2)
+    
     #build grids for data1 and data2
-    cell_size = np.array([np.max(rp_bins),np.max(rp_bins),np.max(pi_bins)])
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    search_length = np.array([np.max(rp_bins),np.max(rp_bins),np.max(pi_bins)])
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length)
+    if do_auto & grid1.has_forward_cells():
+        grid2 = grid1
+    else:
+        do_auto = False
+        grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #sort the weights arrays
     weights1 = weights1[grid1.idx_sorted]
@@ -1183,13 +3083,20 @@ def xy_z_wnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
     Ncell1 = np.prod(grid1.num_divs)
     
     #create a function to call with only one argument
-    engine = partial(_xy_z_wnpairs_engine, grid1, grid2, weights1, weights2, rp_bins, pi_bins, period, PBCs)
+    if do_auto:
+        engine = partial(_xy_z_wnpairs_auto_engine, grid1, weights1, rp_bins, pi_bins, period, PBCs)
+    else:
+        engine = partial(_xy_z_wnpairs_engine, grid1, grid2, weights1, weights2, rp_bins, pi_bins, period, PBCs)
     
     #do the pair counting
-    if N_threads>1:
+    try:
         counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
-    if N_threads==1:
-        counts = np.sum(map(engine,range(Ncell1)),axis=0)
+    finally:
+        if close_pool: pool.close()
+    
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    counts = np.cumsum(np.cumsum(counts, axis=0), axis=1)
     
     return counts
 
@@ -1198,13 +3105,16 @@ def _xy_z_wnpairs_engine(grid1, grid2, weights1, weights2, rp_bins, pi_bins, per
     
     counts = np.zeros((len(rp_bins),len(pi_bins)))
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
         
     #extract the weights in the cell
-    w_icell1 = weights1[grid1.slice_array[icell1]]
+    w_icell1 = weights1[i_start1:i_end1]
         
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
@@ -1219,13 +3129,16 @@ def _xy_z_wnpairs_engine(grid1, grid2, weights1, weights2, rp_bins, pi_bins, per
                                                  grid2.num_divs[1],\
                                                  grid2.num_divs[2]))
         
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
         
         #extract the weights in the cell
-        w_icell2 = weights2[grid2.slice_array[icell2]]
+        w_icell2 = weights2[i_start2:i_end2]
         
         #use cython functions to do pair counting
         if PBCs==False:
@@ -1241,8 +3154,71 @@ def _xy_z_wnpairs_engine(grid1, grid2, weights1, weights2, rp_bins, pi_bins, per
     return counts
 
 
-def xy_z_jnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights1=None, weights2=None,\
-            jtags1=None, jtags2=None, N_samples=0, verbose=False, N_threads=1):
+def _xy_z_wnpairs_auto_engine(grid1, weights1, rp_bins, pi_bins, period, PBCs, icell1):
+    """
+    pair counting engine for xy_z_wnpairs function when data1 and data2 (and weights1 
+    and weights2) are the same sample.  Each pair of cells is visited only once.
+    """
+    
+    counts = np.zeros((len(rp_bins),len(pi_bins)))
+    
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
+    #extract the points in the cell
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
+        
+    #extract the weights in the cell
+    w_icell1 = weights1[i_start1:i_end1]
+    
+    #count the pairs within the cell
+    if PBCs==False:
+        counts += xy_z_wnpairs_auto_no_pbc(x_icell1, y_icell1, z_icell1, w_icell1,\
+                                           rp_bins, pi_bins)
+    else: #PBCs==True
+        counts += xy_z_wnpairs_auto_pbc(x_icell1, y_icell1, z_icell1, w_icell1,\
+                                        rp_bins, pi_bins, period)
+        
+    #get the list of forward neighboring cells
+    ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
+                                             grid1.num_divs[1],\
+                                             grid1.num_divs[2]))
+    adj_cell_arr = grid1.forward_adjacent_cells(ix1, iy1, iz1)
+        
+    #Loop over each of the 13 forward neighboring subvolumes.  Pairs between the cells 
+    #are counted twice, as (x1,x2) and (x2,x1).
+    for icell2 in adj_cell_arr:
+        
+        #indices of the points in the cell
+        i_start2, i_end2 = grid1.cell_id_indices[icell2], grid1.cell_id_indices[icell2+1]
+        
+        #extract the points in the cell
+        x_icell2 = grid1.x[i_start2:i_end2]
+        y_icell2 = grid1.y[i_start2:i_end2]
+        z_icell2 = grid1.z[i_start2:i_end2]
+        
+        #extract the weights in the cell
+        w_icell2 = weights1[i_start2:i_end2]
+        
+        #use cython functions to do pair counting
+        if PBCs==False:
+            counts += 2.0*xy_z_wnpairs_no_pbc(x_icell1, y_icell1, z_icell1,\
+                                              x_icell2, y_icell2, z_icell2,\
+                                              w_icell1, w_icell2,\
+                                              rp_bins, pi_bins)
+        else: #PBCs==True
+            counts += 2.0*xy_z_wnpairs_pbc(x_icell1, y_icell1, z_icell1,\
+                                           x_icell2, y_icell2, z_icell2,\
+                                           w_icell1, w_icell2,\
+                                           rp_bins, pi_bins, period)
+    return counts
+
+
+def xy_z_jnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights1=None,\
+                 weights2=None, jtags1=None, jtags2=None, N_samples=0, verbose=False,\
+                 N_threads=1, approx_cell_size=None):
     """
     jackknife weighted real-space pair counter.
     
@@ -1254,11 +3230,13 @@ def xy_z_jnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
     ----------
     data1: array_like
         N1 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data1.ndim==2.
+        period. This cython implementation requires data1.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
             
     data2: array_like
         N2 by 3 numpy array of 3-dimensional positions. Should be between zero and 
-        period. This cython implementation requires data2.ndim==2.
+        period. This cython implementation requires data2.ndim==2.  A `GridIndex` may 
+        also be passed, in which case its cached grids are used.
             
     rp_bins: array_like
         numpy array of boundaries defining the radial projected bins in which pairs are 
@@ -1298,8 +3276,19 @@ def xy_z_jnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
         If True, print out information and progress.
     
     N_threads: int, optional
-        number of 'threads' to use in the pair counting.  If set to 'max', use all 
-        available cores.  N_threads=0 is the default.
+        number of 'threads' to use in the pair counting.  if set to 'max', use all 
+        available cores.  N_threads=1 is the default.  A `PairCounterPool` may also be 
+        passed, in which case its (persistent) worker processes are used.  Only the 
+        pool of worker processes is supported by this counter, i.e. there is no 
+        multi-threaded (backend='threads') or single precision version.
+    
+    approx_cell_size: array_like, optional
+        approximate size of the cells of the grid used to find pairs, along each 
+        dimension.  By default, the cells are the size of the maximum separation 
+        counted.  For dense samples, smaller cells (e.g. one half or one third of that 
+        size) reduce the number of separations which are calculated, at the cost of 
+        searching more neighboring cells.  If set to 'auto', the cell size is chosen 
+        based on the number of points and the size of the box and the bins.
         
     Returns
     -------
@@ -1315,16 +3304,12 @@ def xy_z_jnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
     if one point is inside, and the other is outside return 0.5*(w1 * w2)
     """
     
-    if N_threads is not 1:
-        if N_threads=='max':
-            N_threads = multiprocessing.cpu_count()
-        if isinstance(N_threads,int):
-            pool = multiprocessing.Pool(N_threads)
-        else: return ValueError("N_threads argument must be an integer number or 'max'")
+    #process N_threads, returning a (possibly shared) pool of worker processes
+    pool, close_pool = _get_pool(N_threads)
     
     #process input
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1, index1 = _process_data(data1)
+    data2, index2 = _process_data(data2)
     rp_bins = np.array(rp_bins)
     pi_bins = np.array(pi_bins)
     if np.all(period==np.inf): period=None
@@ -1339,43 +3324,9 @@ def xy_z_jnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
     if pi_bins.ndim != 1:
         raise ValueError("pi_bins must be a 1D array")
     
-    #process Lbox parameter
-    if (Lbox is None) & (period is None): 
-        data1, data2, Lbox = _enclose_in_box(data1, data2)
-    elif (Lbox is None) & (period is not None):
-        Lbox = period
-    elif np.shape(Lbox)==():
-        Lbox = np.array([Lbox]*3)
-    elif np.shape(Lbox)==(1,):
-        Lbox = np.array([Lbox[0]]*3)
-    else: Lbox = np.array(Lbox)
-    if np.shape(Lbox) != (3,):
-        raise ValueError("Lbox must be an array of length 3, or number indicating the \
-                          length of one side of a rectangular cuboid")
-    
-    #are we working with periodic boundary conditions (PBCs)?
-    if period is None: 
-        PBCs = False
-    elif np.shape(period) == (3,):
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif np.shape(period) == (1,):
-        period = np.array([period[0]]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif isinstance(period, (int, long, float, complex)):
-        period = np.array([period]*3)
-        PBCs = True
-        if np.any(period!=Lbox):
-            raise ValueError("period must == Lbox") 
-    elif (period == True) & (Lbox is not None):
-        PBCs = True
-        period = Lbox
-    elif (period == True) & (Lbox is None):
-        raise ValueError("If period is set to True, Lbox must be defined.")
-    else: PBCs=True
+    #process Lbox and period parameters
+    data1, data2, Lbox, period, PBCs = _process_box(data1, data2, Lbox, period,\
+                                                    index1, index2)
     
     #Process weights1 entry and check for consistency.
     if weights1 is None:
@@ -1435,9 +3386,18 @@ def xy_z_jnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
                           larger than Lbox/2 with PBCs')
     
     #build grids for data1 and data2
-    cell_size = np.array([np.max(rp_bins),np.max(rp_bins),np.max(pi_bins)])
-    grid1 = rect_cuboid_cells(data1[:,0], data1[:,1], data1[:,2], Lbox, cell_size)
-    grid2 = rect_cuboid_cells(data2[:,0], data2[:,1], data2[:,2], Lbox, cell_size)
+    search_length = np.array([np.max(rp_bins),np.max(rp_bins),np.max(pi_bins)])
+    cell_size = _process_cell_size(approx_cell_size, search_length, Lbox,\
+                                   len(data1), len(data2))
+    grid1 = _get_grid(data1, index1, Lbox, cell_size, search_length)
+    grid2 = _get_grid(data2, index2, Lbox, cell_size, search_length)
+    
+    #print some information
+    if verbose==True:
+        print("running grid pairs with {0} by {1} points".format(len(data1),len(data2)))
+        print("cell size= {0}".format(grid1.dL))
+        print("number of cells = {0}".format(np.prod(grid1.num_divs)))
+        print("cell size refinement = {0}".format(search_length/cell_size))
     
     #sort the weights arrays
     weights1 = weights1[grid1.idx_sorted]
@@ -1459,10 +3419,18 @@ def xy_z_jnpairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, weights
                      N_samples, rp_bins, pi_bins, period, PBCs)
     
     #do the pair counting
-    if N_threads>1:
+    try:
         counts = np.sum(pool.map(engine,range(Ncell1)),axis=0)
-    if N_threads==1:
-        counts = np.sum(map(engine,range(Ncell1)),axis=0)
+    finally:
+        if close_pool: pool.close()
+    
+    #the engines return the number of pairs in each bin, accumulate these once to get 
+    #the cumulative counts
+    counts = np.cumsum(np.cumsum(counts, axis=1), axis=2)
+    
+    #the engines return the counts of the pairs with a point in each subvolume, from 
+    #which the counts of every jackknife sample are found at once
+    counts = _jackknife_counts(counts)
     
     return counts
 
@@ -1472,16 +3440,19 @@ def _xy_z_jnpairs_engine(grid1, grid2, weights1, weights2, jtags1, jtags2, N_sam
     
     counts = np.zeros((N_samples+1,len(rp_bins),len(pi_bins)))
     
+    #indices of the points in the cell
+    i_start1, i_end1 = grid1.cell_id_indices[icell1], grid1.cell_id_indices[icell1+1]
+    
     #extract the points in the cell
-    x_icell1, y_icell1, z_icell1 = (grid1.x[grid1.slice_array[icell1]],\
-                                    grid1.y[grid1.slice_array[icell1]],\
-                                    grid1.z[grid1.slice_array[icell1]])
+    x_icell1, y_icell1, z_icell1 = (grid1.x[i_start1:i_end1],\
+                                    grid1.y[i_start1:i_end1],\
+                                    grid1.z[i_start1:i_end1])
         
     #extract the weights in the cell
-    w_icell1 = weights1[grid1.slice_array[icell1]]
+    w_icell1 = weights1[i_start1:i_end1]
         
     #extract the jackknife tags in the cell
-    j_icell1 = jtags1[grid1.slice_array[icell1]]
+    j_icell1 = jtags1[i_start1:i_end1]
         
     #get the list of neighboring cells
     ix1, iy1, iz1 = np.unravel_index(icell1,(grid1.num_divs[0],\
@@ -1496,16 +3467,19 @@ def _xy_z_jnpairs_engine(grid1, grid2, weights1, weights2, jtags1, jtags2, N_sam
                                                  grid2.num_divs[1],\
                                                  grid2.num_divs[2]))
             
+        #indices of the points in the cell
+        i_start2, i_end2 = grid2.cell_id_indices[icell2], grid2.cell_id_indices[icell2+1]
+        
         #extract the points in the cell
-        x_icell2 = grid2.x[grid2.slice_array[icell2]]
-        y_icell2 = grid2.y[grid2.slice_array[icell2]]
-        z_icell2 = grid2.z[grid2.slice_array[icell2]]
+        x_icell2 = grid2.x[i_start2:i_end2]
+        y_icell2 = grid2.y[i_start2:i_end2]
+        z_icell2 = grid2.z[i_start2:i_end2]
             
         #extract the weights in the cell
-        w_icell2 = weights2[grid2.slice_array[icell2]]
+        w_icell2 = weights2[i_start2:i_end2]
             
         #extract the jackknife tags in the cell
-        j_icell2 = jtags2[grid2.slice_array[icell2]]
+        j_icell2 = jtags2[i_start2:i_end2]
             
         #use cython functions to do pair counting
         if PBCs==False:
@@ -1525,297 +3499,63 @@ def _xy_z_jnpairs_engine(grid1, grid2, weights1, weights2, jtags1, jtags2, N_sam
 
 
 
-def _enclose_in_box(data1, data2):
+def _is_auto(data1, data2, weights1=None, weights2=None):
     """
-    build axis aligned box which encloses all points. 
-    shift points so cube's origin is at 0,0,0.
+    return True if data1 and data2 (and weights1 and weights2) are the same sample, in 
+    which case the symmetric, auto-correlation, pair counting engines can be used.
     """
     
-    xmin = np.min([np.min(data1[:,0]),np.min(data2[:,0])])
-    ymin = np.min([np.min(data1[:,1]),np.min(data2[:,1])])
-    zmin = np.min([np.min(data1[:,2]),np.min(data2[:,2])])
-    xmax = np.max([np.max(data1[:,0]),np.max(data2[:,0])])
-    ymax = np.max([np.max(data1[:,1]),np.max(data2[:,1])])
-    zmax = np.max([np.max(data1[:,2]),np.max(data2[:,2])])
-    
-    xyzmin = np.min([xmin,ymin,zmin])
-    xyzmax = np.min([xmax,ymax,zmax])-xyzmin
+    if data1 is not data2:
+        if np.shape(data1)!=np.shape(data2): return False
+        if not np.all(data1==data2): return False
     
-    data1 = data1-xyzmin
-    data2 = data2-xyzmin
+    if weights1 is not weights2:
+        if not np.all(weights1==weights2): return False
     
-    Lbox = np.array([xyzmax]*3)
-    
-    return data1, data2, Lbox
+    return True
 
 
-##########################################################################################
-def main():
+def _jackknife_counts(counts):
     """
-    run this main program to get timed tests of the pair counter.
+    return the counts of each jackknife sample, given the counts of the pairs with one 
+    (or both) of the points in each subvolume, where pairs with both points in a 
+    subvolume are counted twice (see `cpairs.radial_jbinning`).  The first element, 
+    reserved for the full sample, is zero, and the total counts are returned in its place.
+    
+    A pair is weighted by 1 in jackknife sample l if neither point is in subvolume l, by 
+    0.5 if one point is, and by 0 if both points are, so the counts of sample l are the 
+    total counts less half of the counts of the pairs with a point in subvolume l.
     """
     
-    # real space pair counter speed tests
-    _test_npairs_speed()
-    _test_wnpairs_speed()
-    _test_jnpairs_speed()
+    total = 0.5*np.sum(counts, axis=0)
     
-    # 2D+1 space pair counter speed tests
-    _test_xy_z_npairs_speed()
-    _test_xy_z_wnpairs_speed()
-    _test_xy_z_jnpairs_speed()
-
+    return total - 0.5*counts
 
-def _test_npairs_speed():
 
-    "bolshoi like test out to ~20 Mpc"
-    N_threads=4
-    Npts = 1e5
-    Lbox = [250.0,250.0,250.0]
-    period = np.array(Lbox)
-    
-    x = np.random.uniform(0, Lbox[0], Npts)
-    y = np.random.uniform(0, Lbox[1], Npts)
-    z = np.random.uniform(0, Lbox[2], Npts)
-    data1 = np.vstack((x,y,z)).T
-    
-    rbins = np.logspace(-2,1.3)
+def _threads_period(period, PBCs):
+    """
+    return the period passed to the multi-threaded kernels, and to `cell_pair_bins`, 
+    which is infinite if there are no PBCs.
+    """
     
-    print("##########npairs##########")
-    print("running with {0}/{1} cores".format(N_threads,multiprocessing.cpu_count()))
-    print("running speed test with {0} points".format(Npts))
-    print("in {0} x {1} x {2} box.".format(Lbox[0],Lbox[1],Lbox[2]))
-    print("to maximum seperation {0}".format(np.max(rbins)))
-
-    #w/ PBCs
-    start = time()
-    result = npairs(data1, data1, rbins, Lbox=Lbox, period=period, verbose=False, N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (PBCs) = %.1f seconds" % runtime)
-
-    #w/o PBCs
-    start = time()
-    result = npairs(data1, data1, rbins, Lbox=Lbox, period=None, verbose=False, N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (no PBCs) = %.1f seconds" % runtime)
-    print("########################## \n")
-
+    if PBCs==True:
+        return np.asarray(period, dtype=np.float64)
+    else:
+        return np.array([np.inf]*3)
 
-def _test_wnpairs_speed():
 
-    "bolshoi like test out to ~20 Mpc"
-    N_threads=4
-    Npts = 1e5
-    Lbox = [250.0,250.0,250.0]
-    period = np.array(Lbox)
-    
-    x = np.random.uniform(0, Lbox[0], Npts)
-    y = np.random.uniform(0, Lbox[1], Npts)
-    z = np.random.uniform(0, Lbox[2], Npts)
-    data1 = np.vstack((x,y,z)).T
-    weights1 = np.random.random(Npts)
-    
-    rbins = np.logspace(-2,1.3)
-    
-    print("##########wnpairs##########")
-    print("running with {0}/{1} cores".format(N_threads,multiprocessing.cpu_count()))
-    print("running speed test with {0} points".format(Npts))
-    print("in {0} x {1} x {2} box.".format(Lbox[0],Lbox[1],Lbox[2]))
-    print("to maximum seperation {0}".format(np.max(rbins)))
-
-    #w/ PBCs
-    start = time()
-    result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=period,\
-                     weights1=weights1, weights2=weights1, verbose=True,\
-                     N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (PBCs) = %.1f seconds" % runtime)
-
-    #w/o PBCs
-    start = time()
-    result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=None,\
-                     weights1=weights1, weights2=weights1, verbose=True,\
-                     N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (no PBCs) = %.1f seconds" % runtime)
-    print("########################### \n")
-
-
-def _test_jnpairs_speed():
-
-    "bolshoi like test out to ~20 Mpc"
-    N_threads=4
-    Npts = 1e5
-    Nsamples=5*5*5
-    Lbox = [250.0,250.0,250.0]
-    period = np.array(Lbox)
-    
-    x = np.random.uniform(0, Lbox[0], Npts)
-    y = np.random.uniform(0, Lbox[1], Npts)
-    z = np.random.uniform(0, Lbox[2], Npts)
-    data1 = np.vstack((x,y,z)).T
-    weights1 = np.random.random(Npts)
-    jtags1 = np.sort(np.random.random_integers(1, Nsamples, size=Npts))
-    
-    rbins = np.logspace(-2,1.3)
-    
-    print("##########jnpairs##########")
-    print("running with {0}/{1} cores".format(N_threads,multiprocessing.cpu_count()))
-    print("running speed test with {0} points".format(Npts))
-    print("{0} jackknife samples".format(Nsamples))
-    print("in {0} x {1} x {2} box.".format(Lbox[0],Lbox[1],Lbox[2]))
-    print("to maximum seperation {0}".format(np.max(rbins)))
-
-    #w/ PBCs
-    start = time()
-    result = jnpairs(data1, data1, rbins, Lbox=Lbox, period=period,\
-                     weights1=weights1, weights2=weights1, jtags1=jtags1, jtags2=jtags1,\
-                     N_samples=Nsamples, verbose=True, N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (PBCs) = %.1f seconds" % runtime)
-
-    #w/o PBCs
-    start = time()
-    result = jnpairs(data1, data1, rbins, Lbox=Lbox, period=None,\
-                     weights1=weights1, weights2=weights1, jtags1=jtags1, jtags2=jtags1,\
-                     N_samples=Nsamples, verbose=True, N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (no PBCs) = %.1f seconds" % runtime)
-    print("########################### \n")
-
-
-def _test_xy_z_npairs_speed():
-
-    "bolshoi like test out to ~20 Mpc"
-    N_threads=4
-    Npts = 1e5
-    Lbox = [250.0,250.0,250.0]
-    period = np.array(Lbox)
-    
-    x = np.random.uniform(0, Lbox[0], Npts)
-    y = np.random.uniform(0, Lbox[1], Npts)
-    z = np.random.uniform(0, Lbox[2], Npts)
-    data1 = np.vstack((x,y,z)).T
-    
-    rp_bins = np.logspace(-2,1.3)
-    pi_bins = np.linspace(0,50,20)
-    
-    print("##########xy_z_npairs##########")
-    print("running with {0}/{1} cores".format(N_threads,multiprocessing.cpu_count()))
-    print("running speed test with {0} points".format(Npts))
-    print("in {0} x {1} x {2} box.".format(Lbox[0],Lbox[1],Lbox[2]))
-    print("to maximum seperation {0}, {1}".format(np.max(rp_bins),np.max(pi_bins)))
-
-    #w/ PBCs
-    start = time()
-    result = xy_z_npairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=period, verbose=False, N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (PBCs) = %.1f seconds" % runtime)
-
-    #w/o PBCs
-    start = time()
-    result = xy_z_npairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=None, verbose=False, N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (no PBCs) = %.1f seconds" % runtime)
-    print("############################### \n")
-
-
-def _test_xy_z_wnpairs_speed():
-
-    "bolshoi like test out to ~20 Mpc"
-    N_threads=4
-    Npts = 1e5
-    Lbox = [250.0,250.0,250.0]
-    period = np.array(Lbox)
-    
-    x = np.random.uniform(0, Lbox[0], Npts)
-    y = np.random.uniform(0, Lbox[1], Npts)
-    z = np.random.uniform(0, Lbox[2], Npts)
-    data1 = np.vstack((x,y,z)).T
-    weights1 = np.random.random(Npts)
-    
-    rp_bins = np.logspace(-2,1.3)
-    pi_bins = np.linspace(0,50,20)
-    
-    print("##########xy_z_wnpairs##########")
-    print("running with {0}/{1} cores".format(N_threads,multiprocessing.cpu_count()))
-    print("running speed test with {0} points".format(Npts))
-    print("in {0} x {1} x {2} box.".format(Lbox[0],Lbox[1],Lbox[2]))
-    print("to maximum seperation {0}, {1}".format(np.max(rp_bins),np.max(pi_bins)))
-
-    #w/ PBCs
-    start = time()
-    result = xy_z_wnpairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=period,\
-                     weights1=weights1, weights2=weights1, verbose=True,\
-                     N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (PBCs) = %.1f seconds" % runtime)
-
-    #w/o PBCs
-    start = time()
-    result = xy_z_wnpairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=None,\
-                     weights1=weights1, weights2=weights1, verbose=True,\
-                     N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (no PBCs) = %.1f seconds" % runtime)
-    print("################################ \n")
-
-
-def _test_xy_z_jnpairs_speed():
-
-    "bolshoi like test out to ~20 Mpc"
-    N_threads=4
-    Npts = 1e5
-    Nsamples=5*5*5
-    Lbox = [250.0,250.0,250.0]
-    period = np.array(Lbox)
-    
-    x = np.random.uniform(0, Lbox[0], Npts)
-    y = np.random.uniform(0, Lbox[1], Npts)
-    z = np.random.uniform(0, Lbox[2], Npts)
-    data1 = np.vstack((x,y,z)).T
-    weights1 = np.random.random(Npts)
-    jtags1 = np.sort(np.random.random_integers(1, Nsamples, size=Npts))
-    
-    rp_bins = np.logspace(-2,1.3)
-    pi_bins = np.linspace(0,50,20)
-    
-    print("##########xy_z_jnpairs##########")
-    print("running with {0}/{1} cores".format(N_threads,multiprocessing.cpu_count()))
-    print("running speed test with {0} points".format(Npts))
-    print("{0} jackknife samples".format(Nsamples))
-    print("in {0} x {1} x {2} box.".format(Lbox[0],Lbox[1],Lbox[2]))
-    print("to maximum seperation {0}, {1}".format(np.max(rp_bins),np.max(pi_bins)))
-
-    #w/ PBCs
-    start = time()
-    result = xy_z_jnpairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=period,\
-                     weights1=weights1, weights2=weights1, jtags1=jtags1, jtags2=jtags1,\
-                     N_samples=Nsamples, verbose=True, N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (PBCs) = %.1f seconds" % runtime)
-
-    #w/o PBCs
-    start = time()
-    result = xy_z_jnpairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=None,\
-                     weights1=weights1, weights2=weights1, jtags1=jtags1, jtags2=jtags1,\
-                     N_samples=Nsamples, verbose=True, N_threads=N_threads)
-    end = time()
-    runtime = end-start
-    print("Total runtime (no PBCs) = %.1f seconds" % runtime)
-    print("################################ \n")
-
-
-if __name__ == '__main__':
-    main()
+def _process_labels(labels, N, name):
+    """
+    return the integer labels of N points as an int64 array, checking that there is one 
+    non-negative label for each point.
+    """
+    
+    labels = np.asarray(labels)
+    if (labels.ndim!=1) or (len(labels)!=N):
+        raise ValueError("{0} should have same len as the points".format(name))
+    if (N>0) and not np.issubdtype(labels.dtype, np.integer):
+        raise ValueError("{0} must be integers".format(name))
+    if np.any(labels<0):
+        raise ValueError("{0} must be >=0".format(name))
+    
+    return labels.astype(np.int64)
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+
+"""
+out-of-core pair counter.
+
+This module contains pair counting functions, with the same interface as the functions in
+`rect_cuboid_pairs`, for samples which are too large to be held in memory.  The samples
+may be passed as (memory-mapped) arrays, or as iterators over chunks of positions.  The
+points are first sorted, a chunk at a time, into slabs along the x-axis which are written
+to disk.  The pairs are then counted slab by slab, with only one slab of data1, and the
+neighbouring slabs of data2, held in memory at a time.
+"""
+
+from __future__ import print_function, division
+import numpy as np
+import os
+import shutil
+import tempfile
+from functools import partial
+import rect_cuboid_pairs
+from grid_index import _process_box
+
+
+__all__=['npairs', 'xy_z_npairs']
+__author__=['Duncan Campbell']
+
+
+#default number of points read into memory at once when writing the slabs
+_CHUNK_SIZE = 2**20
+
+#maximum default number of slabs
+_MAX_NUM_SLABS = 64
+
+
+def npairs(data1, data2, rbins, Lbox=None, period=None, verbose=False, N_threads=1,\
+           num_slabs=None, chunk_size=_CHUNK_SIZE, slab_dir=None):
+    """
+    real-space out-of-core pair counter.
+
+    Count the number of pairs (x1,x2) that can be formed, with x1 drawn from data1 and x2
+    drawn from data2, and where distance(x1, x2) <= rbins[i].
+
+    Parameters
+    ----------
+    data1: array_like or iterator
+        N1 by 3 numpy array of 3-dimensional positions, e.g. a `numpy.memmap`, or an
+        iterator over arrays of shape (Nchunk,3) of positions.  Should be between zero
+        and period.
+
+    data2: array_like or iterator
+        N2 by 3 numpy array of 3-dimensional positions, e.g. a `numpy.memmap`, or an
+        iterator over arrays of shape (Nchunk,3) of positions.  Should be between zero
+        and period.  If data2 is data1, the sample is only read once.
+
+    rbins: array_like
+        numpy array of boundaries defining the bins in which pairs are counted.
+
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.  Must be specified if
+        either sample is passed as an iterator and period is None.
+
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+
+    verbose: Boolean, optional
+        If True, print out information and progress.
+
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting of each slab.  if set to 'max',
+        use all available cores.  N_threads=1 is the default.  A `PairCounterPool` may
+        also be passed, in which case its (persistent) worker processes are used.
+
+    num_slabs: int, optional
+        number of slabs the samples are split into along the x-axis.  The memory used
+        is roughly proportional to the number of points in one slab of data1, and in
+        2*floor(max(rbins)/slab width)+3 slabs of data2.  If None, the slabs are made as
+        narrow as max(rbins), up to a maximum of 64 slabs.
+
+    chunk_size: int, optional
+        number of points read into memory at once from array inputs when writing the
+        slabs.
+
+    slab_dir: string, optional
+        directory in which the slabs are written.  If None, the default temporary
+        directory is used.  The slabs are removed once the pairs are counted.
+
+    Returns
+    -------
+    N_pairs : array of length len(rbins)
+        number counts of pairs
+
+    Examples
+    --------
+    >>> from halotools.mock_observables.pair_counters.streaming_pairs import npairs
+    >>> import numpy as np
+    >>> data = np.random.random((1000,3))
+    >>> rbins = np.logspace(-2,-0.5,10)
+    >>> period = np.array([1.0,1.0,1.0])
+    >>> counts = npairs(data, data, rbins, period=period, num_slabs=3)
+    """
+
+    rbins = np.array(rbins)
+    if rbins.ndim != 1:
+        raise ValueError("rbins must be a 1D array")
+
+    counter = partial(rect_cuboid_pairs.npairs, rbins=rbins, verbose=False,\
+                      N_threads=N_threads)
+
+    return _stream_counts(counter, data1, data2, np.max(rbins), Lbox, period, verbose,\
+                          num_slabs, chunk_size, slab_dir,\
+                          np.zeros(len(rbins), dtype=np.int64))
+
+
+def xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=None, period=None, verbose=False,\
+                N_threads=1, num_slabs=None, chunk_size=_CHUNK_SIZE, slab_dir=None):
+    """
+    2+1D out-of-core pair counter.
+
+    Count the number of pairs (x1,x2) that can be formed, with x1 drawn from data1 and x2
+    drawn from data2, and where the separation in the x-y plane is <= rp_bins[i], and
+    the separation along the z coordinate is <= pi_bins[j].
+
+    Parameters
+    ----------
+    data1: array_like or iterator
+        N1 by 3 numpy array of 3-dimensional positions, e.g. a `numpy.memmap`, or an
+        iterator over arrays of shape (Nchunk,3) of positions.  Should be between zero
+        and period.
+
+    data2: array_like or iterator
+        N2 by 3 numpy array of 3-dimensional positions, e.g. a `numpy.memmap`, or an
+        iterator over arrays of shape (Nchunk,3) of positions.  Should be between zero
+        and period.  If data2 is data1, the sample is only read once.
+
+    rp_bins: array_like
+        numpy array of boundaries defining the radial projected bins in which pairs are
+        counted.
+
+    pi_bins: array_like
+        numpy array of boundaries defining the parallel bins in which pairs are counted.
+
+    Lbox: array_like, optional
+        length of cube sides which encloses data1 and data2.  Must be specified if
+        either sample is passed as an iterator and period is None.
+
+    period: array_like, optional
+        length 3 array defining axis-aligned periodic boundary conditions. If only
+        one number, Lbox, is specified, period is assumed to be np.array([Lbox]*3).
+        If none, PBCs are set to infinity.  If True, period is set to be Lbox
+
+    verbose: Boolean, optional
+        If True, print out information and progress.
+
+    N_threads: int, optional
+        number of 'threads' to use in the pair counting of each slab.  if set to 'max',
+        use all available cores.  N_threads=1 is the default.  A `PairCounterPool` may
+        also be passed, in which case its (persistent) worker processes are used.
+
+    num_slabs: int, optional
+        number of slabs the samples are split into along the x-axis, see `npairs`.
+
+    chunk_size: int, optional
+        number of points read into memory at once from array inputs when writing the
+        slabs.
+
+    slab_dir: string, optional
+        directory in which the slabs are written.  If None, the default temporary
+        directory is used.  The slabs are removed once the pairs are counted.
+
+    Returns
+    -------
+    N_pairs : ndarray of shape (len(rp_bins),len(pi_bins))
+        number counts of pairs
+    """
+
+    rp_bins = np.array(rp_bins)
+    pi_bins = np.array(pi_bins)
+    if rp_bins.ndim != 1:
+        raise ValueError("rp_bins must be a 1D array")
+    if pi_bins.ndim != 1:
+        raise ValueError("pi_bins must be a 1D array")
+
+    counter = partial(rect_cuboid_pairs.xy_z_npairs, rp_bins=rp_bins, pi_bins=pi_bins,\
+                      verbose=False, N_threads=N_threads)
+
+    return _stream_counts(counter, data1, data2, np.max(rp_bins), Lbox, period, verbose,\
+                          num_slabs, chunk_size, slab_dir,\
+                          np.zeros((len(rp_bins),len(pi_bins)), dtype=np.int64))
+
+
+def _stream_counts(counter, data1, data2, rmax, Lbox, period, verbose, num_slabs,\
+                   chunk_size, slab_dir, counts):
+    """
+    write data1 and data2 to slabs on disk, and add the counts returned by counter for
+    each slab of data1, and its neighbouring slabs of data2, to counts.
+    """
+
+    if np.all(period==np.inf): period=None
+
+    #process Lbox and period parameters
+    _, _, Lbox, period, PBCs = _process_box(None, None, Lbox, period)
+
+    #check to see we dont count pairs more than once
+    if (PBCs==True) and np.any(rmax>Lbox/2.0):
+        raise ValueError('cannot count pairs with seperations \
+                          larger than Lbox/2 with PBCs')
+
+    #the extent of the slabs along the x-axis
+    if Lbox is not None:
+        xmin, xmax = 0.0, Lbox[0]
+    else:
+        xmin, xmax = _x_range(data1, data2, chunk_size)
+    if num_slabs is None:
+        num_slabs = int(np.clip((xmax-xmin)//max(rmax, 1e-300), 1, _MAX_NUM_SLABS))
+    num_slabs = int(num_slabs)
+    if num_slabs<1:
+        raise ValueError("num_slabs must be >=1")
+    slab_width = (xmax-xmin)/num_slabs
+
+    #number of neighbouring slabs on each side of a slab which may hold pairs, allowing
+    #for points on the edges of the slabs
+    if slab_width>0.0:
+        num_adjacent = int(np.floor(rmax/slab_width))+1
+    else: num_adjacent = num_slabs
+
+    slab_dir = tempfile.mkdtemp(prefix='halotools_slabs_', dir=slab_dir)
+    try:
+        #sort the samples into slabs on disk
+        filenames1 = _write_slabs(data1, 'data1', slab_dir, xmin, slab_width, num_slabs,\
+                                  chunk_size)
+        if data2 is data1:
+            filenames2 = filenames1
+        else:
+            filenames2 = _write_slabs(data2, 'data2', slab_dir, xmin, slab_width,\
+                                      num_slabs, chunk_size)
+
+        if verbose==True:
+            print("counting pairs in {0} slabs of width {1}".format(num_slabs,slab_width))
+
+        #count the pairs of each slab of data1 with its neighbourhood of data2
+        for islab in range(num_slabs):
+            slab1 = _read_slabs(filenames1, [islab])
+            if len(slab1)==0: continue
+            slab2 = _read_slabs(filenames2,\
+                    _adjacent_slabs(islab, num_adjacent, num_slabs, PBCs))
+            if len(slab2)==0: continue
+            if verbose==True:
+                print("slab {0}: {1} by {2} points".format(islab,len(slab1),len(slab2)))
+            #the counts of a slab are whole numbers, which may be stored as floats
+            counts += counter(slab1, slab2, Lbox=Lbox, period=period).astype(counts.dtype)
+    finally:
+        shutil.rmtree(slab_dir, ignore_errors=True)
+
+    return counts
+
+
+def _iter_chunks(data, chunk_size):
+    """
+    iterate over chunks of the positions in data, which is either an array, or an
+    iterator over arrays of positions.
+    """
+
+    if isinstance(data, np.ndarray):
+        chunks = (data[i:i+chunk_size] for i in range(0, len(data), chunk_size))
+    else:
+        chunks = data
+
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if (chunk.ndim!=2) or (np.shape(chunk)[1]!=3):
+            raise ValueError("data must be of shape (Npts,3)")
+        yield chunk
+
+
+def _x_range(data1, data2, chunk_size):
+    """
+    return the range of the x-coordinates of data1 and data2.
+    """
+
+    if not (isinstance(data1, np.ndarray) & isinstance(data2, np.ndarray)):
+        raise ValueError("Lbox or period must be specified if the data is passed \
+                          as an iterator")
+
+    xmin, xmax = np.inf, -np.inf
+    for data in [data1, data2]:
+        for chunk in _iter_chunks(data, chunk_size):
+            if len(chunk)==0: continue
+            xmin = min(xmin, np.min(chunk[:,0]))
+            xmax = max(xmax, np.max(chunk[:,0]))
+
+    if xmin>xmax: return 0.0, 0.0
+    return xmin, xmax
+
+
+def _write_slabs(data, name, slab_dir, xmin, slab_width, num_slabs, chunk_size):
+    """
+    append the positions in data to the file of the slab containing each point,
+    returning the list of file names.
+    """
+
+    filenames = [os.path.join(slab_dir, '{0}_{1}.bin'.format(name, islab))\
+                 for islab in range(num_slabs)]
+    files = [open(filename, 'wb') for filename in filenames]
+    try:
+        for chunk in _iter_chunks(data, chunk_size):
+            if slab_width>0.0:
+                islab = np.floor((chunk[:,0]-xmin)/slab_width).astype(np.int)
+            else: islab = np.zeros(len(chunk), dtype=np.int)
+            islab = np.clip(islab, 0, num_slabs-1)
+
+            #write the points of the chunk in order of slab
+            order = np.argsort(islab, kind='mergesort')
+            chunk, islab = chunk[order], islab[order]
+            edges = np.searchsorted(islab, np.arange(num_slabs+1))
+            for i in np.flatnonzero(np.diff(edges)):
+                chunk[edges[i]:edges[i+1]].tofile(files[i])
+    finally:
+        for f in files:
+            f.close()
+
+    return filenames
+
+
+def _read_slabs(filenames, slabs):
+    """
+    read the positions of the points in the given slabs.
+    """
+
+    data = [np.fromfile(filenames[islab], dtype=np.float64) for islab in slabs]
+    return np.concatenate(data).reshape((-1,3))
+
+
+def _adjacent_slabs(islab, num_adjacent, num_slabs, PBCs):
+    """
+    return the indices of the slabs within num_adjacent slabs of slab islab.
+    """
+
+    slabs = np.arange(islab-num_adjacent, islab+num_adjacent+1)
+    if PBCs==True:
+        slabs = np.unique(slabs % num_slabs)
+    else:
+        slabs = slabs[(slabs>=0) & (slabs<num_slabs)]
+
+    return slabs
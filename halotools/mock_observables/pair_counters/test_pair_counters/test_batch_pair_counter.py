@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+import numpy as np
+#load batch and grid pair counters
+from ..batch_pair_counter import BatchPairCounter
+from .. import rect_cuboid_pairs
+
+np.random.seed(1)
+
+def test_batch_pair_counter():
+
+    Npts = 1000
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    rbins = np.array([0.0,0.05,0.1,0.2])
+    pi_bins = np.linspace(0.0,0.2,3)
+
+    counter = BatchPairCounter([('r', rbins), ('xy_z', rbins, pi_bins)])
+
+    result = counter.npairs(data1, data2, rbins, Lbox=Lbox, period=period)
+    test_result = rect_cuboid_pairs.npairs(data1, data2, rbins, Lbox=Lbox, period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+    assert len(counter._cache)==1
+
+    #the counts of the other binning are returned from the cache
+    result = counter.xy_z_npairs(data1, data2, rbins, pi_bins, Lbox=Lbox, period=period)
+    test_result = rect_cuboid_pairs.xy_z_npairs(data1, data2, rbins, pi_bins,\
+                                                Lbox=Lbox, period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+    assert len(counter._cache)==1
+
+    #modifying the returned counts does not modify the cache
+    result[...] = 0
+    result = counter.xy_z_npairs(data1, data2, rbins, pi_bins, Lbox=Lbox, period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+
+    #a different box is counted separately
+    result = counter.npairs(data1, data2, rbins, Lbox=Lbox, period=None)
+    test_result = rect_cuboid_pairs.npairs(data1, data2, rbins, Lbox=Lbox, period=None)
+    assert np.all(test_result==result), "pair counts are incorrect"
+    assert len(counter._cache)==2
+
+    #binnings which were not given are passed on to the pair counters
+    result = counter.npairs(data1, data2, rbins[1:], Lbox=Lbox, period=period)
+    test_result = rect_cuboid_pairs.npairs(data1, data2, rbins[1:], Lbox=Lbox,\
+                                           period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+    assert len(counter._cache)==2
+
+    counter.clear()
+    assert len(counter._cache)==0
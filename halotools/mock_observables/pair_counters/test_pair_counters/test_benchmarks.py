@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import numpy as np
+import os
+import json
+import shutil
+import tempfile
+import pytest
+#load the pair counter benchmarks
+from ..benchmarks import run_benchmarks, compare_benchmarks, _clustered_sample
+
+np.random.seed(1)
+
+def test_run_benchmarks():
+
+    counters = ['npairs', 'xy_z_jnpairs', 'fof_pairs', 'obj_wnpairs']
+
+    output_dir = tempfile.mkdtemp()
+    try:
+        output = os.path.join(output_dir, 'timings.json')
+        results = run_benchmarks(counters, Npts=[500], Nbins=[5], N_threads=[1],\
+                                 PBCs=[True, False], repeat=2, output=output)
+
+        #one record for each combination of parameters
+        assert len(results['results'])==len(counters)*2*2
+        for record in results['results']:
+            assert record['time']==min(record['times'])
+            assert len(record['times'])==2
+
+        #the results are written as JSON
+        with open(output, 'r') as f:
+            assert json.load(f)==json.loads(json.dumps(results))
+    finally:
+        shutil.rmtree(output_dir)
+
+    with pytest.raises(ValueError):
+        run_benchmarks(['not_a_counter'])
+
+def test_compare_benchmarks():
+
+    results = run_benchmarks(['npairs', 'wnpairs'], Npts=[200], samples=['uniform'],\
+                             Nbins=[5], N_threads=[1], PBCs=[True], repeat=1)
+    assert compare_benchmarks(results, results)==[]
+
+    #a slower benchmark is reported
+    slower = json.loads(json.dumps(results))
+    slower['results'][1]['time'] = 2.0*slower['results'][1]['time']+1.0
+    regressions = compare_benchmarks(results, slower)
+    assert len(regressions)==1
+    assert regressions[0][0]['counter']=='wnpairs'
+    assert regressions[0][1]>1.0
+
+def test_clustered_sample():
+
+    Lbox = 100.0
+    data = _clustered_sample(1000, Lbox, 43)
+
+    assert np.shape(data)==(1000,3)
+    assert np.all((data>=0.0) & (data<Lbox))
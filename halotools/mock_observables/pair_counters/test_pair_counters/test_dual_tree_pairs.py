@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pytest
+#load comparison simple pair counters
+from ..pairs import npairs as simp_npairs
+#load dual-tree and grid pair counters
+from ..dual_tree_pairs import npairs, xy_z_npairs
+from .. import rect_cuboid_pairs
+from ..kd_tree import kd_tree
+
+np.random.seed(1)
+
+def clustered_points(Npts, Nclumps=10, sigma=0.02):
+    """
+    return points in a unit box drawn from a few gaussian clumps
+    """
+    centers = np.random.random((Nclumps,3))
+    data = centers[np.random.randint(0,Nclumps,Npts)]
+    data = data + np.random.normal(0.0, sigma, (Npts,3))
+    return data%1.0
+
+
+def test_kd_tree():
+
+    Npts = 1000
+    data = np.random.random((Npts,3))
+    tree = kd_tree(data[:,0], data[:,1], data[:,2], [1.0,1.0,1.0], leafsize=16)
+
+    #the points are a permutation of the input
+    assert np.all(np.sort(tree.idx_sorted)==np.arange(Npts))
+    assert np.all(tree.x==data[tree.idx_sorted,0])
+
+    for inode in range(tree.num_nodes()):
+        i_start, i_end = tree.node_start[inode], tree.node_end[inode]
+        pos = np.vstack((tree.x[i_start:i_end],tree.y[i_start:i_end],\
+                         tree.z[i_start:i_end])).T
+        #the bounding boxes enclose the points of each node
+        assert np.all(pos>=tree.node_lower[inode])
+        assert np.all(pos<=tree.node_upper[inode])
+        if tree.is_leaf(inode):
+            assert i_end-i_start<=16
+        else:
+            child1, child2 = tree.node_children[inode]
+            assert tree.node_start[child1]==i_start
+            assert tree.node_end[child1]==tree.node_start[child2]
+            assert tree.node_end[child2]==i_end
+
+    with pytest.raises(ValueError):
+        kd_tree(data[:,0], data[:,1], data[:,2], [1.0,1.0,1.0], leafsize=0)
+
+
+def test_npairs_periodic():
+
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    data1 = np.random.random((Npts,3))
+    data2 = clustered_points(Npts)
+
+    rbins = np.array([0.0,0.01,0.05,0.1,0.2,0.3,0.4,0.5])
+
+    result = npairs(data1, data1, rbins, Lbox=Lbox, period=period, verbose=True)
+    test_result = simp_npairs(data1, data1, rbins, period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+
+    result = npairs(data1, data2, rbins, Lbox=Lbox, period=period)
+    test_result = simp_npairs(data1, data2, rbins, period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+
+
+def test_npairs_nonperiodic():
+
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+
+    data1 = np.random.random((Npts,3))
+    data2 = clustered_points(Npts)
+
+    rbins = np.array([0.0,0.01,0.05,0.1,0.2,0.3,0.4,0.5])
+
+    result = npairs(data1, data1, rbins, Lbox=Lbox, period=None)
+    test_result = simp_npairs(data1, data1, rbins, period=None)
+    assert np.all(test_result==result), "pair counts are incorrect"
+
+    result = npairs(data2, data1, rbins, period=None)
+    test_result = simp_npairs(data2, data1, rbins, period=None)
+    assert np.all(test_result==result), "pair counts are incorrect"
+
+
+def test_xy_z_npairs():
+
+    Npts = 2e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    data1 = clustered_points(Npts)
+    data2 = np.random.random((Npts,3))
+
+    rp_bins = np.logspace(-3,-0.5,8)
+    pi_bins = np.logspace(-3,-0.5,5)
+
+    for p in [period, None]:
+        result = xy_z_npairs(data1, data1, rp_bins, pi_bins, period=p)
+        test_result = rect_cuboid_pairs.xy_z_npairs(data1, data1, rp_bins, pi_bins, period=p)
+        assert np.all(test_result==result), "pair counts are incorrect"
+
+        result = xy_z_npairs(data1, data2, rp_bins, pi_bins, period=p)
+        test_result = rect_cuboid_pairs.xy_z_npairs(data1, data2, rp_bins, pi_bins, period=p)
+        assert np.all(test_result==result), "pair counts are incorrect"
+
+
+def test_clustered_npairs():
+
+    Npts = 5e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    data1 = clustered_points(Npts, Nclumps=5, sigma=0.005)
+    rbins = np.logspace(-3,-0.5,15)
+
+    test_result = rect_cuboid_pairs.npairs(data1, data1, rbins, period=period)
+    for leafsize in [1, 8, 64]:
+        result = npairs(data1, data1, rbins, period=period, leafsize=leafsize)
+        assert np.all(test_result==result), "pair counts are incorrect"
+
+    #split the node pairs over several processes
+    result = npairs(data1, data1, rbins, period=period, N_threads=2)
+    assert np.all(test_result==result), "pair counts are incorrect"
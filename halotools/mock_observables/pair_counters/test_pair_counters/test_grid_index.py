@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pytest
+#load comparison simple pair counters
+from ..pairs import npairs as simp_npairs
+#load rect_cuboid_pairs pair counters
+from ..rect_cuboid_pairs import npairs, xy_z_npairs
+from ..grid_index import GridIndex, clear_grid_cache
+from .. import grid_index
+from ...clustering import tpcf
+
+np.random.seed(1)
+
+def test_grid_index_pairs():
+
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    x = np.random.uniform(0, Lbox[0], Npts)
+    y = np.random.uniform(0, Lbox[1], Npts)
+    z = np.random.uniform(0, Lbox[2], Npts)
+    data1 = np.vstack((x,y,z)).T
+    data2 = np.random.random((Npts,3))
+
+    rbins = np.array([0.0,0.1,0.2,0.3,0.4,0.5])
+    rp_bins = np.array([0.0,0.1,0.2,0.3])
+    pi_bins = np.array([0.0,0.1,0.2,0.3])
+
+    index1 = GridIndex(data1, Lbox=period)
+    index2 = GridIndex(data2, Lbox=period)
+
+    #indices may be used in place of arrays
+    test_result = npairs(data1, data2, rbins, period=period)
+    result = npairs(index1, index2, rbins, period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+    result = npairs(data1, index2, rbins, period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+
+    test_result = xy_z_npairs(data1, data1, rp_bins, pi_bins, period=period)
+    result = xy_z_npairs(index1, index1, rp_bins, pi_bins, period=period)
+    assert np.all(test_result==result), "pair counts are incorrect"
+
+    #without PBCs, the box of the index is used
+    test_result = simp_npairs(data1, data2, rbins, period=None)
+    result = npairs(index1, data2, rbins)
+    assert np.all(test_result==result), "pair counts are incorrect"
+
+
+def test_grid_cache(monkeypatch):
+
+    monkeypatch.setattr(grid_index, '_MAX_CACHED_GRIDS', 2)
+    clear_grid_cache()
+
+    data1 = np.random.random((100,3))
+    index1 = GridIndex(data1, Lbox=1.0)
+
+    #grids are only built once
+    grid_1 = index1.grid([0.25,0.25,0.25])
+    grid_2 = index1.grid([0.25,0.25,0.25])
+    assert grid_1 is grid_2, "grid was not cached"
+
+    #an index of the same data re-uses the cached grid
+    grid_3 = GridIndex(data1.copy(), Lbox=1.0).grid([0.25,0.25,0.25])
+    assert grid_1 is grid_3, "grid was not cached"
+
+    #the least recently used grid is discarded
+    index1.grid([0.1,0.1,0.1])
+    index1.grid([0.2,0.2,0.2])
+    assert len(grid_index._grid_cache)==2
+    assert index1.grid([0.25,0.25,0.25]) is not grid_1, "grid was not discarded"
+
+    clear_grid_cache()
+    assert len(grid_index._grid_cache)==0
+
+    #an index which does not use the shared cache keeps its own grids
+    index2 = GridIndex(data1, Lbox=1.0, cache=False)
+    grid_1 = index2.grid([0.25,0.25,0.25])
+    assert index2.grid([0.25,0.25,0.25]) is grid_1, "grid was not re-used"
+    assert len(grid_index._grid_cache)==0, "grid was put in the shared cache"
+
+
+def test_clustering_randoms_not_cached():
+
+    clear_grid_cache()
+
+    sample1 = np.random.random((100,3))
+    randoms = np.random.random((500,3))
+    rbins = np.linspace(0.1,0.3,5)
+
+    #the grids of plain randoms arrays do not outlive the call
+    tpcf(sample1, rbins, randoms=randoms, period=1.0, estimator='Landy-Szalay')
+    assert len(grid_index._grid_cache)==0, "grids of the randoms were cached"
+
+    #the grids of a GridIndex are cached
+    tpcf(sample1, rbins, randoms=GridIndex(randoms, Lbox=1.0), period=1.0,\
+         estimator='Landy-Szalay')
+    assert len(grid_index._grid_cache)>0, "grids of the randoms were not cached"
+    clear_grid_cache()
+
+
+def test_grid_index_input():
+
+    data1 = np.random.random((100,3))
+
+    with pytest.raises(ValueError):
+        GridIndex(data1[:,:2], Lbox=1.0)
+    with pytest.raises(ValueError):
+        GridIndex(data1, Lbox=[1.0,1.0])
+
+    #the data of an index can not be modified
+    index1 = GridIndex(data1, Lbox=1.0)
+    assert len(index1)==100
+    assert np.all(index1.Lbox==1.0)
+    with pytest.raises(ValueError):
+        index1.data[0,0] = 0.5
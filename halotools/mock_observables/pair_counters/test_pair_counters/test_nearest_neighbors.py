@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pytest
+#load the nearest neighbor search
+from ..nearest_neighbors import nearest_neighbors, xy_z_nearest_neighbors
+
+np.random.seed(1)
+
+def _brute_force_distances(data1, data2, k, period, xy_z=False, pi_max=np.inf):
+    """
+    return the distances to the k nearest neighbors by calculating all separations.
+    """
+
+    dx = np.fabs(data1[:,None,:]-data2[None,:,:])
+    if period is not None:
+        dx = np.minimum(dx, period-dx)
+
+    if xy_z:
+        d = np.sqrt(dx[:,:,0]**2+dx[:,:,1]**2)
+        d[dx[:,:,2]>pi_max] = np.inf
+    else:
+        d = np.sqrt(np.sum(dx**2, axis=2))
+
+    return np.sort(d, axis=1)[:,:k]
+
+def test_nearest_neighbors():
+
+    Npts1, Npts2 = 200, 500
+    period = np.array([1.0,1.0,1.0])
+
+    data1 = np.random.random((Npts1,3))
+    data2 = np.random.random((Npts2,3))
+
+    for PBCs in [True, False]:
+        p = period if PBCs else None
+        test_result = _brute_force_distances(data1, data2, 5, p)
+        for backend in ['processes', 'threads']:
+            for approx_cell_size in [None, 'auto', 0.05]:
+                dist, inds = nearest_neighbors(data1, data2, 5, period=p,\
+                                               backend=backend, N_threads=2,\
+                                               approx_cell_size=approx_cell_size)
+                assert np.allclose(dist, test_result), "distances are incorrect"
+
+                #the indices point to neighbors at these distances
+                dx = np.fabs(data1[:,None,:]-data2[inds])
+                if PBCs: dx = np.minimum(dx, period-dx)
+                assert np.allclose(np.sqrt(np.sum(dx**2, axis=2)), dist),\
+                    "indices are incorrect"
+
+    #each point is its own nearest neighbor
+    dist, inds = nearest_neighbors(data1, data1, 1, period=period)
+    assert np.all(inds[:,0]==np.arange(Npts1))
+    assert np.all(dist[:,0]==0.0)
+
+    #missing neighbors
+    dist, inds = nearest_neighbors(data1, data2[:3], 5, period=period)
+    assert np.all(np.isinf(dist[:,3:])) & np.all(inds[:,3:]==-1)
+
+    with pytest.raises(ValueError):
+        nearest_neighbors(data1, data2, 0, period=period)
+
+def test_xy_z_nearest_neighbors():
+
+    Npts1, Npts2 = 200, 500
+    period = np.array([1.0,1.0,1.0])
+
+    data1 = np.random.random((Npts1,3))
+    data2 = np.random.random((Npts2,3))
+
+    for PBCs in [True, False]:
+        p = period if PBCs else None
+        for pi_max in [0.05, 0.3, None]:
+            test_result = _brute_force_distances(data1, data2, 5, p, True,\
+                                                 np.inf if pi_max is None else pi_max)
+            for backend in ['processes', 'threads']:
+                dist, inds = xy_z_nearest_neighbors(data1, data2, 5, pi_max=pi_max,\
+                                                    period=p, backend=backend)
+                assert np.allclose(dist, test_result), "distances are incorrect"
+
+    with pytest.raises(ValueError):
+        xy_z_nearest_neighbors(data1, data2, 5, pi_max=0.0, period=period)
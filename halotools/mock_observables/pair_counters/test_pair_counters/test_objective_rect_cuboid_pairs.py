@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import numpy as np
+import pytest
 #load comparison simple pair counters
 from ..pairs import wnpairs as simp_wnpairs
 #load rect_cuboid_pairs pair counters
@@ -49,3 +50,45 @@ def test_wnpairs_nonperiodic():
 
     assert np.allclose(test_result,result,rtol=1e-09), "pair counts are incorrect"
 
+
+
+def test_wnpairs_weight_columns():
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    weights1 = np.random.random((Npts,3))
+    weights2 = np.random.random((Npts,3))
+    aux1 = np.random.random((Npts,3))
+    aux2 = np.random.random(Npts)
+    
+    rbins = np.array([0.0,0.1,0.2,0.3,0.4])
+    wfunc = [1,4,8]
+    
+    #each column of weights is counted with its own weighting function, as if it were 
+    #passed on its own
+    for p in [period, None]:
+        result = wnpairs(data1, data2, rbins, Lbox=Lbox, period=p, weights1=weights1,\
+                         weights2=weights2, aux1=aux1, aux2=aux2, wfunc=wfunc)
+        assert np.shape(result)==(3,len(rbins))
+        for i in range(3):
+            test_result = wnpairs(data1, data2, rbins, Lbox=Lbox, period=p,\
+                                  weights1=weights1[:,i], weights2=weights2[:,i],\
+                                  aux1=aux1[:,i], aux2=aux2, wfunc=wfunc[i])
+            assert np.allclose(test_result, result[i], rtol=1e-09),\
+                "pair counts are incorrect"
+    
+    #multiplicative weights
+    result = wnpairs(data1, data2, rbins, Lbox=Lbox, period=period, weights1=weights1,\
+                     weights2=weights2, wfunc=1)
+    test_result = simp_wnpairs(data1, data2, rbins, period=period,\
+                               weights1=weights1[:,2], weights2=weights2[:,2])
+    assert np.allclose(test_result, result[2], rtol=1e-09), "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        wnpairs(data1, data2, rbins, period=period, weights1=weights1, wfunc=[1,2])
+    with pytest.raises(ValueError):
+        wnpairs(data1, data2, rbins, period=period, wfunc=[1,12])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import numpy as np
+import os
+import shutil
+import tempfile
+import pytest
+#load the pair count cache and grid pair counters
+from ..pair_count_cache import PairCountCache
+from ..grid_index import GridIndex
+from ..rect_cuboid_pairs import npairs, xy_z_npairs
+
+np.random.seed(1)
+
+def test_pair_count_cache():
+
+    Npts = 1000
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    randoms = np.random.random((Npts,3))
+    rbins = np.array([0.0,0.05,0.1,0.2])
+    pi_bins = np.linspace(0.0,0.2,3)
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = PairCountCache(cache_dir=cache_dir)
+
+        calls = []
+        def counter(data1, data2, *bins, **kwargs):
+            calls.append(1)
+            return npairs(data1, data2, *bins, **kwargs)
+
+        test_result = npairs(randoms, randoms, rbins, period=period)
+        for i in range(2):
+            result = cache.pair_counts(counter, 'r', randoms, randoms, [rbins],\
+                                       period=period)
+            assert np.all(test_result==result), "pair counts are incorrect"
+        assert len(calls)==1
+
+        #the cache is shared between instances, and a GridIndex of the same randoms
+        #has its own key
+        cache = PairCountCache(cache_dir=cache_dir)
+        result = cache.pair_counts(counter, 'r', randoms, randoms, [rbins], period=period)
+        assert len(calls)==1
+        result = cache.pair_counts(counter, 'r', GridIndex(randoms, Lbox), \
+                                   GridIndex(randoms, Lbox), [rbins], period=period)
+        assert np.all(test_result==result), "pair counts are incorrect"
+        assert len(calls)==2
+
+        #different bins, period, or binning are counted separately
+        cache.pair_counts(counter, 'r', randoms, randoms, [rbins[:-1]], period=period)
+        cache.pair_counts(counter, 'r', randoms, randoms, [rbins], period=None)
+        assert len(calls)==4
+        result = cache.pair_counts(xy_z_npairs, 'xy_z', randoms, randoms,\
+                                   [rbins, pi_bins], period=period)
+        test_result = xy_z_npairs(randoms, randoms, rbins, pi_bins, period=period)
+        assert np.all(test_result==result), "pair counts are incorrect"
+        assert len(os.listdir(cache_dir))==5
+
+        cache.clear()
+        assert cache.size()==0
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_pair_count_cache_eviction():
+
+    Npts = 100
+    period = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.0,0.2,20)
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = PairCountCache(cache_dir=cache_dir)
+        samples = [np.random.random((Npts,3)) for i in range(4)]
+        for sample in samples:
+            cache.pair_counts(npairs, 'r', sample, sample, [rbins], period=period)
+        file_size = cache.size()//4
+
+        #the least recently used counts are removed to make room for new counts
+        cache.max_size = 3*file_size
+        cache.pair_counts(npairs, 'r', samples[0], samples[0], [rbins], period=period)
+        sample = np.random.random((Npts,3))
+        cache.pair_counts(npairs, 'r', sample, sample, [rbins], period=period)
+        assert cache.size()<=cache.max_size
+        keys = [cache._key('r', s, s, [rbins], period) for s in samples]
+        files = os.listdir(cache_dir)
+        assert keys[0]+'.npy' in files
+        assert keys[1]+'.npy' not in files
+        assert keys[2]+'.npy' not in files
+    finally:
+        shutil.rmtree(cache_dir)
+
+    with pytest.raises(ValueError):
+        PairCountCache(cache_dir=cache_dir, max_size=-1)
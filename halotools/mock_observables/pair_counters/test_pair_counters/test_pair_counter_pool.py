@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pytest
+import pickle
+import os
+#load comparison simple pair counters
+from ..pairs import npairs as simp_npairs
+from ..pairs import wnpairs as simp_wnpairs
+#load rect_cuboid_pairs pair counters
+from ..rect_cuboid_pairs import npairs, wnpairs, xy_z_npairs
+from ..pair_counter_pool import PairCounterPool
+from .. import pair_counter_pool
+from ..rect_cuboid import rect_cuboid_cells
+
+np.random.seed(1)
+
+def test_npairs_shared_pool():
+
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    x = np.random.uniform(0, Lbox[0], Npts)
+    y = np.random.uniform(0, Lbox[1], Npts)
+    z = np.random.uniform(0, Lbox[2], Npts)
+    data1 = np.vstack((x,y,z)).T
+
+    rbins = np.array([0.0,0.1,0.2,0.3,0.4,0.5])
+    rp_bins = np.array([0.0,0.1,0.2,0.3])
+    pi_bins = np.array([0.0,0.1,0.2,0.3])
+
+    test_result_1 = simp_npairs(data1, data1, rbins, period=period)
+    test_result_2 = simp_npairs(data1, data1, rbins, period=None)
+    test_result_3 = xy_z_npairs(data1, data1, rp_bins, pi_bins, period=period, N_threads=1)
+
+    #use the same workers for several different calls
+    with PairCounterPool(2) as pool:
+        result_1 = npairs(data1, data1, rbins, period=period, N_threads=pool)
+        result_2 = npairs(data1, data1, rbins, Lbox=Lbox, period=None, N_threads=pool)
+        result_3 = xy_z_npairs(data1, data1, rp_bins, pi_bins, period=period, N_threads=pool)
+
+    assert np.all(test_result_1==result_1), "pair counts are incorrect"
+    assert np.all(test_result_2==result_2), "pair counts are incorrect"
+    assert np.all(test_result_3==result_3), "pair counts are incorrect"
+
+    #the pool can not be used once it has been closed
+    with pytest.raises(ValueError):
+        npairs(data1, data1, rbins, period=period, N_threads=pool)
+
+
+def test_N_threads_processing():
+
+    with pytest.raises(ValueError):
+        PairCounterPool(N_threads='all')
+    with pytest.raises(ValueError):
+        PairCounterPool(N_threads=0)
+
+    pool = PairCounterPool(N_threads='max')
+    assert pool.N_threads>=1
+    pool.close()
+
+
+def test_shared_memory_grids(monkeypatch):
+
+    #place every array into shared memory, regardless of size
+    monkeypatch.setattr(pair_counter_pool, '_MIN_SHARED_NBYTES', 0)
+
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    x = np.random.uniform(0, Lbox[0], Npts)
+    y = np.random.uniform(0, Lbox[1], Npts)
+    z = np.random.uniform(0, Lbox[2], Npts)
+    data1 = np.vstack((x,y,z)).T
+    weights1 = np.random.random(Npts)
+
+    rbins = np.array([0.0,0.1,0.2,0.3,0.4,0.5])
+
+    #a shared grid should be identical to the original when unpickled
+    grid = rect_cuboid_cells(x, y, z, period, np.array([0.25]*3))
+    filenames = []
+    shared_grid = pair_counter_pool._share_grid(grid, filenames)
+    attached_grid = pickle.loads(pickle.dumps(shared_grid, 2))
+    assert np.all(attached_grid.x==grid.x), "shared grid is incorrect"
+    assert np.all(attached_grid.cell_id_indices==grid.cell_id_indices),\
+        "shared grid is incorrect"
+    for filename in filenames:
+        os.remove(filename)
+
+    test_result_1 = simp_npairs(data1, data1, rbins, period=period)
+    test_result_2 = simp_wnpairs(data1, data1, rbins, period=period,\
+                                 weights1=weights1, weights2=weights1)
+
+    with PairCounterPool(2) as pool:
+        result_1 = npairs(data1, data1, rbins, period=period, N_threads=pool)
+        result_2 = wnpairs(data1, data1, rbins, period=period,\
+                           weights1=weights1, weights2=weights1, N_threads=pool)
+
+    assert np.all(test_result_1==result_1), "pair counts are incorrect"
+    assert np.allclose(test_result_2,result_2), "weighted pair counts are incorrect"
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+import numpy as np
+from ..rect_cuboid import rect_cuboid_cells
+
+np.random.seed(1)
+
+def test_cell_id_indices():
+
+    Npts = 1e3
+    Lbox = np.array([1.0,1.0,1.0])
+    cell_size = np.array([0.1,0.2,0.25])
+
+    x = np.random.uniform(0, Lbox[0], Npts)
+    y = np.random.uniform(0, Lbox[1], Npts)
+    z = np.random.uniform(0, Lbox[2], Npts)
+
+    grid = rect_cuboid_cells(x, y, z, Lbox, cell_size)
+
+    Ncells = np.prod(grid.num_divs)
+    assert len(grid.cell_id_indices)==Ncells+1, "cell index is the wrong length"
+    assert grid.cell_id_indices[0]==0, "cell index is incorrect"
+    assert grid.cell_id_indices[-1]==Npts, "cell index is incorrect"
+    assert np.all(np.diff(grid.cell_id_indices)>=0), "cell index is incorrect"
+
+    #every point should lie within the cell it is indexed to
+    for icell in np.random.randint(0, Ncells, 50):
+        ix, iy, iz = np.unravel_index(icell, grid.num_divs)
+        i_start, i_end = grid.cell_id_indices[icell], grid.cell_id_indices[icell+1]
+        assert np.all(np.floor(grid.x[i_start:i_end]/grid.dL[0])==ix), "points are in the wrong cell"
+        assert np.all(np.floor(grid.y[i_start:i_end]/grid.dL[1])==iy), "points are in the wrong cell"
+        assert np.all(np.floor(grid.z[i_start:i_end]/grid.dL[2])==iz), "points are in the wrong cell"
+
+
+def test_refined_adjacent_cells():
+
+    Npts = 1e3
+    Lbox = np.array([1.0,1.0,1.0])
+    search_length = np.array([0.2,0.2,0.2])
+
+    x = np.random.uniform(0, Lbox[0], Npts)
+    y = np.random.uniform(0, Lbox[1], Npts)
+    z = np.random.uniform(0, Lbox[2], Npts)
+
+    #cells equal to the search length only need the immediately adjacent cells
+    grid = rect_cuboid_cells(x, y, z, Lbox, search_length, search_length)
+    assert np.all(grid.num_adjacent==1)
+    assert len(grid.adjacent_cells(0))==27
+    assert len(grid.forward_adjacent_cells(0))==13
+
+    #cells refined by a factor of 2 need a larger search
+    grid = rect_cuboid_cells(x, y, z, Lbox, search_length/2.0, search_length)
+    assert np.all(grid.num_adjacent==2)
+    assert len(grid.adjacent_cells(0))==125
+    assert len(grid.forward_adjacent_cells(0))==62
+
+    #every neighboring cell is found once, either as a forward neighbor of the cell, or 
+    #with the cell as its forward neighbor
+    Ncells = np.prod(grid.num_divs)
+    forward = [set(grid.forward_adjacent_cells(icell)) for icell in range(Ncells)]
+    for icell in np.random.randint(0, Ncells, 10):
+        neighbors = set(grid.adjacent_cells(icell)) - set([icell])
+        backward = set([jcell for jcell in range(Ncells) if icell in forward[jcell]])
+        assert neighbors == (forward[icell] | backward)
+        assert len(forward[icell] & backward)==0
+
+
+def test_cell_bounds():
+
+    Npts = 1e3
+    Lbox = np.array([1.0,1.0,1.0])
+    cell_size = np.array([0.1,0.2,0.25])
+
+    x = np.random.uniform(0, Lbox[0], Npts)
+    y = np.random.uniform(0, 0.5, Npts)
+    z = np.random.uniform(0, Lbox[2], Npts)
+
+    grid = rect_cuboid_cells(x, y, z, Lbox, cell_size)
+
+    Ncells = np.prod(grid.num_divs)
+    assert np.shape(grid.cell_lower)==(Ncells,3)
+    assert np.shape(grid.cell_upper)==(Ncells,3)
+    for icell in range(Ncells):
+        i_start, i_end = grid.cell_id_indices[icell], grid.cell_id_indices[icell+1]
+        if i_start==i_end:
+            #cells with y>0.5 are empty
+            assert np.all(grid.cell_lower[icell]==np.inf)
+            assert np.all(grid.cell_upper[icell]==-np.inf)
+        else:
+            pos = np.vstack((grid.x[i_start:i_end], grid.y[i_start:i_end],\
+                             grid.z[i_start:i_end])).T
+            assert np.all(grid.cell_lower[icell]==np.min(pos, axis=0))
+            assert np.all(grid.cell_upper[icell]==np.max(pos, axis=0))
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import numpy as np
+import pytest
 #load comparison simple pair counters
 from ..pairs import npairs as simp_npairs
 from ..pairs import wnpairs as simp_wnpairs
@@ -8,6 +9,9 @@ from ..pairs import wnpairs as simp_wnpairs
 from ..rect_cuboid_pairs import npairs, wnpairs, jnpairs
 from ..rect_cuboid_pairs import xy_z_npairs, xy_z_wnpairs, xy_z_jnpairs
 from ..rect_cuboid_pairs import s_mu_npairs
+from ..rect_cuboid_pairs import npairs_per_point, xy_z_npairs_per_point
+from ..rect_cuboid_pairs import wp_npairs, labeled_npairs, multipole_npairs
+from .. import rect_cuboid_pairs
 
 np.random.seed(1)
 
@@ -447,4 +451,556 @@ def test_xy_z_jnpairs_nonperiodic():
     assert np.all(result[0]==result_compare), "shape xy_z jackknife pair counts of result is incorrect"
     
     
-    
\ No newline at end of file
+    
+
+def test_auto_pairs(monkeypatch):
+    """
+    compare the symmetric auto-correlation engines to the full engines.
+    """
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    x = np.random.uniform(0, Lbox[0], Npts)
+    y = np.random.uniform(0, Lbox[1], Npts)
+    z = np.random.uniform(0, Lbox[2], Npts)
+    data1 = np.vstack((x,y,z)).T
+    weights1 = np.random.random(Npts)
+    
+    #small enough that there are at least 3 cells along each dimension
+    rbins = np.array([0.0,0.1,0.2,0.3])
+    rp_bins = np.array([0.0,0.1,0.2,0.3])
+    pi_bins = np.array([0.0,0.1,0.2,0.3])
+    mu_bins = np.array([0.0,0.25,0.5,0.75,1.0])
+    
+    auto_results = []
+    for p in [period, None]:
+        auto_results.append(npairs(data1, data1, rbins, Lbox=Lbox, period=p))
+        auto_results.append(wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                                    weights1=weights1, weights2=weights1))
+        auto_results.append(xy_z_npairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=p))
+        auto_results.append(xy_z_wnpairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=p,\
+                                         weights1=weights1, weights2=weights1))
+        auto_results.append(s_mu_npairs(data1, data1, rbins, mu_bins, Lbox=Lbox, period=p))
+    
+    #force the pair counters to use the full engines
+    monkeypatch.setattr(rect_cuboid_pairs, '_is_auto', lambda *args: False)
+    
+    full_results = []
+    for p in [period, None]:
+        full_results.append(npairs(data1, data1, rbins, Lbox=Lbox, period=p))
+        full_results.append(wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                                    weights1=weights1, weights2=weights1))
+        full_results.append(xy_z_npairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=p))
+        full_results.append(xy_z_wnpairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=p,\
+                                         weights1=weights1, weights2=weights1))
+        full_results.append(s_mu_npairs(data1, data1, rbins, mu_bins, Lbox=Lbox, period=p))
+    
+    for auto_result, full_result in zip(auto_results, full_results):
+        assert np.shape(auto_result)==np.shape(full_result), "auto pair counts are incorrect"
+        assert np.allclose(auto_result, full_result, rtol=1e-12), "auto pair counts are incorrect"
+    
+    #unweighted counts must be identical
+    for i in [0,2,4,5,7,9]:
+        assert np.all(auto_results[i]==full_results[i]), "auto pair counts are incorrect"
+    
+    test_result = simp_npairs(data1, data1, rbins, period=period)
+    assert np.all(test_result==auto_results[0]), "pair counts are incorrect"
+
+
+def test_approx_cell_size():
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    weights1 = np.random.random(Npts)
+    
+    rbins = np.array([0.0,0.1,0.2,0.3])
+    rp_bins = np.array([0.0,0.1,0.2,0.3])
+    pi_bins = np.array([0.0,0.1,0.2])
+    
+    #refined cells, with a larger search of neighboring cells, give the same result
+    for p in [period, None]:
+        test_result = npairs(data1, data2, rbins, Lbox=Lbox, period=p)
+        for approx_cell_size in [0.15, [0.1,0.3,0.15], 'auto']:
+            result = npairs(data1, data2, rbins, Lbox=Lbox, period=p,\
+                            approx_cell_size=approx_cell_size)
+            assert np.all(test_result==result), "pair counts are incorrect"
+        
+        test_result = npairs(data1, data1, rbins, Lbox=Lbox, period=p)
+        result = npairs(data1, data1, rbins, Lbox=Lbox, period=p, approx_cell_size=0.1)
+        assert np.all(test_result==result), "pair counts are incorrect"
+        
+        test_result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                              weights1=weights1, weights2=weights1)
+        result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                         weights1=weights1, weights2=weights1, approx_cell_size=0.15)
+        assert np.allclose(test_result, result, rtol=1e-12), "pair counts are incorrect"
+        
+        test_result = xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=Lbox, period=p)
+        result = xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=Lbox, period=p,\
+                             approx_cell_size=[0.15,0.15,0.1])
+        assert np.all(test_result==result), "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        npairs(data1, data2, rbins, period=period, approx_cell_size='small')
+    with pytest.raises(ValueError):
+        npairs(data1, data2, rbins, period=period, approx_cell_size=[0.1,0.1])
+    with pytest.raises(ValueError):
+        npairs(data1, data2, rbins, period=period, approx_cell_size=-0.1)
+
+
+def test_many_bins():
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    #points on a lattice have separations which fall exactly on the bin edges
+    data2 = np.floor(np.random.random((Npts,3))*8.0)/8.0
+    
+    rbins = np.logspace(-2,np.log10(0.3),40)
+    rbins = np.sort(np.append(rbins,[0.125,0.25]))
+    rp_bins = np.logspace(-2,np.log10(0.3),30)
+    pi_bins = np.linspace(0.0,0.3,31)
+    
+    for p in [period, None]:
+        for data in [data1, data2]:
+            test_result = simp_npairs(data, data, rbins, period=p)
+            result = npairs(data, data, rbins, Lbox=Lbox, period=p)
+            assert np.all(test_result==result), "pair counts are incorrect"
+            
+            #counts are cumulative in both dimensions
+            result = xy_z_npairs(data, data, rp_bins, pi_bins, Lbox=Lbox, period=p)
+            result_1d = xy_z_npairs(data, data, rp_bins, pi_bins[-1:], Lbox=Lbox, period=p)
+            assert np.all(result[:,-1]==result_1d[:,0]), "pair counts are incorrect"
+            assert np.all(np.diff(result, axis=0)>=0), "pair counts are not cumulative"
+            assert np.all(np.diff(result, axis=1)>=0), "pair counts are not cumulative"
+
+
+def test_bulk_cell_pairs():
+    """
+    count pairs in wide bins with refined cells, such that many pairs of cells are 
+    skipped, or have all their pairs counted in a single bin.
+    """
+    
+    Npts = 2e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    #points on a lattice have separations which fall exactly on the bin edges
+    data2 = np.floor(np.random.random((Npts,3))*8.0)/8.0
+    
+    rbins = np.array([0.0,0.01,0.125,0.3])
+    
+    for p in [period, None]:
+        for data in [data1, data2]:
+            test_result = simp_npairs(data, data, rbins, period=p)
+            for backend in ['processes', 'threads']:
+                result = npairs(data, data, rbins, Lbox=Lbox, period=p,\
+                                approx_cell_size=[0.05,0.05,0.05], backend=backend)
+                assert np.all(test_result==result), "pair counts are incorrect"
+                
+                result = npairs(data, data1[:100], rbins, Lbox=Lbox, period=p,\
+                                approx_cell_size=[0.05,0.05,0.05], backend=backend)
+                assert np.all(simp_npairs(data, data1[:100], rbins, period=p)==result),\
+                    "pair counts are incorrect"
+
+
+def test_threads_backend():
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    weights1 = np.random.random(Npts)
+    weights2 = np.random.random(Npts)
+    
+    rbins = np.array([0.0,0.1,0.2,0.3])
+    rp_bins = np.array([0.0,0.1,0.2,0.3])
+    pi_bins = np.array([0.0,0.1,0.2])
+    mu_bins = np.linspace(0,1.0,5)
+    
+    #the multi-threaded kernels give the same result as the pool of processes
+    for p in [period, None]:
+        for N_threads in [1,3]:
+            test_result = npairs(data1, data2, rbins, Lbox=Lbox, period=p)
+            result = npairs(data1, data2, rbins, Lbox=Lbox, period=p,\
+                            N_threads=N_threads, backend='threads')
+            assert np.all(test_result==result), "pair counts are incorrect"
+
+            test_result = npairs(data1, data1, rbins, Lbox=Lbox, period=p)
+            result = npairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                            N_threads=N_threads, backend='threads')
+            assert np.all(test_result==result), "pair counts are incorrect"
+
+            test_result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                                  weights1=weights1, weights2=weights1)
+            result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                             weights1=weights1, weights2=weights1,\
+                             N_threads=N_threads, backend='threads')
+            assert np.allclose(test_result, result, rtol=1e-12), "pair counts are incorrect"
+
+            test_result = wnpairs(data1, data2, rbins, Lbox=Lbox, period=p,\
+                                  weights1=weights1, weights2=weights2)
+            result = wnpairs(data1, data2, rbins, Lbox=Lbox, period=p,\
+                             weights1=weights1, weights2=weights2,\
+                             N_threads=N_threads, backend='threads')
+            assert np.allclose(test_result, result, rtol=1e-12), "pair counts are incorrect"
+            
+            test_result = xy_z_npairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=p)
+            result = xy_z_npairs(data1, data1, rp_bins, pi_bins, Lbox=Lbox, period=p,\
+                                 N_threads=N_threads, backend='threads')
+            assert np.all(test_result==result), "pair counts are incorrect"
+            
+            test_result = s_mu_npairs(data1, data2, rbins, mu_bins, Lbox=Lbox, period=p)
+            result = s_mu_npairs(data1, data2, rbins, mu_bins, Lbox=Lbox, period=p,\
+                                 N_threads=N_threads, backend='threads')
+            assert np.all(test_result==result), "pair counts are incorrect"
+    
+    #the neighbors of each cell are found from the stencil, with fewer cells than the
+    #stencil along each dimension, and with finely refined cells
+    for approx_cell_size in [[0.45,0.45,0.45], [0.1,0.2,0.45], [0.03,0.03,0.03]]:
+        rbins = np.array([0.0,0.1,0.2,0.45])
+        for p in [period, None]:
+            test_result = npairs(data1, data1, rbins, Lbox=Lbox, period=p)
+            result = npairs(data1, data1, rbins, Lbox=Lbox, period=p, N_threads=2,\
+                            approx_cell_size=approx_cell_size, backend='threads')
+            assert np.all(test_result==result), "pair counts are incorrect"
+            
+            test_result = npairs(data1, data2, rbins, Lbox=Lbox, period=p)
+            result = npairs(data1, data2, rbins, Lbox=Lbox, period=p, N_threads=2,\
+                            approx_cell_size=approx_cell_size, backend='threads')
+            assert np.all(test_result==result), "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        npairs(data1, data2, rbins, period=period, backend='mpi')
+
+
+def test_single_precision():
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    #single precision positions, e.g. of a mock galaxy catalog
+    data1 = np.random.random((Npts,3)).astype(np.float32)
+    data2 = np.random.random((Npts,3)).astype(np.float32)
+    weights1 = np.random.random(Npts)
+    
+    rbins = np.array([0.0,0.1,0.2,0.3])
+    mu_bins = np.linspace(0,1.0,5)
+    
+    #separations are calculated in double precision, so the counts are the same as for 
+    #the positions converted to double precision
+    for p in [period, None]:
+        test_result = npairs(data1.astype(np.float64), data2.astype(np.float64), rbins,\
+                             Lbox=Lbox, period=p)
+        result = npairs(data1, data2, rbins, Lbox=Lbox, period=p,\
+                        backend='threads', precision='float32')
+        assert np.all(test_result==result), "pair counts are incorrect"
+        
+        test_result = wnpairs(data1.astype(np.float64), data1.astype(np.float64), rbins,\
+                              Lbox=Lbox, period=p, weights1=weights1, weights2=weights1)
+        result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                         weights1=weights1, weights2=weights1,\
+                         backend='threads', precision='float32')
+        assert np.allclose(test_result, result, rtol=1e-12), "pair counts are incorrect"
+        
+        test_result = s_mu_npairs(data1.astype(np.float64), data2.astype(np.float64),\
+                                  rbins, mu_bins, Lbox=Lbox, period=p)
+        result = s_mu_npairs(data1, data2, rbins, mu_bins, Lbox=Lbox, period=p,\
+                             backend='threads', precision='float32')
+        assert np.all(test_result==result), "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        npairs(data1, data2, rbins, period=period, precision='float32')
+    with pytest.raises(ValueError):
+        npairs(data1, data2, rbins, period=period, backend='threads', precision='float16')
+
+
+def test_multi_npairs():
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    
+    rbins = np.array([0.0,0.05,0.1,0.2,0.3])
+    rp_bins = np.logspace(-2,-0.7,6)
+    pi_bins = np.logspace(-2,-0.7,4)
+    mu_bins = np.linspace(0,1.0,5)
+    binnings = [('r', rbins), ('xy_z', rp_bins, pi_bins), ('s_mu', rbins, mu_bins)]
+    
+    #the counts in each binning are the same as for the separate pair counters
+    for p in [period, None]:
+        for backend in ['processes', 'threads']:
+            for d2 in [data1, data2]:
+                result = rect_cuboid_pairs.multi_npairs(data1, d2, binnings, Lbox=Lbox,\
+                                                        period=p, backend=backend)
+                assert len(result)==3
+                test_result = npairs(data1, d2, rbins, Lbox=Lbox, period=p)
+                assert np.all(test_result==result[0]), "pair counts are incorrect"
+                test_result = xy_z_npairs(data1, d2, rp_bins, pi_bins, Lbox=Lbox, period=p)
+                assert np.all(test_result==result[1]), "pair counts are incorrect"
+                test_result = s_mu_npairs(data1, d2, rbins, mu_bins, Lbox=Lbox, period=p)
+                assert np.all(test_result==result[2]), "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        rect_cuboid_pairs.multi_npairs(data1, data2, [('r', rbins, mu_bins)], period=period)
+    with pytest.raises(ValueError):
+        rect_cuboid_pairs.multi_npairs(data1, data2, [('theta', rbins)], period=period)
+
+
+def test_wnpairs_weight_columns():
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    weights1 = np.random.random((Npts,3))
+    weights2 = np.random.random((Npts,3))
+    
+    rbins = np.array([0.0,0.1,0.2,0.3])
+    
+    #each column of weights is counted as if it were passed on its own
+    for p in [period, None]:
+        for backend in ['processes', 'threads']:
+            result = wnpairs(data1, data2, rbins, Lbox=Lbox, period=p, weights1=weights1,\
+                             weights2=weights2, backend=backend)
+            assert np.shape(result)==(3,len(rbins))
+            for i in range(3):
+                test_result = simp_wnpairs(data1, data2, rbins, period=p,\
+                                           weights1=weights1[:,i], weights2=weights2[:,i])
+                assert np.allclose(test_result, result[i], rtol=1e-09),\
+                    "pair counts are incorrect"
+            
+            #auto-correlation, with 1D weights2 used for each column of weights1
+            result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p, weights1=weights1,\
+                             weights2=weights1, backend=backend)
+            test_result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                                  weights1=weights1[:,1], weights2=weights1[:,1])
+            assert np.allclose(test_result, result[1], rtol=1e-09),\
+                "pair counts are incorrect"
+            result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p, weights1=weights1,\
+                             weights2=weights1[:,0], backend=backend)
+            test_result = wnpairs(data1, data1, rbins, Lbox=Lbox, period=p,\
+                                  weights1=weights1[:,2], weights2=weights1[:,0])
+            assert np.allclose(test_result, result[2], rtol=1e-09),\
+                "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        wnpairs(data1, data2, rbins, period=period, weights1=weights1,\
+                weights2=weights2[:,:2])
+
+
+def test_jnpairs_jackknife_samples():
+    
+    Npts = 1e3
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    weights1 = np.random.random(Npts)
+    weights2 = np.random.random(Npts)
+    jtags1 = np.sort(np.random.random_integers(1,5,size=Npts))
+    jtags2 = np.random.random_integers(1,5,size=Npts)
+    
+    rbins = np.array([0.0,0.1,0.2,0.3])
+    
+    #in jackknife sample l, pairs are weighted by 1 if neither point is in subvolume l, 
+    #0.5 if one of the points is, and 0 if both are.
+    for p in [period, None]:
+        result = jnpairs(data1, data2, rbins, Lbox=Lbox, period=p,\
+                         jtags1=jtags1, jtags2=jtags2, N_samples=5,\
+                         weights1=weights1, weights2=weights2)
+        total = simp_wnpairs(data1, data2, rbins, period=p,\
+                             weights1=weights1, weights2=weights2)
+        assert np.allclose(result[0], total, rtol=1e-09), "pair counts are incorrect"
+        for l in range(1,6):
+            in_l1 = simp_wnpairs(data1, data2, rbins, period=p,\
+                                 weights1=weights1*(jtags1==l), weights2=weights2)
+            in_l2 = simp_wnpairs(data1, data2, rbins, period=p,\
+                                 weights1=weights1, weights2=weights2*(jtags2==l))
+            test_result = total - 0.5*in_l1 - 0.5*in_l2
+            assert np.allclose(result[l], test_result, rtol=1e-09),\
+                "pair counts are incorrect"
+        
+        
+        result = xy_z_jnpairs(data1, data2, rbins, rbins, Lbox=Lbox, period=p,\
+                              jtags1=jtags1, jtags2=jtags2, N_samples=5,\
+                              weights1=weights1, weights2=weights2)
+        total = xy_z_wnpairs(data1, data2, rbins, rbins, Lbox=Lbox, period=p,\
+                             weights1=weights1, weights2=weights2)
+        assert np.allclose(result[0], total, rtol=1e-09), "pair counts are incorrect"
+        in_l1 = xy_z_wnpairs(data1, data2, rbins, rbins, Lbox=Lbox, period=p,\
+                             weights1=weights1*(jtags1==3), weights2=weights2)
+        in_l2 = xy_z_wnpairs(data1, data2, rbins, rbins, Lbox=Lbox, period=p,\
+                             weights1=weights1, weights2=weights2*(jtags2==3))
+        test_result = total - 0.5*in_l1 - 0.5*in_l2
+        assert np.allclose(result[3], test_result, rtol=1e-09), "pair counts are incorrect"
+
+
+def test_npairs_per_point():
+    
+    Npts = 500
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((2*Npts,3))
+    weights2 = np.random.random(2*Npts)
+    rbins = np.array([0.0,0.05,0.1,0.2])
+    
+    for p in [period, None]:
+        for backend in ['processes', 'threads']:
+            result = npairs_per_point(data1, data2, rbins, Lbox=Lbox, period=p,\
+                                      backend=backend)
+            assert np.shape(result)==(Npts,len(rbins))
+            #the counts around each point sum to the pair counts
+            test_result = npairs(data1, data2, rbins, Lbox=Lbox, period=p)
+            assert np.all(np.sum(result,axis=0)==test_result), "pair counts are incorrect"
+            for i in [0, Npts-1]:
+                test_result = simp_npairs(data1[i:i+1], data2, rbins, period=p)
+                assert np.all(result[i]==test_result), "pair counts are incorrect"
+            
+            result = npairs_per_point(data1, data2, rbins, Lbox=Lbox, period=p,\
+                                      weights2=weights2, backend=backend)
+            test_result = wnpairs(data1, data2, rbins, Lbox=Lbox, period=p,\
+                                  weights2=weights2)
+            assert np.allclose(np.sum(result,axis=0),test_result), "pair counts are incorrect"
+            
+            #each point of a sample is its own neighbor
+            result = npairs_per_point(data1, data1, rbins, Lbox=Lbox, period=p,\
+                                      backend=backend)
+            assert np.all(result[:,0]==1), "pair counts are incorrect"
+
+
+def test_xy_z_npairs_per_point():
+    
+    Npts = 500
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((2*Npts,3))
+    rp_bins = np.array([0.05,0.1,0.2])
+    pi_bins = np.array([0.1,0.3])
+    
+    for p in [period, None]:
+        for backend in ['processes', 'threads']:
+            result = xy_z_npairs_per_point(data1, data2, rp_bins, pi_bins, Lbox=Lbox,\
+                                           period=p, backend=backend)
+            assert np.shape(result)==(Npts,len(rp_bins),len(pi_bins))
+            test_result = xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=Lbox, period=p)
+            assert np.all(np.sum(result,axis=0)==test_result), "pair counts are incorrect"
+            test_result = xy_z_npairs(data1[:1], data2, rp_bins, pi_bins, Lbox=Lbox,\
+                                      period=p)
+            assert np.all(result[0]==test_result), "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        xy_z_npairs_per_point(data1, data2, rp_bins, pi_bins, period=period,\
+                              weights2=np.ones(Npts))
+
+
+def test_wp_npairs():
+    
+    Npts = 1000
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    rp_bins = np.array([0.0,0.05,0.1,0.2])
+    pi_max = 0.3
+    
+    for p in [period, None]:
+        for backend in ['processes', 'threads']:
+            #the pairs of a sample with itself, and of two samples
+            for sample in [data1, data2]:
+                result = wp_npairs(data1, sample, rp_bins, pi_max, Lbox=Lbox, period=p,\
+                                   backend=backend, N_threads=2)
+                test_result = xy_z_npairs(data1, sample, rp_bins, [pi_max], Lbox=Lbox,\
+                                          period=p)
+                assert np.all(result==test_result[:,0]), "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        wp_npairs(data1, data2, rp_bins, 0.0, period=period)
+
+def test_labeled_npairs():
+    
+    Npts = 1000
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    labels1 = np.random.randint(0,3,Npts)
+    labels2 = np.random.randint(0,2,Npts)
+    rbins = np.array([0.0,0.05,0.1,0.2])
+    
+    for p in [period, None]:
+        for backend in ['processes', 'threads']:
+            #the pairs of a sample with itself, and of two samples
+            for sample, labels in [(data1, labels1), (data2, labels2)]:
+                result = labeled_npairs(data1, sample, rbins, labels1, labels, Lbox=Lbox,\
+                                        period=p, backend=backend, N_threads=2)
+                assert result.shape==(3, np.max(labels)+1, len(rbins))
+                for a in range(result.shape[0]):
+                    for b in range(result.shape[1]):
+                        test_result = npairs(data1[labels1==a], sample[labels==b], rbins,\
+                                             Lbox=Lbox, period=p)
+                        assert np.all(result[a,b]==test_result), "pair counts are incorrect"
+    
+    with pytest.raises(ValueError):
+        labeled_npairs(data1, data2, rbins, labels1-1, labels2, period=period)
+    with pytest.raises(ValueError):
+        labeled_npairs(data1, data2, rbins, labels1[1:], labels2, period=period)
+
+def test_multipole_npairs():
+    
+    Npts = 500
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+    
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    s_bins = np.array([0.0,0.05,0.1,0.2])
+    
+    for p in [period, None]:
+        for backend in ['processes', 'threads']:
+            #the pairs of a sample with itself, and of two samples
+            for sample in [data1, data2]:
+                result = multipole_npairs(data1, sample, s_bins, ells=[0,2,4],\
+                                          Lbox=Lbox, period=p, backend=backend,\
+                                          N_threads=2)
+                
+                #sum the Legendre polynomials of all the separations
+                dx = np.fabs(data1[:,None,:]-sample[None,:,:])
+                if p is not None: dx = np.minimum(dx, p-dx)
+                s = np.sqrt(np.sum(dx**2, axis=2))
+                mu = dx[:,:,2]/np.where(s>0.0, s, 1.0)
+                legendre = [np.ones(mu.shape), 0.5*(3.0*mu**2-1.0),\
+                            (35.0*mu**4-30.0*mu**2+3.0)/8.0]
+                test_result = np.array([[np.sum(P[s<=r]) for P in legendre]\
+                                        for r in s_bins])
+                
+                assert np.allclose(result, test_result), "multipoles are incorrect"
+                assert np.all(result[:,0]==npairs(data1, sample, s_bins, Lbox=Lbox,\
+                                                  period=p))
+    
+    with pytest.raises(ValueError):
+        multipole_npairs(data1, data2, s_bins, ells=[-2], period=period)
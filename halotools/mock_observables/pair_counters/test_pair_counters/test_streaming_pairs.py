@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import numpy as np
+import os
+import tempfile
+import pytest
+#load streaming and grid pair counters
+from ..streaming_pairs import npairs, xy_z_npairs
+from .. import rect_cuboid_pairs
+
+np.random.seed(1)
+
+def test_npairs_memmap():
+
+    Npts = 2000
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    data1 = np.random.random((Npts,3))
+    rbins = np.logspace(-2,-0.7,8)
+
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        mdata1 = np.memmap(filename, dtype=np.float64, mode='w+', shape=data1.shape)
+        mdata1[:] = data1
+        mdata1.flush()
+
+        for p in [period, None]:
+            result = npairs(mdata1, mdata1, rbins, Lbox=Lbox, period=p, chunk_size=333)
+            test_result = rect_cuboid_pairs.npairs(data1, data1, rbins, Lbox=Lbox, period=p)
+            assert np.all(test_result==result), "pair counts are incorrect"
+        del mdata1
+    finally:
+        os.remove(filename)
+
+
+def test_npairs_chunks():
+
+    Npts = 2000
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    rbins = np.logspace(-2,-0.7,8)
+
+    for p in [period, None]:
+        test_result = rect_cuboid_pairs.npairs(data1, data2, rbins, Lbox=Lbox, period=p)
+        for num_slabs in [1, 2, 7]:
+            chunks = (data2[i:i+300] for i in range(0, Npts, 300))
+            result = npairs(data1, chunks, rbins, Lbox=Lbox, period=p, num_slabs=num_slabs)
+            assert np.all(test_result==result), "pair counts are incorrect"
+            assert result.dtype==np.int64, "pair counts are not integers"
+
+    #the box enclosing an iterator of chunks can not be found
+    chunks = (data2[i:i+300] for i in range(0, Npts, 300))
+    with pytest.raises(ValueError):
+        npairs(data1, chunks, rbins)
+
+
+def test_xy_z_npairs():
+
+    Npts = 2000
+    Lbox = [1.0,1.0,1.0]
+    period = np.array(Lbox)
+
+    data1 = np.random.random((Npts,3))
+    data2 = np.random.random((Npts,3))
+    rp_bins = np.logspace(-2,-0.7,6)
+    pi_bins = np.logspace(-2,-0.7,4)
+
+    for p in [period, None]:
+        result = xy_z_npairs(data1, data2, rp_bins, pi_bins, Lbox=Lbox, period=p,\
+                             verbose=True)
+        test_result = rect_cuboid_pairs.xy_z_npairs(data1, data2, rp_bins, pi_bins,\
+                                                    Lbox=Lbox, period=p)
+        assert np.all(test_result==result), "pair counts are incorrect"
+        assert result.dtype==np.int64, "pair counts are not integers"
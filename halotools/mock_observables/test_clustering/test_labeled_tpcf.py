@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+from __future__ import division, print_function
+import numpy as np
+from ..clustering import labeled_tpcf, tpcf
+
+__all__=['test_labeled_tpcf_periodic','test_labeled_tpcf_randoms']
+
+
+####labeled two point correlation function################################################
+
+def test_labeled_tpcf_periodic():
+    sample1 = np.random.random((1000,3))
+    labels = np.random.choice([1,4,7], 1000)
+    period = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.01,0.2,5)
+    
+    result, DD = labeled_tpcf(sample1, labels, rbins, period=period,\
+                              return_pair_counts=True)
+    
+    assert result.shape==(3,3,len(rbins)-1), "correlation functions have the wrong shape"
+    assert np.all(DD==np.transpose(DD, (1,0,2))), "pair counts are not symmetric"
+    
+    #the matrix contains the auto and cross-correlation functions of the samples
+    for a, label_a in enumerate([1,4,7]):
+        auto = tpcf(sample1[labels==label_a], rbins, period=period)
+        assert np.allclose(result[a,a], auto), "auto-correlation is incorrect"
+        for b, label_b in enumerate([1,4,7]):
+            if a==b: continue
+            cross = tpcf(sample1[labels==label_a], rbins, sample2=sample1[labels==label_b],\
+                         period=period, do_auto=False)
+            assert np.allclose(result[a,b], cross), "cross-correlation is incorrect"
+
+
+def test_labeled_tpcf_randoms():
+    sample1 = np.random.random((1000,3))
+    labels = np.random.randint(0,2,1000)
+    randoms = np.random.random((1000,3))
+    rbins = np.linspace(0.01,0.2,5)
+    
+    for estimator in ['Natural', 'Davis-Peebles', 'Landy-Szalay']:
+        result = labeled_tpcf(sample1, labels, rbins, randoms=randoms,\
+                              estimator=estimator)
+        for a in range(2):
+            for b in range(2):
+                test_result = tpcf(sample1[labels==a], rbins,\
+                                   sample2=sample1[labels==b] if a!=b else None,\
+                                   randoms=randoms, estimator=estimator, do_auto=(a==b))
+                assert np.allclose(result[a,b], test_result), "correlation is incorrect"
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+from __future__ import division, print_function
+import numpy as np
+import pytest
+from ..clustering import marked_tpcf
+
+__all__=['test_marked_tpcf_brute_force','test_marked_tpcf_random_marks',\
+         'test_marked_tpcf_cross']
+
+
+####marked two point correlation function#################################################
+
+def _brute_force_marked_tpcf(sample1, sample2, marks1, marks2, rbins, period, auto):
+    """
+    marked correlation function from all pairs, with the normalisation calculated by 
+    averaging the mark products of all pairs of different points.
+    """
+    dx = np.fabs(sample1[:,None,:]-sample2[None,:,:])
+    dx = np.minimum(dx, period-dx)
+    d = np.sqrt(np.sum(dx**2, axis=2))
+    ww = marks1[:,None]*marks2[None,:]
+    if auto:
+        np.fill_diagonal(d, np.inf)
+        norm = np.mean(ww[~np.eye(len(sample1), dtype=bool)])
+    else:
+        norm = np.mean(ww)
+    
+    inds = np.digitize(d.ravel(), rbins)
+    DD = np.bincount(inds, minlength=len(rbins)+1)[1:len(rbins)]
+    WW = np.bincount(inds, weights=ww.ravel(), minlength=len(rbins)+1)[1:len(rbins)]
+    
+    return WW/(DD*norm)
+
+
+def test_marked_tpcf_brute_force():
+    sample1 = np.random.random((500,3))
+    marks = np.random.random((500,2))
+    period = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.05,0.3,6)
+    
+    #several marks are computed at once
+    result = marked_tpcf(sample1, rbins, marks, period=period)
+    assert result.shape==(2,len(rbins)-1), "marked correlation function has wrong shape"
+    
+    for i in range(2):
+        test_result = _brute_force_marked_tpcf(sample1, sample1, marks[:,i], marks[:,i],\
+                                               rbins, period, True)
+        assert np.allclose(result[i], test_result), "marked correlation is incorrect"
+        
+        #a single mark returns a 1-D array
+        single = marked_tpcf(sample1, rbins, marks[:,i], period=period, N_threads=2)
+        assert np.allclose(single, result[i]), "single mark result is incorrect"
+
+
+def test_marked_tpcf_random_marks():
+    sample1 = np.random.random((2000,3))
+    period = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.05,0.25,5)
+    
+    #constant marks give exactly one
+    result = marked_tpcf(sample1, rbins, 3.0*np.ones(2000), period=period)
+    assert np.allclose(result, 1.0), "constant marks should give M(r)=1"
+    
+    #the analytic normalisation agrees with the average over shuffled marks
+    marks = np.random.exponential(size=2000)
+    shuffled = np.empty((20,2000))
+    for i in range(20):
+        shuffled[i] = np.random.permutation(marks)
+    result = marked_tpcf(sample1, rbins, shuffled.T, period=period)
+    assert np.allclose(np.mean(result, axis=0), 1.0, atol=0.01),\
+        "randomly assigned marks should give M(r)=1 on average"
+
+
+def test_marked_tpcf_cross():
+    sample1 = np.random.random((300,3))
+    sample2 = np.random.random((400,3))
+    marks1 = np.random.random(300)
+    marks2 = np.random.random(400)
+    period = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.05,0.3,6)
+    
+    M_11, M_12, M_22 = marked_tpcf(sample1, rbins, marks1, sample2=sample2,\
+                                   marks2=marks2, period=period)
+    
+    test_11 = _brute_force_marked_tpcf(sample1, sample1, marks1, marks1, rbins, period, True)
+    test_12 = _brute_force_marked_tpcf(sample1, sample2, marks1, marks2, rbins, period, False)
+    test_22 = _brute_force_marked_tpcf(sample2, sample2, marks2, marks2, rbins, period, True)
+    assert np.allclose(M_11, test_11), "auto-correlation of sample1 is incorrect"
+    assert np.allclose(M_12, test_12), "cross-correlation is incorrect"
+    assert np.allclose(M_22, test_22), "auto-correlation of sample2 is incorrect"
+    
+    M_12 = marked_tpcf(sample1, rbins, marks1, sample2=sample2, marks2=marks2,\
+                       period=period, do_auto=False)
+    assert np.allclose(M_12, test_12), "cross-correlation is incorrect"
+    
+    with pytest.raises(ValueError):
+        marked_tpcf(sample1, rbins, marks1, sample2=sample2, period=period)
+    with pytest.raises(ValueError):
+        marked_tpcf(sample1, rbins, marks2, period=period)
@@ -3,10 +3,14 @@
 from __future__ import division, print_function
 import numpy as np
 import sys
+import os
+import shutil
+import tempfile
 from ..clustering import tpcf
+from ..pair_counters.pair_count_cache import PairCountCache
 
 __all__=['test_TPCF_auto', 'test_TPCF_estimator', 'test_TPCF_sample_size_limit',\
-         'test_TPCF_randoms', 'test_TPCF_period_API']
+         'test_TPCF_randoms', 'test_TPCF_period_API', 'test_TPCF_rr_cache']
 
 ####two point correlation function########################################################
 
@@ -130,4 +134,26 @@ def test_TPCF_period_API():
     
     assert len(result_1)==3, "One or more correlation functions returned erroneously."
     assert len(result_2)==3, "One or more correlation functions returned erroneously."
-##########################################################################################
\ No newline at end of file
+##########################################################################################
+
+def test_TPCF_rr_cache():
+    
+    sample1 = np.random.random((100,3))
+    randoms = np.random.random((1000,3))
+    period = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.0,0.3,5)
+    
+    cache_dir = tempfile.mkdtemp()
+    try:
+        rr_cache = PairCountCache(cache_dir=cache_dir)
+        for p in [period, None]:
+            result_1 = tpcf(sample1, rbins, randoms=randoms, period=p,\
+                            estimator='Landy-Szalay')
+            #RR is counted, and then read from the cache
+            for i in range(2):
+                result_2 = tpcf(sample1, rbins, randoms=randoms, period=p,\
+                                estimator='Landy-Szalay', rr_cache=rr_cache)
+                assert np.allclose(result_1,result_2), "correlation functions do not match"
+        assert len(os.listdir(cache_dir))==2
+    finally:
+        shutil.rmtree(cache_dir)
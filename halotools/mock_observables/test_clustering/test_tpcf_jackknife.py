@@ -5,7 +5,8 @@ import numpy as np
 import sys
 from ..clustering import tpcf_jackknife, tpcf
 
-__all__=['test_tpcf_jackknife']
+__all__=['test_tpcf_jackknife','test_tpcf_jackknife_cov_matrix',\
+         'test_tpcf_jackknife_analytic_randoms']
 
 
 def test_tpcf_jackknife():
@@ -39,4 +40,52 @@ def test_tpcf_jackknife_cov_matrix():
     result_1,err = tpcf_jackknife(sample1, randoms, rbins, Nsub=5, Lbox=Lbox, period = period, N_threads=1)
     
     print(err)
-    assert np.shape(err)==(nbins,nbins), "correlation functions do not match"
\ No newline at end of file
+    assert np.shape(err)==(nbins,nbins), "correlation functions do not match"
+
+def test_tpcf_jackknife_analytic_randoms():
+    
+    Npts=100
+    sample1 = np.random.random((Npts,3))
+    period = np.array([1.0,1.0,1.0])
+    Lbox = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.0,0.1,5)
+    nbins = len(rbins)-1
+    
+    #without randoms, the random counts are calculated analytically
+    result_1,err = tpcf_jackknife(sample1, None, rbins, Nsub=3, Lbox=Lbox, period=period)
+    result_2 = tpcf(sample1, rbins, period=period)
+    
+    assert np.allclose(result_1,result_2,rtol=1e-09), "correlation functions do not match"
+    assert np.shape(err)==(nbins,nbins), "covariance matrix is the wrong shape"
+    assert np.all(np.isfinite(err)), "covariance matrix is not finite"
+    
+    try:
+        tpcf_jackknife(sample1, None, rbins, Nsub=3, Lbox=Lbox, period=None)
+    except ValueError:
+        pass
+    else:
+        assert False, "randoms must be required without PBCs"
+    
+    #the DR pairs of the jackknife samples have no analytic form
+    for estimator in ['Davis-Peebles', 'Hewett', 'Hamilton', 'Landy-Szalay']:
+        try:
+            tpcf_jackknife(sample1, None, rbins, Nsub=3, Lbox=Lbox, period=period,\
+                           estimator=estimator)
+        except ValueError:
+            pass
+        else:
+            assert False, "randoms must be required for {0}".format(estimator)
+    
+    #on a clustered sample, the covariance agrees with the one from dense randoms
+    centers = np.random.random((20,3))
+    blobs = (centers[np.random.randint(0,20,500)] + 0.02*np.random.randn(500,3)) % 1.0
+    sample1 = np.vstack((blobs, np.random.random((500,3))))
+    randoms = np.random.random((20000,3))
+    rbins = np.linspace(0.02,0.2,5)
+    
+    result_1,err_1 = tpcf_jackknife(sample1, None, rbins, Nsub=3, Lbox=Lbox, period=period)
+    result_2,err_2 = tpcf_jackknife(sample1, randoms, rbins, Nsub=3, Lbox=Lbox,\
+                                    period=period)
+    
+    assert np.allclose(np.sqrt(np.diag(err_1)), np.sqrt(np.diag(err_2)), rtol=0.05),\
+        "jackknife errors do not match the errors from randoms"
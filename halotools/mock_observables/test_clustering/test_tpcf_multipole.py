@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+from __future__ import division, print_function
+import numpy as np
+import pytest
+from ..clustering import tpcf_multipole, tpcf, s_mu_tpcf
+
+__all__=['test_tpcf_multipole_monopole','test_tpcf_multipole_quadrupole',\
+         'test_tpcf_multipole_cross']
+
+
+####two point correlation function multipoles#############################################
+
+def test_tpcf_multipole_monopole():
+    sample1 = np.random.random((1000,3))
+    randoms = np.random.random((1000,3))
+    period = np.array([1.0,1.0,1.0])
+    s_bins = np.linspace(0.01,0.2,5)
+    
+    #the monopole is the correlation function
+    for estimator in ['Natural', 'Davis-Peebles', 'Hewett', 'Hamilton', 'Landy-Szalay']:
+        for rand, p in [(None, period), (randoms, period), (randoms, None)]:
+            result = tpcf_multipole(sample1, s_bins, ells=[0,2], randoms=rand, period=p,\
+                                    estimator=estimator)
+            assert result.shape==(len(s_bins)-1, 2)
+            test_result = tpcf(sample1, s_bins, randoms=rand, period=p,\
+                               estimator=estimator)
+            assert np.allclose(result[:,0], test_result), "monopole is incorrect"
+    
+    with pytest.raises(ValueError):
+        tpcf_multipole(sample1, s_bins, ells=[0,1], period=period)
+
+
+def test_tpcf_multipole_quadrupole():
+    #clumps elongated along the line of sight
+    centers = np.random.random((200,3))
+    offsets = np.random.normal(0.0, [0.01,0.01,0.03], (2000,3))
+    sample1 = (np.repeat(centers, 10, axis=0) + offsets) % 1.0
+    period = np.array([1.0,1.0,1.0])
+    s_bins = np.linspace(0.02,0.1,5)
+    
+    result = tpcf_multipole(sample1, s_bins, ells=[2], period=period)
+    assert np.all(result[:,0]>0.0), "quadrupole of elongated clumps should be positive"
+    
+    #the same as integrating xi(s,mu) over finely binned mu
+    mu_bins = np.linspace(0.0,1.0,201)
+    mu = 0.5*(mu_bins[1:]+mu_bins[:-1])
+    xi_s_mu = s_mu_tpcf(sample1, s_bins, mu_bins, period=period)
+    test_result = 5.0*np.sum(xi_s_mu*0.5*(3.0*mu**2-1.0)*np.diff(mu_bins), axis=1)
+    assert np.allclose(result[:,0], test_result, rtol=0.01), "quadrupole is incorrect"
+
+
+def test_tpcf_multipole_cross():
+    sample1 = np.random.random((500,3))
+    sample2 = np.random.random((500,3))
+    period = np.array([1.0,1.0,1.0])
+    s_bins = np.linspace(0.01,0.2,5)
+    
+    xi_11, xi_12, xi_22 = tpcf_multipole(sample1, s_bins, sample2=sample2, period=period)
+    assert xi_12.shape==(len(s_bins)-1, 3)
+    assert np.allclose(xi_12[:,0], tpcf(sample1, s_bins, sample2=sample2, period=period,\
+                                        do_auto=False))
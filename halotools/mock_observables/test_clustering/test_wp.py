@@ -3,9 +3,11 @@
 from __future__ import division, print_function
 import numpy as np
 import sys
-from ..clustering import wp
+from ..clustering import wp, tpcf, redshift_space_tpcf
+from ..pair_counters import BatchPairCounter
 
-__all__=['test_wp_auto','test_wp_auto_periodic','test_wp_cross_periodic',]
+__all__=['test_wp_auto','test_wp_auto_periodic','test_wp_cross_periodic',\
+         'test_wp_shared_pair_counter','test_wp_direct']
 
 
 ####two point correlation function########################################################
@@ -62,3 +64,68 @@ def test_wp_cross_periodic():
     assert result[2].ndim == 1, "dimension auto incorrect"
 
 
+def test_wp_shared_pair_counter():
+    sample1 = np.random.random((100,3))
+    randoms = np.random.random((100,3))
+    period = np.array([1,1,1])
+    rp_bins = np.linspace(0,0.5,5)
+    pi_bins = np.linspace(0,0.5,5)
+    
+    #the pairs for tpcf and wp are counted once, in both binnings
+    counter = BatchPairCounter([('r', rp_bins), ('xy_z', rp_bins, pi_bins)])
+    
+    result_1 = tpcf(sample1, rp_bins, randoms=randoms, period=period,
+                    estimator='Natural', pair_counter=counter)
+    result_2 = wp(sample1, rp_bins, pi_bins, randoms=randoms, period=period,
+                  estimator='Natural', pair_counter=counter)
+    
+    assert np.allclose(result_1, tpcf(sample1, rp_bins, randoms=randoms, period=period,
+                                      estimator='Natural')), "tpcf is incorrect"
+    assert np.allclose(result_2, wp(sample1, rp_bins, pi_bins, randoms=randoms,
+                                    period=period, estimator='Natural')), "wp is incorrect"
+
+
+def test_wp_direct():
+    sample1 = np.random.random((1000,3))
+    sample2 = np.random.random((1000,3))
+    randoms = np.random.random((1000,3))
+    period = np.array([1,1,1])
+    rp_bins = np.linspace(0,0.2,5)
+    pi_bins = np.linspace(0,0.3,4)
+    
+    def integrate_2D_xi(x,pi_bins):
+        return np.sum(x*np.diff(pi_bins),axis=1)
+    
+    #with analytic randoms, w_p is counted directly within pi_max, and is the same as 
+    #the integral of the redshift space correlation function over the pi bins
+    for estimator in ['Natural', 'Landy-Szalay']:
+        result = wp(sample1, rp_bins, pi_bins, sample2=sample2, period=period,
+                    estimator=estimator)
+        test_result = redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=sample2,
+                                          period=period, estimator=estimator)
+        for r, t in zip(result, test_result):
+            assert np.allclose(r, integrate_2D_xi(t, pi_bins)), "wp is incorrect"
+    
+    #uniform points are uncorrelated
+    assert np.all(np.fabs(result[0])<0.05*pi_bins[-1])
+    
+    #with randoms, w_p is counted directly if there is a single pi bin
+    pi_bins = np.array([0.0,0.3])
+    for p in [period, None]:
+        result = wp(sample1, rp_bins, pi_bins, randoms=randoms, period=p,
+                    estimator='Landy-Szalay')
+        test_result = redshift_space_tpcf(sample1, rp_bins, pi_bins, randoms=randoms,
+                                          period=p, estimator='Landy-Szalay')
+        assert np.allclose(result, integrate_2D_xi(test_result, pi_bins)),\
+            "wp is incorrect"
+    
+    #only the auto-correlation, which uses the DR pairs with every estimator
+    result = wp(sample1, rp_bins, pi_bins, sample2=sample2, randoms=randoms,
+                do_cross=False, estimator='Natural')
+    test_result = redshift_space_tpcf(sample1, rp_bins, pi_bins, sample2=sample2,
+                                      randoms=randoms, do_cross=False,
+                                      estimator='Natural')
+    assert np.allclose(result, integrate_2D_xi(test_result, pi_bins)), "wp is incorrect"
+    result = wp(sample1, rp_bins, pi_bins, sample2=sample2, randoms=randoms,
+                period=period, do_cross=False, estimator='Natural')
+    assert np.shape(result)==(len(rp_bins)-1,), "wp is incorrect"
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+from __future__ import division, print_function
+import numpy as np
+import pytest
+from ..mesh_clustering import power_spectrum, mesh_tpcf
+from ..clustering import tpcf
+
+__all__=['test_mesh_tpcf','test_mesh_tpcf_cross','test_power_spectrum_shot_noise',\
+         'test_mesh_input']
+
+#set random seed to get consistent behavior
+np.random.seed(1)
+
+
+def _clustered_sample(N_clumps, N_per_clump, sigma):
+    """
+    return points in gaussian clumps in a unit box.
+    """
+    centers = np.random.random((N_clumps,3))
+    offsets = np.random.normal(0.0, sigma, (N_clumps*N_per_clump,3))
+    return (np.repeat(centers, N_per_clump, axis=0) + offsets) % 1.0
+
+
+def test_mesh_tpcf():
+    sample1 = _clustered_sample(500, 10, 0.02)
+    period = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.04,0.2,5)
+    
+    #the mesh agrees with the pair counts on scales larger than a few mesh cells
+    test_result = tpcf(sample1, rbins, period=period)
+    for assignment in ['NGP', 'CIC', 'TSC']:
+        result = mesh_tpcf(sample1, rbins, period=period, Nmesh=128,\
+                           assignment=assignment)
+        assert np.allclose(result, test_result, rtol=0.1, atol=0.01),\
+            "correlation function is incorrect"
+    
+    #separations larger than Lbox/2 may be used
+    result = mesh_tpcf(sample1, [0.5,0.6,0.7], period=period, Nmesh=32)
+    assert np.all(np.isfinite(result)) & np.all(np.fabs(result)<0.1)
+
+
+def test_mesh_tpcf_cross():
+    sample1 = _clustered_sample(500, 10, 0.02)
+    sample2 = sample1[::2]
+    period = np.array([1.0,1.0,1.0])
+    rbins = np.linspace(0.04,0.2,5)
+    
+    xi_11, xi_12, xi_22 = mesh_tpcf(sample1, rbins, sample2=sample2, period=period,\
+                                    Nmesh=128)
+    test_result = tpcf(sample1, rbins, sample2=sample2, period=period, do_auto=False)
+    assert np.allclose(xi_12, test_result, rtol=0.1, atol=0.01)
+    
+    xi_12 = mesh_tpcf(sample1, rbins, sample2=sample2, period=period, Nmesh=64,\
+                      do_auto=False)
+    assert np.shape(xi_12)==(len(rbins)-1,)
+
+
+def test_power_spectrum_shot_noise():
+    N = 20000
+    sample1 = np.random.random((N,3))
+    period = np.array([1.0,1.0,1.0])
+    k_bins = np.linspace(40.0,160.0,7)
+    
+    #the power of random points is all shot noise, V/N, which is removed
+    for assignment in ['NGP', 'CIC', 'TSC']:
+        P = power_spectrum(sample1, k_bins, period=period, Nmesh=64,\
+                           assignment=assignment)
+        assert np.shape(P)==(len(k_bins)-1,)
+        assert np.all(np.fabs(P)<0.1/N), "shot noise is not removed"
+    
+    #there is no shot noise in the cross-power of independent samples
+    sample2 = np.random.random((N,3))
+    P_12 = power_spectrum(sample1, k_bins, sample2=sample2, period=period, Nmesh=64,\
+                          do_auto=False)
+    assert np.all(np.fabs(P_12)<0.1/N)
+
+
+def test_mesh_input():
+    sample1 = np.random.random((100,3))
+    rbins = np.linspace(0.1,0.3,5)
+    period = np.array([1.0,1.0,1.0])
+    
+    with pytest.raises(ValueError):
+        mesh_tpcf(sample1, rbins, period=None)
+    with pytest.raises(ValueError):
+        mesh_tpcf(sample1, rbins, period=period, assignment='PCS')
+    with pytest.raises(ValueError):
+        mesh_tpcf(sample1, [0.1,0.9], period=period)